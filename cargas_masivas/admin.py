@@ -1,11 +1,13 @@
 # archivo: cargas_masivas/admin.py
 from django.contrib import admin
-from .models import LoteConsultaMasiva
+from .models import LoteConsultaMasiva, NotificacionCorreo
+from django.urls import reverse
 from django.utils.html import format_html
+from cola_tareas.cola import encolar
 
 @admin.register(LoteConsultaMasiva)
 class LoteAdmin(admin.ModelAdmin):
-    list_display = ('fecha_solicitud', 'empresa', 'usuario_solicitante', 'estado', 'archivo_subido_link')
+    list_display = ('fecha_solicitud', 'empresa', 'usuario_solicitante', 'estado', 'total_filas', 'filas_invalidas', 'archivo_subido_link')
     list_filter = ('estado', 'empresa')
     search_fields = ('usuario_solicitante__username', 'empresa__nombre')
 
@@ -26,11 +28,28 @@ class LoteAdmin(admin.ModelAdmin):
     def archivo_subido_link(self, obj):
         # Permite al admin descargar el archivo del cliente
         if obj.archivo_subido:
-            return format_html('<a href="{}" download>Descargar Excel</a>', obj.archivo_subido.url)
+            return format_html('<a href="{}" download>Descargar Excel</a>',
+                               reverse('descargar_archivo_lote', args=[obj.pk, 'subido']))
         return "N/A"
 
     def get_readonly_fields(self, request, obj=None):
         # Sobrescribimos para asegurar que los campos sean readonly al editar
         if obj: # obj is not None, so this is an edit
             return self.readonly_fields
-        return () # No hay readonly al crear (aunque no aplica mucho aquí)
\ No newline at end of file
+        return () # No hay readonly al crear (aunque no aplica mucho aquí)
+
+
+@admin.register(NotificacionCorreo)
+class NotificacionCorreoAdmin(admin.ModelAdmin):
+    list_display = ('creada_en', 'asunto', 'destinatario', 'estado', 'intentos', 'enviada_en')
+    list_filter = ('estado',)
+    search_fields = ('destinatario', 'asunto')
+    readonly_fields = ('lote', 'plantilla', 'creada_en', 'enviada_en', 'reservada_hasta', 'ultimo_error')
+    actions = ['reenviar']
+
+    @admin.action(description="Reenviar los correos seleccionados")
+    def reenviar(self, request, queryset):
+        actualizados = queryset.exclude(estado__in=['ENVIADO', 'ENVIANDO']).update(estado='PENDIENTE', intentos=0, ultimo_error='')
+        if actualizados:
+            encolar('cargas_masivas.enviar_correos')
+        self.message_user(request, f"{actualizados} correos puestos de nuevo en cola.")
\ No newline at end of file
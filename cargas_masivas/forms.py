@@ -1,6 +1,10 @@
 # archivo: cargas_masivas/forms.py
 
+from pathlib import Path
+
 from django import forms
+from django.conf import settings
+from .ingesta import EXTENSIONES, ArchivoLoteInvalido, validar_encabezados
 from .models import LoteConsultaMasiva
 
 class LoteForm(forms.ModelForm):
@@ -8,5 +12,18 @@ class LoteForm(forms.ModelForm):
         model = LoteConsultaMasiva
         fields = ['archivo_subido']
         widgets = {
-            'archivo_subido': forms.FileInput(attrs={'class': 'form-control', 'required': True})
-        }
\ No newline at end of file
+            'archivo_subido': forms.FileInput(attrs={'class': 'form-control', 'required': True, 'accept': ','.join(EXTENSIONES)})
+        }
+
+    def clean_archivo_subido(self):
+        archivo = self.cleaned_data['archivo_subido']
+        if Path(archivo.name).suffix.lower() not in EXTENSIONES:
+            raise forms.ValidationError("El archivo debe ser un Excel (.xlsx) o un CSV.")
+        if archivo.size > settings.LOTE_TAMANO_MAXIMO_MB * 1024 * 1024:
+            raise forms.ValidationError(f"El archivo supera el máximo de {settings.LOTE_TAMANO_MAXIMO_MB} MB.")
+        # Solo se revisa el encabezado; las filas se validan en segundo plano
+        try:
+            validar_encabezados(archivo, archivo.name)
+        except ArchivoLoteInvalido as e:
+            raise forms.ValidationError(str(e))
+        return archivo
\ No newline at end of file
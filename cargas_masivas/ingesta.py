@@ -0,0 +1,251 @@
+# archivo: cargas_masivas/ingesta.py
+"""
+Ingesta y validación del archivo de un lote.
+
+El archivo (.xlsx de la plantilla, o .csv con las mismas columnas) se lee en
+streaming, sin cargarlo completo en memoria. Cada fila se normaliza y se
+valida, y las válidas se insertan por bloques en FilaLote, que hace de tabla
+de staging: el procesamiento consulta el API a partir de esas filas y ya no
+vuelve a leer el archivo.
+
+Las filas repetidas (misma identificación o, sin identificación, mismo
+nombre) se descartan en la base de datos con la restricción única
+(lote, clave), así que la memoria no crece con el tamaño del archivo. El
+lote queda con el conteo de filas y un resumen de errores que el cliente ve
+en listar_lotes apenas termina la validación.
+"""
+
+import codecs
+import csv
+import logging
+import re
+import unicodedata
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from consultas.services import normalizar_identificacion
+
+from .models import FilaLote, LoteConsultaMasiva
+
+logger = logging.getLogger(__name__)
+
+FILAS_POR_INSERT = 5000
+EJEMPLOS_POR_ERROR = 20
+EXTENSIONES = ('.xlsx', '.csv')
+
+# Encabezados aceptados para cada columna de la plantilla (ya normalizados)
+ENCABEZADOS_IDENTIFICACION = {
+    'identificacion', 'numero de identificacion', 'documento', 'numero de documento',
+    'cedula', 'nit', 'id',
+}
+ENCABEZADOS_NOMBRES = {
+    'nombres', 'nombre', 'nombre completo', 'nombres o razon social', 'razon social',
+}
+
+MAX_IDENTIFICACION = FilaLote._meta.get_field('identificacion').max_length
+MAX_NOMBRES = FilaLote._meta.get_field('nombres').max_length
+IDENTIFICACION_VALIDA = re.compile(r'^[0-9A-Z-]+$')
+
+ERRORES = {
+    'identificacion_invalida': "Identificación con caracteres no válidos",
+    'identificacion_larga': f"Identificación de más de {MAX_IDENTIFICACION} caracteres",
+    'nombre_largo': f"Nombre de más de {MAX_NOMBRES} caracteres",
+    'nombre_sin_letras': "Nombre sin letras",
+}
+
+
+class ArchivoLoteInvalido(Exception):
+    """El archivo subido no tiene el formato de la plantilla."""
+
+
+def _normalizar_encabezado(valor):
+    texto = unicodedata.normalize('NFKD', str(valor or '')).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(texto.lower().replace('_', ' ').split())
+
+
+def _texto_celda(valor):
+    if valor is None:
+        return ''
+    # Excel guarda las cédulas como números: 1234567.0 -> "1234567"
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return ' '.join(str(valor).split())
+
+
+def ubicar_columnas(encabezados):
+    """Devuelve (indice_identificacion, indice_nombres); alguno puede ser None."""
+    normalizados = [_normalizar_encabezado(e) for e in encabezados]
+    col_id = next((i for i, e in enumerate(normalizados) if e in ENCABEZADOS_IDENTIFICACION), None)
+    col_nombres = next((i for i, e in enumerate(normalizados) if e in ENCABEZADOS_NOMBRES), None)
+    if col_id is None and col_nombres is None:
+        raise ArchivoLoteInvalido(
+            "El archivo debe tener una columna 'Identificación' y/o 'Nombres' en la primera fila."
+        )
+    return col_id, col_nombres
+
+
+def _filas_xlsx(archivo):
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def _filas_csv(archivo):
+    # Excel en español exporta con ';'; se detecta el separador en la primera línea
+    texto = codecs.getreader('utf-8-sig')(archivo, errors='replace')
+    primera = texto.readline()
+    separador = max(',;\t', key=primera.count)
+    yield from csv.reader([primera], delimiter=separador)
+    yield from csv.reader(texto, delimiter=separador)
+
+
+def leer_filas(archivo, nombre_archivo='.xlsx'):
+    """
+    Genera (numero_fila, identificacion, nombres) con el texto de las celdas,
+    sin validar. Omite filas vacías. Los .xlsx se abren en modo read_only.
+    """
+    extension = Path(nombre_archivo).suffix.lower()
+    if extension == '.csv':
+        filas = _filas_csv(archivo)
+    elif extension == '.xlsx':
+        filas = _filas_xlsx(archivo)
+    else:
+        raise ArchivoLoteInvalido("El archivo debe ser un Excel (.xlsx) o un CSV.")
+
+    encabezados = next(filas, None)
+    if encabezados is None:
+        raise ArchivoLoteInvalido("El archivo está vacío.")
+    col_id, col_nombres = ubicar_columnas(encabezados)
+
+    for numero_fila, fila in enumerate(filas, start=2):
+        identificacion = _texto_celda(fila[col_id]) if col_id is not None and col_id < len(fila) else ''
+        nombres = _texto_celda(fila[col_nombres]) if col_nombres is not None and col_nombres < len(fila) else ''
+        if identificacion or nombres:
+            yield numero_fila, identificacion, nombres
+
+
+def validar_encabezados(archivo, nombre_archivo):
+    """Lee solo el encabezado; lanza ArchivoLoteInvalido si no sigue la plantilla."""
+    filas = leer_filas(archivo, nombre_archivo)
+    try:
+        next(filas, None)
+    except ArchivoLoteInvalido:
+        raise
+    except Exception as e:
+        raise ArchivoLoteInvalido("No se pudo leer el archivo. Verifique que sea la plantilla en Excel o CSV.") from e
+    finally:
+        filas.close()
+        archivo.seek(0)
+
+
+def validar_fila(identificacion, nombres):
+    """Devuelve (identificacion, nombres, clave, error) con los datos normalizados."""
+    identificacion = normalizar_identificacion(identificacion)
+    nombres = ' '.join(nombres.split()).upper()
+    if identificacion and not IDENTIFICACION_VALIDA.match(identificacion):
+        return identificacion, nombres, '', 'identificacion_invalida'
+    if len(identificacion) > MAX_IDENTIFICACION:
+        return identificacion, nombres, '', 'identificacion_larga'
+    if len(nombres) > MAX_NOMBRES:
+        return identificacion, nombres, '', 'nombre_largo'
+    if nombres and not any(c.isalpha() for c in nombres):
+        return identificacion, nombres, '', 'nombre_sin_letras'
+    clave = f'I:{identificacion}' if identificacion else f'N:{nombres}'
+    return identificacion, nombres, clave, None
+
+
+def _filas_validas(lote, criterios, resumen):
+    for numero_fila, identificacion, nombres in criterios:
+        resumen['filas_leidas'] += 1
+        if resumen['filas_leidas'] > settings.LOTE_MAX_FILAS:
+            raise ArchivoLoteInvalido(f"El archivo supera el máximo de {settings.LOTE_MAX_FILAS} filas.")
+        identificacion, nombres, clave, error = validar_fila(identificacion, nombres)
+        if error:
+            resumen['filas_invalidas'] += 1
+            resumen['por_tipo'][error] = resumen['por_tipo'].get(error, 0) + 1
+            if resumen['por_tipo'][error] <= EJEMPLOS_POR_ERROR:
+                resumen['ejemplos'].append({'fila': numero_fila, 'error': ERRORES[error]})
+            continue
+        yield FilaLote(lote=lote, numero_fila=numero_fila, identificacion=identificacion,
+                       nombres=nombres, clave=clave)
+
+
+def tomar_para_validar(lote_id):
+    """Pasa el lote de PENDIENTE a VALIDANDO si aún no se validó. Devuelve False si no aplica."""
+    return LoteConsultaMasiva.objects.filter(
+        pk=lote_id, estado='PENDIENTE', validado_en__isnull=True,
+    ).update(estado='VALIDANDO') == 1
+
+
+def ingerir_lote(lote):
+    """
+    Lee, valida y guarda en FilaLote las filas del archivo del lote. Deja en el
+    lote los conteos y el resumen de errores. Lanza ArchivoLoteInvalido si el
+    archivo no se puede usar (columnas, formato, tamaño o ninguna fila válida).
+    """
+    resumen = {'filas_leidas': 0, 'filas_invalidas': 0, 'por_tipo': {}, 'ejemplos': []}
+    # Si un intento anterior quedó a medias, empezamos de cero
+    lote.filas.all().delete()
+
+    with lote.archivo_subido.open('rb') as archivo:
+        filas = _filas_validas(lote, leer_filas(archivo, lote.archivo_subido.name), resumen)
+        validas = 0
+        while bloque := list(islice(filas, FILAS_POR_INSERT)):
+            # Los repetidos chocan con la restricción única (lote, clave) y se descartan
+            FilaLote.objects.bulk_create(bloque, ignore_conflicts=True)
+            validas += len(bloque)
+
+    total = lote.filas.count()
+    lote.total_filas = total
+    lote.filas_leidas = resumen['filas_leidas']
+    lote.filas_invalidas = resumen['filas_invalidas']
+    lote.filas_duplicadas = validas - total
+    lote.resumen_validacion = {'por_tipo': resumen['por_tipo'], 'ejemplos': resumen['ejemplos']}
+    lote.validado_en = timezone.now()
+    LoteConsultaMasiva.objects.filter(pk=lote.pk).update(
+        total_filas=lote.total_filas, filas_leidas=lote.filas_leidas, filas_invalidas=lote.filas_invalidas,
+        filas_duplicadas=lote.filas_duplicadas, resumen_validacion=lote.resumen_validacion,
+        validado_en=lote.validado_en,
+    )
+    if not total:
+        raise ArchivoLoteInvalido("El archivo no tiene filas válidas para consultar.")
+    logger.info("Lote %s validado: %s filas leídas, %s válidas, %s repetidas, %s con errores",
+                lote.pk, lote.filas_leidas, total, lote.filas_duplicadas, lote.filas_invalidas)
+    return lote
+
+
+def validar_lote(lote_id):
+    """
+    Etapa de validación de un lote recién subido. Deja el lote en PENDIENTE
+    (listo para procesar) o en ERROR con el motivo. Devuelve el lote, o None
+    si ya estaba validado o en otro estado.
+    """
+    if not tomar_para_validar(lote_id):
+        return None
+    lote = LoteConsultaMasiva.objects.get(pk=lote_id)
+    try:
+        ingerir_lote(lote)
+    except ArchivoLoteInvalido as e:
+        lote.filas.all().delete()
+        _marcar_error(lote, str(e))
+        return lote
+    except Exception as e:
+        logger.exception("Error validando el lote %s", lote_id)
+        _marcar_error(lote, f"No se pudo leer el archivo: {e}")
+        return lote
+
+    LoteConsultaMasiva.objects.filter(pk=lote_id).update(estado='PENDIENTE')
+    lote.estado = 'PENDIENTE'
+    return lote
+
+
+def _marcar_error(lote, mensaje):
+    LoteConsultaMasiva.objects.filter(pk=lote.pk).update(estado='ERROR', error_procesamiento=mensaje[:1000])
+    lote.estado = 'ERROR'
+    lote.error_procesamiento = mensaje[:1000]
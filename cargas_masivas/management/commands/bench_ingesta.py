@@ -0,0 +1,105 @@
+# archivo: cargas_masivas/management/commands/bench_ingesta.py
+import os
+import random
+import resource
+import tempfile
+import time
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from openpyxl import Workbook
+
+from cargas_masivas.ingesta import ingerir_lote
+from cargas_masivas.models import LoteConsultaMasiva
+from empresas.models import Empresa
+from usuarios.models import Usuario
+
+NOMBRES = ['JUAN', 'MARÍA', 'LUIS', 'ANA', 'CARLOS', 'LUZ', 'JORGE', 'PAOLA', 'ANDRÉS', 'SANDRA']
+APELLIDOS = ['PÉREZ', 'GÓMEZ', 'RODRÍGUEZ', 'LÓPEZ', 'MARTÍNEZ', 'GARCÍA', 'TORRES', 'RAMÍREZ', 'DÍAZ', 'MUÑOZ']
+
+
+def generar_filas(cantidad, repetidas, invalidas, rng):
+    """(identificación, nombres) con una fracción de filas repetidas y otra con errores."""
+    for i in range(cantidad):
+        sorteo = rng.random()
+        if sorteo < invalidas:
+            yield f'{i}#', ''
+        elif sorteo < invalidas + repetidas and i:
+            # Misma cédula con otro formato: cuenta como repetida tras normalizar
+            yield f'{rng.randrange(i) + 10_000_000:,}'.replace(',', '.'), ''
+        else:
+            nombre = f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}'
+            yield str(i + 10_000_000), nombre if i % 3 else ''
+
+
+def escribir_archivo(ruta, filas):
+    if ruta.endswith('.csv'):
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write('Identificación;Nombres\n')
+            archivo.writelines(f'{identificacion};{nombres}\n' for identificacion, nombres in filas)
+        return
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet()
+    hoja.append(['Identificación', 'Nombres'])
+    for fila in filas:
+        hoja.append(list(fila))
+    libro.save(ruta)
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera un archivo de lote sintético y mide la ingesta (lectura, validación "
+        "e inserción en FilaLote): duración, filas por segundo y pico de memoria "
+        "del proceso. "
+        "Todo se hace en una transacción que se revierte al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=500_000)
+        parser.add_argument('--formato', choices=('xlsx', 'csv'), default='xlsx')
+        parser.add_argument('--repetidas', type=float, default=0.05, help='Fracción de filas repetidas')
+        parser.add_argument('--invalidas', type=float, default=0.01, help='Fracción de filas con errores')
+        parser.add_argument('--limite-mb', type=float, default=128.0, help='Pico de memoria (RSS) aceptable del proceso')
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, f"lote.{options['formato']}")
+            inicio = time.perf_counter()
+            escribir_archivo(ruta, generar_filas(options['filas'], options['repetidas'], options['invalidas'], rng))
+            self.stdout.write(f"Archivo de {options['filas']:,} filas ({os.path.getsize(ruta) / 2**20:.1f} MB) "
+                              f"generado en {time.perf_counter() - inicio:.1f}s")
+
+            # Con DEBUG, Django guarda el SQL de cada consulta; en producción no
+            with override_settings(MEDIA_ROOT=directorio, LOTE_MAX_FILAS=max(options['filas'], 1), DEBUG=False), \
+                    transaction.atomic():
+                lote, duracion, base, pico = self._ingerir(ruta)
+                transaction.set_rollback(True)
+
+        self.stdout.write(f"Leídas {lote.filas_leidas:,} | válidas {lote.total_filas:,} | "
+                          f"repetidas {lote.filas_duplicadas:,} | con errores {lote.filas_invalidas:,}")
+        self.stdout.write(f"Ingesta: {duracion:.1f}s | {lote.filas_leidas / duracion:,.0f} filas/s | "
+                          f"memoria del proceso {base:.0f} MB antes, pico {pico:.0f} MB")
+        if pico > options['limite_mb']:
+            raise CommandError(f"El pico de memoria supera el límite de {options['limite_mb']:.0f} MB")
+        self.stdout.write(self.style.SUCCESS(f"Dentro del límite de {options['limite_mb']:.0f} MB"))
+
+    def _ingerir(self, ruta):
+        empresa = Empresa.objects.create(nombre='Bench ingesta')
+        usuario = Usuario.objects.create_user('bench_ingesta', empresa=empresa)
+        with open(ruta, 'rb') as archivo:
+            lote = LoteConsultaMasiva.objects.create(
+                empresa=empresa, usuario_solicitante=usuario,
+                archivo_subido=File(archivo, name=os.path.basename(ruta)),
+            )
+
+        # ru_maxrss (KB en Linux) es el máximo histórico del proceso: la
+        # generación del archivo ya pasó, así que lo que suba aquí es de la ingesta
+        base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        inicio = time.perf_counter()
+        ingerir_lote(lote)
+        duracion = time.perf_counter() - inicio
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return lote, duracion, base, pico
@@ -0,0 +1,46 @@
+# archivo: cargas_masivas/management/commands/procesar_lotes.py
+from django.core.management.base import BaseCommand
+
+from cargas_masivas.models import LoteConsultaMasiva
+from cargas_masivas.procesamiento import marcar_error, procesar_lote
+
+
+class Command(BaseCommand):
+    help = "Procesa automáticamente los lotes de consulta masiva pendientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, action='append', help='ID de un lote específico (se puede repetir)')
+        parser.add_argument(
+            '--reintentar-errores', action='store_true',
+            help='Vuelve a poner en PENDIENTE los lotes que terminaron en ERROR antes de procesar',
+        )
+
+    def handle(self, *args, **options):
+        lotes = LoteConsultaMasiva.objects.all()
+        if options['lote']:
+            lotes = lotes.filter(pk__in=options['lote'])
+
+        if options['reintentar_errores']:
+            lotes.filter(estado='ERROR').update(estado='PENDIENTE')
+
+        ids = list(lotes.filter(estado='PENDIENTE').order_by('fecha_solicitud').values_list('id', flat=True))
+        if not ids:
+            self.stdout.write("No hay lotes pendientes.")
+            return
+
+        for lote_id in ids:
+            try:
+                lote = procesar_lote(lote_id)
+            except Exception as e:
+                # Aquí no hay reintentos de la cola: queda en ERROR para --reintentar-errores
+                marcar_error(lote_id, e)
+                self.stdout.write(self.style.ERROR(f"Lote {lote_id}: {e}"))
+                continue
+            if lote is None:
+                self.stdout.write(f"Lote {lote_id}: ya lo está procesando otro proceso.")
+            elif lote.estado == 'PROCESADO':
+                self.stdout.write(self.style.SUCCESS(
+                    f"Lote {lote_id}: {lote.total_filas} filas, {lote.filas_con_hallazgos} con hallazgos."
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"Lote {lote_id}: {lote.error_procesamiento}"))
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cargas_masivas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loteconsultamasiva',
+            name='error_procesamiento',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='loteconsultamasiva',
+            name='fecha_procesado',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='loteconsultamasiva',
+            name='filas_con_hallazgos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='loteconsultamasiva',
+            name='total_filas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='loteconsultamasiva',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente de Procesar'), ('PROCESANDO', 'En Proceso'), ('PROCESADO', 'Procesado y Completado'), ('ERROR', 'Error al Procesar')], default='PENDIENTE', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='FilaLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_fila', models.PositiveIntegerField()),
+                ('identificacion', models.CharField(blank=True, default='', max_length=50)),
+                ('nombres', models.CharField(blank=True, default='', max_length=150)),
+                ('error_consulta', models.BooleanField(default=False)),
+                ('encontro_resultados', models.BooleanField(default=False)),
+                ('genero_alerta', models.BooleanField(default=False)),
+                ('total_resultados', models.PositiveIntegerField(default=0)),
+                ('clasificaciones', models.CharField(blank=True, default='', max_length=100)),
+                ('resultados', models.JSONField(blank=True, default=list)),
+                ('lote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='filas', to='cargas_masivas.loteconsultamasiva')),
+            ],
+            options={
+                'ordering': ['lote', 'numero_fila'],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cargas_masivas', '0002_procesamiento_automatico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionCorreo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('plantilla', models.CharField(max_length=150)),
+                ('asunto', models.CharField(max_length=255)),
+                ('destinatario', models.EmailField(max_length=254)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('ENVIADO', 'Enviado'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True, default='')),
+                ('creada_en', models.DateTimeField(auto_now_add=True)),
+                ('enviada_en', models.DateTimeField(blank=True, null=True)),
+                ('lote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones', to='cargas_masivas.loteconsultamasiva')),
+            ],
+            options={
+                'ordering': ['-creada_en'],
+            },
+        ),
+    ]
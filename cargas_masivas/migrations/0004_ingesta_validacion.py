@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:13
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+
+def marcar_filas_existentes(apps, schema_editor):
+    # Las filas de lotes anteriores ya tienen su resultado; el número de fila
+    # les da una clave única sin tener que deduplicarlas
+    FilaLote = apps.get_model('cargas_masivas', 'FilaLote')
+    FilaLote.objects.update(
+        clave=Concat(Value('F:'), Cast('numero_fila', output_field=CharField())),
+        consultada=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cargas_masivas', '0003_notificacion_correo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filalote',
+            name='clave',
+            field=models.CharField(default='', max_length=160),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='filalote',
+            name='consultada',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='loteconsultamasiva',
+            name='filas_duplicadas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='loteconsultamasiva',
+            name='filas_invalidas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='loteconsultamasiva',
+            name='filas_leidas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='loteconsultamasiva',
+            name='resumen_validacion',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='loteconsultamasiva',
+            name='validado_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='loteconsultamasiva',
+            name='estado',
+            field=models.CharField(choices=[('VALIDANDO', 'Validando Archivo'), ('PENDIENTE', 'Pendiente de Procesar'), ('PROCESANDO', 'En Proceso'), ('PROCESADO', 'Procesado y Completado'), ('ERROR', 'Error al Procesar')], default='PENDIENTE', max_length=20),
+        ),
+        migrations.RunPython(marcar_filas_existentes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='filalote',
+            constraint=models.UniqueConstraint(fields=('lote', 'clave'), name='fila_lote_clave_unica'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cargas_masivas', '0004_ingesta_validacion'),
+        ('empresas', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre_original', models.CharField(max_length=255)),
+                ('archivo', models.CharField(max_length=255)),
+                ('upload_id', models.CharField(max_length=255)),
+                ('tamano', models.PositiveBigIntegerField()),
+                ('tamano_parte', models.PositiveIntegerField()),
+                ('estado', models.CharField(choices=[('ABIERTA', 'Abierta'), ('COMPLETADA', 'Completada'), ('CANCELADA', 'Cancelada')], default='ABIERTA', max_length=20)),
+                ('creada_en', models.DateTimeField(auto_now_add=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='empresas.empresa')),
+                ('lote', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='subida', to='cargas_masivas.loteconsultamasiva')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-creada_en'],
+            },
+        ),
+    ]
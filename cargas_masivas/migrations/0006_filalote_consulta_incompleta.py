@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cargas_masivas', '0005_subida_lote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filalote',
+            name='consulta_incompleta',
+            field=models.BooleanField(default=False),
+        ),
+    ]
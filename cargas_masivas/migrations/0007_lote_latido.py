@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cargas_masivas', '0006_filalote_consulta_incompleta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loteconsultamasiva',
+            name='latido_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cargas_masivas', '0007_lote_latido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacioncorreo',
+            name='reservada_hasta',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='notificacioncorreo',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('ENVIANDO', 'Enviando'), ('ENVIADO', 'Enviado'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=20),
+        ),
+    ]
@@ -15,8 +15,11 @@ def ruta_archivo_resultado(instance, filename):
 
 class LoteConsultaMasiva(models.Model):
     ESTADO_CHOICES = [
+        ('VALIDANDO', 'Validando Archivo'),
         ('PENDIENTE', 'Pendiente de Procesar'),
+        ('PROCESANDO', 'En Proceso'),
         ('PROCESADO', 'Procesado y Completado'),
+        ('ERROR', 'Error al Procesar'),
     ]
 
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
@@ -26,11 +29,125 @@ class LoteConsultaMasiva(models.Model):
     
     # El Excel que sube el cliente
     archivo_subido = models.FileField(upload_to=ruta_archivo_subido)
-    # El PDF que sube el admin
+    # El reporte de resultados: lo genera el motor automático (Excel) o lo sube el admin (PDF)
     archivo_resultado = models.FileField(upload_to=ruta_archivo_resultado, null=True, blank=True)
 
+    # Validación del archivo (cargas_masivas/ingesta.py)
+    validado_en = models.DateTimeField(null=True, blank=True)
+    filas_leidas = models.PositiveIntegerField(default=0) # Filas no vacías del archivo
+    filas_invalidas = models.PositiveIntegerField(default=0)
+    filas_duplicadas = models.PositiveIntegerField(default=0)
+    resumen_validacion = models.JSONField(default=dict, blank=True) # {'por_tipo': {...}, 'ejemplos': [...]}
+
+    # Avance del procesamiento automático
+    total_filas = models.PositiveIntegerField(default=0) # Filas válidas y sin repetir
+    filas_con_hallazgos = models.PositiveIntegerField(default=0)
+    fecha_procesado = models.DateTimeField(null=True, blank=True)
+    error_procesamiento = models.TextField(blank=True, default='')
+    # Lo renueva el proceso que tiene el lote en PROCESANDO; si queda viejo, otro lo puede retomar
+    latido_en = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         ordering = ['-fecha_solicitud']
 
     def __str__(self):
-        return f"Lote de {self.empresa.nombre} - {self.fecha_solicitud.strftime('%Y-%m-%d')}"
\ No newline at end of file
+        return f"Lote de {self.empresa.nombre} - {self.fecha_solicitud.strftime('%Y-%m-%d')}"
+
+
+class FilaLote(models.Model):
+    """
+    Una fila válida del archivo de un lote junto con el resultado de su
+    consulta. La ingesta las crea sin consultar; el procesamiento las completa.
+    """
+    lote = models.ForeignKey(LoteConsultaMasiva, related_name='filas', on_delete=models.CASCADE)
+    numero_fila = models.PositiveIntegerField() # Fila en el Excel original
+    identificacion = models.CharField(max_length=50, blank=True, default='')
+    nombres = models.CharField(max_length=150, blank=True, default='')
+    # 'I:<identificación>' o, si no hay, 'N:<nombres>': una sola fila por criterio en cada lote
+    clave = models.CharField(max_length=160)
+
+    # Resultado de la consulta
+    consultada = models.BooleanField(default=False)
+    error_consulta = models.BooleanField(default=False) # El API no respondió
+    consulta_incompleta = models.BooleanField(default=False) # Algún endpoint no respondió (o error_consulta)
+    encontro_resultados = models.BooleanField(default=False)
+    genero_alerta = models.BooleanField(default=False)
+    total_resultados = models.PositiveIntegerField(default=0)
+    clasificaciones = models.CharField(max_length=100, blank=True, default='') # Ej: "Rojo, PEP's"
+    resultados = models.JSONField(default=list, blank=True) # Resumen de cada hallazgo
+
+    class Meta:
+        ordering = ['lote', 'numero_fila']
+        constraints = [
+            models.UniqueConstraint(fields=['lote', 'clave'], name='fila_lote_clave_unica'),
+        ]
+
+    def __str__(self):
+        return f"Fila {self.numero_fila} del lote {self.lote_id}"
+
+
+
+class SubidaLote(models.Model):
+    """
+    Subida multiparte de un archivo de lote directo del navegador a S3. El
+    navegador sube las partes con URLs prefirmadas; el servidor solo guarda
+    el upload_id para poder retomarla y, al completarla, crea el lote.
+    """
+    ESTADO_CHOICES = [
+        ('ABIERTA', 'Abierta'),
+        ('COMPLETADA', 'Completada'),
+        ('CANCELADA', 'Cancelada'),
+    ]
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    nombre_original = models.CharField(max_length=255)
+    archivo = models.CharField(max_length=255) # Nombre dentro del almacenamiento (sin el prefijo de S3)
+    upload_id = models.CharField(max_length=255)
+    tamano = models.PositiveBigIntegerField()
+    tamano_parte = models.PositiveIntegerField()
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='ABIERTA')
+    lote = models.OneToOneField(LoteConsultaMasiva, null=True, blank=True, on_delete=models.SET_NULL,
+                                related_name='subida')
+    creada_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-creada_en']
+
+    @property
+    def total_partes(self):
+        return max(1, -(-self.tamano // self.tamano_parte))
+
+    def __str__(self):
+        return f"{self.nombre_original} ({self.estado})"
+
+
+class NotificacionCorreo(models.Model):
+    """
+    Correo pendiente de enviar por el worker. Los que agotan sus intentos
+    quedan en FALLIDO para revisarlos y reenviarlos desde el admin.
+    """
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('ENVIANDO', 'Enviando'),
+        ('ENVIADO', 'Enviado'),
+        ('FALLIDO', 'Fallido'),
+    ]
+
+    lote = models.ForeignKey(LoteConsultaMasiva, related_name='notificaciones', on_delete=models.CASCADE)
+    plantilla = models.CharField(max_length=150)
+    asunto = models.CharField(max_length=255)
+    destinatario = models.EmailField()
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+    intentos = models.PositiveIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True, default='')
+    creada_en = models.DateTimeField(auto_now_add=True)
+    enviada_en = models.DateTimeField(null=True, blank=True)
+    # Mientras está en ENVIANDO: hasta cuándo es del worker que lo reservó
+    reservada_hasta = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-creada_en']
+
+    def __str__(self):
+        return f"{self.asunto} -> {self.destinatario} ({self.estado})"
\ No newline at end of file
@@ -0,0 +1,183 @@
+# archivo: cargas_masivas/notificaciones.py
+"""
+Envío de correos de los lotes fuera del ciclo de la petición.
+
+La señal post_save solo inserta filas en NotificacionCorreo (en la misma
+transacción que el lote) y encola la tarea 'cargas_masivas.enviar_correos'.
+El worker envía todos los pendientes reutilizando una sola conexión SMTP.
+Mientras un worker los envía quedan en ENVIANDO con una reserva que vence a
+los CORREO_RESERVA_SEGUNDOS; si el worker muere, otro los retoma al vencer.
+Los que fallan se reintentan con el backoff de la cola y, al agotar los
+intentos, quedan en estado FALLIDO como registro de correos no entregados.
+"""
+
+import logging
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from cola_tareas.cola import encolar
+from monitoreo.instrumentacion import medir
+
+from .models import NotificacionCorreo
+
+logger = logging.getLogger(__name__)
+
+CORREOS_POR_CONEXION = 50
+
+
+class CorreosPendientes(Exception):
+    """Quedaron correos sin enviar; la cola reintentará la tarea más tarde."""
+
+
+@lru_cache(maxsize=None)
+def _plantilla(nombre):
+    # La plantilla se compila una sola vez por proceso
+    return get_template(nombre)
+
+
+def programar_notificaciones(lote, created):
+    """Registra los correos que corresponden al cambio del lote y encola su envío."""
+    notificaciones = []
+    if created:
+        notificaciones.append(NotificacionCorreo(
+            lote=lote,
+            plantilla='cargas_masivas/emails/admin_notificacion.html',
+            asunto=f'Nueva Solicitud de Carga Masiva - {lote.empresa.nombre}',
+            destinatario=settings.ADMIN_EMAIL,
+        ))
+        if lote.usuario_solicitante and lote.usuario_solicitante.email:
+            notificaciones.append(NotificacionCorreo(
+                lote=lote,
+                plantilla='cargas_masivas/emails/usuario_confirmacion.html',
+                asunto=f'Hemos recibido tu solicitud de Carga Masiva (ID: {lote.id})',
+                destinatario=lote.usuario_solicitante.email,
+            ))
+    elif lote.estado == 'PROCESADO' and lote.archivo_resultado:
+        if lote.usuario_solicitante and lote.usuario_solicitante.email:
+            notificaciones.append(NotificacionCorreo(
+                lote=lote,
+                plantilla='cargas_masivas/emails/usuario_notificacion.html',
+                asunto=f'Tu Reporte de Consulta Masiva (ID: {lote.id}) está Listo',
+                destinatario=lote.usuario_solicitante.email,
+            ))
+
+    if notificaciones:
+        NotificacionCorreo.objects.bulk_create(notificaciones)
+        encolar('cargas_masivas.enviar_correos')
+    return notificaciones
+
+
+def construir_mensaje(notificacion, conexion=None):
+    contexto = {
+        'instance': notificacion.lote,
+        'domain': settings.MI_DOMINIO,
+        'logo_url': f'{settings.STATIC_URL}images/logo_vadom.png',
+    }
+    html_message = _plantilla(notificacion.plantilla).render(contexto)
+    mensaje = EmailMultiAlternatives(
+        subject=notificacion.asunto,
+        body=strip_tags(html_message),
+        from_email=settings.EMAIL_HOST_USER,
+        to=[notificacion.destinatario],
+        connection=conexion,
+    )
+    mensaje.attach_alternative(html_message, "text/html")
+    return mensaje
+
+
+def _reservar_bloque(excluir):
+    """
+    Marca un bloque como ENVIANDO hasta `reservada_hasta` y confirma enseguida.
+    También recoge los ENVIANDO cuya reserva venció: el worker que los tenía
+    murió a mitad del envío.
+    """
+    ahora = timezone.now()
+    reserva = ahora + timedelta(seconds=settings.CORREO_RESERVA_SEGUNDOS)
+    with transaction.atomic():
+        bloque = list(
+            NotificacionCorreo.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(Q(estado='PENDIENTE') | Q(estado='ENVIANDO', reservada_hasta__lt=ahora))
+            .exclude(pk__in=excluir)
+            .select_related('lote__empresa', 'lote__usuario_solicitante')
+            .order_by('creada_en')[:CORREOS_POR_CONEXION]
+        )
+        NotificacionCorreo.objects.filter(pk__in=[n.pk for n in bloque]).update(
+            estado='ENVIANDO', reservada_hasta=reserva,
+        )
+    return bloque, reserva
+
+
+def _registrar(notificacion, reserva, **campos):
+    # Solo si la reserva sigue siendo nuestra; si venció y otro worker la tomó, él registra
+    return NotificacionCorreo.objects.filter(
+        pk=notificacion.pk, estado='ENVIANDO', reservada_hasta=reserva,
+    ).update(reservada_hasta=None, **campos)
+
+
+def _registrar_fallo(notificacion, reserva, error):
+    intentos = notificacion.intentos + 1
+    estado = 'PENDIENTE'
+    if intentos >= settings.CORREO_MAX_INTENTOS:
+        estado = 'FALLIDO'
+        logger.error("Correo %s descartado tras %s intentos: %s", notificacion.pk, intentos, error)
+    _registrar(notificacion, reserva, estado=estado, intentos=intentos,
+               ultimo_error=f"{type(error).__name__}: {error}"[:1000])
+
+
+def enviar_correos_pendientes():
+    """
+    Envía todos los correos pendientes usando una conexión SMTP por bloque.
+    Cada lote guardado encola una tarea, y dos workers a la vez no deben
+    mandar el mismo correo: el bloque se reserva en una transacción corta
+    (FOR UPDATE SKIP LOCKED y estado ENVIANDO con un plazo), el envío ocurre
+    fuera de toda transacción y cada resultado se registra con su propio
+    UPDATE. Así no quedan filas bloqueadas ni una transacción abierta
+    mientras se habla con el servidor SMTP.
+    """
+    enviados = fallidos = 0
+    procesados = set()
+
+    while True:
+        bloque, reserva = _reservar_bloque(procesados)
+        if not bloque:
+            break
+        procesados.update(notificacion.pk for notificacion in bloque)
+
+        conexion = get_connection(fail_silently=False)
+        try:
+            conexion.open()
+        except Exception as e:
+            # Sin servidor SMTP ninguno del bloque sale: cuenta como un intento de cada uno
+            logger.warning("No se pudo abrir la conexión SMTP: %s", e)
+            for notificacion in bloque:
+                _registrar_fallo(notificacion, reserva, e)
+            fallidos += len(bloque)
+            continue
+
+        try:
+            for notificacion in bloque:
+                try:
+                    with medir('smtp'):
+                        construir_mensaje(notificacion, conexion).send()
+                except Exception as e:
+                    fallidos += 1
+                    _registrar_fallo(notificacion, reserva, e)
+                else:
+                    enviados += 1
+                    _registrar(notificacion, reserva, estado='ENVIADO',
+                               intentos=notificacion.intentos + 1, enviada_en=timezone.now())
+        finally:
+            conexion.close()
+
+    logger.info("Correos de lotes: %s enviados, %s con error", enviados, fallidos)
+    if NotificacionCorreo.objects.filter(pk__in=procesados, estado='PENDIENTE').exists():
+        raise CorreosPendientes(f"{fallidos} correos no se pudieron enviar")
+    return enviados
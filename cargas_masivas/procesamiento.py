@@ -0,0 +1,219 @@
+# archivo: cargas_masivas/procesamiento.py
+"""
+Motor de procesamiento automático de lotes de consulta masiva.
+
+Toma las filas que la ingesta dejó en FilaLote (si el lote aún no se validó,
+la ingesta corre primero), consulta cada identificación/nombre contra el API
+con concurrencia acotada (consultas.consulta_paralela, los mismos endpoints
+que la búsqueda individual), guarda el resultado en la misma fila y genera un
+Excel de resultados que queda en `archivo_resultado` con el lote en estado
+PROCESADO. Si el proceso se interrumpe, al retomarlo solo se consultan las
+filas que faltaban.
+
+Mientras procesa, el worker renueva `latido_en` después de cada bloque. Un
+lote en PROCESANDO con el latido vencido (LOTE_LATIDO_VENCIDO) se puede
+retomar; uno con el latido al día sigue siendo de quien lo tiene.
+"""
+
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+from openpyxl import Workbook
+
+from consultas.consulta_paralela import consultar_lote, es_incompleta
+from consultas.clasificacion import clasificar_lote
+from consultas.entidades import interpretar_estado
+from consultas.models import EntidadLista
+
+from .ingesta import ArchivoLoteInvalido, ingerir_lote
+from .models import FilaLote, LoteConsultaMasiva
+
+logger = logging.getLogger(__name__)
+
+
+def _resumir_resultados(resultados_api):
+    resumen = []
+    tipos_lista = [item.get('Tipo_Lista', '') for item in resultados_api]
+    for item, tipo_lista, clasificacion in zip(resultados_api, tipos_lista, clasificar_lote(tipos_lista)):
+        movimiento, fecha_estado = interpretar_estado(item.get('Estado'))
+        resumen.append({
+            'nombre_completo': item.get('NombreCompleto'),
+            'identificacion': item.get('Id'),
+            'tipo_lista': tipo_lista,
+            'clasificacion': clasificacion,
+            'es_restrictiva': bool(item.get('Restrictiva', False)),
+            'coincidencia_nombre': item.get('CoincidenciaNombre', 0),
+            'coincidencia_id': item.get('CoincidenciaID', 0),
+            'ingreso_lista': fecha_estado.isoformat() if movimiento == EntidadLista.INGRESO and fecha_estado else '',
+        })
+    return resumen
+
+
+CAMPOS_RESULTADO = [
+    'consultada', 'error_consulta', 'consulta_incompleta', 'encontro_resultados', 'genero_alerta',
+    'total_resultados', 'clasificaciones', 'resultados',
+]
+
+
+def _completar_fila(fila, resultados_api):
+    fila.consultada = True
+    fila.consulta_incompleta = es_incompleta(resultados_api)
+    if resultados_api is None:
+        fila.error_consulta = True
+        return fila
+
+    fila.resultados = _resumir_resultados(resultados_api)
+    fila.total_resultados = len(fila.resultados)
+    fila.encontro_resultados = bool(fila.resultados)
+    fila.genero_alerta = any(r['es_restrictiva'] for r in fila.resultados)
+    clasificaciones = sorted({r['clasificacion'] for r in fila.resultados})
+    fila.clasificaciones = ', '.join(clasificaciones)[:100]
+    return fila
+
+
+def _consultar_bloque(bloque):
+    respuestas = consultar_lote(((fila.identificacion, fila.nombres) for fila in bloque),
+                                concurrencia=settings.LOTE_CONCURRENCIA)
+    return [_completar_fila(fila, respuesta) for fila, respuesta in zip(bloque, respuestas)]
+
+
+def _observacion(fila):
+    if fila.error_consulta:
+        return 'Error al consultar el servicio'
+    if fila.consulta_incompleta:
+        return 'Consulta incompleta: no respondieron todos los servicios; repetir la consulta'
+    return ''
+
+
+def generar_reporte(lote, destino):
+    """Escribe el Excel de resultados en `destino` en modo write_only (streaming)."""
+    libro = Workbook(write_only=True)
+    resumen = libro.create_sheet('Resumen')
+    hallazgos = libro.create_sheet('Hallazgos')
+    resumen.append([
+        'Fila', 'Identificación', 'Nombres', 'Resultados Encontrados',
+        'Genera Alerta', 'Clasificaciones', 'Observación',
+    ])
+    hallazgos.append([
+        'Fila', 'Identificación Consultada', 'Nombres Consultados', 'Nombre Encontrado',
+        'Identificación Encontrada', 'Tipo de Lista', 'Clasificación', 'Restrictiva', 'Ingreso a la Lista',
+    ])
+
+    for fila in lote.filas.order_by('numero_fila').iterator(chunk_size=2000):
+        resumen.append([
+            fila.numero_fila, fila.identificacion, fila.nombres, fila.total_resultados,
+            'Sí' if fila.genero_alerta else 'No', fila.clasificaciones,
+            _observacion(fila),
+        ])
+        for resultado in fila.resultados:
+            hallazgos.append([
+                fila.numero_fila, fila.identificacion, fila.nombres,
+                resultado['nombre_completo'], resultado['identificacion'], resultado['tipo_lista'],
+                resultado['clasificacion'], 'Sí' if resultado['es_restrictiva'] else 'No',
+                resultado.get('ingreso_lista', ''),  # Los lotes anteriores no la tienen
+            ])
+    libro.save(destino)
+
+
+class LoteRetomado(Exception):
+    """Otro proceso retomó el lote porque este dejó vencer su latido."""
+
+
+def tomar_lote(lote_id):
+    """
+    Marca el lote como PROCESANDO si estaba PENDIENTE, o si estaba PROCESANDO
+    con el latido vencido (el proceso que lo tenía murió). Devuelve False si
+    otro proceso lo tiene, para que dos workers nunca procesen el mismo lote.
+    """
+    ahora = timezone.now()
+    vencido = ahora - timedelta(seconds=settings.LOTE_LATIDO_VENCIDO)
+    return LoteConsultaMasiva.objects.filter(
+        Q(estado='PENDIENTE')
+        | (Q(estado='PROCESANDO') & (Q(latido_en__lt=vencido) | Q(latido_en__isnull=True))),
+        pk=lote_id,
+    ).update(estado='PROCESANDO', error_procesamiento='', latido_en=ahora) == 1
+
+
+def _renovar_latido(lote):
+    # El latido anterior sirve de testigo: si cambió, otro proceso tomó el lote
+    ahora = timezone.now()
+    if not LoteConsultaMasiva.objects.filter(
+        pk=lote.id, estado='PROCESANDO', latido_en=lote.latido_en
+    ).update(latido_en=ahora):
+        raise LoteRetomado(lote.id)
+    lote.latido_en = ahora
+
+
+def marcar_error(lote_id, error):
+    """Deja el lote en ERROR cuando ya no se va a reintentar."""
+    LoteConsultaMasiva.objects.filter(pk=lote_id).exclude(estado='PROCESADO').update(
+        estado='ERROR', error_procesamiento=str(error)[:1000], latido_en=None
+    )
+
+
+def procesar_lote(lote_id):
+    """
+    Procesa un lote completo. Devuelve el lote actualizado, o None si no
+    estaba pendiente.
+
+    Un error inesperado (el API, el almacenamiento, la base) se anota en
+    `error_procesamiento`, el lote vuelve a PENDIENTE y la excepción sigue su
+    curso para que la cola reintente; al reintentar solo se consultan las
+    filas que faltaban. Quien ya no va a reintentar llama a marcar_error().
+    """
+    if not tomar_lote(lote_id):
+        return None
+
+    lote = LoteConsultaMasiva.objects.select_related('empresa', 'usuario_solicitante').get(pk=lote_id)
+    try:
+        if lote.validado_en is None:
+            ingerir_lote(lote)
+            _renovar_latido(lote)
+
+        # Por bloques de id: cada bloque se consulta y se guarda antes de leer el siguiente
+        tamano_bloque = settings.LOTE_TAMANO_BLOQUE
+        ultimo_id = 0
+        while bloque := list(lote.filas.filter(consultada=False, pk__gt=ultimo_id)
+                             .order_by('pk')[:tamano_bloque]):
+            FilaLote.objects.bulk_update(_consultar_bloque(bloque), CAMPOS_RESULTADO, batch_size=tamano_bloque)
+            ultimo_id = bloque[-1].pk
+            _renovar_latido(lote)
+
+        lote.total_filas = lote.filas.count()
+        lote.filas_con_hallazgos = lote.filas.filter(encontro_resultados=True).count()
+
+        with tempfile.TemporaryFile() as temporal:
+            generar_reporte(lote, temporal)
+            temporal.seek(0)
+            nombre = f'resultado_lote_{lote.id}_{timezone.now():%Y%m%d%H%M}.xlsx'
+            lote.archivo_resultado.save(nombre, File(temporal), save=False)
+
+        _renovar_latido(lote)
+        lote.estado = 'PROCESADO'
+        lote.latido_en = None
+        lote.fecha_procesado = timezone.now()
+        # save() dispara la señal que avisa al usuario que su reporte está listo
+        lote.save()
+        logger.info("Lote %s procesado: %s filas", lote.id, lote.total_filas)
+    except LoteRetomado:
+        # El que lo retomó termina el trabajo; aquí no se toca el lote
+        logger.warning("El lote %s lo retomó otro proceso; se abandona", lote.id)
+        return None
+    except ArchivoLoteInvalido as e:
+        # Archivo que no sigue la plantilla: no es un error del sistema ni se reintenta
+        lote.filas.all().delete()
+        marcar_error(lote.id, e)
+        lote.estado = 'ERROR'
+        lote.error_procesamiento = str(e)[:1000]
+    except Exception as e:
+        logger.exception("Error procesando el lote %s", lote.id)
+        LoteConsultaMasiva.objects.filter(pk=lote.id, estado='PROCESANDO', latido_en=lote.latido_en).update(
+            estado='PENDIENTE', error_procesamiento=str(e)[:1000], latido_en=None
+        )
+        raise
+    return lote
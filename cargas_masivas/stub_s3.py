@@ -0,0 +1,264 @@
+# archivo: cargas_masivas/stub_s3.py
+"""
+Servidor local compatible con S3 (direccionamiento por ruta) para pruebas.
+
+Implementa lo que usan django-storages y la subida directa: PutObject,
+GetObject (con Range), HeadObject, DeleteObject y la subida multiparte
+(CreateMultipartUpload, UploadPart, ListParts, CompleteMultipartUpload y
+AbortMultipartUpload). No valida firmas, así que sirve igual para las
+peticiones de boto3 y para las URLs prefirmadas que usa el navegador.
+"""
+
+import hashlib
+import re
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+TAMANO_MINIMO_PARTE = 5 * 1024 * 1024  # El mismo mínimo de S3 (salvo la última parte)
+
+# settings.STORAGES de desarrollo (DEBUG=True). Las pruebas que guardan archivos lo
+# fijan: con DEBUG=False en el entorno, settings apunta el almacenamiento a S3.
+ALMACENAMIENTO_LOCAL = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def _etag(datos):
+    return f'"{hashlib.md5(datos).hexdigest()}"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _partes_ruta(self):
+        url = urlsplit(self.path)
+        bucket, _, clave = unquote(url.path).lstrip('/').partition('/')
+        consulta = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        with self.server.lock:
+            self.server.peticiones.append((self.command, clave, sorted(consulta)))
+        return bucket, clave, consulta
+
+    def _leer_cuerpo(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def do_PUT(self):
+        _, clave, consulta = self._partes_ruta()
+        datos = self._leer_cuerpo()
+        servidor = self.server
+        if 'uploadId' in consulta:
+            with servidor.lock:
+                subida = servidor.subidas.get(consulta['uploadId'])
+                if subida is None:
+                    return self._error(404, 'NoSuchUpload')
+                subida['partes'][int(consulta['partNumber'])] = datos
+            return self._responder(200, b'', {'ETag': _etag(datos)})
+        with servidor.lock:
+            servidor.objetos[clave] = datos
+            servidor.modificados[clave] = time.time()
+        self._responder(200, b'', {'ETag': _etag(datos)})
+
+    def do_POST(self):
+        _, clave, consulta = self._partes_ruta()
+        cuerpo = self._leer_cuerpo()
+        servidor = self.server
+        if 'uploads' in consulta:
+            upload_id = uuid.uuid4().hex
+            with servidor.lock:
+                servidor.subidas[upload_id] = {'clave': clave, 'partes': {}}
+            return self._xml(
+                f'<InitiateMultipartUploadResult><Key>{escape(clave)}</Key>'
+                f'<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>'
+            )
+        if 'uploadId' in consulta:
+            pedidas = [
+                (int(p.findtext('{*}PartNumber')), p.findtext('{*}ETag'))
+                for p in ElementTree.fromstring(cuerpo).iter('{http://s3.amazonaws.com/doc/2006-03-01/}Part')
+            ]
+            with servidor.lock:
+                subida = servidor.subidas.get(consulta['uploadId'])
+                if subida is None:
+                    return self._error(404, 'NoSuchUpload')
+                partes = subida['partes']
+                for i, (numero, etag) in enumerate(pedidas):
+                    if numero not in partes or _etag(partes[numero]) != etag:
+                        return self._error(400, 'InvalidPart')
+                    if i < len(pedidas) - 1 and len(partes[numero]) < servidor.tamano_minimo_parte:
+                        return self._error(400, 'EntityTooSmall')
+                datos = b''.join(partes[numero] for numero, _ in pedidas)
+                servidor.objetos[clave] = datos
+                servidor.modificados[clave] = time.time()
+                del servidor.subidas[consulta['uploadId']]
+            return self._xml(
+                f'<CompleteMultipartUploadResult><Key>{escape(clave)}</Key>'
+                f'<ETag>{_etag(datos)}</ETag></CompleteMultipartUploadResult>'
+            )
+        self._error(400, 'InvalidRequest')
+
+    def do_GET(self):
+        _, clave, consulta = self._partes_ruta()
+        servidor = self.server
+        if 'uploadId' in consulta:
+            with servidor.lock:
+                subida = servidor.subidas.get(consulta['uploadId'])
+                if subida is None:
+                    return self._error(404, 'NoSuchUpload')
+                partes = sorted(subida['partes'].items())
+            xml = ''.join(
+                f'<Part><PartNumber>{numero}</PartNumber><ETag>{escape(_etag(datos))}</ETag>'
+                f'<Size>{len(datos)}</Size></Part>'
+                for numero, datos in partes
+            )
+            return self._xml(f'<ListPartsResult><IsTruncated>false</IsTruncated>{xml}</ListPartsResult>')
+        if 'list-type' in consulta:
+            prefijo = consulta.get('prefix', '')
+            with servidor.lock:
+                claves = sorted(c for c in servidor.objetos if c.startswith(prefijo))
+            xml = ''.join(f'<Contents><Key>{escape(c)}</Key><Size>{len(servidor.objetos[c])}</Size></Contents>'
+                          for c in claves)
+            return self._xml(f'<ListBucketResult><IsTruncated>false</IsTruncated><KeyCount>{len(claves)}</KeyCount>'
+                             f'{xml}</ListBucketResult>')
+
+        datos = servidor.objetos.get(clave)
+        if datos is None:
+            return self._error(404, 'NoSuchKey')
+        with servidor.lock:
+            servidor.lecturas.append((clave, self.headers.get('Range')))
+        rango = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if rango and (rango.group(1) or rango.group(2)):
+            if rango.group(1):
+                inicio = int(rango.group(1))
+                fin = min(int(rango.group(2)) if rango.group(2) else len(datos) - 1, len(datos) - 1)
+            else:
+                inicio, fin = max(len(datos) - int(rango.group(2)), 0), len(datos) - 1
+            if inicio >= len(datos):
+                return self._error(416, 'InvalidRange')
+            return self._responder(206, datos[inicio:fin + 1], {
+                **self._validadores(clave, datos), 'Content-Range': f'bytes {inicio}-{fin}/{len(datos)}',
+            })
+        self._responder(200, datos, self._validadores(clave, datos))
+
+    def do_HEAD(self):
+        _, clave, _ = self._partes_ruta()
+        datos = self.server.objetos.get(clave)
+        if datos is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(datos)))
+        for nombre, valor in self._validadores(clave, datos).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+
+    def do_DELETE(self):
+        _, clave, consulta = self._partes_ruta()
+        with self.server.lock:
+            if 'uploadId' in consulta:
+                self.server.subidas.pop(consulta['uploadId'], None)
+            else:
+                self.server.objetos.pop(clave, None)
+                self.server.modificados.pop(clave, None)
+        self._responder(204, b'')
+
+    def _validadores(self, clave, datos):
+        return {'ETag': _etag(datos), 'Last-Modified': formatdate(self.server.modificados[clave], usegmt=True)}
+
+    def _xml(self, cuerpo):
+        self._responder(200, f'<?xml version="1.0" encoding="UTF-8"?>{cuerpo}'.encode('utf-8'),
+                        {'Content-Type': 'application/xml'})
+
+    def _error(self, status, codigo):
+        self._responder(status, f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{codigo}</Code>'
+                                f'<Message>{codigo}</Message></Error>'.encode('utf-8'),
+                        {'Content-Type': 'application/xml'})
+
+    def _responder(self, status, datos, encabezados=None):
+        self.send_response(status)
+        for nombre, valor in (encabezados or {}).items():
+            self.send_header(nombre, valor)
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(datos)
+
+
+class StubS3Server:
+    """
+    Uso:
+        with StubS3Server() as s3:
+            with override_settings(STORAGES=s3.storages(location='cliente/media')): ...
+    """
+
+    def __init__(self, bucket='pruebas', tamano_minimo_parte=TAMANO_MINIMO_PARTE):
+        self.bucket = bucket
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.objetos = {}
+        self.httpd.subidas = {}
+        self.httpd.modificados = {}
+        self.httpd.peticiones = []
+        self.httpd.lecturas = []  # (clave, encabezado Range o None) de cada GetObject
+        self.httpd.tamano_minimo_parte = tamano_minimo_parte
+        self._hilo = None
+
+    @property
+    def base_url(self):
+        host, puerto = self.httpd.server_address[:2]
+        return f'http://{host}:{puerto}'
+
+    @property
+    def objetos(self):
+        return self.httpd.objetos
+
+    @property
+    def subidas(self):
+        return self.httpd.subidas
+
+    @property
+    def peticiones(self):
+        return list(self.httpd.peticiones)
+
+    @property
+    def lecturas(self):
+        return list(self.httpd.lecturas)
+
+    def storages(self, location=''):
+        """Valor de settings.STORAGES con el almacenamiento por defecto en este servidor."""
+        return {
+            'default': {
+                'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+                'OPTIONS': {
+                    'bucket_name': self.bucket, 'endpoint_url': self.base_url, 'location': location,
+                    'access_key': 'pruebas', 'secret_key': 'pruebas', 'region_name': 'us-east-1',
+                    'addressing_style': 'path', 'default_acl': None, 'querystring_auth': True,
+                },
+            },
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self.httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
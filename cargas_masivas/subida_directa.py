@@ -0,0 +1,146 @@
+# archivo: cargas_masivas/subida_directa.py
+"""
+Subida de archivos de lote directo del navegador a S3.
+
+Con S3 como almacenamiento (DEBUG=False), un archivo grande ya no pasa por
+el worker de gunicorn. El navegador pide una subida multiparte, sube cada
+parte a S3 con una URL prefirmada y al final pide completarla; solo entonces
+se crea el LoteConsultaMasiva, apuntando al objeto que ya está en S3. Si la
+conexión se cae, ListParts dice qué partes ya llegaron y el navegador sube
+solo las que faltan.
+
+Con FileSystemStorage (DEBUG=True) no hay subida directa y se usa el
+formulario de siempre (SubirLoteView).
+"""
+
+import logging
+import mimetypes
+import os
+import posixpath
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.text import get_valid_filename
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from cola_tareas.cola import encolar
+
+from .ingesta import EXTENSIONES
+from .models import LoteConsultaMasiva, SubidaLote, ruta_archivo_subido
+
+logger = logging.getLogger(__name__)
+
+MAX_PARTES = 10_000  # Límite de S3 por subida multiparte
+
+
+class SubidaInvalida(Exception):
+    """La subida no se puede iniciar o completar; el mensaje es para el usuario."""
+
+
+def subida_directa_disponible():
+    return isinstance(default_storage, S3Boto3Storage)
+
+
+def _cliente():
+    return default_storage.connection.meta.client
+
+
+def _clave_s3(archivo):
+    # Nombre completo del objeto: el storage antepone {S3_PREFIX}/media
+    return posixpath.join(default_storage.location, archivo) if default_storage.location else archivo
+
+
+def _parametros(subida):
+    return {'Bucket': default_storage.bucket_name, 'Key': _clave_s3(subida.archivo), 'UploadId': subida.upload_id}
+
+
+def calcular_tamano_parte(tamano):
+    minimo = settings.LOTE_SUBIDA_TAMANO_PARTE_MB * 1024 * 1024
+    return max(minimo, -(-tamano // MAX_PARTES))
+
+
+def iniciar_subida(usuario, nombre_archivo, tamano):
+    """Crea la subida multiparte en S3 y la registra para poder retomarla."""
+    nombre = get_valid_filename(os.path.basename(nombre_archivo or ''))
+    if os.path.splitext(nombre)[1].lower() not in EXTENSIONES:
+        raise SubidaInvalida("El archivo debe ser un Excel (.xlsx) o un CSV.")
+    if tamano <= 0:
+        raise SubidaInvalida("El archivo está vacío.")
+    if tamano > settings.LOTE_TAMANO_MAXIMO_MB * 1024 * 1024:
+        raise SubidaInvalida(f"El archivo supera el máximo de {settings.LOTE_TAMANO_MAXIMO_MB} MB.")
+
+    # Mismo prefijo que los lotes subidos por el formulario, con un nombre que no se repite
+    archivo = ruta_archivo_subido(LoteConsultaMasiva(empresa=usuario.empresa), f'{uuid.uuid4().hex[:12]}_{nombre}')
+    tipo = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+    respuesta = _cliente().create_multipart_upload(
+        Bucket=default_storage.bucket_name, Key=_clave_s3(archivo), ContentType=tipo,
+    )
+    return SubidaLote.objects.create(
+        empresa=usuario.empresa, usuario=usuario, nombre_original=nombre, archivo=archivo,
+        upload_id=respuesta['UploadId'], tamano=tamano, tamano_parte=calcular_tamano_parte(tamano),
+    )
+
+
+def firmar_partes(subida, numeros):
+    """URLs prefirmadas para subir (PUT) cada parte pedida."""
+    cliente = _cliente()
+    urls = {}
+    for numero in numeros:
+        if not 1 <= numero <= subida.total_partes:
+            raise SubidaInvalida(f"Parte {numero} fuera de rango.")
+        urls[numero] = cliente.generate_presigned_url(
+            'upload_part', Params={**_parametros(subida), 'PartNumber': numero},
+            ExpiresIn=settings.LOTE_SUBIDA_EXPIRACION,
+        )
+    return urls
+
+
+def partes_subidas(subida):
+    """Partes que S3 ya recibió: [{'PartNumber', 'ETag', 'Size'}, ...]."""
+    paginas = _cliente().get_paginator('list_parts').paginate(**_parametros(subida))
+    return [parte for pagina in paginas for parte in pagina.get('Parts', [])]
+
+
+def completar_subida(subida):
+    """
+    Une las partes en S3 y crea el lote. Las partes se toman de ListParts y no
+    de lo que diga el navegador. Si la subida ya se había completado devuelve
+    el mismo lote (el navegador puede reintentar la petición).
+    """
+    with transaction.atomic():
+        # Bloqueo de la fila: dos peticiones de completar no crean dos lotes
+        subida = SubidaLote.objects.select_for_update().get(pk=subida.pk)
+        if subida.estado == 'COMPLETADA':
+            return subida.lote
+        if subida.estado != 'ABIERTA':
+            raise SubidaInvalida("La subida fue cancelada.")
+
+        partes = partes_subidas(subida)
+        numeros = [parte['PartNumber'] for parte in partes]
+        if numeros != list(range(1, subida.total_partes + 1)) or sum(p['Size'] for p in partes) != subida.tamano:
+            raise SubidaInvalida("Faltan partes del archivo; reanude la subida.")
+
+        _cliente().complete_multipart_upload(
+            **_parametros(subida),
+            MultipartUpload={'Parts': [{'PartNumber': p['PartNumber'], 'ETag': p['ETag']} for p in partes]},
+        )
+        # El archivo ya está en S3: solo se guarda su nombre, no se vuelve a subir
+        lote = LoteConsultaMasiva.objects.create(
+            empresa=subida.empresa, usuario_solicitante=subida.usuario, archivo_subido=subida.archivo,
+        )
+        subida.lote = lote
+        subida.estado = 'COMPLETADA'
+        subida.save(update_fields=['lote', 'estado'])
+        encolar('cargas_masivas.validar_lote', lote_id=lote.id)
+
+    logger.info("Subida directa %s completada: lote %s (%s bytes)", subida.pk, lote.id, subida.tamano)
+    return lote
+
+
+def cancelar_subida(subida):
+    """Descarta la subida y las partes que ya estaban en S3."""
+    _cliente().abort_multipart_upload(**_parametros(subida))
+    subida.estado = 'CANCELADA'
+    subida.save(update_fields=['estado'])
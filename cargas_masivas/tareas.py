@@ -0,0 +1,49 @@
+# archivo: cargas_masivas/tareas.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from cola_tareas.cola import encolar, tarea
+
+from .ingesta import validar_lote
+from .models import LoteConsultaMasiva
+from .notificaciones import enviar_correos_pendientes
+from .procesamiento import marcar_error, procesar_lote
+
+
+class LoteEnProceso(Exception):
+    """Otro worker tiene el lote con el latido al día: se reintenta más tarde."""
+
+
+@tarea('cargas_masivas.validar_lote', max_intentos=3, timeout=30 * 60)
+def validar_lote_tarea(lote_id):
+    # Igual que al procesar: si el worker anterior murió validando, se retoma
+    LoteConsultaMasiva.objects.filter(pk=lote_id, estado='VALIDANDO').update(estado='PENDIENTE')
+    lote = validar_lote(lote_id)
+    if lote is not None and lote.estado == 'PENDIENTE' and settings.LOTE_PROCESAMIENTO_AUTOMATICO:
+        encolar('cargas_masivas.procesar_lote', lote_id=lote_id)
+
+
+def _lote_fallido(lote_id):
+    # Si otro worker lo tiene con el latido al día, él decide cómo termina
+    vencido = timezone.now() - timedelta(seconds=settings.LOTE_LATIDO_VENCIDO)
+    lote = (LoteConsultaMasiva.objects.filter(pk=lote_id)
+            .exclude(estado='PROCESANDO', latido_en__gte=vencido)
+            .only('error_procesamiento').first())
+    if lote is not None:
+        marcar_error(lote_id, lote.error_procesamiento or 'El procesamiento no terminó tras varios intentos')
+
+
+@tarea('cargas_masivas.procesar_lote', max_intentos=3, timeout=4 * 60 * 60, al_fallar=_lote_fallido)
+def procesar_lote_tarea(lote_id):
+    # procesar_lote retoma el lote si quedó en PROCESANDO con el latido vencido
+    # (el worker anterior murió). Si el latido está al día es porque el worker
+    # anterior sigue trabajando aunque la tarea se retomó: no se toca.
+    if procesar_lote(lote_id) is None and LoteConsultaMasiva.objects.filter(pk=lote_id, estado='PROCESANDO').exists():
+        raise LoteEnProceso(lote_id)
+
+
+@tarea('cargas_masivas.enviar_correos', max_intentos=10)
+def enviar_correos_tarea():
+    enviar_correos_pendientes()
@@ -1,3 +1,698 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+
+from cola_tareas.cola import ejecutar, ejecutar_pendientes, encolar, tomar_siguiente
+from cola_tareas.models import Tarea
+from consultas import services
+from consultas.services import normalizar_identificacion
+from consultas.stub_api import StubAPIServer
+from empresas.models import Empresa
+from usuarios.models import Usuario
+
+from .forms import LoteForm
+from .ingesta import validar_lote
+from .models import FilaLote, LoteConsultaMasiva, NotificacionCorreo, SubidaLote
+from . import notificaciones, procesamiento
+from .procesamiento import procesar_lote
+from .stub_s3 import ALMACENAMIENTO_LOCAL, StubS3Server
+
+
+def crear_excel(filas, encabezados=('Identificación', 'Nombres')):
+    libro = Workbook()
+    hoja = libro.active
+    hoja.append(list(encabezados))
+    for fila in filas:
+        hoja.append(list(fila))
+    contenido = io.BytesIO()
+    libro.save(contenido)
+    return contenido.getvalue()
+
+
+class ProcesamientoLoteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('cliente', email='cliente@example.com', empresa=cls.empresa)
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.stub = StubAPIServer(resultados_por_consulta=self._resultados_por_consulta).iniciar()
+        self.ajustes = override_settings(
+            MEDIA_ROOT=self.media, STORAGES=ALMACENAMIENTO_LOCAL, API_BASE_URL=self.stub.base_url, API_TOKEN='tok',
+            API_CACHE_ACTIVO=False, LOTE_TAMANO_BLOQUE=2, LOTE_CONCURRENCIA=3,
+        )
+        self.ajustes.enable()
+
+    def tearDown(self):
+        services.cerrar_sesion()
+        self.ajustes.disable()
+        self.stub.detener()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    @staticmethod
+    def _resultados_por_consulta(endpoint, identificacion, nombre):
+        # Solo la identificación 111 aparece en listas
+        return 2 if identificacion == '111' else 0
+
+    def _crear_lote(self, contenido):
+        return LoteConsultaMasiva.objects.create(
+            empresa=self.empresa,
+            usuario_solicitante=self.usuario,
+            archivo_subido=SimpleUploadedFile('lote.xlsx', contenido),
+        )
+
+    def test_procesa_lote_completo(self):
+        lote = self._crear_lote(crear_excel([
+            (111, 'Juan Perez'), ('222', ''), (None, 'Maria Gomez'), (None, None), ('333', 'Ana'),
+        ]))
+        # Correos de confirmación de la carga
+        ejecutar_pendientes()
+        mail.outbox.clear()
+
+        lote = procesar_lote(lote.id)
+
+        self.assertEqual(lote.estado, 'PROCESADO')
+        self.assertEqual(lote.total_filas, 4)
+        self.assertEqual(lote.filas_con_hallazgos, 1)
+        # Con identificación y nombre se hace la revisión completa (tres endpoints)
+        self.assertEqual(
+            sorted(self.stub.rutas),
+            ['/PepsExactaID/tok/111', '/PepsExactaID/tok/222', '/PepsExactaID/tok/333',
+             '/PepsIDNombre/tok/111/JUAN%20PEREZ', '/PepsIDNombre/tok/333/ANA',
+             '/PepsNombre/tok/ANA', '/PepsNombre/tok/JUAN%20PEREZ', '/PepsNombre/tok/MARIA%20GOMEZ'],
+        )
+        fila = lote.filas.get(numero_fila=2)
+        self.assertEqual(fila.identificacion, '111')
+        # 2 registros de PepsIDNombre y otros 2 (con otro nombre) de PepsExactaID
+        self.assertEqual(fila.total_resultados, 4)
+        self.assertTrue(fila.genero_alerta)
+
+        with lote.archivo_resultado.open('rb') as archivo:
+            libro = load_workbook(archivo, read_only=True)
+            self.assertEqual(len(list(libro['Resumen'].iter_rows())), 5)
+            self.assertEqual(len(list(libro['Hallazgos'].iter_rows())), 5)
+        # Se notifica al usuario que el reporte está listo (lo envía el worker)
+        self.assertEqual(len(mail.outbox), 0)
+        ejecutar_pendientes()
+        self.assertEqual([m.to for m in mail.outbox], [['cliente@example.com']])
+
+    @override_settings(API_PLAZO_BUSQUEDA=0.3)
+    def test_fila_con_respuesta_parcial_queda_marcada(self):
+        self.stub.configurar(latencia=lambda endpoint: 1.0 if endpoint == 'PepsNombre' else 0)
+        lote = self._crear_lote(crear_excel([('222', 'Ana'), ('333', '')]))
+        with self.assertLogs('consultas.consulta_paralela', level='WARNING'):
+            lote = procesar_lote(lote.id)
+
+        self.assertEqual(
+            list(lote.filas.order_by('numero_fila').values_list('consulta_incompleta', 'error_consulta')),
+            [(True, False), (False, False)],
+        )
+        with lote.archivo_resultado.open('rb') as archivo:
+            observaciones = [fila[6] for fila in load_workbook(archivo, read_only=True)['Resumen'].iter_rows(values_only=True)]
+        self.assertIn('Consulta incompleta', observaciones[1])
+        self.assertFalse(observaciones[2])
+
+    def test_lote_ya_tomado_no_se_procesa_dos_veces(self):
+        lote = self._crear_lote(crear_excel([('111', '')]))
+        self.assertIsNotNone(procesar_lote(lote.id))
+        self.assertIsNone(procesar_lote(lote.id))
+        self.assertEqual(self.stub.peticiones, 1)
+
+    @override_settings(TAREAS_BACKOFF_BASE=0)
+    def test_error_inesperado_se_reintenta_y_al_final_queda_en_error(self):
+        lote = self._crear_lote(crear_excel([('111', ''), ('222', '')]))
+        validar_lote(lote.id)
+        encolar('cargas_masivas.procesar_lote', lote_id=lote.id)
+        with mock.patch('cargas_masivas.procesamiento.generar_reporte', side_effect=OSError('S3 no responde')), \
+                self.assertLogs('cola_tareas.cola', level='ERROR'), \
+                self.assertLogs('cargas_masivas.procesamiento', level='ERROR'):
+            ejecutar(tomar_siguiente(['cargas_masivas.procesar_lote']))
+            lote.refresh_from_db()
+            # Vuelve a la cola con el error anotado; las filas consultadas no se repiten
+            self.assertEqual(lote.estado, 'PENDIENTE')
+            self.assertIn('S3 no responde', lote.error_procesamiento)
+            self.assertEqual(lote.filas.filter(consultada=True).count(), 2)
+            ejecutar_pendientes(['cargas_masivas.procesar_lote'])
+
+        lote.refresh_from_db()
+        self.assertEqual(lote.estado, 'ERROR')
+        self.assertIn('S3 no responde', lote.error_procesamiento)
+        self.assertEqual(Tarea.objects.get(nombre='cargas_masivas.procesar_lote').estado, 'FALLIDA')
+        self.assertEqual(self.stub.peticiones, 2)
+
+    def test_lote_en_proceso_solo_se_retoma_con_el_latido_vencido(self):
+        lote = self._crear_lote(crear_excel([('111', '')]))
+        validar_lote(lote.id)
+        LoteConsultaMasiva.objects.filter(pk=lote.id).update(estado='PROCESANDO', latido_en=timezone.now())
+        tarea = encolar('cargas_masivas.procesar_lote', lote_id=lote.id)
+
+        # El worker que lo tiene sigue vivo: la tarea se reintenta más tarde sin tocar el lote
+        with self.assertLogs('cola_tareas.cola', level='ERROR'):
+            ejecutar(tomar_siguiente(['cargas_masivas.procesar_lote']))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, 'PENDIENTE')
+        self.assertIn('LoteEnProceso', tarea.ultimo_error)
+        self.assertEqual(LoteConsultaMasiva.objects.get(pk=lote.id).estado, 'PROCESANDO')
+        self.assertEqual(self.stub.peticiones, 0)
+
+        # Murió: su latido venció y el reintento lo termina
+        LoteConsultaMasiva.objects.filter(pk=lote.id).update(latido_en=timezone.now() - timedelta(hours=1))
+        Tarea.objects.filter(pk=tarea.pk).update(disponible_en=timezone.now())
+        ejecutar_pendientes(['cargas_masivas.procesar_lote'])
+        lote.refresh_from_db()
+        self.assertEqual(lote.estado, 'PROCESADO')
+        self.assertIsNone(lote.latido_en)
+
+    def test_proceso_que_perdio_el_lote_no_lo_termina(self):
+        lote = self._crear_lote(crear_excel([('111', ''), ('222', ''), ('333', '')]))
+        validar_lote(lote.id)
+        consultar_bloque = procesamiento._consultar_bloque
+
+        def retomado_por_otro(bloque):
+            # Mientras consultaba, otro proceso lo retomó con un latido nuevo
+            LoteConsultaMasiva.objects.filter(pk=lote.id).update(latido_en=timezone.now() + timedelta(seconds=1))
+            return consultar_bloque(bloque)
+
+        with mock.patch('cargas_masivas.procesamiento._consultar_bloque', side_effect=retomado_por_otro), \
+                self.assertLogs('cargas_masivas.procesamiento', level='WARNING'):
+            self.assertIsNone(procesar_lote(lote.id))
+        lote.refresh_from_db()
+        self.assertEqual(lote.estado, 'PROCESANDO')
+        self.assertFalse(lote.archivo_resultado)
+        # Solo alcanzó a guardar el primer bloque
+        self.assertEqual(lote.filas.filter(consultada=True).count(), 2)
+
+    def test_archivo_sin_columnas_conocidas_marca_error(self):
+        lote = self._crear_lote(crear_excel([('1', '2')], encabezados=('A', 'B')))
+        lote = procesar_lote(lote.id)
+        self.assertEqual(lote.estado, 'ERROR')
+        lote.refresh_from_db()
+        self.assertEqual(lote.estado, 'ERROR')
+        self.assertIn("columna 'Identificación'", lote.error_procesamiento)
+
+    def test_retoma_solo_las_filas_sin_consultar(self):
+        lote = self._crear_lote(crear_excel([('111', ''), ('222', ''), ('333', '')]))
+        validar_lote(lote.id)
+        # Un intento anterior alcanzó a consultar la primera fila antes de caerse
+        lote.filas.filter(identificacion='111').update(consultada=True)
+
+        lote = procesar_lote(lote.id)
+
+        self.assertEqual(lote.estado, 'PROCESADO')
+        self.assertEqual(sorted(self.stub.rutas), ['/PepsExactaID/tok/222', '/PepsExactaID/tok/333'])
+        self.assertEqual(lote.total_filas, 3)
+
+    def test_subir_lote_lo_encola_para_el_motor(self):
+        self.client.force_login(self.usuario)
+        archivo = SimpleUploadedFile('lote.xlsx', crear_excel([('111', 'Juan')]))
+        self.client.post(reverse('subir_lote'), {'archivo_subido': archivo})
+
+        lote = LoteConsultaMasiva.objects.get()
+        tarea = Tarea.objects.get(nombre='cargas_masivas.validar_lote')
+        self.assertEqual(tarea.argumentos, {'lote_id': lote.id})
+
+        # La validación encola el procesamiento y el mismo worker lo ejecuta
+        ejecutar_pendientes()
+        lote.refresh_from_db()
+        self.assertEqual(lote.estado, 'PROCESADO')
+        self.assertEqual(lote.filas_leidas, 1)
+        self.assertTrue(Tarea.objects.filter(nombre='cargas_masivas.procesar_lote', estado='COMPLETADA').exists())
+
+    @override_settings(LOTE_PROCESAMIENTO_AUTOMATICO=False)
+    def test_lote_validado_muestra_el_resumen_sin_procesar(self):
+        self.client.force_login(self.usuario)
+        archivo = SimpleUploadedFile('lote.xlsx', crear_excel([('111', 'Juan'), ('1.11', ''), ('abc$', '')]))
+        self.client.post(reverse('subir_lote'), {'archivo_subido': archivo})
+        ejecutar_pendientes()
+
+        lote = LoteConsultaMasiva.objects.get()
+        self.assertEqual(lote.estado, 'PENDIENTE')
+        self.assertFalse(Tarea.objects.filter(nombre='cargas_masivas.procesar_lote').exists())
+        respuesta = self.client.get(reverse('listar_lotes'))
+        self.assertContains(respuesta, '3 filas leídas: 1 para consultar, 1 repetidas, 1 con errores')
+        self.assertContains(respuesta, 'Fila 4: Identificación con caracteres no válidos')
+
+    def test_formulario_rechaza_archivos_fuera_de_la_plantilla(self):
+        for nombre, contenido in (
+            ('lote.xlsx', crear_excel([('1', '2')], encabezados=('A', 'B'))),
+            ('lote.xlsx', b'no es un excel'),
+            ('lote.pdf', b'%PDF'),
+        ):
+            with self.subTest(nombre=nombre, contenido=contenido[:10]):
+                form = LoteForm(files={'archivo_subido': SimpleUploadedFile(nombre, contenido)})
+                self.assertFalse(form.is_valid())
+                self.assertIn('archivo_subido', form.errors)
+
+        form = LoteForm(files={'archivo_subido': SimpleUploadedFile('lote.csv', 'Cédula;Nombre\n1;A\n'.encode())})
+        self.assertTrue(form.is_valid(), form.errors)
+
+
+class IngestaLoteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('cliente', email='cliente@example.com', empresa=cls.empresa)
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.ajustes = override_settings(MEDIA_ROOT=self.media, STORAGES=ALMACENAMIENTO_LOCAL)
+        self.ajustes.enable()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def _crear_lote(self, contenido, nombre='lote.xlsx'):
+        return LoteConsultaMasiva.objects.create(
+            empresa=self.empresa, usuario_solicitante=self.usuario,
+            archivo_subido=SimpleUploadedFile(nombre, contenido),
+        )
+
+    def test_normaliza_y_descarta_repetidos(self):
+        lote = self._crear_lote(crear_excel([
+            (1234567, 'Juan  Pérez'), ('1.234.567', 'Otro nombre'), ('900123456-1', ''),
+            (None, 'maría gómez'), (None, 'MARÍA GÓMEZ'), (None, None),
+        ]))
+        lote = validar_lote(lote.id)
+
+        self.assertEqual(lote.estado, 'PENDIENTE')
+        self.assertEqual((lote.filas_leidas, lote.total_filas, lote.filas_duplicadas, lote.filas_invalidas),
+                         (5, 3, 2, 0))
+        self.assertEqual(
+            list(lote.filas.order_by('numero_fila').values_list('numero_fila', 'identificacion', 'nombres')),
+            [(2, '1234567', 'JUAN PÉREZ'), (4, '900123456-1', ''), (5, '', 'MARÍA GÓMEZ')],
+        )
+        self.assertFalse(lote.filas.filter(consultada=True).exists())
+
+    def test_filas_invalidas_quedan_en_el_resumen(self):
+        lote = self._crear_lote(crear_excel([
+            ('12#34', 'Ana'), ('1' * 60, ''), ('', '12345'), ('555', 'Luis'),
+        ]))
+        lote = validar_lote(lote.id)
+
+        self.assertEqual((lote.total_filas, lote.filas_invalidas), (1, 3))
+        self.assertEqual(lote.resumen_validacion['por_tipo'],
+                         {'identificacion_invalida': 1, 'identificacion_larga': 1, 'nombre_sin_letras': 1})
+        self.assertEqual([e['fila'] for e in lote.resumen_validacion['ejemplos']], [2, 3, 4])
+
+    def test_csv_con_punto_y_coma(self):
+        contenido = '\ufeffNúmero de documento;Nombre completo\n111;Juan\n222;"Pérez; Ana"\n'.encode('utf-8')
+        lote = validar_lote(self._crear_lote(contenido, 'lote.csv').id)
+        self.assertEqual(list(lote.filas.order_by('numero_fila').values_list('identificacion', 'nombres')),
+                         [('111', 'JUAN'), ('222', 'PÉREZ; ANA')])
+
+    def test_sin_filas_validas_o_demasiadas_filas_es_error(self):
+        lote = validar_lote(self._crear_lote(crear_excel([('$$', '')])).id)
+        self.assertEqual(lote.estado, 'ERROR')
+        self.assertIn('no tiene filas válidas', lote.error_procesamiento)
+        self.assertFalse(FilaLote.objects.exists())
+
+        with override_settings(LOTE_MAX_FILAS=2):
+            lote = validar_lote(self._crear_lote(crear_excel([('1', ''), ('2', ''), ('3', '')])).id)
+        self.assertEqual(lote.estado, 'ERROR')
+        self.assertIn('máximo de 2 filas', lote.error_procesamiento)
+        self.assertFalse(FilaLote.objects.exists())
+
+    def test_normalizar_identificacion(self):
+        self.assertEqual(normalizar_identificacion(' 1.234.567 '), '1234567')
+        self.assertEqual(normalizar_identificacion('900 123 456-1'), '900123456-1')
+        self.assertEqual(normalizar_identificacion('pa12345'), 'PA12345')
+
+
+# Sin el stub de S3 (al desactivar self.ajustes) queda el almacenamiento local
+@override_settings(LOTE_SUBIDA_TAMANO_PARTE_MB=1, LOTE_PROCESAMIENTO_AUTOMATICO=False, STORAGES=ALMACENAMIENTO_LOCAL)
+class SubidaDirectaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('cliente', email='cliente@example.com', empresa=cls.empresa)
+        cls.otro = Usuario.objects.create_user('otro', email='otro@example.com', empresa=cls.empresa)
+        # ~2,5 MB: tres partes de 1 MB
+        filas = ''.join(f'{10_000_000 + i};PERSONA {i} {"DE PRUEBA " * 8}\n' for i in range(25_000))
+        cls.contenido = f'Identificación;Nombres\n{filas}'.encode('utf-8')
+
+    def setUp(self):
+        self.s3 = StubS3Server(tamano_minimo_parte=1024 * 1024).iniciar()
+        self.ajustes = override_settings(STORAGES=self.s3.storages(location='cliente/media'))
+        self.ajustes.enable()
+        self.client.force_login(self.usuario)
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.s3.detener()
+
+    def _post(self, nombre, datos=None, **kwargs):
+        return self.client.post(reverse(nombre, kwargs=kwargs), json.dumps(datos or {}),
+                                content_type='application/json')
+
+    def _subir_partes(self, subida_id, numeros):
+        urls = self._post('subida_firmar', {'partes': numeros}, pk=subida_id).json()['urls']
+        tamano = 1024 * 1024
+        for numero in numeros:
+            respuesta = requests.put(urls[str(numero)], data=self.contenido[(numero - 1) * tamano:numero * tamano])
+            self.assertEqual(respuesta.status_code, 200)
+
+    def test_subida_por_partes_se_retoma_y_crea_el_lote(self):
+        respuesta = self._post('subida_iniciar', {'nombre': 'clientes marzo.csv', 'tamano': len(self.contenido)})
+        self.assertEqual(respuesta.status_code, 200)
+        subida_id = respuesta.json()['id']
+        self.assertEqual(respuesta.json()['total_partes'], 3)
+
+        # Se corta la conexión después de subir las partes 1 y 3
+        self._subir_partes(subida_id, [1, 3])
+        respuesta = self._post('subida_completar', pk=subida_id)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(LoteConsultaMasiva.objects.exists())
+
+        estado = self.client.get(reverse('subida_estado', kwargs={'pk': subida_id})).json()
+        self.assertEqual(estado['partes'], [1, 3])
+        self._subir_partes(subida_id, [2])
+        respuesta = self._post('subida_completar', pk=subida_id)
+        self.assertEqual(respuesta.status_code, 200)
+
+        lote = LoteConsultaMasiva.objects.get()
+        subida = SubidaLote.objects.get()
+        self.assertEqual(respuesta.json()['lote'], lote.id)
+        self.assertEqual((subida.estado, subida.lote), ('COMPLETADA', lote))
+        self.assertEqual(lote.archivo_subido.name, subida.archivo)
+        self.assertTrue(subida.archivo.startswith(f'cargas_masivas/empresa_{self.empresa.id}/subidas/'))
+        self.assertTrue(subida.archivo.endswith('_clientes_marzo.csv'))
+        self.assertEqual(self.s3.objetos[f'cliente/media/{subida.archivo}'], self.contenido)
+        # Ninguna petición al bucket llevó el archivo a través de Django
+        self.assertFalse([p for p in self.s3.peticiones if p[0] == 'PUT' and not p[2]])
+
+        # Completar dos veces (el navegador reintenta) no crea otro lote
+        self.assertEqual(self._post('subida_completar', pk=subida_id).json()['lote'], lote.id)
+        self.assertEqual(LoteConsultaMasiva.objects.count(), 1)
+
+        # La validación lee el archivo desde S3
+        ejecutar_pendientes(nombres=['cargas_masivas.validar_lote'])
+        lote.refresh_from_db()
+        self.assertEqual((lote.estado, lote.total_filas), ('PENDIENTE', 25_000))
+
+    def test_subida_de_otro_usuario_no_es_accesible(self):
+        subida_id = self._post('subida_iniciar', {'nombre': 'lote.xlsx', 'tamano': 10}).json()['id']
+        self.client.force_login(self.otro)
+        self.assertEqual(self.client.get(reverse('subida_estado', kwargs={'pk': subida_id})).status_code, 404)
+        self.assertEqual(self._post('subida_firmar', {'partes': [1]}, pk=subida_id).status_code, 404)
+        self.assertEqual(self._post('subida_completar', pk=subida_id).status_code, 404)
+
+    @override_settings(LOTE_TAMANO_MAXIMO_MB=1)
+    def test_rechaza_extension_o_tamano(self):
+        for datos in ({'nombre': 'lote.pdf', 'tamano': 10}, {'nombre': 'lote.xlsx', 'tamano': 2 * 1024 * 1024},
+                      {'nombre': 'lote.xlsx', 'tamano': 0}):
+            with self.subTest(**datos):
+                self.assertEqual(self._post('subida_iniciar', datos).status_code, 400)
+        self.assertFalse(self.s3.subidas)
+
+    def test_cancelar_descarta_las_partes(self):
+        subida_id = self._post('subida_iniciar', {'nombre': 'lote.csv', 'tamano': len(self.contenido)}).json()['id']
+        self._subir_partes(subida_id, [1])
+        self.assertEqual(self._post('subida_cancelar', pk=subida_id).status_code, 200)
+        self.assertFalse(self.s3.subidas)
+        self.assertEqual(SubidaLote.objects.get().estado, 'CANCELADA')
+        self.assertEqual(self._post('subida_completar', pk=subida_id).status_code, 400)
+
+    def test_formulario_usa_la_subida_directa_solo_con_s3(self):
+        self.assertContains(self.client.get(reverse('subir_lote')), 'js/subida_lote.js')
+        self.ajustes.disable()
+        try:
+            self.assertNotContains(self.client.get(reverse('subir_lote')), 'js/subida_lote.js')
+            self.assertEqual(self._post('subida_iniciar', {'nombre': 'lote.csv', 'tamano': 10}).status_code, 404)
+        finally:
+            self.ajustes.enable()
+
+
+class DescargaArchivosLoteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.otra_empresa = Empresa.objects.create(nombre='Otra Empresa')
+        cls.usuario = Usuario.objects.create_user('cliente', email='cliente@example.com', empresa=cls.empresa)
+        cls.ajeno = Usuario.objects.create_user('ajeno', email='ajeno@example.com', empresa=cls.otra_empresa)
+        cls.admin = Usuario.objects.create_superuser('admin', email='admin@example.com', password='x')
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.ajustes = override_settings(MEDIA_ROOT=self.media, STORAGES=ALMACENAMIENTO_LOCAL)
+        self.ajustes.enable()
+        self.contenido = crear_excel([('111', 'Juan')])
+
+    def tearDown(self):
+        self.ajustes.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def _crear_lote(self):
+        return LoteConsultaMasiva.objects.create(
+            empresa=self.empresa, usuario_solicitante=self.usuario,
+            archivo_subido=SimpleUploadedFile('lote.xlsx', self.contenido),
+        )
+
+    def _descargar(self, lote, tipo='subido', **encabezados):
+        return self.client.get(reverse('descargar_archivo_lote', args=[lote.pk, tipo]), headers=encabezados)
+
+    def test_solo_la_empresa_del_lote_o_un_superusuario(self):
+        lote = self._crear_lote()
+        self.client.force_login(self.usuario)
+        respuesta = self._descargar(lote)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido)
+        # Todavía no hay reporte
+        self.assertEqual(self._descargar(lote, 'resultado').status_code, 404)
+        self.assertEqual(self._descargar(lote, 'otro').status_code, 404)
+
+        self.client.force_login(self.ajeno)
+        self.assertEqual(self._descargar(lote).status_code, 404)
+        self.client.force_login(self.admin)
+        self.assertEqual(self._descargar(lote).status_code, 200)
+
+    def test_lista_de_lotes_enlaza_la_descarga(self):
+        lote = self._crear_lote()
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('listar_lotes'))
+        self.assertContains(respuesta, reverse('descargar_archivo_lote', args=[lote.pk, 'subido']))
+        self.assertNotContains(respuesta, lote.archivo_subido.url)
+
+    def test_plantilla_desde_el_almacenamiento(self):
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get(reverse('descargar_plantilla')).status_code, 404)
+        default_storage.save('plantillas/plantilla_consultas.xlsx', ContentFile(self.contenido))
+        respuesta = self.client.get(reverse('descargar_plantilla'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('plantilla_consultas.xlsx', respuesta['Content-Disposition'])
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido)
+
+    def test_con_s3_pequenos_por_bloques_y_grandes_por_redireccion(self):
+        with StubS3Server() as s3, override_settings(STORAGES=s3.storages(location='cliente/media')):
+            lote = self._crear_lote()
+            self.client.force_login(self.usuario)
+
+            respuesta = self._descargar(lote, Range='bytes=0-99')
+            self.assertEqual(respuesta.status_code, 206)
+            self.assertEqual(b''.join(respuesta.streaming_content), self.contenido[:100])
+            # Solo se pidió a S3 el rango, no el objeto completo
+            self.assertEqual([p[0] for p in s3.peticiones[-2:]], ['HEAD', 'GET'])
+            self.assertEqual(self._descargar(lote, If_None_Match=respuesta['ETag']).status_code, 304)
+
+            with override_settings(DESCARGAS_REDIRECCION_MINIMO_KB=0):
+                respuesta = self._descargar(lote)
+            self.assertEqual(respuesta.status_code, 302)
+            self.assertTrue(respuesta['Location'].startswith(f'{s3.base_url}/pruebas/cliente/media/cargas_masivas/'))
+            self.assertIn('response-content-disposition', respuesta['Location'])
+            self.assertEqual(requests.get(respuesta['Location']).content, self.contenido)
+
+
+class NumeroDeConsultasTests(TestCase):
+    """Las páginas de cargas masivas hacen las mismas consultas con uno o muchos lotes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('cliente', email='cliente@example.com', empresa=cls.empresa)
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.ajustes = override_settings(MEDIA_ROOT=self.media, STORAGES=ALMACENAMIENTO_LOCAL)
+        self.ajustes.enable()
+        self.client.force_login(self.usuario)
+
+    def tearDown(self):
+        self.ajustes.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def _crear_lotes(self, cantidad):
+        for i in range(cantidad):
+            lote = LoteConsultaMasiva.objects.create(
+                empresa=self.empresa, usuario_solicitante=self.usuario, estado='PROCESADO',
+                archivo_subido=SimpleUploadedFile(f'lote{i}.csv', b'Identificacion\n1\n'),
+                resumen_validacion={'ejemplos': [{'fila': 2, 'error': 'Vacía'}]}, validado_en=timezone.now(),
+            )
+        return lote
+
+    def _consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertLess(respuesta.status_code, 400, url)
+        return len(consultas)
+
+    def test_no_dependen_del_numero_de_lotes(self):
+        lote = self._crear_lotes(1)
+        urls = [reverse('listar_lotes'), reverse('subir_lote'),
+                reverse('descargar_archivo_lote', args=[lote.pk, 'subido'])]
+        pocos = [self._consultas(url) for url in urls]
+        self._crear_lotes(15)
+        self.assertEqual([self._consultas(url) for url in urls], pocos)
+
+
+class BackendQueFalla(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError('SMTP caído')
+
+
+class BackendSinServidor(EmailBackend):
+    def open(self):
+        raise ConnectionRefusedError('Sin servidor SMTP')
+
+    def send_messages(self, messages):
+        raise AssertionError('No debería enviar sin conexión')
+
+
+class BackendQueAnotaTransacciones(EmailBackend):
+    # Cuántos bloques atomic() había abiertos en el momento de cada envío
+    transacciones = []
+
+    def send_messages(self, messages):
+        self.transacciones.append(len(connection.atomic_blocks))
+        return super().send_messages(messages)
+
+
+@override_settings(ADMIN_EMAIL='admin@example.com', CORREO_MAX_INTENTOS=2)
+class NotificacionesLoteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('cliente', email='cliente@example.com', empresa=cls.empresa)
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.ajustes = override_settings(MEDIA_ROOT=self.media, STORAGES=ALMACENAMIENTO_LOCAL)
+        self.ajustes.enable()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def _crear_lote(self):
+        return LoteConsultaMasiva.objects.create(
+            empresa=self.empresa, usuario_solicitante=self.usuario,
+            archivo_subido=SimpleUploadedFile('lote.xlsx', b'contenido'),
+        )
+
+    def test_correos_se_envian_desde_el_worker(self):
+        self._crear_lote()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(NotificacionCorreo.objects.filter(estado='PENDIENTE').count(), 2)
+
+        ejecutar_pendientes()
+
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['admin@example.com', 'cliente@example.com'])
+        self.assertIn('text/html', mail.outbox[0].alternatives[0][1])
+        self.assertEqual(NotificacionCorreo.objects.filter(estado='ENVIADO').count(), 2)
+
+    def test_varios_correos_en_un_solo_envio(self):
+        self._crear_lote()
+        self._crear_lote()
+        # Cada lote encola la tarea, pero la primera envía todo lo pendiente
+        ejecutar_pendientes()
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(Tarea.objects.filter(estado='COMPLETADA').count(), 2)
+
+    @override_settings(EMAIL_BACKEND='cargas_masivas.tests.BackendQueFalla')
+    def test_correo_que_no_sale_queda_como_fallido(self):
+        self._crear_lote()
+        with self.assertLogs('cargas_masivas.notificaciones', level='ERROR'), \
+                self.assertLogs('cola_tareas.cola', level='ERROR'):
+            ejecutar_pendientes()
+            Tarea.objects.filter(estado='PENDIENTE').update(disponible_en=timezone.now())
+            ejecutar_pendientes()
+
+        self.assertEqual(NotificacionCorreo.objects.filter(estado='FALLIDO').count(), 2)
+        self.assertIn('SMTP caído', NotificacionCorreo.objects.first().ultimo_error)
+
+    @override_settings(EMAIL_BACKEND='cargas_masivas.tests.BackendSinServidor')
+    def test_conexion_que_no_abre_cuenta_como_intento(self):
+        self._crear_lote()
+        with self.assertLogs('cargas_masivas.notificaciones', level='WARNING'), \
+                self.assertLogs('cola_tareas.cola', level='ERROR'):
+            ejecutar_pendientes()
+            self.assertEqual(set(NotificacionCorreo.objects.values_list('estado', 'intentos')), {('PENDIENTE', 1)})
+            Tarea.objects.filter(estado='PENDIENTE').update(disponible_en=timezone.now())
+            ejecutar_pendientes()
+
+        self.assertEqual(NotificacionCorreo.objects.filter(estado='FALLIDO').count(), 2)
+        self.assertIn('Sin servidor SMTP', NotificacionCorreo.objects.first().ultimo_error)
+
+    @override_settings(EMAIL_BACKEND='cargas_masivas.tests.BackendQueAnotaTransacciones')
+    def test_el_envio_ocurre_fuera_de_la_transaccion_de_reserva(self):
+        self._crear_lote()
+        BackendQueAnotaTransacciones.transacciones = []
+        # Las de TestCase (la de la clase y la del test) son las únicas abiertas
+        abiertas = len(connection.atomic_blocks)
+
+        ejecutar_pendientes()
+
+        self.assertEqual(BackendQueAnotaTransacciones.transacciones, [abiertas, abiertas])
+        self.assertEqual(set(NotificacionCorreo.objects.values_list('estado', 'reservada_hasta')),
+                         {('ENVIADO', None)})
+
+    def test_reserva_vencida_se_retoma_y_la_vigente_no(self):
+        self._crear_lote()
+        vencida, vigente = NotificacionCorreo.objects.order_by('pk')
+        ahora = timezone.now()
+        NotificacionCorreo.objects.filter(pk=vencida.pk).update(
+            estado='ENVIANDO', reservada_hasta=ahora - timedelta(seconds=1))
+        NotificacionCorreo.objects.filter(pk=vigente.pk).update(
+            estado='ENVIANDO', reservada_hasta=ahora + timedelta(minutes=5))
+
+        self.assertEqual(notificaciones.enviar_correos_pendientes(), 1)
+
+        self.assertEqual([m.to[0] for m in mail.outbox], [vencida.destinatario])
+        vigente.refresh_from_db()
+        self.assertEqual(vigente.estado, 'ENVIANDO')
+
+    def test_resultado_no_pisa_una_reserva_ajena(self):
+        self._crear_lote()
+        notificacion = NotificacionCorreo.objects.first()
+        NotificacionCorreo.objects.filter(pk=notificacion.pk).update(
+            estado='ENVIANDO', reservada_hasta=timezone.now())
+        notificacion.refresh_from_db()
+        # Otro worker la retomó tras vencer la reserva de este
+        NotificacionCorreo.objects.filter(pk=notificacion.pk).update(
+            reservada_hasta=timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual(notificaciones._registrar(notificacion, notificacion.reservada_hasta, estado='ENVIADO'), 0)
+        notificacion.refresh_from_db()
+        self.assertEqual(notificacion.estado, 'ENVIANDO')
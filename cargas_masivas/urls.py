@@ -10,6 +10,16 @@ urlpatterns = [
     # Vista para que el cliente suba un nuevo lote
     path('subir/', views.SubirLoteView.as_view(), name='subir_lote'),
 
+    # Subida directa a S3 por partes (solo con almacenamiento S3)
+    path('subir/directa/', views.subida_iniciar, name='subida_iniciar'),
+    path('subir/directa/<int:pk>/', views.subida_estado, name='subida_estado'),
+    path('subir/directa/<int:pk>/firmar/', views.subida_firmar, name='subida_firmar'),
+    path('subir/directa/<int:pk>/completar/', views.subida_completar, name='subida_completar'),
+    path('subir/directa/<int:pk>/cancelar/', views.subida_cancelar, name='subida_cancelar'),
+
     # URL para el botón de descargar la plantilla
     path('plantilla/', views.descargar_plantilla, name='descargar_plantilla'),
+
+    # Archivo subido o reporte de un lote ('subido' o 'resultado')
+    path('<int:pk>/descargar/<str:tipo>/', views.descargar_archivo_lote, name='descargar_archivo_lote'),
 ]
\ No newline at end of file
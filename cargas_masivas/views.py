@@ -1,15 +1,23 @@
 # archivo: cargas_masivas/views.py
 
-from django.shortcuts import render, redirect
+import json
+
+from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import CreateView, ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
-from django.urls import reverse_lazy
-from django.http import HttpResponse
-from django.conf import settings
-from .models import LoteConsultaMasiva
+from django.urls import reverse, reverse_lazy
+from django.http import HttpResponse, JsonResponse, Http404
+from django.views.decorators.http import require_GET, require_POST
+from django.core.files.storage import default_storage
+from .models import LoteConsultaMasiva, SubidaLote
 from .forms import LoteForm
-import os
+from .subida_directa import (
+    SubidaInvalida, cancelar_subida, completar_subida, firmar_partes, iniciar_subida,
+    partes_subidas, subida_directa_disponible,
+)
+from cola_tareas.cola import encolar
+from consultas.descargas import servir_archivo
 
 class ListarLotesView(LoginRequiredMixin, ListView):
     model = LoteConsultaMasiva
@@ -26,22 +34,110 @@ class SubirLoteView(LoginRequiredMixin, CreateView):
     template_name = 'cargas_masivas/subir_lote.html'
     success_url = reverse_lazy('listar_lotes') # Redirige a la lista después de subir
 
+    def get_context_data(self, **kwargs):
+        # Con S3 el navegador sube el archivo directo al bucket; el formulario queda de respaldo
+        kwargs.setdefault('subida_directa', subida_directa_disponible())
+        return super().get_context_data(**kwargs)
+
     def form_valid(self, form):
         # Asignamos la empresa y el usuario automáticamente
         form.instance.usuario_solicitante = self.request.user
         form.instance.empresa = self.request.user.empresa
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        # La validación (y luego el motor, si está activo) corre en segundo
+        # plano; el cliente ve el conteo de filas en la lista de lotes
+        encolar('cargas_masivas.validar_lote', lote_id=self.object.id)
+        return response
 
 @login_required
 def descargar_plantilla(request):
-    # Asegúrate de crear este archivo: /media/plantillas/plantilla_consultas.xlsx
-    plantilla_path = os.path.join(settings.MEDIA_ROOT, 'plantillas', 'plantilla_consultas.xlsx')
-
+    # La plantilla está en el almacenamiento por defecto: media/plantillas/plantilla_consultas.xlsx
     try:
-        with open(plantilla_path, 'rb') as f:
-            response = HttpResponse(f.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = 'attachment; filename="plantilla_consultas.xlsx"'
-            return response
-    except FileNotFoundError:
+        return servir_archivo(request, default_storage, 'plantillas/plantilla_consultas.xlsx')
+    except Http404:
         # Esta página de error simple es suficiente por ahora
-        return HttpResponse("Archivo de plantilla no encontrado. Contacte al administrador.", status=404)
\ No newline at end of file
+        return HttpResponse("Archivo de plantilla no encontrado. Contacte al administrador.", status=404)
+
+
+@login_required
+def descargar_archivo_lote(request, pk, tipo):
+    """Archivo subido o reporte de resultados de un lote, solo para su empresa (o un superusuario)."""
+    lote = get_object_or_404(LoteConsultaMasiva, pk=pk)
+    if not request.user.is_superuser and lote.empresa_id != request.user.empresa_id:
+        raise Http404
+    archivo = {'subido': lote.archivo_subido, 'resultado': lote.archivo_resultado}.get(tipo)
+    if not archivo:
+        raise Http404
+    return servir_archivo(request, archivo.storage, archivo.name)
+
+
+# --- Subida directa a S3 (ver subida_directa.py) ---
+
+def _cuerpo_json(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return {}
+
+
+def _subida_abierta(request, pk):
+    if not subida_directa_disponible():
+        raise Http404
+    # Cada usuario solo ve sus propias subidas
+    return get_object_or_404(SubidaLote, pk=pk, usuario=request.user, estado='ABIERTA')
+
+
+@login_required
+@require_POST
+def subida_iniciar(request):
+    if not subida_directa_disponible():
+        raise Http404
+    datos = _cuerpo_json(request)
+    try:
+        subida = iniciar_subida(request.user, str(datos.get('nombre', '')), int(datos.get('tamano') or 0))
+    except (SubidaInvalida, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'id': subida.pk, 'tamano_parte': subida.tamano_parte, 'total_partes': subida.total_partes})
+
+
+@login_required
+@require_GET
+def subida_estado(request, pk):
+    """Partes que ya llegaron a S3, para retomar una subida interrumpida."""
+    subida = _subida_abierta(request, pk)
+    return JsonResponse({
+        'id': subida.pk, 'tamano': subida.tamano, 'tamano_parte': subida.tamano_parte,
+        'total_partes': subida.total_partes,
+        'partes': [parte['PartNumber'] for parte in partes_subidas(subida)],
+    })
+
+
+@login_required
+@require_POST
+def subida_firmar(request, pk):
+    subida = _subida_abierta(request, pk)
+    try:
+        urls = firmar_partes(subida, [int(n) for n in _cuerpo_json(request).get('partes', [])])
+    except (SubidaInvalida, TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'urls': urls})
+
+
+@login_required
+@require_POST
+def subida_completar(request, pk):
+    if not subida_directa_disponible():
+        raise Http404
+    subida = get_object_or_404(SubidaLote, pk=pk, usuario=request.user)
+    try:
+        lote = completar_subida(subida)
+    except SubidaInvalida as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'lote': lote.pk, 'siguiente': reverse('listar_lotes')})
+
+
+@login_required
+@require_POST
+def subida_cancelar(request, pk):
+    cancelar_subida(_subida_abierta(request, pk))
+    return JsonResponse({'cancelada': True})
\ No newline at end of file
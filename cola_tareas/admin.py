@@ -0,0 +1,21 @@
+# archivo: cola_tareas/admin.py
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Tarea
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nombre', 'estado', 'intentos', 'creada_en', 'iniciada_en', 'finalizada_en')
+    list_filter = ('estado', 'nombre')
+    search_fields = ('nombre',)
+    readonly_fields = ('creada_en', 'iniciada_en', 'finalizada_en', 'ultimo_error')
+    actions = ['reintentar']
+
+    @admin.action(description="Reintentar las tareas seleccionadas")
+    def reintentar(self, request, queryset):
+        actualizadas = queryset.exclude(estado='EN_CURSO').update(
+            estado='PENDIENTE', intentos=0, disponible_en=timezone.now(), ultimo_error=''
+        )
+        self.message_user(request, f"{actualizadas} tareas puestas de nuevo en cola.")
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class ColaTareasConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'cola_tareas'
+
+    def ready(self):
+        # Cada app declara sus tareas en un módulo tareas.py
+        autodiscover_modules('tareas')
@@ -0,0 +1,204 @@
+# archivo: cola_tareas/cola.py
+"""
+API de la cola de tareas.
+
+    from cola_tareas.cola import tarea, encolar
+
+    @tarea('cargas_masivas.procesar_lote', max_intentos=3)
+    def procesar(lote_id): ...
+
+    encolar('cargas_masivas.procesar_lote', lote_id=lote.id)
+
+La tarea se inserta en la misma transacción que la llamada, así que el worker
+solo la ve si la transacción se confirma.
+"""
+
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min, Q
+from django.utils import timezone
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+# nombre -> (función, max_intentos, timeout de visibilidad en segundos, al_fallar)
+_registro = {}
+
+
+class TareaNoRegistrada(Exception):
+    pass
+
+
+def tarea(nombre, max_intentos=5, timeout=None, al_fallar=None):
+    """
+    Decorador que registra una función como tarea ejecutable por el worker.
+    `al_fallar` se llama con los mismos argumentos cuando la tarea queda
+    FALLIDA (agotó sus intentos), para que deje su estado en orden.
+    """
+    def decorador(funcion):
+        _registro[nombre] = (funcion, max_intentos, timeout or settings.TAREAS_TIMEOUT_VISIBILIDAD, al_fallar)
+        return funcion
+    return decorador
+
+
+def tareas_registradas():
+    return sorted(_registro)
+
+
+def encolar(nombre, disponible_en=None, **argumentos):
+    """Inserta una tarea en la cola. Los argumentos deben ser serializables a JSON."""
+    if nombre not in _registro:
+        raise TareaNoRegistrada(nombre)
+    return Tarea.objects.create(
+        nombre=nombre,
+        argumentos=argumentos,
+        max_intentos=_registro[nombre][1],
+        disponible_en=disponible_en or timezone.now(),
+    )
+
+
+def tomar_siguiente(nombres=None):
+    """
+    Reserva la siguiente tarea lista para ejecutarse, o devuelve None.
+    FOR UPDATE SKIP LOCKED permite varios workers sin que dos tomen la misma
+    fila; también se retoman tareas EN_CURSO cuyo timeout de visibilidad venció
+    (el worker que las tenía murió o quedó colgado). Si esa tarea ya agotó sus
+    intentos se marca FALLIDA en lugar de retomarla: una tarea que mata al
+    worker no debe reintentarse para siempre.
+    """
+    ahora = timezone.now()
+    fallidas = []
+    with transaction.atomic():
+        candidatas = Tarea.objects.select_for_update(skip_locked=True).filter(
+            Q(estado='PENDIENTE', disponible_en__lte=ahora)
+            | Q(estado='EN_CURSO', bloqueada_hasta__lt=ahora)
+        )
+        if nombres:
+            candidatas = candidatas.filter(nombre__in=nombres)
+        while True:
+            tarea_obj = candidatas.order_by('disponible_en').first()
+            if tarea_obj is None or tarea_obj.estado != 'EN_CURSO' or tarea_obj.intentos < tarea_obj.max_intentos:
+                break
+            logger.error("La tarea %s venció su timeout en el último intento; se marca fallida", tarea_obj)
+            tarea_obj.estado = 'FALLIDA'
+            tarea_obj.finalizada_en = ahora
+            tarea_obj.bloqueada_hasta = None
+            tarea_obj.ultimo_error = f"Timeout de visibilidad vencido en el intento {tarea_obj.intentos}"
+            tarea_obj.save(update_fields=['estado', 'finalizada_en', 'bloqueada_hasta', 'ultimo_error'])
+            fallidas.append(tarea_obj)
+
+        if tarea_obj is not None:
+            timeout = _registro[tarea_obj.nombre][2] if tarea_obj.nombre in _registro else settings.TAREAS_TIMEOUT_VISIBILIDAD
+            tarea_obj.estado = 'EN_CURSO'
+            tarea_obj.intentos += 1
+            tarea_obj.iniciada_en = ahora
+            tarea_obj.bloqueada_hasta = ahora + timedelta(seconds=timeout)
+            tarea_obj.save(update_fields=['estado', 'intentos', 'iniciada_en', 'bloqueada_hasta'])
+
+    for fallida in fallidas:
+        _avisar_fallo(fallida)
+    return tarea_obj
+
+
+def _avisar_fallo(tarea_obj):
+    # Fuera de la transacción de la cola: si al_fallar falla, la tarea sigue FALLIDA
+    al_fallar = _registro[tarea_obj.nombre][3] if tarea_obj.nombre in _registro else None
+    if al_fallar is None:
+        return
+    try:
+        al_fallar(**tarea_obj.argumentos)
+    except Exception:
+        logger.exception("Falló al_fallar de la tarea %s", tarea_obj)
+
+
+def _espera_reintento(intentos):
+    # Backoff exponencial con algo de azar para no reintentar todas a la vez
+    base = settings.TAREAS_BACKOFF_BASE * (2 ** (intentos - 1))
+    return min(base, settings.TAREAS_BACKOFF_MAXIMO) * random.uniform(0.8, 1.2)
+
+
+def ejecutar(tarea_obj):
+    """Ejecuta una tarea ya reservada y registra el resultado. Devuelve True si terminó bien."""
+    try:
+        if tarea_obj.nombre not in _registro:
+            raise TareaNoRegistrada(tarea_obj.nombre)
+        funcion = _registro[tarea_obj.nombre][0]
+        funcion(**tarea_obj.argumentos)
+    except Exception as e:
+        logger.exception("Falló la tarea %s (intento %s)", tarea_obj, tarea_obj.intentos)
+        tarea_obj.ultimo_error = f"{type(e).__name__}: {e}"[:2000]
+        tarea_obj.bloqueada_hasta = None
+        if tarea_obj.intentos >= tarea_obj.max_intentos or isinstance(e, TareaNoRegistrada):
+            tarea_obj.estado = 'FALLIDA'
+            tarea_obj.finalizada_en = timezone.now()
+        else:
+            tarea_obj.estado = 'PENDIENTE'
+            tarea_obj.disponible_en = timezone.now() + timedelta(seconds=_espera_reintento(tarea_obj.intentos))
+        tarea_obj.save(update_fields=['estado', 'ultimo_error', 'bloqueada_hasta', 'disponible_en', 'finalizada_en'])
+        if tarea_obj.estado == 'FALLIDA':
+            _avisar_fallo(tarea_obj)
+        return False
+
+    tarea_obj.estado = 'COMPLETADA'
+    tarea_obj.finalizada_en = timezone.now()
+    tarea_obj.bloqueada_hasta = None
+    tarea_obj.save(update_fields=['estado', 'finalizada_en', 'bloqueada_hasta'])
+    return True
+
+
+def ejecutar_pendientes(nombres=None, limite=None):
+    """Ejecuta tareas hasta vaciar la cola (o hasta `limite`). Útil en pruebas y scripts."""
+    ejecutadas = 0
+    while limite is None or ejecutadas < limite:
+        tarea_obj = tomar_siguiente(nombres)
+        if tarea_obj is None:
+            break
+        ejecutar(tarea_obj)
+        ejecutadas += 1
+    return ejecutadas
+
+
+def estadisticas_cola(horas=24):
+    """
+    Profundidad de la cola y latencias por tipo de tarea. La espera es el tiempo
+    desde que se encoló hasta que empezó su último intento; la duración, lo que
+    tardó en ejecutarse. Las latencias se calculan sobre las últimas `horas`.
+    """
+    desde = timezone.now() - timedelta(hours=horas)
+    por_nombre = {}
+
+    def fila(nombre):
+        return por_nombre.setdefault(nombre, {
+            'nombre': nombre, 'pendientes': 0, 'en_curso': 0, 'fallidas': 0,
+            'completadas': 0, 'mas_antigua': None, 'espera_promedio': None, 'duracion_promedio': None,
+        })
+
+    conteos = (Tarea.objects.filter(Q(estado__in=['PENDIENTE', 'EN_CURSO', 'FALLIDA']) | Q(finalizada_en__gte=desde))
+               .values('nombre', 'estado')
+               .annotate(total=Count('id'), mas_antigua=Min('creada_en'))
+               .order_by())
+    for conteo in conteos:
+        datos = fila(conteo['nombre'])
+        datos[{'PENDIENTE': 'pendientes', 'EN_CURSO': 'en_curso',
+               'FALLIDA': 'fallidas', 'COMPLETADA': 'completadas'}[conteo['estado']]] = conteo['total']
+        if conteo['estado'] == 'PENDIENTE':
+            datos['mas_antigua'] = conteo['mas_antigua']
+
+    latencias = (Tarea.objects.filter(estado='COMPLETADA', finalizada_en__gte=desde)
+                 .values('nombre')
+                 .annotate(
+                     espera=Avg(ExpressionWrapper(F('iniciada_en') - F('creada_en'), output_field=DurationField())),
+                     duracion=Avg(ExpressionWrapper(F('finalizada_en') - F('iniciada_en'), output_field=DurationField())),
+                 )
+                 .order_by())
+    for latencia in latencias:
+        datos = fila(latencia['nombre'])
+        datos['espera_promedio'] = latencia['espera']
+        datos['duracion_promedio'] = latencia['duracion']
+
+    return sorted(por_nombre.values(), key=lambda d: d['nombre'])
@@ -0,0 +1,62 @@
+# archivo: cola_tareas/management/commands/procesar_tareas.py
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from cola_tareas.cola import ejecutar, tareas_registradas, tomar_siguiente
+from cola_tareas.models import Tarea
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de la cola de tareas: toma tareas pendientes de la base de datos "
+        "y las ejecuta. Se pueden correr varios en paralelo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Vacía la cola y termina')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando no hay tareas')
+        parser.add_argument('--tarea', action='append', dest='nombres', help='Solo ejecutar tareas con este nombre')
+        parser.add_argument(
+            '--purgar-dias', type=int, default=7,
+            help='Borra tareas completadas con más de estos días (0 para no borrar)',
+        )
+
+    def handle(self, *args, **options):
+        self.detener = False
+        signal.signal(signal.SIGTERM, self._pedir_detencion)
+        signal.signal(signal.SIGINT, self._pedir_detencion)
+
+        self.stdout.write(f"Worker iniciado. Tareas registradas: {', '.join(tareas_registradas())}")
+        ultima_purga = None
+
+        while not self.detener:
+            # El worker vive mucho tiempo: renovamos conexiones caídas o viejas
+            close_old_connections()
+
+            if options['purgar_dias'] and (ultima_purga is None or time.monotonic() - ultima_purga > 3600):
+                limite = timezone.now() - timedelta(days=options['purgar_dias'])
+                Tarea.objects.filter(estado='COMPLETADA', finalizada_en__lt=limite).delete()
+                ultima_purga = time.monotonic()
+
+            tarea_obj = tomar_siguiente(options['nombres'])
+            if tarea_obj is None:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            inicio = time.monotonic()
+            ok = ejecutar(tarea_obj)
+            estilo = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(estilo(f"{tarea_obj} en {time.monotonic() - inicio:.2f}s"))
+
+        self.stdout.write("Worker detenido.")
+
+    def _pedir_detencion(self, signum, frame):
+        # Terminamos la tarea en curso antes de salir
+        self.detener = True
@@ -0,0 +1,42 @@
+# cola_tareas/models.py
+from django.db import models
+from django.utils import timezone
+
+
+class Tarea(models.Model):
+    """
+    Trabajo pendiente que ejecuta el worker (`manage.py procesar_tareas`)
+    fuera del ciclo de la petición web. La cola vive en PostgreSQL, así que
+    no hace falta ningún broker adicional.
+    """
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_CURSO', 'En Curso'),
+        ('COMPLETADA', 'Completada'),
+        ('FALLIDA', 'Fallida'),
+    ]
+
+    nombre = models.CharField(max_length=100) # Nombre registrado con @tarea, ej: 'cargas_masivas.procesar_lote'
+    argumentos = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    # No se ejecuta antes de esta fecha (se usa para el backoff entre reintentos)
+    disponible_en = models.DateTimeField(default=timezone.now)
+    # Timeout de visibilidad: si el worker muere, otro la retoma al vencer esta fecha
+    bloqueada_hasta = models.DateTimeField(null=True, blank=True)
+
+    creada_en = models.DateTimeField(auto_now_add=True)
+    iniciada_en = models.DateTimeField(null=True, blank=True)
+    finalizada_en = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ['-creada_en']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_en'], name='tarea_estado_disponible_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} #{self.id} ({self.estado})"
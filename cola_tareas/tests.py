@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from usuarios.models import Usuario
+
+from .cola import encolar, ejecutar, ejecutar_pendientes, tarea, tomar_siguiente
+from .models import Tarea
+
+LLAMADAS = []
+
+
+@tarea('pruebas.anotar')
+def anotar(valor):
+    LLAMADAS.append(valor)
+
+
+@tarea('pruebas.fallar', max_intentos=2)
+def fallar():
+    raise RuntimeError('falla simulada')
+
+
+@override_settings(TAREAS_BACKOFF_BASE=60)
+class ColaTareasTests(TestCase):
+
+    def setUp(self):
+        LLAMADAS.clear()
+
+    def test_ejecuta_en_orden_y_marca_completada(self):
+        encolar('pruebas.anotar', valor=1)
+        encolar('pruebas.anotar', valor=2)
+        self.assertEqual(ejecutar_pendientes(), 2)
+        self.assertEqual(LLAMADAS, [1, 2])
+        self.assertEqual(Tarea.objects.filter(estado='COMPLETADA').count(), 2)
+
+    def test_tarea_futura_no_se_toma(self):
+        encolar('pruebas.anotar', disponible_en=timezone.now() + timedelta(minutes=5), valor=1)
+        self.assertIsNone(tomar_siguiente())
+
+    def test_reintenta_con_backoff_y_luego_falla(self):
+        tarea_obj = encolar('pruebas.fallar')
+        with self.assertLogs('cola_tareas.cola', level='ERROR'):
+            self.assertFalse(ejecutar(tomar_siguiente()))
+        tarea_obj.refresh_from_db()
+        self.assertEqual(tarea_obj.estado, 'PENDIENTE')
+        self.assertGreater(tarea_obj.disponible_en, timezone.now() + timedelta(seconds=40))
+        self.assertIn('falla simulada', tarea_obj.ultimo_error)
+
+        Tarea.objects.filter(pk=tarea_obj.pk).update(disponible_en=timezone.now())
+        with self.assertLogs('cola_tareas.cola', level='ERROR'):
+            ejecutar(tomar_siguiente())
+        tarea_obj.refresh_from_db()
+        self.assertEqual(tarea_obj.estado, 'FALLIDA')
+        self.assertEqual(tarea_obj.intentos, 2)
+
+    def test_retoma_tarea_con_timeout_vencido(self):
+        encolar('pruebas.anotar', valor=1)
+        tomada = tomar_siguiente()
+        # Mientras el timeout de visibilidad esté vigente nadie más la toma
+        self.assertIsNone(tomar_siguiente())
+        Tarea.objects.filter(pk=tomada.pk).update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+        retomada = tomar_siguiente()
+        self.assertEqual(retomada.pk, tomada.pk)
+        self.assertEqual(retomada.intentos, 2)
+
+    def test_no_retoma_tarea_que_agoto_sus_intentos(self):
+        tarea_obj = encolar('pruebas.fallar')
+        siguiente = encolar('pruebas.anotar', valor=1)
+        Tarea.objects.filter(pk=tarea_obj.pk).update(
+            disponible_en=timezone.now() - timedelta(minutes=1),
+            estado='EN_CURSO', intentos=2, bloqueada_hasta=timezone.now() - timedelta(seconds=1),
+        )
+        with self.assertLogs('cola_tareas.cola', level='ERROR'):
+            self.assertEqual(tomar_siguiente().pk, siguiente.pk)
+        tarea_obj.refresh_from_db()
+        self.assertEqual(tarea_obj.estado, 'FALLIDA')
+        self.assertEqual(tarea_obj.intentos, 2)
+        self.assertIsNone(tarea_obj.bloqueada_hasta)
+        self.assertIn('Timeout', tarea_obj.ultimo_error)
+
+    def test_vista_de_cola_para_superusuario(self):
+        admin = Usuario.objects.create_superuser('admin', 'admin@example.com', 'clave-segura')
+        encolar('pruebas.anotar', valor=1)
+        self.client.force_login(admin)
+        respuesta = self.client.get(reverse('core_admin:cola_tareas'))
+        self.assertContains(respuesta, 'pruebas.anotar')
+        self.assertEqual(respuesta.context['total_pendientes'], 1)
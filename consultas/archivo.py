@@ -0,0 +1,320 @@
+# archivo: consultas/archivo.py
+"""
+Archivo mensual del historial de búsquedas en Parquet.
+
+Las búsquedas de los meses más viejos que ARCHIVO_HISTORIAL_MESES se
+exportan, un mes a la vez, a dos archivos Parquet comprimidos en el
+almacenamiento por defecto (S3 en producción): uno con las búsquedas y otro
+con sus resultados, cada resultado con los datos completos de su entidad
+para que el archivo se pueda leer sin la base. Cuando los archivos están
+escritos y verificados, el mes queda anotado en ArchivoMensual y sus filas
+se borran de la base por bloques. Los dashboards y reportes no cambian:
+leen MetricaDiaria, que se conserva.
+
+El detalle de una búsqueda y su PDF la buscan primero en la base y, si ya
+no está, en el archivo del mes (obtener_busqueda): se reconstruye en memoria
+con sus resultados, sin volver a insertarla. En S3 el Parquet se lee por
+rangos (pyarrow.fs.S3FileSystem): se bajan el pie del archivo y los row
+groups que pueden contener la búsqueda, no el mes completo.
+
+Se usa con `manage.py archivar_historial`. Requiere pyarrow.
+"""
+
+import logging
+import tempfile
+from datetime import date, datetime, time as hora
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Max, Min
+from django.http import Http404
+from django.utils import timezone
+
+from .entidades import CAMPOS_API, tipar_entidades
+from .models import ArchivoMensual, Busqueda, EntidadLista, Resultado
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_BUSQUEDA = ('id', 'usuario_id', 'empresa_id', 'termino_buscado', 'fecha_busqueda',
+                   'encontro_resultados', 'genero_alerta', 'consulta_incompleta')
+CAMPOS_RESULTADO = ('id', 'busqueda_id', 'coincidencia_nombre', 'coincidencia_id', 'clasificacion')
+CAMPOS_ENTIDAD = ('huella', *(campo for campo, _ in CAMPOS_API))
+FILAS_POR_GRUPO = 10_000  # Filas por row group: leer una búsqueda solo descomprime su grupo
+
+
+def _pyarrow():
+    # Solo el comando de archivo y la lectura de búsquedas archivadas lo necesitan
+    import pyarrow
+    import pyarrow.fs
+    import pyarrow.parquet
+    return pyarrow
+
+
+def _s3(storage):
+    """S3FileSystem de pyarrow con la configuración de `storage`, o None si no es S3."""
+    try:
+        from storages.backends.s3boto3 import S3Boto3Storage
+    except ImportError:
+        return None
+    if not isinstance(storage, S3Boto3Storage):
+        return None
+    opciones = {'region': storage.region_name}
+    if storage.access_key:
+        opciones.update(access_key=storage.access_key, secret_key=storage.secret_key,
+                        session_token=storage.security_token)
+    if storage.endpoint_url:
+        # MinIO o el stub de pruebas; sin esto se usa el endpoint de AWS de la región
+        endpoint = urlsplit(storage.endpoint_url)
+        opciones.update(endpoint_override=endpoint.netloc, scheme=endpoint.scheme)
+    return _pyarrow().fs.S3FileSystem(**opciones)
+
+
+def _abrir(ruta):
+    """
+    Abre un Parquet del archivo para lectura aleatoria. default_storage.open()
+    de django-storages descarga el objeto completo antes de la primera lectura;
+    con S3FileSystem cada lectura es un GET con Range.
+    """
+    s3 = _s3(default_storage)
+    if s3 is None:
+        return default_storage.open(ruta, 'rb')
+    return s3.open_input_file(f'{default_storage.bucket_name}/{default_storage._normalize_name(ruta)}')
+
+
+def _esquemas():
+    pa = _pyarrow()
+    busquedas = pa.schema([
+        ('id', pa.int64()), ('usuario_id', pa.int64()), ('empresa_id', pa.int64()),
+        ('termino_buscado', pa.string()), ('fecha_busqueda', pa.timestamp('us', tz='UTC')),
+        ('encontro_resultados', pa.bool_()), ('genero_alerta', pa.bool_()),
+        # Los meses archivados antes de existir la columna no la tienen: se leen como False
+        ('consulta_incompleta', pa.bool_()),
+    ])
+    resultados = pa.schema(
+        [('id', pa.int64()), ('busqueda_id', pa.int64()), ('coincidencia_nombre', pa.int64()),
+         ('coincidencia_id', pa.int64()), ('clasificacion', pa.string())]
+        + [(campo, pa.bool_() if isinstance(EntidadLista._meta.get_field(campo), models.BooleanField) else pa.string())
+           for campo in CAMPOS_ENTIDAD]
+    )
+    return busquedas, resultados
+
+
+def inicio_de_mes(dia):
+    return date(dia.year, dia.month, 1)
+
+
+def mes_siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _limites(mes):
+    """Primer y último instante (excluido) del mes en la zona horaria del proyecto."""
+    return (timezone.make_aware(datetime.combine(mes, hora.min)),
+            timezone.make_aware(datetime.combine(mes_siguiente(mes), hora.min)))
+
+
+def meses_por_archivar(meses=None, hoy=None):
+    """Meses con búsquedas en la base más viejos que la retención, del más antiguo al más reciente."""
+    meses = settings.ARCHIVO_HISTORIAL_MESES if meses is None else meses
+    corte = inicio_de_mes(hoy or timezone.localdate())
+    for _ in range(meses):
+        corte = date(corte.year - (corte.month == 1), (corte.month - 2) % 12 + 1, 1)
+
+    primera = Busqueda.objects.filter(fecha_busqueda__lt=_limites(corte)[0]).aggregate(m=Min('fecha_busqueda'))['m']
+    if primera is None:
+        return []
+    mes, pendientes = inicio_de_mes(timezone.localtime(primera).date()), []
+    while mes < corte:
+        desde, hasta = _limites(mes)
+        if Busqueda.objects.filter(fecha_busqueda__gte=desde, fecha_busqueda__lt=hasta).exists():
+            pendientes.append(mes)
+        mes = mes_siguiente(mes)
+    return pendientes
+
+
+def _ruta(mes, tabla):
+    return f'{settings.ARCHIVO_HISTORIAL_CARPETA}/{mes:%Y-%m}/{tabla}.parquet'
+
+
+def _bloques_de_busquedas(mes, lote):
+    # Por cursor sobre el id: cada bloque cuesta lo mismo aunque el mes tenga millones de filas
+    desde, hasta = _limites(mes)
+    ultimo = 0
+    while True:
+        bloque = list(Busqueda.objects.filter(fecha_busqueda__gte=desde, fecha_busqueda__lt=hasta, id__gt=ultimo)
+                      .order_by('id').values(*CAMPOS_BUSQUEDA)[:lote])
+        if not bloque:
+            return
+        yield bloque
+        ultimo = bloque[-1]['id']
+
+
+def _exportar(mes, lote):
+    """Escribe los dos Parquet del mes en archivos temporales; devuelve (archivos, conteos, ids)."""
+    pa = _pyarrow()
+    esquema_busquedas, esquema_resultados = _esquemas()
+    compresion = settings.ARCHIVO_HISTORIAL_COMPRESION
+    temporal_busquedas = tempfile.TemporaryFile()
+    temporal_resultados = tempfile.TemporaryFile()
+    conteos = {'busquedas': 0, 'resultados': 0}
+    ids = []
+    campos_resultado = [*CAMPOS_RESULTADO, *(f'entidad__{campo}' for campo in CAMPOS_ENTIDAD)]
+    with pa.parquet.ParquetWriter(temporal_busquedas, esquema_busquedas, compression=compresion) as busquedas, \
+            pa.parquet.ParquetWriter(temporal_resultados, esquema_resultados, compression=compresion) as resultados:
+        for bloque in _bloques_de_busquedas(mes, lote):
+            busquedas.write_table(pa.Table.from_pylist(bloque, schema=esquema_busquedas), FILAS_POR_GRUPO)
+            ids_bloque = [fila['id'] for fila in bloque]
+            filas = [
+                {campo.removeprefix('entidad__'): valor for campo, valor in fila.items()}
+                for fila in Resultado.objects.filter(busqueda_id__in=ids_bloque)
+                .order_by('busqueda_id', 'id').values(*campos_resultado)
+            ]
+            if filas:
+                resultados.write_table(pa.Table.from_pylist(filas, schema=esquema_resultados), FILAS_POR_GRUPO)
+            conteos['busquedas'] += len(bloque)
+            conteos['resultados'] += len(filas)
+            ids.append((ids_bloque[0], ids_bloque[-1]))
+    return (temporal_busquedas, temporal_resultados), conteos, (ids[0][0], ids[-1][1])
+
+
+def _filas_guardadas(ruta):
+    pa = _pyarrow()
+    with _abrir(ruta) as archivo:
+        return pa.parquet.ParquetFile(archivo).metadata.num_rows
+
+
+def archivar_mes(mes, lote=5000):
+    """
+    Exporta el mes a Parquet, lo anota en ArchivoMensual y borra sus filas de
+    la base. Si el mes ya estaba anotado (una corrida anterior se interrumpió
+    mientras borraba), solo termina de borrar. Devuelve el ArchivoMensual, o
+    None si el mes no tiene búsquedas.
+    """
+    archivo = ArchivoMensual.objects.filter(mes=mes).first()
+    if archivo is None:
+        desde, hasta = _limites(mes)
+        if not Busqueda.objects.filter(fecha_busqueda__gte=desde, fecha_busqueda__lt=hasta).exists():
+            return None
+        (temporal_busquedas, temporal_resultados), conteos, (id_minimo, id_maximo) = _exportar(mes, lote)
+        try:
+            rutas = {}
+            for tabla, temporal in (('busquedas', temporal_busquedas), ('resultados', temporal_resultados)):
+                temporal.seek(0)
+                ruta = _ruta(mes, tabla)
+                if default_storage.exists(ruta):
+                    # Restos de una corrida que falló antes de anotar el mes
+                    default_storage.delete(ruta)
+                rutas[tabla] = default_storage.save(ruta, File(temporal))
+        finally:
+            temporal_busquedas.close()
+            temporal_resultados.close()
+
+        # Antes de borrar nada, el archivo guardado debe tener todas las filas
+        for tabla, ruta in rutas.items():
+            guardadas = _filas_guardadas(ruta)
+            if guardadas != conteos[tabla]:
+                raise RuntimeError(f"{ruta} tiene {guardadas} filas y se exportaron {conteos[tabla]}")
+
+        archivo = ArchivoMensual.objects.create(
+            mes=mes, ruta_busquedas=rutas['busquedas'], ruta_resultados=rutas['resultados'],
+            busquedas=conteos['busquedas'], resultados=conteos['resultados'],
+            id_minimo=id_minimo, id_maximo=id_maximo,
+        )
+
+    _borrar_mes(archivo, lote)
+    return archivo
+
+
+def _borrar_mes(archivo, lote):
+    desde, hasta = _limites(archivo.mes)
+    del_mes = Busqueda.objects.filter(fecha_busqueda__gte=desde, fecha_busqueda__lt=hasta)
+    posteriores = del_mes.filter(id__gt=archivo.id_maximo).count()
+    if posteriores:
+        # No deberían existir (fecha_busqueda es la hora de inserción); no están en el archivo
+        logger.warning("%s búsquedas de %s no están en el archivo y no se borran", posteriores, archivo.mes)
+    del_mes = del_mes.filter(id__lte=archivo.id_maximo)
+    while True:
+        ids = list(del_mes.order_by('id').values_list('id', flat=True)[:lote])
+        if not ids:
+            return
+        # Un bloque por transacción: no se retienen bloqueos ni se agranda el WAL de una sola vez
+        with transaction.atomic():
+            Resultado.objects.filter(busqueda_id__in=ids).delete()
+            Busqueda.objects.filter(id__in=ids).delete()
+
+
+def primer_dia_sin_archivar():
+    """Primer día cuyas búsquedas siguen en la base, o None si no se ha archivado ningún mes."""
+    ultimo = ArchivoMensual.objects.aggregate(m=Max('mes'))['m']
+    return None if ultimo is None else mes_siguiente(ultimo)
+
+
+# --- Lectura de búsquedas archivadas ---
+
+def _leer(ruta, columna, valor):
+    pa = _pyarrow()
+    with _abrir(ruta) as archivo:
+        # Las estadísticas de cada row group descartan los que no tienen el valor sin leerlos
+        return pa.parquet.read_table(archivo, filters=[(columna, '=', valor)]).to_pylist()
+
+
+def _busqueda_archivada(busqueda_id):
+    for archivo in ArchivoMensual.objects.filter(id_minimo__lte=busqueda_id, id_maximo__gte=busqueda_id):
+        filas = _leer(archivo.ruta_busquedas, 'id', busqueda_id)
+        if filas:
+            return archivo, filas[0]
+    return None, None
+
+
+def _coincide(busqueda, filtros):
+    for campo, valor in filtros.items():
+        esperado = valor.pk if isinstance(valor, models.Model) else valor
+        if getattr(busqueda, Busqueda._meta.get_field(campo).attname) != esperado:
+            return False
+    return True
+
+
+def cargar_busqueda_archivada(busqueda_id, **filtros):
+    """
+    La búsqueda archivada con sus resultados (instancias sin guardar, con
+    `resultados_archivados`), o None si no está en el archivo o no cumple los
+    filtros (p. ej. usuario=request.user).
+    """
+    archivo, fila = _busqueda_archivada(busqueda_id)
+    if fila is None:
+        return None
+    busqueda = Busqueda(**fila)
+    busqueda._state.adding = False
+    if not _coincide(busqueda, filtros):
+        return None
+
+    resultados = []
+    for fila in _leer(archivo.ruta_resultados, 'busqueda_id', busqueda_id):
+        entidad = EntidadLista(**{campo: fila.pop(campo) for campo in CAMPOS_ENTIDAD})
+        resultado = Resultado(entidad=entidad, **fila)
+        resultado.busqueda = busqueda
+        resultados.append(resultado)
+    tipar_entidades([resultado.entidad for resultado in resultados])
+    busqueda.resultados_archivados = resultados
+    return busqueda
+
+
+def obtener_busqueda(busqueda_id, queryset=None, **filtros):
+    """Como get_object_or_404, pero si la búsqueda ya se archivó la lee del archivo."""
+    busqueda = (queryset if queryset is not None else Busqueda.objects).filter(pk=busqueda_id, **filtros).first()
+    if busqueda is None:
+        busqueda = cargar_busqueda_archivada(busqueda_id, **filtros)
+    if busqueda is None:
+        raise Http404("No existe la búsqueda")
+    return busqueda
+
+
+def resultados_de(busqueda):
+    """Los resultados con su entidad, leídos de la base o del archivo."""
+    archivados = getattr(busqueda, 'resultados_archivados', None)
+    if archivados is not None:
+        return archivados
+    return list(busqueda.resultados.select_related('entidad'))
@@ -0,0 +1,319 @@
+# archivo: consultas/benchmark.py
+"""
+Escenarios de carga para comparar el rendimiento antes y después de un cambio.
+
+Cada escenario repite una petición real (con el Client de Django, pasando por
+URLs, middlewares, vistas y plantillas) como el usuario de la empresa con más
+historial sintético (datos_prueba). Por escenario se reporta: peticiones por
+segundo, latencia p50/p95/p99 y consultas SQL por petición. El API de listas
+es el servidor local de stub_api, con la latencia y el número de resultados
+que se pidan; los archivos (PDF, lotes) van a una carpeta temporal.
+
+El resultado se guarda en JSON y se compara contra otro guardado antes (la
+línea base): comparar() marca los escenarios con más latencia o más
+consultas que la base.
+
+Se usa con `manage.py bench_escenarios`. Solo para bases de desarrollo: las
+búsquedas, lotes y tareas que se crean durante la corrida se borran al final.
+
+Las funciones del comienzo (cronometrar, tiempos, p50_p95, generar el
+historial...) las comparten los demás comandos bench_* de consultas.
+"""
+
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count, Max
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from cargas_masivas.models import LoteConsultaMasiva
+from cola_tareas.models import Tarea
+from monitoreo.instrumentacion import MedicionPeticion
+
+from .datos_prueba import PREFIJO, generar_historial
+from .models import Busqueda
+from .paginacion import cursor_de
+from .reportes_pdf import invalidar_pdfs
+from .stub_api import StubAPIServer
+from .views import BUSQUEDAS_POR_PAGINA, ORDEN_BUSQUEDAS
+
+# Búsquedas sintéticas de cada escala (datos_prueba.generar_historial)
+ESCALAS = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+PERCENTILES = (0.50, 0.95, 0.99)
+
+
+# --- Utilidades compartidas por los comandos bench_* ---
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def cronometrar(funcion, *args):
+    """(resultado, segundos) de una llamada a funcion(*args)."""
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def tiempos(funcion, veces):
+    """Segundos de cada una de `veces` llamadas a funcion(i), en orden."""
+    return [cronometrar(funcion, i)[1] for i in range(veces)]
+
+
+def mediana_ms(segundos):
+    return statistics.median(segundos) * 1000
+
+
+def p50_p95(segundos, decimales=2):
+    """'p50 … ms | p95 … ms' de una lista de latencias en segundos."""
+    return (f"p50 {mediana_ms(segundos):7.{decimales}f} ms | "
+            f"p95 {percentil(segundos, 0.95) * 1000:7.{decimales}f} ms")
+
+
+def exigir_base_de_pruebas(options, que_hace='inserta datos de prueba'):
+    """Los bench_* escriben en la base: sin DEBUG solo corren con --forzar."""
+    if not settings.DEBUG and not options['forzar']:
+        raise CommandError(f"Este comando {que_hace}; usar --forzar si la base es de pruebas.")
+
+
+def analizar(*modelos):
+    """ANALYZE en PostgreSQL, para que el planificador vea los datos e índices recién creados."""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {', '.join(modelo._meta.db_table for modelo in modelos)}".strip())
+
+
+def generar_historial_con_avance(salida, busquedas, **opciones):
+    """datos_prueba.generar_historial mostrando el avance en `salida` (el stdout del comando)."""
+    inicio = time.perf_counter()
+    generadas, resultados = generar_historial(
+        busquedas, progreso=lambda b, r: salida.write(f"\r  {b:,} búsquedas, {r:,} resultados", ending=''),
+        **opciones,
+    )
+    salida.write(f"\n{generadas:,} búsquedas y {resultados:,} resultados generados en "
+                 f"{time.perf_counter() - inicio:.1f}s")
+    analizar()
+    return generadas, resultados
+
+
+# --- Escenarios de bench_escenarios ---
+
+
+def _buscar(cliente, contexto, i):
+    # Cédulas nuevas en cada petición: la caché del API no responde por el stub
+    identificacion = str(contexto['rng'].randrange(10_000_000, 1_999_999_999))
+    datos = {'identificacion': identificacion}
+    if i % 2:
+        datos['nombres'] = f'PERSONA SINTETICA {i}'
+    return cliente.post(reverse('pagina_busqueda'), datos)
+
+
+def _dashboard(cliente, contexto, i):
+    return cliente.get(reverse('dashboard'))
+
+
+def _gestion_consultas(cliente, contexto, i):
+    # Primera página, una página siguiente y el filtro por término, alternados
+    url = reverse('gestion_consultas')
+    if i % 3 == 1 and contexto['cursor']:
+        return cliente.get(url, {'despues': contexto['cursor']})
+    if i % 3 == 2:
+        return cliente.get(url, {'termino': str(contexto['rng'].randrange(100, 999))})
+    return cliente.get(url)
+
+
+def _generar_pdf(cliente, contexto, i):
+    ids = contexto['busquedas_pdf']
+    return cliente.get(reverse('generar_pdf_busqueda', args=[ids[i % len(ids)]]))
+
+
+def _subir_lote(cliente, contexto, i):
+    archivo = SimpleUploadedFile(f'lote_{i}.csv', contexto['archivo_lote'], content_type='text/csv')
+    return cliente.post(reverse('subir_lote'), {'archivo_subido': archivo})
+
+
+ESCENARIOS = {
+    'pagina_busqueda': _buscar,
+    'dashboard': _dashboard,
+    'gestion_consultas': _gestion_consultas,
+    'generar_pdf_busqueda': _generar_pdf,
+    'subir_lote': _subir_lote,
+}
+
+
+def usuario_de_prueba():
+    """Un usuario de la empresa sintética con más búsquedas, con acceso a la gestión de su empresa."""
+    mayor = (Busqueda.objects.filter(empresa__nombre__startswith=PREFIJO).values('empresa')
+             .annotate(total=Count('id')).order_by('-total').first())
+    if mayor is None:
+        return None, 0
+    busqueda = Busqueda.objects.filter(empresa_id=mayor['empresa']).select_related('usuario').first()
+    usuario = busqueda.usuario
+    if not usuario.es_superior:
+        usuario.es_superior = True
+        usuario.save(update_fields=['es_superior'])
+    return usuario, mayor['total']
+
+
+def _archivo_lote(filas):
+    lineas = ['Identificación;Nombres'] + [f'{10_000_000 + i};PERSONA SINTETICA {i}' for i in range(filas)]
+    return ('\n'.join(lineas) + '\n').encode('utf-8')
+
+
+def _medir(usuario, funcion, contexto, peticiones, concurrencia, calentamiento):
+    latencias, consultas, errores = [], [], []
+    lock = threading.Lock()
+    marcas = {}
+
+    def correr(indices):
+        cliente = Client()
+        cliente.force_login(usuario)
+        # Calentamiento: sesión, plantillas y cachés del proceso
+        for i in range(calentamiento):
+            funcion(cliente, contexto, -1 - i)
+        barrera.wait()
+        propias = []
+        for i in indices:
+            medicion = MedicionPeticion()
+            with connection.execute_wrapper(medicion.medir_sql):
+                inicio = time.perf_counter()
+                respuesta = funcion(cliente, contexto, i)
+                if getattr(respuesta, 'streaming', False):
+                    # La descarga termina cuando se lee el último bloque
+                    for _ in respuesta.streaming_content:
+                        pass
+                propias.append((time.perf_counter() - inicio, medicion.sql_consultas, respuesta.status_code))
+        with lock:
+            for duracion, sql, estado in propias:
+                latencias.append(duracion)
+                consultas.append(sql)
+                if estado >= 400:
+                    errores.append(estado)
+
+    def en_hilo(indices):
+        try:
+            correr(indices)
+        except BaseException:
+            barrera.abort()  # Que los demás hilos no se queden esperando
+            raise
+        finally:
+            connection.close()
+
+    barrera = threading.Barrier(concurrencia, action=lambda: marcas.setdefault('inicio', time.perf_counter()))
+    grupos = [range(h, peticiones, concurrencia) for h in range(concurrencia)]
+    if concurrencia == 1:
+        # En el hilo actual: así también sirve dentro de una transacción (pruebas)
+        correr(grupos[0])
+    else:
+        with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+            list(ejecutor.map(en_hilo, grupos))
+    duracion = time.perf_counter() - marcas['inicio']
+
+    return {
+        'peticiones': len(latencias),
+        'por_segundo': len(latencias) / duracion,
+        **{f'p{int(p * 100)}_ms': percentil(latencias, p) * 1000 for p in PERCENTILES},
+        'media_ms': statistics.fmean(latencias) * 1000,
+        'sql_mediana': statistics.median(consultas),
+        'sql_max': max(consultas),
+        'errores': len(errores),
+    }
+
+
+def ejecutar(escenarios, peticiones=100, concurrencia=1, calentamiento=3, latencia_api=0.05,
+             resultados_api=3, filas_lote=1000, semilla=1, progreso=None):
+    """
+    Corre los escenarios pedidos y devuelve
+    {'busquedas_empresa': N, 'escenarios': {escenario: métricas}}. Los datos
+    creados durante la corrida (búsquedas del usuario de prueba, lotes, tareas
+    encoladas y PDF) se borran al terminar.
+    """
+    usuario, total_busquedas = usuario_de_prueba()
+    if usuario is None:
+        raise ValueError("No hay historial sintético; generarlo con datos_prueba.generar_historial")
+
+    carpeta = tempfile.mkdtemp(prefix='bench_escenarios_')
+    ultima_busqueda = Busqueda.objects.aggregate(m=Max('id'))['m'] or 0
+    ultimo_lote = LoteConsultaMasiva.objects.aggregate(m=Max('id'))['m'] or 0
+    ultima_tarea = Tarea.objects.aggregate(m=Max('id'))['m'] or 0
+
+    resultados = {}
+    try:
+        with ExitStack() as pila:
+            stub = pila.enter_context(StubAPIServer(latencia=latencia_api, resultados_por_consulta=resultados_api))
+            pila.enter_context(override_settings(
+                API_BASE_URL=stub.base_url, API_TOKEN='bench',
+                # Sin DEBUG: Django no guarda el SQL de cada consulta
+                DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                MEDIA_ROOT=carpeta,
+                STORAGES={**settings.STORAGES, 'default': {
+                    'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                    'OPTIONS': {'location': carpeta},
+                }},
+            ))
+            caches['consultas_api'].clear()
+
+            primera_pagina = list(Busqueda.objects.filter(empresa_id=usuario.empresa_id)
+                                  .order_by(*ORDEN_BUSQUEDAS)[:BUSQUEDAS_POR_PAGINA])
+            contexto = {
+                'rng': random.Random(semilla),
+                'cursor': cursor_de(primera_pagina[-1], ORDEN_BUSQUEDAS) if primera_pagina else None,
+                # Búsquedas distintas para que cada petición genere el PDF y no lo lea guardado
+                'busquedas_pdf': list(
+                    Busqueda.objects.filter(usuario=usuario, encontro_resultados=True)
+                    .order_by('-id').values_list('id', flat=True)[:peticiones + calentamiento]
+                ) or list(Busqueda.objects.filter(usuario=usuario).values_list('id', flat=True)[:1]),
+                'archivo_lote': _archivo_lote(filas_lote),
+            }
+            for nombre in escenarios:
+                if nombre == 'generar_pdf_busqueda':
+                    invalidar_pdfs(contexto['busquedas_pdf'])
+                if progreso:
+                    progreso(nombre)
+                resultados[nombre] = _medir(usuario, ESCENARIOS[nombre], contexto, peticiones,
+                                            concurrencia, calentamiento)
+    finally:
+        Tarea.objects.filter(id__gt=ultima_tarea).delete()
+        LoteConsultaMasiva.objects.filter(id__gt=ultimo_lote, usuario_solicitante=usuario).delete()
+        Busqueda.objects.filter(id__gt=ultima_busqueda, usuario=usuario).delete()
+        shutil.rmtree(carpeta, ignore_errors=True)
+    return {'busquedas_empresa': total_busquedas, 'escenarios': resultados}
+
+
+def comparar(actual, base, tolerancia=0.10):
+    """
+    Diferencias contra la línea base por escenario: [(escenario, métrica,
+    base, actual, cambio relativo, empeora)]. Empeora si la latencia sube o las
+    peticiones por segundo bajan más que `tolerancia`, o si hay más consultas SQL.
+    """
+    filas = []
+    for nombre, metricas in actual['escenarios'].items():
+        anterior = base.get('escenarios', {}).get(nombre)
+        if anterior is None:
+            continue
+        for metrica in ('por_segundo', 'p50_ms', 'p95_ms', 'p99_ms', 'sql_mediana', 'sql_max'):
+            antes, ahora = anterior[metrica], metricas[metrica]
+            cambio = (ahora - antes) / antes if antes else 0.0
+            if metrica == 'por_segundo':
+                empeora = cambio < -tolerancia
+            elif metrica.startswith('sql'):
+                empeora = ahora > antes
+            else:
+                empeora = cambio > tolerancia
+            filas.append((nombre, metrica, antes, ahora, cambio, empeora))
+    return filas
@@ -0,0 +1,111 @@
+# archivo: consultas/clasificacion.py
+"""
+Clasificación interna (Rojo, Amarillo, PEP's) de los Tipo_Lista del API.
+
+Las reglas viven en un archivo JSON (CLASIFICACION_REGLAS) y no en el código,
+así que se pueden cambiar sin desplegar: el archivo se vuelve a leer cuando
+cambia su fecha de modificación. Al cargarlas se compilan una sola vez:
+las reglas 'exacta' quedan en un conjunto y las 'contiene' en una única
+expresión regular con todas las palabras clave. Como solo existen unos
+cientos de listas distintas, cada resultado se memoriza por Tipo_Lista.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+_TIPOS_REGLA = ('exacta', 'contiene')
+# Tope de memoria de la caché; hay pocos cientos de listas, esto nunca debería alcanzarse
+_MAX_MEMORIZADOS = 10_000
+
+
+class ReglasInvalidas(ValueError):
+    pass
+
+
+class Clasificador:
+
+    def __init__(self, reglas):
+        self.sin_tipo = reglas.get('sin_tipo', 'No Clasificado')
+        self.por_defecto = reglas['por_defecto']
+        self._reglas = []
+        for regla in reglas['reglas']:
+            if regla.get('tipo') not in _TIPOS_REGLA:
+                raise ReglasInvalidas(f"Tipo de regla desconocido: {regla.get('tipo')!r}")
+            valores = [v.upper() for v in regla['valores'] if v]
+            if regla['tipo'] == 'exacta':
+                patron = frozenset(valores)
+            else:
+                # Las palabras más largas primero para que la alternancia no se corte antes
+                patron = re.compile('|'.join(re.escape(v) for v in sorted(valores, key=len, reverse=True)))
+            self._reglas.append((regla['tipo'], patron, regla['clasificacion']))
+        self._memoria = {}
+
+    def _evaluar(self, tipo_lista_upper):
+        for tipo, patron, clasificacion in self._reglas:
+            if tipo == 'exacta':
+                if tipo_lista_upper in patron:
+                    return clasificacion
+            elif patron.search(tipo_lista_upper):
+                return clasificacion
+        return self.por_defecto
+
+    def clasificar(self, tipo_lista):
+        if not tipo_lista:
+            return self.sin_tipo
+        try:
+            return self._memoria[tipo_lista]
+        except KeyError:
+            pass
+        clasificacion = self._evaluar(tipo_lista.upper())
+        if len(self._memoria) >= _MAX_MEMORIZADOS:
+            self._memoria.clear()
+        self._memoria[tipo_lista] = clasificacion
+        return clasificacion
+
+    def clasificar_lote(self, tipos_lista):
+        """Clasifica una secuencia completa evaluando cada Tipo_Lista distinto una sola vez."""
+        distintos = {tipo: self.clasificar(tipo) for tipo in set(tipos_lista)}
+        return [distintos[tipo] for tipo in tipos_lista]
+
+
+def cargar_reglas(ruta):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+_lock = threading.Lock()
+_estado = {'clasificador': None, 'ruta': None, 'mtime': None, 'revisado': 0.0}
+
+
+def obtener_clasificador():
+    """
+    Devuelve el clasificador vigente. Como mucho cada CLASIFICACION_RECARGA_SEGUNDOS
+    se revisa si el archivo de reglas cambió y, si es así, se recompila.
+    """
+    ruta = str(settings.CLASIFICACION_REGLAS)
+    ahora = time.monotonic()
+    if (_estado['clasificador'] is not None and _estado['ruta'] == ruta
+            and ahora - _estado['revisado'] < settings.CLASIFICACION_RECARGA_SEGUNDOS):
+        return _estado['clasificador']
+
+    with _lock:
+        mtime = os.path.getmtime(ruta)
+        if _estado['clasificador'] is None or _estado['ruta'] != ruta or _estado['mtime'] != mtime:
+            _estado['clasificador'] = Clasificador(cargar_reglas(ruta))
+            _estado['ruta'] = ruta
+            _estado['mtime'] = mtime
+        _estado['revisado'] = ahora
+        return _estado['clasificador']
+
+
+def clasificar(tipo_lista):
+    return obtener_clasificador().clasificar(tipo_lista)
+
+
+def clasificar_lote(tipos_lista):
+    return obtener_clasificador().clasificar_lote(tipos_lista)
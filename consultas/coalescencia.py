@@ -0,0 +1,139 @@
+# archivo: consultas/coalescencia.py
+"""
+Una sola llamada en curso por consulta idéntica (single-flight).
+
+Cuando varios usuarios de una empresa consultan a la misma persona casi al
+mismo tiempo, o un usuario envía el formulario dos veces, cada petición
+haría su propia llamada al API. Aquí la primera petición con una clave hace
+la llamada y las demás esperan su resultado:
+
+- Dentro del proceso (hilos del worker y el pool de consulta_paralela), con
+  un Event por clave: compartir().
+- Entre procesos, con un candado en la caché compartida: cache.add es
+  atómico en la tabla de caché, Redis y memcached. Quien no obtiene el
+  candado sondea la caché hasta que aparece el resultado que guarda el
+  primero: una_vez_entre_procesos().
+
+Si el primero termina sin resultado (el API falló; los errores no se
+guardan) o la espera pasa de API_COALESCENCIA_ESPERA, cada uno hace su
+propia llamada: la coalescencia ahorra llamadas pero nunca deja una
+consulta sin respuesta. Dentro de una búsqueda con plazo (consultas.plazos)
+la espera no pasa del plazo y, si este venció, se devuelve None sin llamar.
+"""
+
+import copy
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .plazos import restante, vencido
+
+logger = logging.getLogger(__name__)
+
+SONDEO_MAXIMO = 1.0  # Segundos entre lecturas de la caché compartida
+
+
+class _Vuelo:
+    """Una llamada en curso y lo que devolvió."""
+
+    def __init__(self):
+        self.terminado = threading.Event()
+        self.resultado = None
+        self.fallo = False
+
+
+_vuelos = {}
+_vuelos_pid = None
+_vuelos_lock = threading.Lock()
+
+
+def compartir(clave, funcion):
+    """
+    Devuelve funcion(). Si otro hilo del proceso ya está llamando con la
+    misma clave, espera y devuelve una copia de su resultado.
+    """
+    global _vuelos, _vuelos_pid
+    with _vuelos_lock:
+        if _vuelos_pid != os.getpid():
+            # Después de un fork las llamadas del padre no existen en este proceso
+            _vuelos, _vuelos_pid = {}, os.getpid()
+        vuelo = _vuelos.get(clave)
+        primero = vuelo is None
+        if primero:
+            vuelo = _vuelos[clave] = _Vuelo()
+
+    if not primero:
+        terminado = vuelo.terminado.wait(restante(settings.API_COALESCENCIA_ESPERA))
+        if terminado and not vuelo.fallo and vuelo.resultado is not None:
+            # Cada quien recibe su copia, como si la hubiera leído de la caché
+            return copy.deepcopy(vuelo.resultado)
+        return None if vencido() else funcion()
+
+    try:
+        vuelo.resultado = funcion()
+        return vuelo.resultado
+    except BaseException:
+        vuelo.fallo = True
+        raise
+    finally:
+        with _vuelos_lock:
+            if _vuelos.get(clave) is vuelo:
+                del _vuelos[clave]
+        vuelo.terminado.set()
+
+
+def una_vez_entre_procesos(cache, clave, funcion, timeout):
+    """
+    El valor de `clave` en `cache`. Si no está, lo calcula funcion() y lo
+    guarda `timeout` segundos, de a un proceso a la vez: los demás esperan a
+    que aparezca. None no se guarda.
+    """
+    candado = f'{clave}:en_curso'
+    espera = settings.API_COALESCENCIA_ESPERA
+    try:
+        primero = cache.add(candado, os.getpid(), espera)
+    except Exception as e:
+        logger.warning("No se pudo usar la caché para coalescer consultas: %s", e)
+        return funcion()
+
+    if primero:
+        try:
+            # Otro proceso pudo terminar entre la lectura de quien llama y el candado
+            resultado = cache.get(clave)
+            if resultado is None:
+                resultado = _calcular_y_guardar(cache, clave, funcion, timeout)
+            return resultado
+        finally:
+            cache.delete(candado)
+
+    limite = time.monotonic() + restante(espera)
+    sondeo = settings.API_COALESCENCIA_SONDEO_MS / 1000
+    try:
+        while (falta := limite - time.monotonic()) > 0:
+            time.sleep(min(sondeo, falta))
+            # La mayoría responde en los primeros sondeos; después se lee cada
+            # vez menos para no cargar la tabla de caché con quienes esperan
+            sondeo = min(sondeo * 2, SONDEO_MAXIMO)
+            valores = cache.get_many([clave, candado])
+            if valores.get(clave) is not None:
+                return valores[clave]
+            if candado not in valores:
+                break  # El primero terminó sin resultado
+    except Exception as e:
+        logger.warning("No se pudo leer la caché mientras se esperaba otra consulta: %s", e)
+    if vencido():
+        return None
+    return _calcular_y_guardar(cache, clave, funcion, timeout)
+
+
+def _calcular_y_guardar(cache, clave, funcion, timeout):
+    resultado = funcion()
+    if resultado is not None:
+        try:
+            cache.set(clave, resultado, timeout)
+        except Exception as e:
+            logger.warning("No se pudo escribir en la caché: %s", e)
+    return resultado
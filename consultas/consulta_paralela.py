@@ -0,0 +1,191 @@
+# archivo: consultas/consulta_paralela.py
+"""
+Consultas concurrentes al API de listas.
+
+PepsIDNombre solo devuelve los registros que coinciden en identificación y
+nombre a la vez. Con API_REVISION_COMPLETA, una búsqueda con ambos datos
+consulta además PepsExactaID y PepsNombre y une las tres respuestas. Las
+peticiones salen al mismo tiempo, así que la búsqueda tarda lo que el
+endpoint más lento y no la suma de los tres. Todo tiene un plazo
+(API_PLAZO_BUSQUEDA): lo que no respondió a tiempo se descarta y se usa lo
+que ya llegó, marcado como incompleto (Respuesta.incompleta): la ausencia
+de un registro en una respuesta incompleta no prueba que no esté en las
+listas. Si el que falta es el endpoint principal (el primero de
+endpoints_para), la búsqueda se trata como un error del API (None).
+
+Cada petición corre en un pool de hilos del proceso sobre services._consultar.
+Así se reutilizan la misma sesión HTTP, la caché, el espejo local y las
+métricas, y no hace falta otro cliente HTTP. El hilo recibe el plazo de su
+búsqueda (consultas.plazos), así que una petición descartada no lo retiene
+más allá del plazo. Las vistas síncronas entran por
+consultar_criterios (async_to_sync). Los lotes entran por consultar_lote, que
+acota con un semáforo cuántos criterios se consultan a la vez.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import close_old_connections
+
+from .plazos import con_plazo, limite_en
+from .services import _consultar, normalizar_identificacion, normalizar_nombre
+
+logger = logging.getLogger(__name__)
+
+# Campos de coincidencia: si un registro llega por varios endpoints se conserva el mayor
+CAMPOS_COINCIDENCIA = ('CoincidenciaID', 'CoincidenciaNombre')
+
+_ejecutor = None
+_ejecutor_pid = None
+_ejecutor_lock = threading.Lock()
+
+
+def obtener_ejecutor():
+    """Pool de hilos del proceso para las peticiones; se vuelve a crear después de un fork."""
+    global _ejecutor, _ejecutor_pid
+    pid = os.getpid()
+    if _ejecutor is None or _ejecutor_pid != pid:
+        with _ejecutor_lock:
+            if _ejecutor is None or _ejecutor_pid != pid:
+                _ejecutor = ThreadPoolExecutor(max_workers=settings.API_HILOS, thread_name_prefix='consulta-api')
+                _ejecutor_pid = pid
+    return _ejecutor
+
+
+def _consultar_en_hilo(endpoint, argumentos, limite):
+    try:
+        with con_plazo(limite):
+            return _consultar(endpoint, argumentos)
+    finally:
+        # La caché del API puede estar en la base de datos; estos hilos no
+        # pasan por el ciclo de una petición, así que cerramos la conexión aquí
+        close_old_connections()
+
+
+class Respuesta(list):
+    """Registros unidos de los endpoints consultados; incompleta si alguno no respondió."""
+
+    def __init__(self, registros=(), incompleta=False):
+        super().__init__(registros)
+        self.incompleta = incompleta
+
+
+def es_incompleta(resultados):
+    """
+    True si la consulta no cubrió todo lo que debía: el API falló (None) o
+    algún endpoint de la revisión completa no respondió.
+    """
+    return resultados is None or getattr(resultados, 'incompleta', False)
+
+
+def endpoints_para(identificacion, nombres):
+    """Lista de (endpoint, argumentos) que hay que consultar para estos criterios."""
+    identificacion = normalizar_identificacion(identificacion) if identificacion else ''
+    nombres = normalizar_nombre(nombres) if nombres else ''
+    if identificacion and nombres:
+        endpoints = [('PepsIDNombre', [identificacion, nombres])]
+        if settings.API_REVISION_COMPLETA:
+            endpoints += [('PepsExactaID', [identificacion]), ('PepsNombre', [nombres])]
+        return endpoints
+    if identificacion:
+        return [('PepsExactaID', [identificacion])]
+    if nombres:
+        return [('PepsNombre', [nombres])]
+    return []
+
+
+def clave_registro(item):
+    # El mismo registro puede llegar por varios endpoints; una persona en
+    # dos listas distintas son dos registros
+    return (
+        normalizar_identificacion(item.get('Id') or ''),
+        normalizar_nombre(item.get('NombreCompleto') or ''),
+        item.get('Tipo_Lista') or '',
+    )
+
+
+def fusionar_resultados(respuestas):
+    """Une las listas de resultados sin repetir registros, en el orden en que llegaron."""
+    unidos = {}
+    for resultados in respuestas:
+        for item in resultados or ():
+            clave = clave_registro(item)
+            existente = unidos.get(clave)
+            if existente is None:
+                unidos[clave] = dict(item)
+                continue
+            for campo in CAMPOS_COINCIDENCIA:
+                existente[campo] = max(existente.get(campo) or 0, item.get(campo) or 0)
+    return list(unidos.values())
+
+
+async def consultar_endpoint(endpoint, argumentos, limite):
+    loop = asyncio.get_running_loop()
+    # run_in_executor no copia el contexto: sin esto el tiempo del API no se
+    # atribuiría a la petición que lo pidió (monitoreo.instrumentacion)
+    contexto = contextvars.copy_context()
+    return await loop.run_in_executor(
+        obtener_ejecutor(), contexto.run, _consultar_en_hilo, endpoint, argumentos, limite)
+
+
+async def consultar_criterios_async(identificacion, nombres, plazo=None):
+    """
+    Consulta a la vez todos los endpoints que aplican y une sus resultados en
+    una Respuesta. Devuelve None si el endpoint principal no respondió bien
+    dentro del plazo; si falta otro, la Respuesta queda incompleta.
+    """
+    endpoints = endpoints_para(identificacion, nombres)
+    if not endpoints:
+        return []
+    plazo = settings.API_PLAZO_BUSQUEDA if plazo is None else plazo
+    limite = limite_en(plazo)
+    tareas = {
+        asyncio.ensure_future(consultar_endpoint(endpoint, argumentos, limite)): endpoint
+        for endpoint, argumentos in endpoints
+    }
+    terminadas, pendientes = await asyncio.wait(tareas, timeout=plazo)
+    for tarea in pendientes:
+        # Una petición que ya está en curso termina en su hilo (a más tardar al
+        # vencer `limite`), pero nadie la espera
+        tarea.cancel()
+    if pendientes:
+        logger.warning("Plazo de %.1fs agotado; sin respuesta de %s",
+                       plazo, ', '.join(sorted(tareas[t] for t in pendientes)))
+
+    # Se respeta el orden de endpoints_para: primero los registros de PepsIDNombre
+    respuestas = [tarea.result() if tarea in terminadas else None for tarea in tareas]
+    if respuestas[0] is None:
+        if len(respuestas) > 1:
+            logger.warning("%s no respondió; la búsqueda se registra como error del API", endpoints[0][0])
+        return None
+    return Respuesta(fusionar_resultados(respuestas), incompleta=None in respuestas)
+
+
+async def consultar_lote_async(criterios, concurrencia=None, plazo=None):
+    """
+    Consulta una lista de (identificacion, nombres) con a lo sumo
+    `concurrencia` criterios en curso. Devuelve las respuestas en el mismo orden.
+    """
+    semaforo = asyncio.Semaphore(concurrencia or settings.LOTE_CONCURRENCIA)
+
+    async def consultar(identificacion, nombres):
+        async with semaforo:
+            return await consultar_criterios_async(identificacion, nombres, plazo)
+
+    return await asyncio.gather(*(consultar(i, n) for i, n in criterios))
+
+
+def consultar_criterios(identificacion, nombres, plazo=None):
+    """Versión síncrona de consultar_criterios_async para las vistas."""
+    return async_to_sync(consultar_criterios_async)(identificacion, nombres, plazo)
+
+
+def consultar_lote(criterios, concurrencia=None, plazo=None):
+    """Versión síncrona de consultar_lote_async para el procesamiento de lotes."""
+    return async_to_sync(consultar_lote_async)(list(criterios), concurrencia, plazo)
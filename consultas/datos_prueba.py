@@ -0,0 +1,147 @@
+# archivo: consultas/datos_prueba.py
+"""
+Generador de historial sintético (empresas, usuarios, búsquedas y resultados)
+para medir consultas sobre tablas grandes. Solo para bases de desarrollo:
+los datos quedan marcados con el prefijo PREFIJO en nombres de empresa y
+usuario para poder borrarlos con `borrar_historial`.
+"""
+
+import random
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from empresas.models import Empresa
+from usuarios.models import Usuario
+
+from .clasificacion import clasificar
+from .entidades import calcular_huella, guardar_entidades, valores_normalizados
+from .models import Busqueda, EntidadLista, Resultado
+
+PREFIJO = 'bench_'
+
+TIPOS_LISTA = [
+    'OFAC', 'ONU', 'INTERPOL', 'PANAMA PAPERS', 'PEPS COLOMBIA', 'SENADO DE LA REPUBLICA',
+    'BOLETIN PROCURADURIA', 'OFFSHORE LEAKS', 'CONSEJO DE ESTADO', 'POLICIA NACIONAL',
+]
+DESCRIPCION = (
+    'Registro sintético para pruebas de rendimiento. Persona vinculada en la fuente a '
+    'investigaciones y sanciones publicadas; el texto tiene el largo habitual de Relacionado_Con.'
+)
+
+
+@contextmanager
+def _fechas_manuales():
+    # fecha_busqueda usa auto_now_add; aquí necesitamos repartir el historial en el tiempo
+    campo = Busqueda._meta.get_field('fecha_busqueda')
+    campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        campo.auto_now_add = True
+
+
+def generar_entidades(cantidad, rng, lote=5000):
+    """
+    Crea (o reutiliza, si ya existen) `cantidad` registros sintéticos de las
+    listas y devuelve {id: tipo_lista}. Como en el API real, las búsquedas
+    encuentran una y otra vez a las mismas personas.
+    """
+    tipos = {}
+    for inicio in range(0, cantidad, lote):
+        entidades = []
+        for i in range(inicio, min(inicio + lote, cantidad)):
+            tipo_lista = rng.choice(TIPOS_LISTA)
+            valores = valores_normalizados({
+                'nombre_completo': f'PERSONA SINTETICA {i}',
+                'identificacion': str(10_000_000 + i) if rng.random() < 0.8 else None,
+                'tipo_lista': tipo_lista,
+                'origen_lista': 'INTERNACIONAL' if i % 2 else 'NACIONAL',
+                'relacionado_con': f'{PREFIJO}entidad_{i}: ' + DESCRIPCION,
+                'fuente': f'https://fuente.example/{tipo_lista.lower().replace(" ", "-")}/{i}',
+                'es_restrictiva': tipo_lista in ('OFAC', 'ONU', 'INTERPOL'),
+                'tipo_persona': 'NATURAL',
+                'fecha_update': '/Date(1470009600000-0500)/',
+                # Ingresos repartidos en diez años, para que filtrar por estado_fecha tenga sentido
+                'estado': f'INGRESA LISTA: {date(2016, 8, 1) + timedelta(days=i * 37 % 3650):%Y%m%d}',
+                'alias': '',
+                'llaveimagen': '',
+            })
+            entidades.append(EntidadLista(huella=calcular_huella(valores), **valores))
+        tipos.update((entidad.pk, entidad.tipo_lista) for entidad in guardar_entidades(entidades))
+    return tipos
+
+
+def generar_historial(busquedas, resultados_por_busqueda=3, empresas=20, usuarios_por_empresa=10,
+                      dias=365, lote=5000, semilla=1, progreso=None, entidades=None):
+    """
+    Inserta `busquedas` búsquedas repartidas en los últimos `dias` días. Cerca de
+    un tercio encuentra resultados (entre 1 y 2 * resultados_por_busqueda), que
+    apuntan a `entidades` registros distintos (por defecto uno por cada 20
+    búsquedas). Devuelve (búsquedas, resultados) insertados.
+    """
+    rng = random.Random(semilla)
+    ahora = timezone.now()
+    segundos = dias * 24 * 3600
+    tipos_entidad = generar_entidades(entidades or max(100, busquedas // 20), rng, lote)
+    ids_entidad = list(tipos_entidad)
+
+    nuevas_empresas = Empresa.objects.bulk_create(
+        [Empresa(nombre=f'{PREFIJO}empresa_{i}') for i in range(empresas)]
+    )
+    usuarios = []
+    for empresa in nuevas_empresas:
+        for j in range(usuarios_por_empresa):
+            usuario = Usuario(username=f'{PREFIJO}{empresa.pk}_{j}', empresa=empresa)
+            usuario.set_unusable_password()
+            usuarios.append(usuario)
+    usuarios = Usuario.objects.bulk_create(usuarios)
+
+    total_busquedas = total_resultados = 0
+    with _fechas_manuales():
+        while total_busquedas < busquedas:
+            tamano = min(lote, busquedas - total_busquedas)
+            bloque = []
+            for _ in range(tamano):
+                usuario = rng.choice(usuarios)
+                encontro = rng.random() < 0.33
+                bloque.append(Busqueda(
+                    usuario=usuario,
+                    empresa_id=usuario.empresa_id,
+                    termino_buscado=f'ID: {rng.randrange(10_000_000, 1_999_999_999)}',
+                    fecha_busqueda=ahora - timedelta(seconds=rng.randrange(segundos)),
+                    encontro_resultados=encontro,
+                ))
+
+            with transaction.atomic():
+                Busqueda.objects.bulk_create(bloque)
+                resultados = []
+                for busqueda in bloque:
+                    if not busqueda.encontro_resultados:
+                        continue
+                    for _ in range(rng.randint(1, 2 * resultados_por_busqueda)):
+                        entidad_id = rng.choice(ids_entidad)
+                        resultados.append(Resultado(
+                            busqueda=busqueda,
+                            entidad_id=entidad_id,
+                            coincidencia_id=100 if rng.random() < 0.8 else 0,
+                            coincidencia_nombre=rng.randrange(50, 101),
+                            clasificacion=clasificar(tipos_entidad[entidad_id]),
+                        ))
+                Resultado.objects.bulk_create(resultados, batch_size=lote)
+
+            total_busquedas += tamano
+            total_resultados += len(resultados)
+            if progreso:
+                progreso(total_busquedas, total_resultados)
+    return total_busquedas, total_resultados
+
+
+def borrar_historial():
+    """Borra todo lo creado por generar_historial (las búsquedas caen en cascada con sus resultados)."""
+    Busqueda.objects.filter(usuario__username__startswith=PREFIJO).delete()
+    Usuario.objects.filter(username__startswith=PREFIJO).delete()
+    Empresa.objects.filter(nombre__startswith=PREFIJO).delete()
+    EntidadLista.objects.filter(relacionado_con__startswith=PREFIJO, resultados__isnull=True).delete()
@@ -0,0 +1,174 @@
+# archivo: consultas/descargas.py
+"""
+Descarga de archivos guardados en el almacenamiento (local o S3).
+
+servir_archivo() es el único camino para entregar un archivo al navegador:
+la plantilla de cargas masivas, los archivos de los lotes y los PDF de las
+búsquedas. El archivo se envía por bloques con FileResponse y nunca se
+carga completo en memoria. Se atienden las peticiones condicionales
+(ETag/Last-Modified, respuesta 304) y Range (reanudar descargas).
+
+Con S3, los archivos grandes no pasan por Django: se responde con una
+redirección a una URL prefirmada de pocos segundos y S3 entrega el archivo
+(también atiende Range). Los pequeños se envían directamente, para no
+sumarle al navegador una petición más.
+
+Quien llama debe verificar antes que el usuario puede ver el archivo; este
+módulo no sabe de empresas ni usuarios.
+"""
+
+import hashlib
+import mimetypes
+import posixpath
+import re
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from storages.backends.s3boto3 import S3Boto3Storage
+
+TAMANO_BLOQUE = 64 * 1024
+RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _es_s3(storage):
+    return isinstance(storage, S3Boto3Storage)
+
+
+def _clave_s3(storage, nombre):
+    return posixpath.join(storage.location, nombre) if storage.location else nombre
+
+
+def _metadatos(storage, nombre):
+    """(tamaño, última modificación en segundos, ETag) del archivo; Http404 si no existe."""
+    if _es_s3(storage):
+        try:
+            cabecera = storage.connection.meta.client.head_object(
+                Bucket=storage.bucket_name, Key=_clave_s3(storage, nombre),
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                raise Http404("Archivo no encontrado")
+            raise
+        return cabecera['ContentLength'], int(cabecera['LastModified'].timestamp()), cabecera['ETag']
+    try:
+        tamano = storage.size(nombre)
+        modificado = int(storage.get_modified_time(nombre).timestamp())
+    except (FileNotFoundError, NotImplementedError):
+        raise Http404("Archivo no encontrado")
+    huella = hashlib.sha1(f'{nombre}:{tamano}:{modificado}'.encode('utf-8')).hexdigest()[:20]
+    return tamano, modificado, f'"{huella}"'
+
+
+def _rango_pedido(request, tamano, etag, modificado):
+    """
+    (inicio, fin) del Range pedido, None para enviar el archivo completo, o
+    False si el rango no se puede atender (416). Solo se atiende un rango.
+    """
+    encabezado = request.headers.get('Range', '')
+    coincidencia = RANGO.match(encabezado.strip())
+    if not coincidencia or not any(coincidencia.groups()):
+        return None
+    if_range = request.headers.get('If-Range')
+    # Si el archivo cambió desde la primera descarga, se envía completo
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != modificado:
+        return None
+
+    desde, hasta = coincidencia.groups()
+    if desde:
+        inicio, fin = int(desde), min(int(hasta) if hasta else tamano - 1, tamano - 1)
+    else:
+        inicio, fin = max(tamano - int(hasta), 0), tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return False
+    return inicio, fin
+
+
+class _LecturaAcotada:
+    """Lee a lo sumo `restante` bytes de un archivo ya posicionado."""
+
+    def __init__(self, archivo, restante):
+        self.archivo = archivo
+        self.restante = restante
+
+    def read(self, tamano=-1):
+        if self.restante <= 0:
+            return b''
+        if tamano < 0 or tamano > self.restante:
+            tamano = self.restante
+        datos = self.archivo.read(tamano)
+        self.restante -= len(datos)
+        return datos
+
+    def close(self):
+        self.archivo.close()
+
+
+def _abrir(storage, nombre, inicio, fin):
+    if _es_s3(storage):
+        # S3File descarga el objeto completo antes de leerlo; get_object entrega
+        # el cuerpo como flujo y solo el rango pedido
+        respuesta = storage.connection.meta.client.get_object(
+            Bucket=storage.bucket_name, Key=_clave_s3(storage, nombre), Range=f'bytes={inicio}-{fin}',
+        )
+        return _LecturaAcotada(respuesta['Body'], fin - inicio + 1)
+    archivo = storage.open(nombre, 'rb')
+    if inicio:
+        archivo.seek(inicio)
+    return _LecturaAcotada(archivo, fin - inicio + 1)
+
+
+def _url_prefirmada(storage, nombre, nombre_descarga, content_type, adjunto):
+    return storage.connection.meta.client.generate_presigned_url('get_object', Params={
+        'Bucket': storage.bucket_name, 'Key': _clave_s3(storage, nombre),
+        'ResponseContentDisposition': content_disposition_header(adjunto, nombre_descarga),
+        'ResponseContentType': content_type,
+    }, ExpiresIn=settings.DESCARGAS_EXPIRACION)
+
+
+def servir_archivo(request, storage, nombre, nombre_descarga=None, content_type=None, adjunto=True):
+    """
+    Respuesta para descargar `nombre` de `storage`: 200/206 por bloques, 304 si
+    el navegador ya lo tiene, 416 si el rango no existe o una redirección a S3.
+    """
+    nombre_descarga = nombre_descarga or posixpath.basename(nombre)
+    content_type = content_type or mimetypes.guess_type(nombre_descarga)[0] or 'application/octet-stream'
+    tamano, modificado, etag = _metadatos(storage, nombre)
+
+    def con_validadores(respuesta):
+        respuesta['ETag'] = etag
+        respuesta['Last-Modified'] = http_date(modificado)
+        # El archivo es de una empresa: que no lo guarden cachés compartidas
+        patch_cache_control(respuesta, private=True, no_cache=True)
+        return respuesta
+
+    condicional = get_conditional_response(request, etag=etag, last_modified=modificado)
+    if condicional is not None:
+        return con_validadores(condicional)
+
+    if (_es_s3(storage) and settings.DESCARGAS_REDIRECCION_S3
+            and tamano >= settings.DESCARGAS_REDIRECCION_MINIMO_KB * 1024):
+        return HttpResponseRedirect(_url_prefirmada(storage, nombre, nombre_descarga, content_type, adjunto))
+
+    rango = _rango_pedido(request, tamano, etag, modificado)
+    if rango is False:
+        respuesta = HttpResponse(status=416)
+        respuesta['Content-Range'] = f'bytes */{tamano}'
+        return con_validadores(respuesta)
+    inicio, fin = rango or (0, tamano - 1)
+
+    if request.method == 'HEAD' or not tamano:
+        respuesta = HttpResponse(content_type=content_type)
+        respuesta['Content-Disposition'] = content_disposition_header(adjunto, nombre_descarga)
+    else:
+        respuesta = FileResponse(_abrir(storage, nombre, inicio, fin), as_attachment=adjunto,
+                                 filename=nombre_descarga, content_type=content_type)
+        respuesta.block_size = TAMANO_BLOQUE
+    if rango:
+        respuesta.status_code = 206
+        respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+    respuesta['Content-Length'] = str(fin - inicio + 1 if tamano else 0)
+    respuesta['Accept-Ranges'] = 'bytes'
+    return con_validadores(respuesta)
@@ -0,0 +1,158 @@
+# archivo: consultas/entidades.py
+"""
+Registros de las listas guardados una sola vez (EntidadLista).
+
+La misma persona sancionada aparece en cientos de búsquedas con exactamente
+los mismos datos. En vez de copiar el registro completo en cada Resultado,
+se guarda una EntidadLista por contenido: su llave es la huella (SHA-1) de
+los campos del registro, así que dos registros iguales son la misma fila.
+Resultado solo enlaza la búsqueda con la entidad y guarda lo que sí cambia
+en cada consulta: los porcentajes de coincidencia y la clasificación.
+
+Si el API cambia cualquier dato del registro (estado, fuente...), la huella
+cambia y se guarda una entidad nueva; las búsquedas anteriores conservan la
+versión que vieron.
+
+Fecha_Update y Estado llegan como texto ('/Date(1500354000000-0500)/',
+'INGRESA LISTA: 20160801'). Al insertar cada entidad nueva se interpretan una
+vez y se guardan también en columnas tipadas (fecha_actualizacion,
+estado_movimiento, estado_fecha) que se pueden filtrar en SQL. En un lote los
+mismos textos se repiten miles de veces, así que los intérpretes guardan en
+memoria los últimos valores distintos: cada texto se interpreta una vez.
+"""
+
+import hashlib
+import json
+import re
+from datetime import date, datetime, timezone as tz
+from functools import lru_cache
+
+from django.utils import timezone
+
+from .models import EntidadLista
+
+# Campo del modelo -> llave del registro del API. El orden es parte de la huella: no cambiarlo.
+CAMPOS_API = (
+    ('nombre_completo', 'NombreCompleto'),
+    ('identificacion', 'Id'),
+    ('tipo_lista', 'Tipo_Lista'),
+    ('origen_lista', 'Origen_Lista'),
+    ('relacionado_con', 'Relacionado_Con'),
+    ('fuente', 'Fuente'),
+    ('es_restrictiva', 'Restrictiva'),
+    ('es_boletin', 'Boletin'),
+    ('alias', 'Aka'),
+    ('tipo_persona', 'Tipo_Persona'),
+    ('fecha_update', 'Fecha_Update'),
+    ('estado', 'Estado'),
+    ('llaveimagen', 'LlaveImagen'),
+)
+CAMPOS_BOOLEANOS = {'es_restrictiva', 'es_boletin'}
+LOTE_CONSULTA = 1000  # Huellas por SELECT ... IN (...)
+INTERPRETADOS_EN_MEMORIA = 10_000  # Textos distintos de Fecha_Update/Estado ya interpretados
+
+# Fecha_Update del API JSON: milisegundos desde 1970 (UTC) y la zona de origen, que no cambia el instante
+_FECHA_JSON = re.compile(r'/Date\((-?\d+)(?:[+-]\d{4})?\)/')
+# Estado: 'INGRESA LISTA: 20160801', 'SALE LISTA: 20190315'...
+_ESTADO = re.compile(r'\s*([A-ZÁÉÍÓÚÑ]+)?[^:]*:\s*(\d{4})(\d{2})(\d{2})')
+_MOVIMIENTOS = {
+    'INGRESA': EntidadLista.INGRESO, 'INGRESO': EntidadLista.INGRESO,
+    'SALE': EntidadLista.RETIRO, 'RETIRA': EntidadLista.RETIRO, 'RETIRO': EntidadLista.RETIRO,
+    'EXCLUIDO': EntidadLista.RETIRO,
+}
+
+
+def valores_normalizados(valores):
+    """Los valores tal como quedan guardados: así la huella del API y la de la base coinciden."""
+    normalizados = {}
+    for campo, _ in CAMPOS_API:
+        valor = valores.get(campo)
+        if campo in CAMPOS_BOOLEANOS:
+            normalizados[campo] = bool(valor)
+        else:
+            normalizados[campo] = None if valor is None else str(valor)
+    return normalizados
+
+
+@lru_cache(maxsize=INTERPRETADOS_EN_MEMORIA)
+def interpretar_fecha_update(valor):
+    """'/Date(ms-0500)/' (API JSON) o '2017-07-18T00:00:00' (API SOAP) a datetime con zona; None si no se entiende."""
+    if not valor:
+        return None
+    coincidencia = _FECHA_JSON.fullmatch(valor.strip())
+    try:
+        if coincidencia:
+            fecha = datetime.fromtimestamp(int(coincidencia.group(1)) / 1000, tz=tz.utc)
+        else:
+            fecha = datetime.fromisoformat(valor.strip())
+    except (ValueError, OverflowError, OSError):
+        return None
+    if fecha.year < 1900:
+        return None  # DateTime.MinValue de .NET: el registro no tiene fecha
+    # Sin zona: el API responde en la hora del proyecto (Colombia)
+    return fecha if timezone.is_aware(fecha) else timezone.make_aware(fecha)
+
+
+@lru_cache(maxsize=INTERPRETADOS_EN_MEMORIA)
+def interpretar_estado(valor):
+    """'INGRESA LISTA: 20160801' -> (EntidadLista.INGRESO, date(2016, 8, 1)). ('', None) si no hay estado."""
+    if not valor or not valor.strip():
+        return '', None
+    coincidencia = _ESTADO.match(valor.upper())
+    if not coincidencia:
+        return EntidadLista.OTRO, None
+    movimiento = _MOVIMIENTOS.get(coincidencia.group(1), EntidadLista.OTRO)
+    try:
+        return movimiento, date(*(int(parte) for parte in coincidencia.group(2, 3, 4)))
+    except ValueError:
+        return movimiento, None
+
+
+def tipar_entidades(entidades):
+    """Llena las columnas tipadas de cada entidad a partir de fecha_update y estado."""
+    for entidad in entidades:
+        entidad.fecha_actualizacion = interpretar_fecha_update(entidad.fecha_update)
+        entidad.estado_movimiento, entidad.estado_fecha = interpretar_estado(entidad.estado)
+    return entidades
+
+
+def calcular_huella(valores):
+    datos = [valores[campo] for campo, _ in CAMPOS_API]
+    return hashlib.sha1(json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def entidad_desde_registro(item):
+    """EntidadLista sin guardar para un registro del API."""
+    valores = valores_normalizados({campo: item.get(llave) for campo, llave in CAMPOS_API})
+    return EntidadLista(huella=calcular_huella(valores), **valores)
+
+
+def guardar_entidades(entidades):
+    """
+    Asigna a cada EntidadLista (sin guardar) el id de la fila con su huella,
+    insertando solo las que no existen. Si todas existen cuesta un SELECT;
+    si no, un INSERT que ignora las que otra búsqueda insertó a la vez y un
+    SELECT más para leer sus ids.
+    """
+    por_huella = {}
+    for entidad in entidades:
+        por_huella.setdefault(entidad.huella, entidad)
+    ids = _ids_por_huella(list(por_huella))
+
+    nuevas = [entidad for huella, entidad in por_huella.items() if huella not in ids]
+    if nuevas:
+        tipar_entidades(nuevas)
+        EntidadLista.objects.bulk_create(nuevas, batch_size=LOTE_CONSULTA, ignore_conflicts=True)
+        ids.update(_ids_por_huella([entidad.huella for entidad in nuevas]))
+
+    for entidad in entidades:
+        entidad.pk = ids[entidad.huella]
+        entidad._state.adding = False
+    return entidades
+
+
+def _ids_por_huella(huellas):
+    ids = {}
+    for i in range(0, len(huellas), LOTE_CONSULTA):
+        ids.update(EntidadLista.objects.filter(huella__in=huellas[i:i + LOTE_CONSULTA]).values_list('huella', 'pk'))
+    return ids
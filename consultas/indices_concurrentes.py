@@ -0,0 +1,62 @@
+# archivo: consultas/indices_concurrentes.py
+"""
+Operaciones de migración para crear y quitar índices sin bloquear las
+escrituras de tablas grandes (consultas_busqueda, consultas_resultado).
+
+En PostgreSQL son CREATE/DROP INDEX CONCURRENTLY, que no pueden correr
+dentro de una transacción: la migración que las use debe tener
+atomic = False. En las demás bases (SQLite en desarrollo y pruebas) hacen
+lo mismo que AddIndex y RemoveIndex.
+
+Si un CREATE INDEX CONCURRENTLY falla a mitad, PostgreSQL deja el índice
+marcado como inválido; al volver a correr la migración se borra y se crea
+de nuevo en lugar de fallar porque ya existe.
+"""
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db.migrations.operations import AddIndex, RemoveIndex
+
+
+def _es_postgres(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+def borrar_indice_invalido(schema_editor, nombre):
+    """Borra el índice `nombre` si quedó inválido por un CREATE INDEX CONCURRENTLY interrumpido."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+            'WHERE c.relname = %s',
+            [nombre],
+        )
+        fila = cursor.fetchone()
+    if fila and fila[0]:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(nombre)}')
+
+
+class CrearIndiceConcurrente(AddIndexConcurrently):
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _es_postgres(schema_editor):
+            return AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+        borrar_indice_invalido(schema_editor, self.index.name)
+        return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not _es_postgres(schema_editor):
+            return AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+        return super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class QuitarIndiceConcurrente(RemoveIndexConcurrently):
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _es_postgres(schema_editor):
+            return RemoveIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+        return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not _es_postgres(schema_editor):
+            return RemoveIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+        borrar_indice_invalido(schema_editor, self.name)
+        return super().database_backwards(app_label, schema_editor, from_state, to_state)
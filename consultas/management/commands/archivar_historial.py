@@ -0,0 +1,51 @@
+# archivo: consultas/management/commands/archivar_historial.py
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from consultas.archivo import archivar_mes, meses_por_archivar
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta a Parquet (en el almacenamiento por defecto) las búsquedas y "
+        "resultados de los meses más viejos que la retención y los borra de la "
+        "base. Pensado para correr una vez al mes (cron). Si se interrumpe, "
+        "volver a correrlo retoma donde quedó."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=None,
+                            help=f'Meses completos que se conservan en la base (por defecto {settings.ARCHIVO_HISTORIAL_MESES})')
+        parser.add_argument('--lote', type=int, default=5000, help='Búsquedas leídas y borradas por bloque')
+        parser.add_argument('--simular', action='store_true', help='Solo muestra los meses que se archivarían')
+
+    def handle(self, *args, **options):
+        if options['meses'] is not None and options['meses'] < 1:
+            raise CommandError("--meses debe ser al menos 1")
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise CommandError("El archivo del historial necesita pyarrow (pip install pyarrow)")
+
+        meses = meses_por_archivar(options['meses'])
+        if not meses:
+            self.stdout.write("No hay meses por archivar.")
+            return
+        if options['simular']:
+            self.stdout.write("Se archivarían: " + ', '.join(f'{mes:%Y-%m}' for mes in meses))
+            return
+
+        for mes in meses:
+            inicio = time.perf_counter()
+            archivo = archivar_mes(mes, lote=options['lote'])
+            if archivo is None:
+                continue
+            tamano = sum(default_storage.size(ruta) for ruta in (archivo.ruta_busquedas, archivo.ruta_resultados))
+            self.stdout.write(
+                f"{mes:%Y-%m}: {archivo.busquedas:,} búsquedas y {archivo.resultados:,} resultados -> "
+                f"{tamano / 1024:,.0f} KB en {time.perf_counter() - inicio:.1f}s"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Meses archivados: {len(meses)}"))
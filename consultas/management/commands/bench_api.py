@@ -0,0 +1,50 @@
+# archivo: consultas/management/commands/bench_api.py
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from consultas import services
+from consultas.benchmark import cronometrar, p50_p95
+from consultas.stub_api import StubAPIServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el cliente del API con y sin pool de conexiones contra un "
+        "servidor local que imita ConsultaListasPeps. Reporta peticiones/s y p95."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=500)
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--latencia-ms', type=float, default=2.0, help='Latencia simulada del servidor')
+        parser.add_argument('--resultados', type=int, default=3, help='Registros por respuesta')
+
+    def handle(self, *args, **options):
+        total = options['peticiones']
+        hilos = options['hilos']
+
+        with StubAPIServer(latencia=options['latencia_ms'] / 1000, resultados_por_consulta=options['resultados']) as stub:
+            with override_settings(API_BASE_URL=stub.base_url, API_TOKEN='bench', API_POOL_MAXSIZE=hilos):
+                services.cerrar_sesion()
+
+                def sin_pool(i):
+                    # Comportamiento anterior: una conexión nueva por consulta
+                    return cronometrar(lambda: requests.get(f'{stub.base_url}PepsExactaID/bench/{i}', timeout=20).json())[1]
+
+                def con_pool(i):
+                    return cronometrar(services.consultar_api_por_id, str(i))[1]
+
+                for nombre, funcion in (('sin pool', sin_pool), ('con pool', con_pool)):
+                    # Calentamiento para abrir las conexiones del pool
+                    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+                        list(ejecutor.map(funcion, range(hilos)))
+
+                    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+                        latencias, duracion = cronometrar(lambda: list(ejecutor.map(funcion, range(total))))
+
+                    self.stdout.write(f"{nombre:>9}: {total / duracion:8.1f} pet/s | {p50_p95(latencias)}")
+
+                services.cerrar_sesion()
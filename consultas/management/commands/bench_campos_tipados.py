@@ -0,0 +1,70 @@
+# archivo: consultas/management/commands/bench_campos_tipados.py
+import random
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from consultas.benchmark import cronometrar
+from consultas.entidades import interpretar_estado, interpretar_fecha_update
+from consultas.models import EntidadLista
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la interpretación de Fecha_Update y Estado a escala de lote (cada "
+        "registro por separado contra los intérpretes con memoria) y, si hay "
+        "entidades guardadas, el filtro \"ingresaron en los últimos N días\" con "
+        "la columna tipada contra leer y revisar los textos en Python."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--registros', type=int, default=500_000, help='Registros del API interpretados')
+        parser.add_argument('--distintos', type=int, default=3000, help='Estados distintos en la muestra')
+        parser.add_argument('--dias', type=int, default=90, help='Ventana del filtro de ingreso reciente')
+
+    def handle(self, *args, **options):
+        rng = random.Random(5)
+        estados = [f'INGRESA LISTA: {date(2016, 8, 1) + timedelta(days=i):%Y%m%d}' for i in range(options['distintos'])]
+        fechas = [f'/Date({1470009600000 + i * 86_400_000}-0500)/' for i in range(options['distintos'] // 10 or 1)]
+        muestra = [(rng.choice(fechas), rng.choice(estados)) for _ in range(options['registros'])]
+
+        # Cada registro por separado, sin memoria
+        fecha_sin_memoria, estado_sin_memoria = interpretar_fecha_update.__wrapped__, interpretar_estado.__wrapped__
+        esperado, anterior = cronometrar(lambda: [(fecha_sin_memoria(f), estado_sin_memoria(e)) for f, e in muestra])
+
+        interpretar_fecha_update.cache_clear()
+        interpretar_estado.cache_clear()
+        obtenido, nuevo = cronometrar(lambda: [(interpretar_fecha_update(f), interpretar_estado(e)) for f, e in muestra])
+
+        if obtenido != esperado:
+            self.stderr.write(self.style.ERROR("¡Las interpretaciones no coinciden!"))
+            return
+        registros = options['registros']
+        self.stdout.write(f"por registro: {anterior:.3f}s ({registros / anterior:,.0f} registros/s)")
+        self.stdout.write(f"con memoria:  {nuevo:.3f}s ({registros / nuevo:,.0f} registros/s)")
+        self.stdout.write(self.style.SUCCESS(f"{anterior / nuevo:.1f}x más rápido"))
+
+        if EntidadLista.objects.exists():
+            self._comparar_filtro(options['dias'])
+
+    def _comparar_filtro(self, dias):
+        desde = timezone.localdate() - timedelta(days=dias)
+
+        def en_python():
+            conteo = 0
+            for estado in EntidadLista.objects.values_list('estado', flat=True).iterator(chunk_size=5000):
+                movimiento, fecha = interpretar_estado.__wrapped__(estado)
+                conteo += movimiento == EntidadLista.INGRESO and fecha is not None and fecha >= desde
+            return conteo
+
+        por_python, python = cronometrar(en_python)
+        por_sql, sql = cronometrar(EntidadLista.objects.filter(
+            estado_movimiento=EntidadLista.INGRESO, estado_fecha__gte=desde).count)
+
+        total = EntidadLista.objects.count()
+        self.stdout.write(f"\nEntidades que ingresaron en los últimos {dias} días ({total:,} entidades):")
+        self.stdout.write(f"  leyendo estado en Python:  {python * 1000:9.1f} ms ({por_python:,})")
+        self.stdout.write(f"  columnas tipadas en SQL:   {sql * 1000:9.1f} ms ({por_sql:,})")
+        if por_python != por_sql:
+            self.stderr.write(self.style.WARNING("Los conteos no coinciden: correr tipar_entidades"))
@@ -0,0 +1,59 @@
+# archivo: consultas/management/commands/bench_clasificacion.py
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from consultas.benchmark import cronometrar
+from consultas.clasificacion import Clasificador, cargar_reglas
+
+
+def clasificacion_anterior(tipo_lista):
+    # Implementación previa (listas recreadas y recorridas en cada llamada), solo para comparar
+    if not tipo_lista:
+        return 'No Clasificado'
+    tipo_lista_upper = tipo_lista.upper()
+    yellow_lists = [
+        "PARADISE PAPERS", "PANAMA PAPERS", "BAHAMAS LEAKS",
+        "BOLETIN PANAMA PAPERS", "OFFSHORE LEAKS"
+    ]
+    if tipo_lista_upper in yellow_lists:
+        return "Amarillo"
+    pep_keywords = [
+        'PEP', 'GOBIERNO', 'CONSEJO', 'CORTE', 'EMBAJADAS', 'MINISTERIO',
+        'PRESIDENCIA', 'SENADO', 'CAMARA', 'ASAMBLEA', 'ALCALDIAS',
+        'CONCEJOS', 'NOTARIAS', 'SIGEP', 'ELECTORAL', 'JUDICATURA',
+        'CANDIDATOS', 'PARTIDOS'
+    ]
+    if any(keyword in tipo_lista_upper for keyword in pep_keywords):
+        return "PEP's"
+    return "Rojo"
+
+
+class Command(BaseCommand):
+    help = "Compara la clasificación anterior con el clasificador compilado sobre N tipos de lista."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=1_000_000)
+        parser.add_argument('--distintos', type=int, default=300, help='Tipos de lista distintos en la muestra')
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+        base = ['OFAC', 'ONU', 'INTERPOL', 'PANAMA PAPERS', 'PEPS COLOMBIA', 'SENADO DE LA REPUBLICA',
+                'MINISTERIO DE HACIENDA', 'BOLETIN PROCURADURIA', 'OFFSHORE LEAKS', 'CONSEJO DE ESTADO']
+        tipos = [f'{rng.choice(base)} {i}' if i >= len(base) else base[i] for i in range(options['distintos'])]
+        muestra = [rng.choice(tipos) for _ in range(options['filas'])]
+
+        esperado, anterior = cronometrar(lambda: [clasificacion_anterior(t) for t in muestra])
+
+        # Clasificador nuevo, sin memoria previa
+        clasificador = Clasificador(cargar_reglas(settings.CLASIFICACION_REGLAS))
+        obtenido, nuevo = cronometrar(clasificador.clasificar_lote, muestra)
+
+        if obtenido != esperado:
+            self.stderr.write(self.style.ERROR("¡Las clasificaciones no coinciden!"))
+            return
+        filas = options['filas']
+        self.stdout.write(f"anterior:  {anterior:.3f}s ({filas / anterior:,.0f} filas/s)")
+        self.stdout.write(f"compilado: {nuevo:.3f}s ({filas / nuevo:,.0f} filas/s)")
+        self.stdout.write(self.style.SUCCESS(f"{anterior / nuevo:.1f}x más rápido"))
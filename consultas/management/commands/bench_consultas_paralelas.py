@@ -0,0 +1,75 @@
+# archivo: consultas/management/commands/bench_consultas_paralelas.py
+import random
+import threading
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from consultas import services
+from consultas.benchmark import cronometrar, p50_p95, tiempos
+from consultas.consulta_paralela import consultar_criterios, consultar_lote, endpoints_para, fusionar_resultados
+from consultas.stub_api import StubAPIServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la revisión completa (ID y nombre por tres endpoints) en serie y en "
+        "paralelo, y un lote de consultas con distinta concurrencia, contra un "
+        "servidor local con latencia inyectada por endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--busquedas', type=int, default=30)
+        parser.add_argument('--lote', type=int, default=200, help='Criterios del lote')
+        parser.add_argument('--latencia-ms', type=float, default=150.0, help='Latencia media por petición')
+        parser.add_argument('--variacion-ms', type=float, default=100.0, help='Variación aleatoria (+/-) de la latencia')
+        parser.add_argument('--concurrencias', default='1,4,8,16')
+
+    def handle(self, *args, **options):
+        rng = random.Random(3)
+        rng_lock = threading.Lock()
+        media = options['latencia_ms'] / 1000
+        variacion = options['variacion_ms'] / 1000
+
+        def latencia(endpoint):
+            with rng_lock:
+                return max(0.0, media + rng.uniform(-variacion, variacion))
+
+        with StubAPIServer(latencia=latencia, resultados_por_consulta=3) as stub:
+            with override_settings(API_BASE_URL=stub.base_url, API_TOKEN='bench', API_CACHE_ACTIVO=False,
+                                   ESPEJO_LISTAS_MODO='remoto', API_REVISION_COMPLETA=True):
+                services.cerrar_sesion()
+                self._busquedas(options['busquedas'])
+                self._lotes(options['lote'], [int(c) for c in options['concurrencias'].split(',')])
+                services.cerrar_sesion()
+
+    def _busquedas(self, total):
+        def en_serie(i):
+            # Lo que costaría la revisión completa con el cliente síncrono
+            respuestas = [services._consultar(endpoint, argumentos)
+                          for endpoint, argumentos in endpoints_para(str(i), f'PERSONA {i}')]
+            return fusionar_resultados(respuestas)
+
+        def en_paralelo(i):
+            return consultar_criterios(str(i), f'PERSONA {i}')
+
+        def solo_id_y_nombre(i):
+            # Comportamiento anterior: solo PepsIDNombre
+            return services.consultar_api_por_id_y_nombre(str(i), f'PERSONA {i}')
+
+        self.stdout.write(f"Búsqueda con ID y nombre ({total} búsquedas):")
+        for nombre, funcion in (('solo PepsIDNombre', solo_id_y_nombre),
+                                ('3 endpoints en serie', en_serie),
+                                ('3 endpoints en paralelo', en_paralelo)):
+            self.stdout.write(f"  {nombre:>24}: {p50_p95(tiempos(funcion, total), decimales=1)}")
+
+    def _lotes(self, total, concurrencias):
+        criterios = [(str(i), f'PERSONA {i}' if i % 2 else '') for i in range(total)]
+        self.stdout.write(f"Lote de {total} criterios (la mitad con ID y nombre):")
+        for concurrencia in concurrencias:
+            respuestas, duracion = cronometrar(lambda: consultar_lote(criterios, concurrencia=concurrencia))
+            errores = sum(1 for r in respuestas if r is None)
+            self.stdout.write(
+                f"  concurrencia {concurrencia:>3}: {duracion:6.2f}s | "
+                f"{total / duracion:7.1f} criterios/s | {errores} errores"
+            )
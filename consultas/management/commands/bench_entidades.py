@@ -0,0 +1,155 @@
+# archivo: consultas/management/commands/bench_entidades.py
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from consultas.benchmark import cronometrar, exigir_base_de_pruebas, generar_historial_con_avance, mediana_ms
+from consultas.datos_prueba import PREFIJO, borrar_historial
+from consultas.entidades import CAMPOS_API
+from consultas.models import EntidadLista, Resultado
+from consultas.stub_api import generar_registro
+from consultas.views import guardar_busqueda
+from usuarios.models import Usuario
+
+COPIA = 'bench_resultado_copia'
+CAMPOS = [campo for campo, _ in CAMPOS_API]
+# Índices que tenía Resultado cuando guardaba el registro completo
+INDICES_COPIA = {
+    'bench_copia_busqueda_idx': ['busqueda_id', 'clasificacion'],
+    'bench_copia_tipo_lista_idx': ['tipo_lista'],
+    'bench_copia_identificacion_idx': ['identificacion'],
+}
+
+
+def tamanos(tabla):
+    """(bytes de la tabla, bytes de sus índices), o None si el motor no lo informa."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_table_size(%s), pg_indexes_size(%s)', [tabla, tabla])
+            return cursor.fetchone()
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')
+            except Exception:
+                return None
+            por_nombre = dict(cursor.fetchall())
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s", [tabla])
+            indices = sum(por_nombre.get(nombre, 0) for (nombre,) in cursor.fetchall())
+            return por_nombre.get(tabla, 0), indices
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el almacenamiento de resultados con EntidadLista contra la copia "
+        "completa del registro en cada Resultado (el esquema anterior, reconstruido "
+        "en una tabla temporal): filas, tamaño de tabla e índices, y costo de "
+        "guardar una búsqueda."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generar', type=int, default=0, help='Búsquedas sintéticas a insertar antes de medir')
+        parser.add_argument('--entidades', type=int, default=None,
+                            help='Registros distintos del historial generado (por defecto uno por cada 20 búsquedas)')
+        parser.add_argument('--busquedas', type=int, default=200, help='Búsquedas guardadas para medir la inserción')
+        parser.add_argument('--resultados', type=int, default=5, help='Resultados por búsqueda al medir la inserción')
+        parser.add_argument('--repetidos', type=float, default=0.9,
+                            help='Fracción de resultados que ya estaban guardados de búsquedas anteriores')
+        parser.add_argument('--borrar', action='store_true', help='Borra los datos sintéticos al terminar')
+        parser.add_argument('--forzar', action='store_true', help='Permite correr con DEBUG=False')
+
+    def handle(self, *args, **options):
+        exigir_base_de_pruebas(options)
+        if options['generar']:
+            generar_historial_con_avance(self.stdout, options['generar'], entidades=options['entidades'])
+        if not Resultado.objects.exists():
+            raise CommandError("No hay resultados; ejecutar con --generar N")
+
+        self._crear_copia()
+        try:
+            self._comparar_tamanos()
+            self._comparar_insercion(options)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE {COPIA}')
+
+        if options['borrar']:
+            borrar_historial()
+
+    def _crear_copia(self):
+        # El esquema anterior: cada resultado con el registro completo
+        resultado, entidad = Resultado._meta.db_table, EntidadLista._meta.db_table
+        columnas = ', '.join(f'e.{campo}' for campo in CAMPOS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {COPIA}')
+            cursor.execute(
+                f'CREATE TABLE {COPIA} AS SELECT r.id, r.busqueda_id, {columnas}, r.coincidencia_nombre, '
+                f'r.coincidencia_id, r.clasificacion FROM {resultado} r JOIN {entidad} e ON e.id = r.entidad_id'
+            )
+            for nombre, columnas_indice in INDICES_COPIA.items():
+                cursor.execute(f'CREATE INDEX {nombre} ON {COPIA} ({", ".join(columnas_indice)})')
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'ANALYZE {COPIA}, {resultado}, {entidad}')
+
+    def _comparar_tamanos(self):
+        resultados = Resultado.objects.count()
+        entidades = EntidadLista.objects.count()
+        self.stdout.write(f"\n{resultados:,} resultados que apuntan a {entidades:,} entidades "
+                          f"({resultados / max(entidades, 1):.1f} resultados por entidad)")
+        copia = tamanos(COPIA)
+        if copia is None:
+            self.stdout.write("El motor de base de datos no informa tamaños de tabla.")
+            return
+        slim = tamanos(Resultado._meta.db_table)
+        entidad = tamanos(EntidadLista._meta.db_table)
+        nuevo = (slim[0] + entidad[0], slim[1] + entidad[1])
+        self.stdout.write(f"{'':<30}{'tabla (MB)':>12}{'índices (MB)':>14}")
+        for nombre, (tabla, indices) in (('copia completa (antes)', copia), ('Resultado', slim),
+                                         ('EntidadLista', entidad), ('Resultado + EntidadLista', nuevo)):
+            self.stdout.write(f"{nombre:<30}{tabla / 2**20:>12.1f}{indices / 2**20:>14.1f}")
+        self.stdout.write(f"Reducción: tabla {1 - nuevo[0] / copia[0]:.0%}, índices {1 - nuevo[1] / copia[1]:.0%}")
+
+    def _comparar_insercion(self, options):
+        rng = random.Random(3)
+        conocidos = [
+            generar_registro(0, identificacion=e.identificacion, nombre=e.nombre_completo) | {
+                campo_api: getattr(e, campo) for campo, campo_api in CAMPOS_API
+            }
+            for e in EntidadLista.objects.filter(relacionado_con__startswith=PREFIJO)[:1000]
+        ]
+        if not conocidos:
+            raise CommandError("No hay entidades sintéticas; ejecutar con --generar N")
+        nuevo_id = iter(range(10**9, 2 * 10**9))
+
+        def respuesta():
+            return [rng.choice(conocidos) if rng.random() < options['repetidos']
+                    else generar_registro(next(nuevo_id)) for _ in range(options['resultados'])]
+
+        respuestas = [respuesta() for _ in range(options['busquedas'])]
+        usuario = Usuario.objects.filter(username__startswith=PREFIJO).first() or Usuario.objects.first()
+
+        with transaction.atomic():
+            actual = [cronometrar(guardar_busqueda, usuario, 'ID: bench_entidades', registros)[1]
+                      for registros in respuestas]
+
+            # Lo mismo con el esquema anterior: cada resultado inserta el registro completo
+            columnas = ['busqueda_id', *CAMPOS, 'coincidencia_nombre', 'coincidencia_id', 'clasificacion']
+            fila_sql = f'({", ".join(["%s"] * len(columnas))})'
+
+            def guardar_copia(registros):
+                busqueda = guardar_busqueda(usuario, 'ID: bench_entidades', [])
+                parametros = [valor for r in registros for valor in (
+                    busqueda.pk, *[r.get(campo_api) for _, campo_api in CAMPOS_API], 0, 0, 'Rojo')]
+                with connection.cursor() as cursor:
+                    # Un solo INSERT de varias filas, como el bulk_create de entonces
+                    cursor.execute(f'INSERT INTO {COPIA} ({", ".join(columnas)}) VALUES '
+                                   f'{", ".join([fila_sql] * len(registros))}', parametros)
+
+            anterior = [cronometrar(guardar_copia, registros)[1] for registros in respuestas]
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"\nGuardar una búsqueda con {options['resultados']} resultados "
+                          f"({options['repetidos']:.0%} ya conocidos), mediana de {options['busquedas']}:")
+        self.stdout.write(f"  copia completa (antes):   {mediana_ms(anterior):8.2f} ms")
+        self.stdout.write(f"  con EntidadLista:         {mediana_ms(actual):8.2f} ms")
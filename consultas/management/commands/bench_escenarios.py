@@ -0,0 +1,103 @@
+# archivo: consultas/management/commands/bench_escenarios.py
+import json
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from consultas import benchmark
+from consultas.datos_prueba import PREFIJO, borrar_historial
+from consultas.models import Busqueda
+
+
+class Command(BaseCommand):
+    help = (
+        "Escenarios de carga (búsqueda, dashboard, gestión de consultas, PDF y subida "
+        "de lotes) contra el historial sintético y un API local. Reporta peticiones/s, "
+        "p50/p95/p99 y consultas SQL por petición; guarda el resultado en JSON y lo "
+        "compara con una línea base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', choices=sorted(benchmark.ESCALAS), default='10k',
+                            help='Tamaño del historial sintético (búsquedas)')
+        parser.add_argument('--generar', action='store_true',
+                            help='Borra el historial sintético y lo vuelve a generar a la escala pedida')
+        parser.add_argument('--empresas', type=int, default=20, help='Empresas del historial generado')
+        parser.add_argument('--escenarios', nargs='+', choices=list(benchmark.ESCENARIOS),
+                            default=list(benchmark.ESCENARIOS))
+        parser.add_argument('--peticiones', type=int, default=100, help='Peticiones medidas por escenario')
+        parser.add_argument('--concurrencia', type=int, default=1, help='Clientes simultáneos')
+        parser.add_argument('--calentamiento', type=int, default=3, help='Peticiones sin medir por cliente')
+        parser.add_argument('--latencia-ms', type=float, default=50.0, help='Latencia simulada del API de listas')
+        parser.add_argument('--resultados', type=int, default=3, help='Registros por respuesta del API')
+        parser.add_argument('--filas-lote', type=int, default=1000, help='Filas del archivo de lote subido')
+        parser.add_argument('--guardar', help='Archivo JSON donde guardar el resultado (nueva línea base)')
+        parser.add_argument('--comparar', help='Archivo JSON de una corrida anterior (línea base)')
+        parser.add_argument('--tolerancia', type=float, default=0.10,
+                            help='Empeoramiento relativo aceptado en latencia y peticiones/s')
+        parser.add_argument('--fallar-si-empeora', action='store_true',
+                            help='Termina con error si algún escenario empeora contra la línea base')
+        parser.add_argument('--forzar', action='store_true', help='Permite correr con DEBUG=False')
+
+    def handle(self, *args, **options):
+        benchmark.exigir_base_de_pruebas(options)
+        if options['concurrencia'] > 1 and connection.vendor == 'sqlite':
+            self.stderr.write("Con SQLite las escrituras concurrentes se serializan; usar PostgreSQL para medir concurrencia.")
+
+        if options['generar']:
+            borrar_historial()
+            benchmark.generar_historial_con_avance(self.stdout, benchmark.ESCALAS[options['escala']],
+                                                   empresas=options['empresas'])
+        elif not Busqueda.objects.filter(empresa__nombre__startswith=PREFIJO).exists():
+            raise CommandError("No hay historial sintético; ejecutar con --generar")
+
+        try:
+            resultado = benchmark.ejecutar(
+                options['escenarios'], peticiones=options['peticiones'], concurrencia=options['concurrencia'],
+                calentamiento=options['calentamiento'], latencia_api=options['latencia_ms'] / 1000,
+                resultados_api=options['resultados'], filas_lote=options['filas_lote'],
+                progreso=lambda nombre: self.stdout.write(f"  {nombre}..."),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        resultado['configuracion'] = {
+            'fecha': timezone.now().isoformat(), 'escala': options['escala'], 'base_de_datos': connection.vendor,
+            'python': platform.python_version(),
+            **{clave: options[clave] for clave in ('peticiones', 'concurrencia', 'latencia_ms', 'resultados', 'filas_lote')},
+        }
+
+        self.stdout.write(f"Empresa con {resultado['busquedas_empresa']:,} búsquedas | "
+                          f"{options['peticiones']} peticiones x {options['concurrencia']} cliente(s) | "
+                          f"API {options['latencia_ms']:.0f} ms\n")
+        self.stdout.write(f"{'escenario':<22}{'pet/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+                          f"{'SQL/pet':>9}{'SQL máx':>9}{'errores':>9}")
+        for nombre, m in resultado['escenarios'].items():
+            self.stdout.write(f"{nombre:<22}{m['por_segundo']:>9.1f}{m['p50_ms']:>10.1f}{m['p95_ms']:>10.1f}"
+                              f"{m['p99_ms']:>10.1f}{m['sql_mediana']:>9g}{m['sql_max']:>9}{m['errores']:>9}")
+
+        if options['guardar']:
+            with open(options['guardar'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"\nResultado guardado en {options['guardar']}")
+
+        if options['comparar']:
+            self._comparar(resultado, options)
+
+    def _comparar(self, resultado, options):
+        with open(options['comparar'], encoding='utf-8') as archivo:
+            base = json.load(archivo)
+        filas = benchmark.comparar(resultado, base, options['tolerancia'])
+        self.stdout.write(f"\nContra {options['comparar']} ({base.get('configuracion', {}).get('fecha', '?')}):")
+        self.stdout.write(f"{'escenario':<22}{'métrica':<13}{'base':>10}{'actual':>10}{'cambio':>9}")
+        for nombre, metrica, antes, ahora, cambio, empeora in filas:
+            linea = f"{nombre:<22}{metrica:<13}{antes:>10.1f}{ahora:>10.1f}{cambio:>+9.0%}"
+            self.stdout.write(self.style.ERROR(linea) if empeora else linea)
+        empeorados = sorted({fila[0] for fila in filas if fila[5]})
+        if not empeorados:
+            self.stdout.write(self.style.SUCCESS("Ningún escenario empeoró"))
+        elif options['fallar_si_empeora']:
+            raise CommandError(f"Empeoraron: {', '.join(empeorados)}")
+        else:
+            self.stdout.write(self.style.WARNING(f"Empeoraron: {', '.join(empeorados)}"))
@@ -0,0 +1,104 @@
+# archivo: consultas/management/commands/bench_indices.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.utils import timezone
+
+from consultas.benchmark import analizar, exigir_base_de_pruebas, generar_historial_con_avance, mediana_ms, tiempos
+from consultas.datos_prueba import PREFIJO, borrar_historial
+from consultas.models import Busqueda, EntidadLista, Resultado
+
+# Índice simple de la FK que existía antes de 0003 y que reemplazó resultado_busqueda_clasif_idx
+INDICE_ANTERIOR = (Resultado, models.Index(fields=['busqueda'], name='bench_resultado_busqueda_tmp'))
+TABLAS = (Busqueda, Resultado, EntidadLista)
+
+
+def consultas_frecuentes():
+    """Las consultas de las vistas que más se usan, con parámetros tomados de los datos generados."""
+    busqueda = (Busqueda.objects.filter(usuario__username__startswith=PREFIJO, encontro_resultados=True)
+                .order_by('pk').first())
+    if busqueda is None:
+        raise CommandError("No hay datos generados; ejecutar con --generar N")
+    identificacion = (EntidadLista.objects.filter(relacionado_con__startswith=PREFIJO, identificacion__isnull=False)
+                      .values_list('identificacion', flat=True).first())
+    hace_30_dias = timezone.now() - timedelta(days=30)
+
+    return {
+        'historial del usuario': lambda: Busqueda.objects.filter(
+            usuario_id=busqueda.usuario_id).order_by('-fecha_busqueda')[:25],
+        'consultas de la empresa': lambda: Busqueda.objects.filter(
+            empresa_id=busqueda.empresa_id).order_by('-fecha_busqueda')[:25],
+        'empresa con resultados': lambda: Busqueda.objects.filter(
+            empresa_id=busqueda.empresa_id, encontro_resultados=True).order_by('-fecha_busqueda')[:25],
+        'empresa últimos 30 días': lambda: Busqueda.objects.filter(
+            empresa_id=busqueda.empresa_id, fecha_busqueda__gte=hace_30_dias).values('pk'),
+        'reporte del mes (admin)': lambda: Busqueda.objects.filter(
+            fecha_busqueda__gte=hace_30_dias).values('pk'),
+        'resultados rojos de una búsqueda': lambda: Resultado.objects.filter(
+            busqueda_id=busqueda.pk, clasificacion='Rojo'),
+        'resultados por tipo de lista': lambda: Resultado.objects.filter(
+            entidad__tipo_lista='PANAMA PAPERS').values('pk')[:100],
+        'resultados por identificación': lambda: Resultado.objects.filter(
+            entidad__identificacion=identificacion)[:25],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide las consultas frecuentes sobre Busqueda y Resultado sin y con los "
+        "índices del modelo, mostrando tiempos y planes de ejecución. Quita y vuelve "
+        "a crear los índices, así que solo debe correrse en una base de desarrollo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generar', type=int, default=0, help='Búsquedas sintéticas a insertar antes de medir')
+        parser.add_argument('--resultados-por-busqueda', type=int, default=3)
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--planes', action='store_true', help='Imprime el plan completo de cada consulta')
+        parser.add_argument('--borrar', action='store_true', help='Borra los datos sintéticos al terminar')
+        parser.add_argument('--forzar', action='store_true', help='Permite correr con DEBUG=False')
+
+    def handle(self, *args, **options):
+        exigir_base_de_pruebas(options, 'modifica índices y datos')
+        if options['generar']:
+            generar_historial_con_avance(self.stdout, options['generar'], options['resultados_por_busqueda'])
+        analizar(*TABLAS)
+
+        consultas = consultas_frecuentes()
+        indices = [(modelo, indice) for modelo in TABLAS for indice in modelo._meta.indexes]
+
+        with connection.schema_editor() as editor:
+            for modelo, indice in indices:
+                editor.remove_index(modelo, indice)
+            editor.add_index(*INDICE_ANTERIOR)
+        # Estadísticas frescas para que el planificador vea los índices recién quitados y creados
+        analizar(*TABLAS)
+        try:
+            antes = self._medir(consultas, options)
+        finally:
+            with connection.schema_editor() as editor:
+                editor.remove_index(*INDICE_ANTERIOR)
+                for modelo, indice in indices:
+                    editor.add_index(modelo, indice)
+        analizar(*TABLAS)
+        despues = self._medir(consultas, options)
+
+        self.stdout.write(f"\n{'consulta':<36}{'antes (ms)':>12}{'después (ms)':>14}")
+        for nombre in consultas:
+            self.stdout.write(f"{nombre:<36}{antes[nombre][0]:>12.2f}{despues[nombre][0]:>14.2f}")
+        for nombre in consultas:
+            self.stdout.write(f"\n== {nombre}\n-- antes:\n{antes[nombre][1]}\n-- después:\n{despues[nombre][1]}")
+
+        if options['borrar']:
+            borrar_historial()
+
+    def _medir(self, consultas, options):
+        medidas = {}
+        for nombre, construir in consultas.items():
+            duraciones = tiempos(lambda i: list(construir()), options['repeticiones'])
+            plan = construir().explain(analyze=True) if connection.vendor == 'postgresql' else construir().explain()
+            if not options['planes']:
+                plan = plan.splitlines()[0]
+            medidas[nombre] = (mediana_ms(duraciones), plan)
+        return medidas
@@ -0,0 +1,76 @@
+# archivo: consultas/management/commands/bench_paginacion.py
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from consultas.benchmark import cronometrar, exigir_base_de_pruebas, generar_historial_con_avance, mediana_ms, tiempos
+from consultas.datos_prueba import PREFIJO, borrar_historial
+from consultas.models import Busqueda
+from consultas.paginacion import contar, cursor_de, paginar_por_cursor
+from consultas.views import BUSQUEDAS_POR_PAGINA, ORDEN_BUSQUEDAS
+
+PROFUNDIDADES = (0.0, 0.01, 0.1, 0.5, 0.99)  # Fracción del listado donde empieza la página
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el listado de consultas de la empresa con más búsquedas a distintas "
+        "profundidades: página por OFFSET (Paginator) contra página por cursor, "
+        "COUNT(*) contra el conteo de paginacion.contar y el filtro por término."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generar', type=int, default=0, help='Búsquedas sintéticas a insertar antes de medir')
+        parser.add_argument('--empresas', type=int, default=1, help='Empresas entre las que se reparten las búsquedas')
+        parser.add_argument('--repeticiones', type=int, default=10)
+        parser.add_argument('--termino', default='123', help='Texto para el filtro por término (icontains)')
+        parser.add_argument('--borrar', action='store_true', help='Borra los datos sintéticos al terminar')
+        parser.add_argument('--forzar', action='store_true', help='Permite correr con DEBUG=False')
+
+    def handle(self, *args, **options):
+        exigir_base_de_pruebas(options)
+        if options['generar']:
+            generar_historial_con_avance(self.stdout, options['generar'], resultados_por_busqueda=1,
+                                         empresas=options['empresas'])
+
+        mayor = (Busqueda.objects.filter(empresa__nombre__startswith=PREFIJO).values('empresa')
+                 .annotate(total=Count('id')).order_by('-total').first())
+        if mayor is None:
+            raise CommandError("No hay datos generados; ejecutar con --generar N")
+        base = Busqueda.objects.filter(empresa_id=mayor['empresa'])
+        total = mayor['total']
+        self.stdout.write(f"Empresa con {total:,} búsquedas, {BUSQUEDAS_POR_PAGINA} por página\n")
+
+        self.stdout.write(f"{'página':>10}{'OFFSET (ms)':>14}{'cursor (ms)':>14}")
+        for fraccion in PROFUNDIDADES:
+            desde = min(int(total * fraccion), max(total - BUSQUEDAS_POR_PAGINA, 0))
+            parametros = {}
+            if desde:
+                # El cursor es la última fila de la página anterior, como lo dejaría el enlace "Siguiente"
+                anterior = base.order_by(*ORDEN_BUSQUEDAS).only(*[c.lstrip('-') for c in ORDEN_BUSQUEDAS])[desde - 1]
+                parametros = {'despues': cursor_de(anterior, ORDEN_BUSQUEDAS)}
+            offset = self._medir(lambda: list(base.order_by(*ORDEN_BUSQUEDAS)[desde:desde + BUSQUEDAS_POR_PAGINA]),
+                                 options)
+            cursor = self._medir(lambda: paginar_por_cursor(base, parametros, ORDEN_BUSQUEDAS, BUSQUEDAS_POR_PAGINA),
+                                 options)
+            self.stdout.write(f"{desde // BUSQUEDAS_POR_PAGINA + 1:>10,}{offset:>14.2f}{cursor:>14.2f}")
+
+        filtrada = base.filter(termino_buscado__icontains=options['termino'])
+        self.stdout.write("")
+        self.stdout.write(f"COUNT(*) de la empresa:            {self._medir(base.count, options):>10.2f} ms")
+        cache.clear()
+        (valor, exacto), duracion = cronometrar(contar, base)
+        self.stdout.write(f"contar() sin caché:                {duracion * 1000:>10.2f} ms "
+                          f"({'exacto' if exacto else 'aproximado'}: {valor:,})")
+        self.stdout.write(f"contar() en caché:                 {self._medir(lambda: contar(base), options):>10.2f} ms")
+        self.stdout.write(f"primera página filtrada por término: "
+                          f"{self._medir(lambda: paginar_por_cursor(filtrada, {}, ORDEN_BUSQUEDAS), options):>8.2f} ms")
+        if connection.vendor == 'postgresql':
+            self.stdout.write(filtrada.order_by(*ORDEN_BUSQUEDAS)[:BUSQUEDAS_POR_PAGINA].explain(analyze=True))
+
+        if options['borrar']:
+            borrar_historial()
+
+    def _medir(self, funcion, options):
+        return mediana_ms(tiempos(lambda i: funcion(), options['repeticiones']))
@@ -0,0 +1,64 @@
+# archivo: consultas/management/commands/bench_pdf.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from consultas import reportes_pdf
+from consultas.benchmark import cronometrar, mediana_ms, tiempos
+from consultas.models import Busqueda
+from consultas.stub_api import generar_registro
+from consultas.views import guardar_busqueda
+from usuarios.models import Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la generación del PDF de una búsqueda: en frío (sin fuentes ni estilos "
+        "cargados), en caliente (recursos compartidos del proceso) y servido desde "
+        "el almacenamiento."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--busqueda', type=int, help='Id de una búsqueda existente')
+        parser.add_argument('--resultados', type=int, default=200,
+                            help='Si no se indica --busqueda, crea una temporal con estos resultados')
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['busqueda']:
+            self._medir(Busqueda.objects.get(pk=options['busqueda']), options['repeticiones'])
+            return
+
+        # Búsqueda temporal: todo se deshace al terminar
+        with transaction.atomic():
+            usuario = Usuario.objects.filter(is_active=True).first()
+            if usuario is None:
+                raise CommandError("Se necesita al menos un usuario para crear la búsqueda temporal")
+            registros = [generar_registro(i) for i in range(options['resultados'])]
+            busqueda = guardar_busqueda(usuario, 'ID: bench_pdf', registros)
+            try:
+                self._medir(busqueda, options['repeticiones'])
+            finally:
+                reportes_pdf.invalidar_pdfs([busqueda.pk])
+                transaction.set_rollback(True)
+
+    def _medir(self, busqueda, repeticiones):
+        reportes_pdf.invalidar_pdfs([busqueda.pk])
+
+        frio = []
+        for _ in range(repeticiones):
+            reportes_pdf.olvidar_recursos()
+            frio.append(cronometrar(reportes_pdf.renderizar_pdf, busqueda)[1])
+
+        caliente = tiempos(lambda i: reportes_pdf.renderizar_pdf(busqueda), repeticiones)
+
+        def leer_guardado(i):
+            with reportes_pdf.abrir_pdf(busqueda) as archivo:
+                return len(archivo.read())
+
+        reportes_pdf.guardar_pdf(busqueda)
+        almacenado = tiempos(leer_guardado, repeticiones)
+        tamano = leer_guardado(0)
+
+        self.stdout.write(f"Búsqueda {busqueda.pk}: {busqueda.resultados.count()} resultados, PDF de {tamano / 1024:.0f} KB")
+        for nombre, duraciones in (('en frío', frio), ('en caliente', caliente), ('desde almacenamiento', almacenado)):
+            self.stdout.write(f"  {nombre:<22}{mediana_ms(duraciones):>10.1f} ms")
@@ -0,0 +1,28 @@
+# archivo: consultas/management/commands/recalcular_metricas.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from consultas.metricas import reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye la tabla de métricas diarias de los dashboards a partir de "
+        "las búsquedas y resultados guardados. Usar después de desplegar la "
+        "tabla por primera vez o tras corregir datos históricos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Solo recalcular desde este día (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError("--desde debe tener el formato AAAA-MM-DD")
+
+        filas = reconstruir(desde)
+        self.stdout.write(self.style.SUCCESS(f"Métricas recalculadas: {filas} filas."))
@@ -0,0 +1,62 @@
+# archivo: consultas/management/commands/reclasificar_resultados.py
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from consultas.clasificacion import obtener_clasificador
+from consultas.metricas import reconstruir
+from consultas.reportes_pdf import invalidar_pdfs
+from consultas.models import Resultado
+
+
+class Command(BaseCommand):
+    help = (
+        "Vuelve a calcular la clasificación de los resultados guardados con las "
+        "reglas vigentes. Recorre la tabla por bloques de id y solo actualiza las "
+        "filas cuya clasificación cambió."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bloque', type=int, default=5000, help='Filas leídas por consulta')
+        parser.add_argument('--dry-run', action='store_true', help='Solo cuenta los cambios, no guarda')
+
+    def handle(self, *args, **options):
+        clasificador = obtener_clasificador()
+        ultimo_id = 0
+        revisados = cambiados = 0
+
+        while True:
+            filas = list(
+                Resultado.objects.filter(pk__gt=ultimo_id).order_by('pk')
+                .values_list('pk', 'busqueda_id', 'entidad__tipo_lista', 'clasificacion')[:options['bloque']]
+            )
+            if not filas:
+                break
+            ultimo_id = filas[-1][0]
+            revisados += len(filas)
+
+            # Un UPDATE por clasificación nueva en lugar de uno por fila
+            por_clasificacion = defaultdict(list)
+            busquedas_afectadas = set()
+            nuevas = clasificador.clasificar_lote([tipo_lista for _, _, tipo_lista, _ in filas])
+            for (pk, busqueda_id, _, actual), nueva in zip(filas, nuevas):
+                if nueva != actual:
+                    por_clasificacion[nueva].append(pk)
+                    busquedas_afectadas.add(busqueda_id)
+
+            if not options['dry_run']:
+                with transaction.atomic():
+                    for clasificacion, ids in por_clasificacion.items():
+                        Resultado.objects.filter(pk__in=ids).update(clasificacion=clasificacion)
+                # Los PDF guardados muestran la clasificación anterior; se borran bloque a bloque,
+                # ya confirmado, para no acumular en memoria las búsquedas de toda la tabla
+                invalidar_pdfs(busquedas_afectadas)
+            cambiados += sum(len(ids) for ids in por_clasificacion.values())
+
+        if cambiados and not options['dry_run']:
+            # Los conteos de los dashboards muestran la clasificación anterior
+            reconstruir()
+
+        accion = 'cambiarían' if options['dry_run'] else 'se actualizaron'
+        self.stdout.write(self.style.SUCCESS(f"{revisados} resultados revisados, {cambiados} {accion}."))
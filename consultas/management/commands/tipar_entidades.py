@@ -0,0 +1,62 @@
+# archivo: consultas/management/commands/tipar_entidades.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from consultas.entidades import interpretar_estado, interpretar_fecha_update, tipar_entidades
+from consultas.models import EntidadLista
+
+CAMPOS_TIPADOS = ['fecha_actualizacion', 'estado_movimiento', 'estado_fecha']
+
+
+class Command(BaseCommand):
+    help = (
+        "Llena fecha_actualizacion, estado_movimiento y estado_fecha de las "
+        "entidades guardadas antes de que existieran esas columnas, interpretando "
+        "fecha_update y estado. Recorre la tabla por bloques de id; si se "
+        "interrumpe, --desde-id retoma donde quedó."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Entidades leídas y actualizadas por bloque')
+        parser.add_argument('--desde-id', type=int, default=0, help='Retomar a partir de este id')
+        parser.add_argument('--todas', action='store_true',
+                            help='Volver a interpretar también las que ya tienen columnas tipadas')
+
+    def handle(self, *args, **options):
+        entidades = EntidadLista.objects.filter(Q(fecha_update__isnull=False) | Q(estado__isnull=False))
+        if not options['todas']:
+            entidades = entidades.filter(fecha_actualizacion__isnull=True, estado_movimiento='')
+
+        ops = connection.ops
+        sql = (f'UPDATE {EntidadLista._meta.db_table} SET fecha_actualizacion = %s, '
+               f'estado_movimiento = %s, estado_fecha = %s WHERE id = %s')
+        inicio = time.perf_counter()
+        ultimo_id, revisadas, actualizadas = options['desde_id'], 0, 0
+        while bloque := list(entidades.filter(pk__gt=ultimo_id).order_by('pk')
+                             .only('pk', 'fecha_update', 'estado', *CAMPOS_TIPADOS)[:options['lote']]):
+            antes = [tuple(getattr(entidad, campo) for campo in CAMPOS_TIPADOS) for entidad in bloque]
+            tipar_entidades(bloque)
+            filas = [
+                (ops.adapt_datetimefield_value(entidad.fecha_actualizacion), entidad.estado_movimiento,
+                 ops.adapt_datefield_value(entidad.estado_fecha), entidad.pk)
+                for entidad, previo in zip(bloque, antes)
+                if tuple(getattr(entidad, campo) for campo in CAMPOS_TIPADOS) != previo
+            ]
+            # Un UPDATE por id con executemany: bulk_update arma en Python un CASE por fila
+            # y campo, que con estas columnas cuesta más que la propia escritura
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, filas)
+            revisadas += len(bloque)
+            actualizadas += len(filas)
+            ultimo_id = bloque[-1].pk
+            self.stdout.write(f"  {revisadas:,} revisadas, {actualizadas:,} actualizadas (último id {ultimo_id})")
+
+        segundos = time.perf_counter() - inicio
+        fechas, estados = interpretar_fecha_update.cache_info(), interpretar_estado.cache_info()
+        self.stdout.write(self.style.SUCCESS(
+            f"{actualizadas:,} de {revisadas:,} entidades actualizadas en {segundos:.1f}s "
+            f"({fechas.misses:,} fechas y {estados.misses:,} estados distintos interpretados)"
+        ))
@@ -0,0 +1,165 @@
+# archivo: consultas/metricas.py
+"""
+Mantenimiento y lectura de la tabla MetricaDiaria.
+
+`registrar_busqueda` suma una búsqueda recién guardada al día correspondiente
+con un número fijo de consultas (leer las claves del día, un UPDATE por lotes
+con F() y un INSERT por lotes para las nuevas), sin importar cuántos
+resultados traiga. `reconstruir` vuelve a calcular todo desde Busqueda y
+Resultado; es lo que usa el comando recalcular_metricas.
+"""
+
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .archivo import primer_dia_sin_archivar
+from .models import Busqueda, MetricaDiaria, Resultado
+
+
+def registrar_busqueda(busqueda, resultados):
+    """Incrementa los conteos del día para una búsqueda y sus resultados (ya guardados)."""
+    base = {
+        'dia': timezone.localdate(busqueda.fecha_busqueda),
+        'empresa_id': busqueda.empresa_id,
+        'usuario_id': busqueda.usuario_id,
+    }
+    incrementos = Counter({(MetricaDiaria.CONSULTAS, '', ''): 1})
+    if busqueda.genero_alerta:
+        incrementos[(MetricaDiaria.ALERTAS, '', '')] += 1
+    for resultado in resultados:
+        incrementos[(MetricaDiaria.RESULTADOS, resultado.clasificacion, resultado.tipo_lista or '')] += 1
+
+    with transaction.atomic():
+        existentes = {}
+        # FOR UPDATE: si reconstruir() está reemplazando las filas, se espera a que termine
+        # y se suman a las nuevas (si no, el UPDATE caería sobre filas ya borradas)
+        for metrica in (MetricaDiaria.objects.select_for_update().filter(**base)
+                        .only('pk', 'metrica', 'clasificacion', 'tipo_lista')):
+            existentes.setdefault((metrica.metrica, metrica.clasificacion, metrica.tipo_lista), metrica)
+
+        actualizar, crear = [], []
+        for clave, cantidad in incrementos.items():
+            if clave in existentes:
+                metrica = existentes[clave]
+                metrica.conteo = F('conteo') + cantidad
+                actualizar.append(metrica)
+            else:
+                crear.append(MetricaDiaria(
+                    metrica=clave[0], clasificacion=clave[1], tipo_lista=clave[2], conteo=cantidad, **base,
+                ))
+        if actualizar:
+            MetricaDiaria.objects.bulk_update(actualizar, ['conteo'])
+        if crear:
+            MetricaDiaria.objects.bulk_create(crear)
+
+
+def reconstruir(desde=None):
+    """
+    Borra y recalcula las métricas (todas, o a partir del día `desde`).
+    Devuelve cuántas filas de métricas quedaron. Los meses archivados ya no
+    tienen búsquedas en la base: sus métricas se conservan como están.
+
+    El cálculo y el reemplazo van en la misma transacción, con la tabla
+    bloqueada para escritura (en PostgreSQL): una búsqueda que se guarda a la
+    vez, o ya está en el cálculo, o suma sus conteos a las filas nuevas
+    cuando termina la reconstrucción (registrar_busqueda espera el bloqueo).
+    Los dashboards siguen leyendo mientras tanto.
+    """
+    archivado_hasta = primer_dia_sin_archivar()
+    if archivado_hasta is not None and (desde is None or desde < archivado_hasta):
+        desde = archivado_hasta
+
+    with transaction.atomic():
+        _bloquear_metricas()
+        filas = _calcular_metricas(desde)
+        existentes = MetricaDiaria.objects.all()
+        if desde is not None:
+            existentes = existentes.filter(dia__gte=desde)
+        existentes.delete()
+        MetricaDiaria.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def _bloquear_metricas():
+    # EXCLUSIVE deja leer pero no escribir ni tomar filas con FOR UPDATE. En SQLite
+    # las escrituras ya van de a una
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {MetricaDiaria._meta.db_table} IN EXCLUSIVE MODE')
+
+
+def _calcular_metricas(desde):
+    """Filas de MetricaDiaria (sin guardar) calculadas desde Busqueda y Resultado."""
+    busquedas = Busqueda.objects.all()
+    resultados = Resultado.objects.all()
+    if desde is not None:
+        inicio = timezone.make_aware(datetime.combine(desde, time.min))
+        busquedas = busquedas.filter(fecha_busqueda__gte=inicio)
+        resultados = resultados.filter(busqueda__fecha_busqueda__gte=inicio)
+
+    por_busqueda = (busquedas
+                    .annotate(d=TruncDate('fecha_busqueda'))
+                    .values('d', 'empresa_id', 'usuario_id')
+                    .annotate(consultas=Count('id'), alertas=Count('id', filter=Q(genero_alerta=True)))
+                    .order_by())
+    por_resultado = (resultados
+                     .annotate(d=TruncDate('busqueda__fecha_busqueda'))
+                     .values('d', 'busqueda__empresa_id', 'busqueda__usuario_id', 'clasificacion', 'entidad__tipo_lista')
+                     .annotate(total=Count('id'))
+                     .order_by())
+
+    filas = []
+    for fila in por_busqueda:
+        base = {'dia': fila['d'], 'empresa_id': fila['empresa_id'], 'usuario_id': fila['usuario_id']}
+        filas.append(MetricaDiaria(metrica=MetricaDiaria.CONSULTAS, conteo=fila['consultas'], **base))
+        if fila['alertas']:
+            filas.append(MetricaDiaria(metrica=MetricaDiaria.ALERTAS, conteo=fila['alertas'], **base))
+    for fila in por_resultado:
+        filas.append(MetricaDiaria(
+            dia=fila['d'], empresa_id=fila['busqueda__empresa_id'], usuario_id=fila['busqueda__usuario_id'],
+            metrica=MetricaDiaria.RESULTADOS, clasificacion=fila['clasificacion'], tipo_lista=fila['entidad__tipo_lista'] or '',
+            conteo=fila['total'],
+        ))
+    return filas
+
+
+# --- Lecturas para los dashboards ---
+
+def resumen_periodo(metricas, hoy):
+    """
+    KPIs de un queryset de MetricaDiaria ya filtrado: consultas y resultados por
+    clasificación en todo el periodo y solo del día `hoy`. Una sola consulta.
+    """
+    def suma(**filtro):
+        return Sum('conteo', filter=Q(**filtro), default=0)
+
+    return metricas.aggregate(
+        consultas=suma(metrica=MetricaDiaria.CONSULTAS),
+        consultas_hoy=suma(metrica=MetricaDiaria.CONSULTAS, dia=hoy),
+        rojo=suma(metrica=MetricaDiaria.RESULTADOS, clasificacion='Rojo'),
+        amarillo=suma(metrica=MetricaDiaria.RESULTADOS, clasificacion='Amarillo'),
+        peps=suma(metrica=MetricaDiaria.RESULTADOS, clasificacion="PEP's"),
+        rojo_hoy=suma(metrica=MetricaDiaria.RESULTADOS, clasificacion='Rojo', dia=hoy),
+        amarillo_hoy=suma(metrica=MetricaDiaria.RESULTADOS, clasificacion='Amarillo', dia=hoy),
+        peps_hoy=suma(metrica=MetricaDiaria.RESULTADOS, clasificacion="PEP's", dia=hoy),
+    )
+
+
+def consultas_por_dia(metricas):
+    return (metricas.filter(metrica=MetricaDiaria.CONSULTAS)
+            .values('dia').annotate(conteo=Sum('conteo')).order_by('dia'))
+
+
+def consultas_por_mes(metricas):
+    return (metricas.filter(metrica=MetricaDiaria.CONSULTAS)
+            .annotate(mes=TruncMonth('dia')).values('mes').annotate(total=Sum('conteo')).order_by('mes'))
+
+
+def ultimos_dias(dias):
+    """Primer día (fecha local) de una ventana de `dias` días que termina hoy."""
+    return timezone.localdate() - timedelta(days=dias)
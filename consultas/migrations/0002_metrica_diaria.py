@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0001_initial'),
+        ('empresas', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('metrica', models.CharField(choices=[('CONSULTAS', 'Consultas'), ('ALERTAS', 'Consultas con alerta'), ('RESULTADOS', 'Resultados')], max_length=10)),
+                ('clasificacion', models.CharField(blank=True, default='', max_length=20)),
+                ('tipo_lista', models.CharField(blank=True, default='', max_length=100)),
+                ('conteo', models.PositiveIntegerField(default=0)),
+                ('empresa', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='metricas_diarias', to='empresas.empresa')),
+                ('usuario', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='metricas_diarias', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['empresa', 'dia'], name='metrica_empresa_dia_idx'), models.Index(fields=['dia', 'metrica'], name='metrica_dia_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # La columna se copia de usuario.empresa en 0003_empresa_busqueda_copiar y sus
+    # índices se crean sin bloquear la tabla en 0003_empresa_busqueda_indices
+
+    dependencies = [
+        ('consultas', '0002_metrica_diaria'),
+        ('empresas', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='busqueda',
+            name='empresa',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='busquedas', to='empresas.empresa'),
+        ),
+    ]
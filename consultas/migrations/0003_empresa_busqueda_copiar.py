@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:45
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+BLOQUE = 50_000
+
+
+def copiar_empresa_de_usuario(apps, schema_editor):
+    # Por rangos de id, cada UPDATE en su propia transacción (la migración no es
+    # atómica): no se bloquea toda la tabla y, si se interrumpe, lo ya copiado queda
+    Busqueda = apps.get_model('consultas', 'Busqueda')
+    Usuario = apps.get_model('usuarios', 'Usuario')
+    empresa_del_usuario = Subquery(Usuario.objects.filter(pk=OuterRef('usuario_id')).values('empresa_id')[:1])
+    ultimo = Busqueda.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for inicio in range(0, ultimo + 1, BLOQUE):
+        (Busqueda.objects
+         .filter(pk__gte=inicio, pk__lt=inicio + BLOQUE, usuario__isnull=False, empresa__isnull=True)
+         .update(empresa_id=empresa_del_usuario))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('consultas', '0003_empresa_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(copiar_empresa_de_usuario, migrations.RunPython.noop),
+    ]
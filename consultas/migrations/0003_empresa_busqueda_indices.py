@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from consultas.indices_concurrentes import CrearIndiceConcurrente
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no bloquea las escrituras, pero no puede ir en una transacción
+    atomic = False
+
+    dependencies = [
+        ('consultas', '0003_empresa_busqueda_copiar'),
+    ]
+
+    operations = [
+        CrearIndiceConcurrente(
+            model_name='busqueda',
+            index=models.Index(fields=['usuario', '-fecha_busqueda'], name='busqueda_usuario_fecha_idx'),
+        ),
+        CrearIndiceConcurrente(
+            model_name='busqueda',
+            index=models.Index(fields=['empresa', '-fecha_busqueda'], name='busqueda_empresa_fecha_idx'),
+        ),
+        CrearIndiceConcurrente(
+            model_name='busqueda',
+            index=models.Index(fields=['fecha_busqueda'], name='busqueda_fecha_idx'),
+        ),
+        CrearIndiceConcurrente(
+            model_name='busqueda',
+            index=models.Index(condition=models.Q(('encontro_resultados', True)), fields=['empresa', '-fecha_busqueda'], name='busqueda_empresa_hallazgo_idx'),
+        ),
+        CrearIndiceConcurrente(
+            model_name='resultado',
+            index=models.Index(fields=['busqueda', 'clasificacion'], name='resultado_busqueda_clasif_idx'),
+        ),
+        # El índice simple de la FK se quita después de crear el compuesto que lo reemplaza
+        migrations.AlterField(
+            model_name='resultado',
+            name='busqueda',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='resultados', to='consultas.busqueda'),
+        ),
+        CrearIndiceConcurrente(
+            model_name='resultado',
+            index=models.Index(fields=['tipo_lista'], name='resultado_tipo_lista_idx'),
+        ),
+        CrearIndiceConcurrente(
+            model_name='resultado',
+            index=models.Index(fields=['identificacion'], name='resultado_identificacion_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+from consultas.indices_concurrentes import CrearIndiceConcurrente, QuitarIndiceConcurrente, borrar_indice_invalido
+
+# icontains en PostgreSQL se traduce a UPPER("termino_buscado"::text) LIKE UPPER('%…%');
+# el índice se hace sobre esa misma expresión para que el planificador lo use.
+# CREATE EXTENSION necesita permisos de dueño de la base (o que pg_trgm ya esté instalada).
+# CONCURRENTLY: construir el GIN tarda, y mientras tanto se siguen guardando búsquedas.
+INDICE_TRIGRAMAS = (
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS busqueda_termino_trgm_idx ON consultas_busqueda '
+    'USING gin (UPPER(termino_buscado::text) gin_trgm_ops)'
+)
+
+
+def crear_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # IF NOT EXISTS no distingue un índice a medio construir de uno válido
+    borrar_indice_invalido(schema_editor, 'busqueda_termino_trgm_idx')
+    schema_editor.execute(INDICE_TRIGRAMAS)
+
+
+def borrar_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS busqueda_termino_trgm_idx')
+
+
+class Migration(migrations.Migration):
+    # Los índices se quitan y se crean con CONCURRENTLY, que no puede ir en una transacción
+    atomic = False
+
+    dependencies = [
+        ('consultas', '0003_empresa_busqueda_indices'),
+        ('empresas', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        QuitarIndiceConcurrente(
+            model_name='busqueda',
+            name='busqueda_usuario_fecha_idx',
+        ),
+        QuitarIndiceConcurrente(
+            model_name='busqueda',
+            name='busqueda_empresa_fecha_idx',
+        ),
+        QuitarIndiceConcurrente(
+            model_name='busqueda',
+            name='busqueda_empresa_hallazgo_idx',
+        ),
+        CrearIndiceConcurrente(
+            model_name='busqueda',
+            index=models.Index(fields=['usuario', '-fecha_busqueda', '-id'], name='busqueda_usuario_fecha_idx'),
+        ),
+        CrearIndiceConcurrente(
+            model_name='busqueda',
+            index=models.Index(fields=['empresa', '-fecha_busqueda', '-id'], name='busqueda_empresa_fecha_idx'),
+        ),
+        CrearIndiceConcurrente(
+            model_name='busqueda',
+            index=models.Index(condition=models.Q(('encontro_resultados', True)), fields=['empresa', '-fecha_busqueda', '-id'], name='busqueda_empresa_hallazgo_idx'),
+        ),
+        migrations.RunPython(crear_indice_trigramas, borrar_indice_trigramas, atomic=False),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0004_indices_cursor_y_trigramas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntidadLista',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('huella', models.CharField(max_length=40, unique=True)),
+                ('nombre_completo', models.CharField(blank=True, max_length=255, null=True)),
+                ('identificacion', models.CharField(blank=True, max_length=50, null=True)),
+                ('tipo_lista', models.CharField(blank=True, max_length=100, null=True)),
+                ('origen_lista', models.CharField(blank=True, max_length=100, null=True)),
+                ('relacionado_con', models.TextField(blank=True, null=True)),
+                ('fuente', models.CharField(blank=True, max_length=255, null=True)),
+                ('es_restrictiva', models.BooleanField(default=False)),
+                ('es_boletin', models.BooleanField(default=False)),
+                ('alias', models.CharField(blank=True, max_length=255, null=True)),
+                ('tipo_persona', models.CharField(blank=True, max_length=50, null=True)),
+                ('fecha_update', models.CharField(blank=True, max_length=100, null=True)),
+                ('estado', models.CharField(blank=True, max_length=100, null=True)),
+                ('llaveimagen', models.CharField(blank=True, max_length=255, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tipo_lista'], name='entidad_tipo_lista_idx'), models.Index(fields=['identificacion'], name='entidad_identificacion_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='resultado',
+            name='entidad',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='resultados', to='consultas.entidadlista'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:10
+
+import hashlib
+import json
+
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+
+BLOQUE = 5000
+LOTE_CONSULTA = 1000
+
+# Copia congelada de consultas/entidades.py tal como estaba al escribir esta
+# migración: la huella tiene que ser la que calculaba la aplicación al guardar
+# búsquedas nuevas (si no, la misma persona quedaría dos veces), y no debe
+# cambiar si entidades.py cambia después.
+CAMPOS = [
+    'nombre_completo', 'identificacion', 'tipo_lista', 'origen_lista', 'relacionado_con', 'fuente',
+    'es_restrictiva', 'es_boletin', 'alias', 'tipo_persona', 'fecha_update', 'estado', 'llaveimagen',
+]
+CAMPOS_BOOLEANOS = {'es_restrictiva', 'es_boletin'}
+
+
+def valores_normalizados(valores):
+    normalizados = {}
+    for campo in CAMPOS:
+        valor = valores.get(campo)
+        if campo in CAMPOS_BOOLEANOS:
+            normalizados[campo] = bool(valor)
+        else:
+            normalizados[campo] = None if valor is None else str(valor)
+    return normalizados
+
+
+def calcular_huella(valores):
+    datos = [valores[campo] for campo in CAMPOS]
+    return hashlib.sha1(json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def plegar_resultados(apps, schema_editor):
+    """
+    Crea una EntidadLista por cada registro distinto de Resultado y enlaza las
+    filas. Sin transacción global: cada bloque se confirma por separado y solo
+    se procesan las filas sin entidad, así que si se interrumpe se retoma.
+    """
+    Resultado = apps.get_model('consultas', 'Resultado')
+    EntidadLista = apps.get_model('consultas', 'EntidadLista')
+    ultimo_id = 0
+    while True:
+        filas = list(Resultado.objects.filter(pk__gt=ultimo_id, entidad__isnull=True)
+                     .order_by('pk').values('pk', *CAMPOS)[:BLOQUE])
+        if not filas:
+            break
+        ultimo_id = filas[-1]['pk']
+
+        huellas = {}
+        for fila in filas:
+            valores = valores_normalizados(fila)
+            fila['huella'] = calcular_huella(valores)
+            huellas.setdefault(fila['huella'], valores)
+
+        with transaction.atomic():
+            lista = list(huellas)
+            ids = {}
+            for i in range(0, len(lista), LOTE_CONSULTA):
+                ids.update(EntidadLista.objects.filter(huella__in=lista[i:i + LOTE_CONSULTA]).values_list('huella', 'pk'))
+            nuevas = [EntidadLista(huella=huella, **valores) for huella, valores in huellas.items() if huella not in ids]
+            EntidadLista.objects.bulk_create(nuevas, batch_size=LOTE_CONSULTA)
+            for i in range(0, len(nuevas), LOTE_CONSULTA):
+                ids.update(EntidadLista.objects.filter(
+                    huella__in=[entidad.huella for entidad in nuevas[i:i + LOTE_CONSULTA]]).values_list('huella', 'pk'))
+
+            enlazar = [Resultado(pk=fila['pk'], entidad_id=ids[fila['huella']]) for fila in filas]
+            Resultado.objects.bulk_update(enlazar, ['entidad'], batch_size=1000)
+
+
+def copiar_entidades_a_resultados(apps, schema_editor):
+    # Reversa: vuelve a llenar las columnas que 0007 quitó de Resultado
+    Resultado = apps.get_model('consultas', 'Resultado')
+    EntidadLista = apps.get_model('consultas', 'EntidadLista')
+    ultimo = Resultado.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for inicio in range(0, ultimo + 1, BLOQUE):
+        with transaction.atomic():
+            Resultado.objects.filter(pk__gte=inicio, pk__lt=inicio + BLOQUE).update(**{
+                campo: Subquery(EntidadLista.objects.filter(pk=OuterRef('entidad_id')).values(campo)[:1])
+                for campo in CAMPOS
+            })
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('consultas', '0005_entidad_lista'),
+    ]
+
+    operations = [
+        migrations.RunPython(plegar_resultados, copiar_entidades_a_resultados),
+    ]
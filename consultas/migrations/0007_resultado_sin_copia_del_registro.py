@@ -0,0 +1,90 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:10
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Resultados guardados sin entidad entre 0006 y esta migración (la versión
+# anterior de la aplicación siguió escribiendo durante el despliegue) se pliegan
+# antes de quitar las columnas y de hacer obligatoria la entidad
+plegado = import_module('consultas.migrations.0006_plegar_resultados_en_entidades')
+
+
+class Migration(migrations.Migration):
+    # El plegado confirma cada bloque por separado, como en 0006; además, en PostgreSQL
+    # un ALTER TABLE en la misma transacción que actualizó la FK falla por "pending trigger events"
+    atomic = False
+
+    dependencies = [
+        ('consultas', '0006_plegar_resultados_en_entidades'),
+    ]
+
+    operations = [
+        migrations.RunPython(plegado.plegar_resultados, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='resultado',
+            name='resultado_tipo_lista_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='resultado',
+            name='resultado_identificacion_idx',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='alias',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='es_boletin',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='es_restrictiva',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='estado',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='fecha_update',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='fuente',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='identificacion',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='llaveimagen',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='nombre_completo',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='origen_lista',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='relacionado_con',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='tipo_lista',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='tipo_persona',
+        ),
+        migrations.AlterField(
+            model_name='resultado',
+            name='entidad',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='resultados', to='consultas.entidadlista'),
+        ),
+    ]
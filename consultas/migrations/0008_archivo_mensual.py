@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0007_resultado_sin_copia_del_registro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(unique=True)),
+                ('ruta_busquedas', models.CharField(max_length=255)),
+                ('ruta_resultados', models.CharField(max_length=255)),
+                ('busquedas', models.PositiveIntegerField()),
+                ('resultados', models.PositiveIntegerField()),
+                ('id_minimo', models.BigIntegerField()),
+                ('id_maximo', models.BigIntegerField()),
+                ('fecha_archivado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['id_minimo', 'id_maximo'], name='archivo_mensual_ids_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+from consultas.indices_concurrentes import CrearIndiceConcurrente
+
+
+class Migration(migrations.Migration):
+    # consultas_entidadlista crece con cada búsqueda: los índices se crean con
+    # CONCURRENTLY, que no puede ir en una transacción
+    atomic = False
+
+    dependencies = [
+        ('consultas', '0008_archivo_mensual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entidadlista',
+            name='estado_fecha',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='entidadlista',
+            name='estado_movimiento',
+            field=models.CharField(blank=True, choices=[('INGRESO', 'Ingresa a la lista'), ('RETIRO', 'Sale de la lista'), ('OTRO', 'Otro')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='entidadlista',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        CrearIndiceConcurrente(
+            model_name='entidadlista',
+            index=models.Index(fields=['estado_movimiento', 'estado_fecha'], name='entidad_movimiento_fecha_idx'),
+        ),
+        CrearIndiceConcurrente(
+            model_name='entidadlista',
+            index=models.Index(fields=['fecha_actualizacion'], name='entidad_actualizacion_idx'),
+        ),
+    ]
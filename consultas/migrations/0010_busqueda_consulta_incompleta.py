@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0009_entidad_campos_tipados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='busqueda',
+            name='consulta_incompleta',
+            field=models.BooleanField(default=False),
+        ),
+    ]
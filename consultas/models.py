@@ -1,22 +1,91 @@
 # archivo: consultas/models.py
 
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from empresas.models import Empresa
 from usuarios.models import Usuario
 
+def _conteo_resultados(**filtros):
+    # Subconsulta correlacionada: se calcula solo para las filas que se devuelven
+    # (después del LIMIT) y la resuelve resultado_busqueda_clasif_idx sin leer la tabla
+    return Coalesce(Subquery(
+        Resultado.objects.filter(busqueda=OuterRef('pk'), **filtros).order_by()
+        .values('busqueda').annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class BusquedaQuerySet(models.QuerySet):
+
+    def con_conteos(self):
+        """
+        Anota en cada búsqueda total_resultados, rojos, amarillos y peps, para que
+        los listados muestren los hallazgos sin cargar los resultados de cada fila.
+        """
+        return self.annotate(
+            total_resultados=_conteo_resultados(),
+            rojos=_conteo_resultados(clasificacion='Rojo'),
+            amarillos=_conteo_resultados(clasificacion='Amarillo'),
+            peps=_conteo_resultados(clasificacion="PEP's"),
+        )
+
+
 class Busqueda(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, related_name='busquedas')
+    # Copia de usuario.empresa al momento de buscar: las vistas por empresa filtran
+    # aquí sin pasar por la tabla de usuarios. Sin índice propio: busqueda_empresa_fecha_idx
+    # empieza por empresa
+    empresa = models.ForeignKey(Empresa, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='busquedas', db_index=False)
     termino_buscado = models.CharField(max_length=100)
     fecha_busqueda = models.DateTimeField(auto_now_add=True)
     encontro_resultados = models.BooleanField(default=False)
     genero_alerta = models.BooleanField(default=False)
+    # El API falló o algún endpoint de la revisión completa no respondió: sin
+    # hallazgos no significa que la persona no esté en las listas
+    consulta_incompleta = models.BooleanField(default=False)
+
+    objects = BusquedaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Historial del usuario y listados de la empresa, siempre del más reciente al más antiguo.
+            # Terminan en id porque las páginas se piden por cursor (fecha, id): consultas/paginacion.py
+            models.Index(fields=['usuario', '-fecha_busqueda', '-id'], name='busqueda_usuario_fecha_idx'),
+            models.Index(fields=['empresa', '-fecha_busqueda', '-id'], name='busqueda_empresa_fecha_idx'),
+            # Reportes por rango de fechas sin filtro de empresa (administración)
+            models.Index(fields=['fecha_busqueda'], name='busqueda_fecha_idx'),
+            # Filtro "con resultados" de gestión: solo una parte de las búsquedas encuentra algo
+            models.Index(
+                fields=['empresa', '-fecha_busqueda', '-id'], name='busqueda_empresa_hallazgo_idx',
+                condition=models.Q(encontro_resultados=True),
+            ),
+            # El filtro por término (icontains) usa un índice GIN de trigramas que solo
+            # existe en PostgreSQL; se crea en la migración 0004
+        ]
 
     def __str__(self):
-        return f"Búsqueda de '{self.termino_buscado}' por {self.usuario.username}"
+        # Sin tocar self.usuario: en listados sería una consulta más por fila
+        return f"Búsqueda #{self.pk} de '{self.termino_buscado}'"
+
+class EntidadLista(models.Model):
+    """
+    Un registro de las listas tal como lo devolvió el API, guardado una sola vez
+    aunque aparezca en muchas búsquedas. La llave es la huella del contenido
+    (consultas/entidades.py); los campos del API no se modifican. Las columnas
+    tipadas se derivan de fecha_update y estado al insertar la fila.
+    """
+    INGRESO = 'INGRESO'
+    RETIRO = 'RETIRO'
+    OTRO = 'OTRO'
+    MOVIMIENTO_CHOICES = (
+        (INGRESO, 'Ingresa a la lista'),
+        (RETIRO, 'Sale de la lista'),
+        (OTRO, 'Otro'),
+    )
+
+    huella = models.CharField(max_length=40, unique=True)  # SHA-1 de los campos del registro
 
-class Resultado(models.Model):
-    # Relación con la búsqueda a la que pertenece
-    busqueda = models.ForeignKey(Busqueda, related_name='resultados', on_delete=models.CASCADE)
-    
     # Campos originales del API
     nombre_completo = models.CharField(max_length=255, null=True, blank=True)
     identificacion = models.CharField(max_length=50, null=True, blank=True) # Mapeado desde 'Id' del API
@@ -25,21 +94,135 @@ class Resultado(models.Model):
     relacionado_con = models.TextField(null=True, blank=True) # Descripción principal
     fuente = models.CharField(max_length=255, null=True, blank=True)
     es_restrictiva = models.BooleanField(default=False) # Campo 'Restrictiva' del API
-    
+
     # Campos adicionales identificados en los PDFs
     es_boletin = models.BooleanField(default=False) # Campo 'Boletin' del API
     alias = models.CharField(max_length=255, null=True, blank=True) # Campo 'Aka' del API
-    coincidencia_nombre = models.IntegerField(default=0) # Campo 'CoincidenciaNombre' del API
-    coincidencia_id = models.IntegerField(default=0) # Campo 'CoincidenciaID' del API
     tipo_persona = models.CharField(max_length=50, null=True, blank=True) # Campo 'Tipo_Persona' del API
-    
+
     # Campos de la guía SIDIF (Página 41) - Opcionales pero útiles
     fecha_update = models.CharField(max_length=100, null=True, blank=True) # Formato /Date(...)/
     estado = models.CharField(max_length=100, null=True, blank=True) # Ej: INGRESA LISTA: 20160801
     llaveimagen = models.CharField(max_length=255, null=True, blank=True) # Sub-clasificación
-    
+
+    # fecha_update y estado interpretados (consultas/entidades.py): se pueden filtrar y ordenar en SQL
+    fecha_actualizacion = models.DateTimeField(null=True, blank=True)
+    estado_movimiento = models.CharField(max_length=10, choices=MOVIMIENTO_CHOICES, blank=True, default='')
+    estado_fecha = models.DateField(null=True, blank=True) # La fecha de 'INGRESA LISTA: 20160801'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tipo_lista'], name='entidad_tipo_lista_idx'),
+            # Búsquedas cruzadas por documento
+            models.Index(fields=['identificacion'], name='entidad_identificacion_idx'),
+            # "Ingresaron a una lista en los últimos N días"
+            models.Index(fields=['estado_movimiento', 'estado_fecha'], name='entidad_movimiento_fecha_idx'),
+            models.Index(fields=['fecha_actualizacion'], name='entidad_actualizacion_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre_completo or 'Desconocido'} ({self.identificacion or 'N/A'}, {self.tipo_lista or 'N/A'})"
+
+
+def _de_la_entidad(campo):
+    # Las plantillas y las métricas leen resultado.tipo_lista, resultado.fuente...
+    # como antes; con select_related('entidad') no cuesta consultas extra
+    return property(lambda resultado: getattr(resultado.entidad, campo))
+
+
+class Resultado(models.Model):
+    """Un hallazgo de una búsqueda: enlace a la entidad encontrada con los datos propios de esa consulta."""
+    # Relación con la búsqueda a la que pertenece
+    # Sin índice propio: lo cubre resultado_busqueda_clasif_idx, que empieza por busqueda
+    busqueda = models.ForeignKey(Busqueda, related_name='resultados', on_delete=models.CASCADE, db_index=False)
+    entidad = models.ForeignKey(EntidadLista, related_name='resultados', on_delete=models.PROTECT)
+
+    coincidencia_nombre = models.IntegerField(default=0) # Campo 'CoincidenciaNombre' del API
+    coincidencia_id = models.IntegerField(default=0) # Campo 'CoincidenciaID' del API
+
     # Campo para nuestra clasificación interna
     clasificacion = models.CharField(max_length=20, default='No Clasificado') # Opciones: Rojo, Amarillo, PEP's
 
+    nombre_completo = _de_la_entidad('nombre_completo')
+    identificacion = _de_la_entidad('identificacion')
+    tipo_lista = _de_la_entidad('tipo_lista')
+    origen_lista = _de_la_entidad('origen_lista')
+    relacionado_con = _de_la_entidad('relacionado_con')
+    fuente = _de_la_entidad('fuente')
+    es_restrictiva = _de_la_entidad('es_restrictiva')
+    es_boletin = _de_la_entidad('es_boletin')
+    alias = _de_la_entidad('alias')
+    tipo_persona = _de_la_entidad('tipo_persona')
+    fecha_update = _de_la_entidad('fecha_update')
+    estado = _de_la_entidad('estado')
+    llaveimagen = _de_la_entidad('llaveimagen')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['busqueda', 'clasificacion'], name='resultado_busqueda_clasif_idx'),
+        ]
+
+    def __str__(self):
+        return f"Resultado de la búsqueda #{self.busqueda_id} (entidad #{self.entidad_id})"
+
+class ArchivoMensual(models.Model):
+    """
+    Un mes del historial que ya no está en la base: sus búsquedas y resultados
+    quedaron en dos archivos Parquet del almacenamiento (consultas/archivo.py).
+    """
+    mes = models.DateField(unique=True)  # Primer día del mes
+    ruta_busquedas = models.CharField(max_length=255)
+    ruta_resultados = models.CharField(max_length=255)
+    busquedas = models.PositiveIntegerField()
+    resultados = models.PositiveIntegerField()
+    # Rango de ids de las búsquedas del mes: el detalle de una búsqueda archivada
+    # solo abre los archivos cuyo rango la contiene
+    id_minimo = models.BigIntegerField()
+    id_maximo = models.BigIntegerField()
+    fecha_archivado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id_minimo', 'id_maximo'], name='archivo_mensual_ids_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archivo de {self.mes:%Y-%m} ({self.busquedas} búsquedas)"
+
+class MetricaDiaria(models.Model):
+    """
+    Conteos precalculados por día para los dashboards. Se actualizan al guardar
+    cada búsqueda (consultas/metricas.py) y se reconstruyen con
+    `python manage.py recalcular_metricas`.
+
+    Las filas CONSULTAS y ALERTAS cuentan búsquedas (con clasificacion y
+    tipo_lista vacíos); las filas RESULTADOS cuentan resultados por
+    clasificación y tipo de lista. Puede haber filas repetidas para la misma
+    clave si dos búsquedas simultáneas las crean a la vez, por eso los
+    dashboards siempre suman `conteo`.
+    """
+    CONSULTAS = 'CONSULTAS'
+    ALERTAS = 'ALERTAS'
+    RESULTADOS = 'RESULTADOS'
+    METRICA_CHOICES = (
+        (CONSULTAS, 'Consultas'),
+        (ALERTAS, 'Consultas con alerta'),
+        (RESULTADOS, 'Resultados'),
+    )
+
+    dia = models.DateField()
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, related_name='metricas_diarias')
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, related_name='metricas_diarias')
+    metrica = models.CharField(max_length=10, choices=METRICA_CHOICES)
+    clasificacion = models.CharField(max_length=20, blank=True, default='')
+    tipo_lista = models.CharField(max_length=100, blank=True, default='')
+    conteo = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'dia'], name='metrica_empresa_dia_idx'),
+            models.Index(fields=['dia', 'metrica'], name='metrica_dia_idx'),
+        ]
+
     def __str__(self):
-        return f"Resultado para {self.nombre_completo or 'Desconocido'} ({self.identificacion or 'N/A'})"
\ No newline at end of file
+        return f"{self.dia} {self.metrica} {self.clasificacion} {self.tipo_lista}: {self.conteo}"
\ No newline at end of file
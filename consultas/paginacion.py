@@ -0,0 +1,198 @@
+# archivo: consultas/paginacion.py
+"""
+Paginación por cursor (keyset) y conteos baratos para listados grandes.
+
+Con Paginator, la página N es un OFFSET: la base de datos lee y descarta
+todas las filas anteriores, y además cuenta la tabla completa para saber
+cuántas páginas hay. Con millones de búsquedas, las últimas páginas y el
+conteo se vuelven lentos.
+
+Aquí cada página se pide a partir de la última fila de la anterior:
+  WHERE (fecha, id) < (fecha_ultima, id_ultimo) ORDER BY fecha DESC, id DESC LIMIT 25
+que con un índice sobre (…, fecha, id) cuesta lo mismo en la página 1 que en
+la 10.000. A cambio no hay "página N de M": solo anterior y siguiente. El
+cursor viaja en la URL (?despues=… o ?antes=…) y los filtros se conservan.
+
+Los campos del orden no deben ser nulos y el último tiene que ser único
+(normalmente '-id').
+"""
+
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+PARAMETRO_DESPUES = 'despues'
+PARAMETRO_ANTES = 'antes'
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(valores):
+    datos = [v.isoformat() if isinstance(v, (datetime, date)) else v for v in valores]
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, modelo, orden):
+    """Valores del cursor convertidos al tipo de cada campo del orden."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if not isinstance(datos, list) or len(datos) != len(orden):
+            raise CursorInvalido(cursor)
+        return [modelo._meta.get_field(campo.lstrip('-')).to_python(valor) for campo, valor in zip(orden, datos)]
+    except (ValueError, TypeError, ValidationError) as e:
+        raise CursorInvalido(cursor) from e
+
+
+def cursor_de(objeto, orden):
+    """Cursor que apunta a `objeto`: la página siguiente empieza justo después de él."""
+    return codificar_cursor([getattr(objeto, objeto._meta.get_field(campo.lstrip('-')).attname) for campo in orden])
+
+
+def _filtro_despues(orden, valores):
+    """
+    Filas que van después de `valores` en `orden`. Para ['-fecha', '-id']:
+      fecha < f OR (fecha = f AND id < i)
+    más un `fecha <= f` redundante, que la base de datos sí puede usar como
+    límite del recorrido del índice (el OR solo no lo aprovecha).
+    """
+    condicion = None
+    for campo, valor in reversed(list(zip(orden, valores))):
+        nombre = campo.lstrip('-')
+        operador = 'lt' if campo.startswith('-') else 'gt'
+        estricta = Q(**{f'{nombre}__{operador}': valor})
+        condicion = estricta if condicion is None else estricta | (Q(**{nombre: valor}) & condicion)
+    primero = orden[0].lstrip('-')
+    return condicion & Q(**{f"{primero}__{'lte' if orden[0].startswith('-') else 'gte'}": valores[0]})
+
+
+def _invertir(orden):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden]
+
+
+class PaginaCursor:
+    """
+    Una página del listado. Se itera como la lista de objetos; `siguiente` y
+    `anterior` son los cursores para los enlaces (None si no hay más).
+    Expone también has_next/has_previous para las plantillas que ya usaban
+    page_obj.
+    """
+
+    def __init__(self, objetos, siguiente, anterior):
+        self.objetos = objetos
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    def __getitem__(self, indice):
+        return self.objetos[indice]
+
+    def has_next(self):
+        return self.siguiente is not None
+
+    def has_previous(self):
+        return self.anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginar_por_cursor(queryset, parametros, orden, por_pagina=25):
+    """
+    Página de `queryset` ordenado por `orden` a partir del cursor en
+    `parametros` (request.GET). Un cursor dañado o viejo lleva a la primera
+    página en vez de dar error.
+    """
+    modelo = queryset.model
+    cursor, hacia_atras = parametros.get(PARAMETRO_DESPUES), False
+    if not cursor and parametros.get(PARAMETRO_ANTES):
+        cursor, hacia_atras = parametros.get(PARAMETRO_ANTES), True
+
+    valores = None
+    if cursor:
+        try:
+            valores = decodificar_cursor(cursor, modelo, orden)
+        except CursorInvalido:
+            hacia_atras = False
+
+    orden_consulta = _invertir(orden) if hacia_atras else list(orden)
+    consulta = queryset.order_by(*orden_consulta)
+    if valores is not None:
+        consulta = consulta.filter(_filtro_despues(orden_consulta, valores))
+    # Una fila de más para saber si hay otra página sin contar
+    objetos = list(consulta[:por_pagina + 1])
+    hay_mas = len(objetos) > por_pagina
+    objetos = objetos[:por_pagina]
+
+    if hacia_atras:
+        objetos.reverse()
+        hay_siguiente, hay_anterior = True, hay_mas
+    else:
+        hay_siguiente, hay_anterior = hay_mas, valores is not None
+    if not objetos:
+        # El cursor apunta fuera del listado (se borraron filas): primera página
+        return paginar_por_cursor(queryset, {}, orden, por_pagina) if valores is not None else PaginaCursor([], None, None)
+    return PaginaCursor(
+        objetos,
+        siguiente=cursor_de(objetos[-1], orden) if hay_siguiente else None,
+        anterior=cursor_de(objetos[0], orden) if hay_anterior else None,
+    )
+
+
+class PaginacionCursorMixin:
+    """
+    Para ListView: reemplaza Paginator por paginar_por_cursor. Las plantillas
+    reciben page_obj (una PaginaCursor) e is_paginated como antes.
+    """
+    orden_cursor = ['-id']
+
+    def paginate_queryset(self, queryset, page_size):
+        pagina = paginar_por_cursor(queryset, self.request.GET, self.orden_cursor, page_size)
+        return None, pagina, pagina.objetos, pagina.has_other_pages()
+
+
+def contar(queryset):
+    """
+    (total, exacto) de `queryset` para mostrar junto al listado.
+
+    En PostgreSQL se pide primero la estimación del planificador (EXPLAIN, sin
+    leer la tabla); si pasa de PAGINACION_CONTEO_EXACTO_MAXIMO se muestra como
+    aproximada, y si no se hace el COUNT(*), que para pocos registros es
+    barato. El resultado queda en caché PAGINACION_CONTEO_TTL segundos.
+    """
+    queryset = queryset.order_by()
+    conexion = connections[queryset.db]
+    sql, parametros = queryset.query.sql_with_params()
+    clave = 'conteo:' + hashlib.sha1(f'{queryset.db}|{sql}|{parametros!r}'.encode('utf-8')).hexdigest()
+    resultado = cache.get(clave)
+    if resultado is not None:
+        return tuple(resultado)
+
+    resultado = None
+    if conexion.vendor == 'postgresql':
+        with conexion.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', parametros)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimado = int(plan[0]['Plan']['Plan Rows'])
+        if estimado > settings.PAGINACION_CONTEO_EXACTO_MAXIMO:
+            resultado = (estimado, False)
+    if resultado is None:
+        resultado = (queryset.count(), True)
+    cache.set(clave, resultado, settings.PAGINACION_CONTEO_TTL)
+    return resultado
@@ -0,0 +1,49 @@
+# archivo: consultas/plazos.py
+"""
+Plazo de la consulta en curso.
+
+consulta_paralela deja de esperar lo que no respondió dentro de
+API_PLAZO_BUSQUEDA, pero el hilo del pool que hace la petición no se puede
+cancelar: seguiría ocupado con el timeout de lectura y las esperas de la
+coalescencia, y con el API lento el pool se llenaría de llamadas que ya nadie
+espera. Por eso cada petición corre con el mismo plazo que su búsqueda
+(con_plazo) y la llamada HTTP y las esperas lo respetan (restante): una
+llamada abandonada termina, a más tardar, cuando vence el plazo. Una que
+esperó en la cola del pool hasta después del plazo ni siquiera sale.
+
+Fuera de consulta_paralela no hay plazo y todo usa sus máximos de siempre.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+_limite = contextvars.ContextVar('limite_consulta', default=None)
+
+
+def limite_en(segundos):
+    """Instante (time.monotonic) en que vence un plazo de `segundos` desde ahora."""
+    return time.monotonic() + segundos
+
+
+@contextmanager
+def con_plazo(limite):
+    """Lo que corre dentro respeta `limite` (un valor de limite_en)."""
+    token = _limite.set(limite)
+    try:
+        yield
+    finally:
+        _limite.reset(token)
+
+
+def restante(maximo):
+    """Segundos que se pueden esperar: `maximo`, o menos si el plazo vence antes."""
+    limite = _limite.get()
+    if limite is None:
+        return maximo
+    return max(0.0, min(maximo, limite - time.monotonic()))
+
+
+def vencido():
+    limite = _limite.get()
+    return limite is not None and time.monotonic() >= limite
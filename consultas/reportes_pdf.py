@@ -0,0 +1,147 @@
+# archivo: consultas/reportes_pdf.py
+"""
+Reportes PDF de las búsquedas.
+
+Una Busqueda no cambia después de guardarse, así que su PDF se genera una
+sola vez y se guarda en el almacenamiento por defecto (S3 en producción)
+con una clave que incluye la versión de la plantilla: si se modifica
+reporte_pdf.html o reporte_pdf.css, la versión cambia y los reportes se
+vuelven a generar la próxima vez que se pidan.
+
+Dentro de cada proceso se reutilizan la configuración de fuentes, la hoja de
+estilos ya interpretada y los recursos descargados (fuentes web, logo), que
+antes se volvían a pedir en cada render.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template.loader import get_template
+from weasyprint import CSS, HTML, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
+
+from monitoreo.instrumentacion import medir
+
+from .archivo import resultados_de
+
+logger = logging.getLogger(__name__)
+
+PLANTILLA = 'consultas/reporte_pdf.html'
+HOJA_ESTILOS = Path(__file__).resolve().parent / 'templates' / 'consultas' / 'reporte_pdf.css'
+CARPETA = 'reportes_pdf'
+
+_recursos = {}
+_recursos_lock = threading.Lock()
+
+
+def _url_fetcher(url, *args, **kwargs):
+    # Las fuentes de Google y el logo son los mismos en todos los reportes
+    with _recursos_lock:
+        recurso = _recursos.get(url)
+    if recurso is None:
+        recurso = default_url_fetcher(url, *args, **kwargs)
+        if 'file_obj' in recurso:
+            archivo = recurso.pop('file_obj')
+            try:
+                recurso['string'] = archivo.read()
+            finally:
+                archivo.close()
+        with _recursos_lock:
+            _recursos[url] = recurso
+    return dict(recurso)
+
+
+@lru_cache(maxsize=None)
+def version_plantilla():
+    """Huella de la plantilla y la hoja de estilos; cambia cuando cambia el diseño del reporte."""
+    huella = hashlib.sha1()
+    huella.update(get_template(PLANTILLA).template.source.encode('utf-8'))
+    huella.update(HOJA_ESTILOS.read_bytes())
+    return huella.hexdigest()[:12]
+
+
+@lru_cache(maxsize=None)
+def _estilos():
+    # FontConfiguration guarda las fuentes ya cargadas; se comparte entre renders del proceso
+    configuracion_fuentes = FontConfiguration()
+    hoja = CSS(string=HOJA_ESTILOS.read_text(encoding='utf-8'),
+               font_config=configuracion_fuentes, url_fetcher=_url_fetcher)
+    return configuracion_fuentes, hoja
+
+
+def olvidar_recursos():
+    """Descarta fuentes, estilos y recursos compartidos (los benchmarks lo usan para medir en frío)."""
+    _estilos.cache_clear()
+    version_plantilla.cache_clear()
+    with _recursos_lock:
+        _recursos.clear()
+
+
+def ruta_pdf(busqueda_id):
+    return f'{CARPETA}/busqueda_{busqueda_id}_{version_plantilla()}.pdf'
+
+
+def contexto_reporte(busqueda):
+    """
+    Datos de la plantilla con un número fijo de consultas: los resultados se
+    leen una vez y los conteos por clasificación salen de esa misma lista.
+    """
+    resultados = resultados_de(busqueda)
+    por_clasificacion = Counter(resultado.clasificacion for resultado in resultados)
+    return {
+        'busqueda': busqueda,
+        'resultados': resultados,
+        'conteos': {
+            'rojos': por_clasificacion['Rojo'],
+            'amarillos': por_clasificacion['Amarillo'],
+            'peps': por_clasificacion["PEP's"],
+        },
+    }
+
+
+def renderizar_pdf(busqueda, base_url=None):
+    """Genera el PDF de la búsqueda (sin usar el almacenamiento) y devuelve sus bytes."""
+    configuracion_fuentes, hoja = _estilos()
+    html_string = get_template(PLANTILLA).render(contexto_reporte(busqueda))
+    with medir('weasyprint'):
+        html = HTML(string=html_string, base_url=base_url or settings.MI_DOMINIO, url_fetcher=_url_fetcher)
+        return html.write_pdf(stylesheets=[hoja], font_config=configuracion_fuentes)
+
+
+def guardar_pdf(busqueda, base_url=None):
+    """Genera el PDF si aún no existe para la versión actual de la plantilla. Devuelve su ruta."""
+    ruta = ruta_pdf(busqueda.pk)
+    if not default_storage.exists(ruta):
+        guardado = default_storage.save(ruta, ContentFile(renderizar_pdf(busqueda, base_url)))
+        if guardado != ruta:
+            # Otro proceso (la tarea consultas.generar_pdf o una descarga) lo guardó
+            # mientras se generaba y FileSystemStorage eligió otro nombre. Es el mismo
+            # PDF: se queda el suyo y se borra la copia. S3 sobrescribe la misma clave.
+            default_storage.delete(guardado)
+    return ruta
+
+
+def abrir_pdf(busqueda, base_url=None):
+    """Devuelve el PDF guardado de la búsqueda, generándolo la primera vez."""
+    ruta = ruta_pdf(busqueda.pk)
+    try:
+        return default_storage.open(ruta, 'rb')
+    except FileNotFoundError:
+        pass
+    except Exception:
+        # Con S3 un objeto inexistente puede llegar como otro tipo de error
+        logger.warning("No se pudo abrir el PDF guardado %s; se genera de nuevo", ruta, exc_info=True)
+    return default_storage.open(guardar_pdf(busqueda, base_url), 'rb')
+
+
+def invalidar_pdfs(busqueda_ids):
+    """Borra los PDF guardados de estas búsquedas (por ejemplo, tras reclasificar sus resultados)."""
+    for busqueda_id in busqueda_ids:
+        default_storage.delete(ruta_pdf(busqueda_id))
@@ -1,45 +1,309 @@
 # archivo: consultas/services.py
 
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
 import requests
 from django.conf import settings
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from monitoreo.instrumentacion import registrar_componente
+
+from .coalescencia import compartir, una_vez_entre_procesos
+from .plazos import restante, vencido
+
+logger = logging.getLogger(__name__)
+
+# --- CLIENTE HTTP COMPARTIDO ---
+# Una sola sesión por proceso (cada worker de gunicorn tiene la suya) para
+# reutilizar conexiones TCP/TLS con keep-alive en lugar de abrir una por consulta.
+_sesion = None
+_sesion_pid = None
+_sesion_lock = threading.Lock()
+
+# --- MÉTRICAS DE LATENCIA POR ENDPOINT ---
+_metricas_lock = threading.Lock()
+_metricas = defaultdict(lambda: {
+    'peticiones': 0,
+    'errores': 0,
+    'tiempo_total': 0.0,
+    'tiempo_max': 0.0,
+    'muestras': deque(maxlen=1000),
+})
+_estadisticas_cache = {'aciertos': 0, 'fallos': 0}
+
+
+def _crear_sesion():
+    """
+    Crea una sesión con pool de conexiones y reintentos acotados: solo para
+    respuestas 5xx y conexiones que no se pudieron abrir o se reiniciaron.
+    Un timeout de lectura no se reintenta; si no, una consulta lenta tardaría
+    API_TIMEOUT_LECTURA por cada intento.
+    """
+    reintentos = Retry(
+        total=settings.API_MAX_REINTENTOS,
+        connect=settings.API_MAX_REINTENTOS,
+        read=0,
+        status=settings.API_MAX_REINTENTOS,
+        backoff_factor=settings.API_BACKOFF_FACTOR,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        # Si se agotan los reintentos devolvemos la última respuesta 5xx
+        # y dejamos que _realizar_peticion la trate como un error normal.
+        raise_on_status=False,
+    )
+    adaptador = HTTPAdapter(
+        pool_connections=settings.API_POOL_CONEXIONES,
+        pool_maxsize=settings.API_POOL_MAXSIZE,
+        max_retries=reintentos,
+    )
+    sesion = requests.Session()
+    sesion.mount('http://', adaptador)
+    sesion.mount('https://', adaptador)
+    return sesion
+
+
+def obtener_sesion():
+    """
+    Devuelve la sesión HTTP del proceso actual, creándola si hace falta.
+    Se vuelve a crear después de un fork para no compartir sockets entre workers.
+    """
+    global _sesion, _sesion_pid
+    pid = os.getpid()
+    if _sesion is None or _sesion_pid != pid:
+        with _sesion_lock:
+            if _sesion is None or _sesion_pid != pid:
+                _sesion = _crear_sesion()
+                _sesion_pid = pid
+    return _sesion
+
+
+def cerrar_sesion():
+    """Cierra la sesión compartida (útil en pruebas y al cambiar la configuración)."""
+    global _sesion, _sesion_pid
+    with _sesion_lock:
+        if _sesion is not None:
+            _sesion.close()
+        _sesion = None
+        _sesion_pid = None
+
 
-def _realizar_peticion(url):
+def _registrar_metrica(endpoint, duracion, error):
+    with _metricas_lock:
+        metrica = _metricas[endpoint]
+        metrica['peticiones'] += 1
+        metrica['tiempo_total'] += duracion
+        metrica['tiempo_max'] = max(metrica['tiempo_max'], duracion)
+        metrica['muestras'].append(duracion)
+        if error:
+            metrica['errores'] += 1
+
+
+def obtener_metricas_api():
+    """
+    Resumen de latencia por endpoint del proceso actual (en milisegundos).
+    El p95 se calcula sobre las últimas 1000 peticiones de cada endpoint.
+    """
+    resumen = {}
+    with _metricas_lock:
+        for endpoint, metrica in _metricas.items():
+            muestras = sorted(metrica['muestras'])
+            p95 = muestras[min(len(muestras) - 1, int(len(muestras) * 0.95))] if muestras else 0.0
+            resumen[endpoint] = {
+                'peticiones': metrica['peticiones'],
+                'errores': metrica['errores'],
+                'promedio_ms': metrica['tiempo_total'] / metrica['peticiones'] * 1000 if metrica['peticiones'] else 0.0,
+                'p95_ms': p95 * 1000,
+                'max_ms': metrica['tiempo_max'] * 1000,
+            }
+    return resumen
+
+
+def reiniciar_metricas_api():
+    with _metricas_lock:
+        _metricas.clear()
+
+
+def _realizar_peticion(url, endpoint):
     """Función auxiliar para realizar peticiones y manejar errores comunes."""
+    # Dentro de una búsqueda con plazo (consulta_paralela) la petición no lo pasa
+    lectura = restante(settings.API_TIMEOUT_LECTURA)
+    if not lectura:
+        logger.warning("Plazo de la búsqueda agotado antes de consultar el API %s", endpoint)
+        return None
+    inicio = time.perf_counter()
+    error = True
     try:
-        # Hacemos la petición GET con un tiempo de espera de 20 segundos
-        response = requests.get(url, timeout=20)
+        # Timeouts separados: conectar debe ser rápido, la respuesta puede tardar más
+        response = obtener_sesion().get(
+            url,
+            timeout=(min(settings.API_TIMEOUT_CONEXION, lectura), lectura),
+        )
 
         # Si la petición fue exitosa (código 200 OK)
         if response.status_code == 200:
             data = response.json()
+            error = False
             # El manual indica que los datos vienen en la llave "Resultados"
             return data.get('Resultados', [])
         else:
             # Si el API responde con un error (404, 500, etc.)
-            print(f"Error en la respuesta del API: {response.status_code} - {response.text}")
+            logger.warning("Error en la respuesta del API %s: %s - %s", endpoint, response.status_code, response.text[:200])
+            return None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        if vencido():
+            # Nadie la espera ya: consulta_paralela avisó que el plazo se agotó
+            logger.info("Petición al API %s abandonada al vencer el plazo: %s", endpoint, e)
             return None
-    except requests.exceptions.RequestException as e:
-        # Si hay un error de conexión (no hay internet, el servidor está caído, etc.)
-        print(f"Error de conexión con el API: {e}")
+        # Error de conexión (sin internet, servidor caído, reintentos agotados) o JSON inválido
+        logger.warning("Error de conexión con el API %s: %s", endpoint, e)
         return None
+    finally:
+        duracion = time.perf_counter() - inicio
+        _registrar_metrica(endpoint, duracion, error)
+        registrar_componente('api_listas', duracion)
+
+
+def normalizar_identificacion(identificacion):
+    """
+    '1.234.567 ' -> '1234567': sin espacios ni separadores de miles, para que
+    la búsqueda, los lotes, el espejo y la vigilancia comparen la misma
+    identificación. Se conserva el guion del dígito de verificación del NIT.
+    """
+    return ''.join(str(identificacion).replace('.', '').replace(',', '').split()).upper()
+
+
+def normalizar_nombre(nombres):
+    """Mayúsculas y espacios colapsados: ' juan  perez' -> 'JUAN PEREZ'."""
+    return ' '.join(str(nombres).split()).upper()
+
+
+def _clave_cache(endpoint, argumentos):
+    # Hash de los argumentos para que la llave sea válida en cualquier backend
+    # (memcached no acepta espacios ni más de 250 caracteres)
+    huella = hashlib.sha1('|'.join(argumentos).encode('utf-8')).hexdigest()
+    return f'api:{endpoint}:{huella}'
+
+
+def _registrar_cache(acierto):
+    with _metricas_lock:
+        _estadisticas_cache['aciertos' if acierto else 'fallos'] += 1
+
+
+def estadisticas_cache_api():
+    """Aciertos y fallos de la caché de resultados en el proceso actual."""
+    with _metricas_lock:
+        aciertos = _estadisticas_cache['aciertos']
+        fallos = _estadisticas_cache['fallos']
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': aciertos / total if total else 0.0,
+    }
+
+
+def reiniciar_estadisticas_cache():
+    with _metricas_lock:
+        _estadisticas_cache['aciertos'] = 0
+        _estadisticas_cache['fallos'] = 0
+
+
+def _consultar_espejo(endpoint, argumentos):
+    # Import diferido: espejo_listas importa los normalizadores de este módulo
+    from espejo_listas.indice import consultar
+    try:
+        return consultar(endpoint, argumentos)
+    except Exception as e:
+        logger.warning("No se pudo consultar el espejo local de listas: %s", e)
+        return None
+
+
+def _consultar(endpoint, argumentos, usar_cache=True):
+    """
+    Resuelve la consulta según ESPEJO_LISTAS_MODO:
+      'remoto'   solo el API (comportamiento original).
+      'local'    el espejo local; el API solo si no hay un snapshot vigente.
+      'respaldo' el API; el espejo local si el API falla.
+    """
+    modo = settings.ESPEJO_LISTAS_MODO
+    if modo == 'local':
+        resultados = _consultar_espejo(endpoint, argumentos)
+        if resultados is not None:
+            return resultados
+
+    resultados = _consultar_remoto(endpoint, argumentos, usar_cache)
+    if resultados is None and modo == 'respaldo':
+        resultados = _consultar_espejo(endpoint, argumentos)
+        if resultados is not None:
+            logger.warning("API de listas no disponible; %s respondido con el espejo local", endpoint)
+    return resultados
+
+
+def _consultar_remoto(endpoint, argumentos, usar_cache=True):
+    """
+    Arma la URL del endpoint y consulta el API pasando primero por la caché.
+    Solo se guardan respuestas válidas (una lista, aunque esté vacía); los
+    errores (None) nunca se cachean para no ocultar una caída del servicio.
+    Las consultas idénticas simultáneas comparten una sola llamada.
+    """
+    url = f"{settings.API_BASE_URL}{endpoint}/{settings.API_TOKEN}/" + '/'.join(argumentos)
+    usar_cache = usar_cache and settings.API_CACHE_ACTIVO
+    if not settings.API_COALESCENCIA_ACTIVA:
+        return _consultar_url(url, endpoint, argumentos, usar_cache)
+    # Quien pide saltarse la caché no se suma a una llamada que pudo responder de ella
+    return compartir((url, usar_cache), lambda: _consultar_url(url, endpoint, argumentos, usar_cache))
+
+
+def _consultar_url(url, endpoint, argumentos, usar_cache):
+    if not usar_cache:
+        return _realizar_peticion(url, endpoint)
+
+    clave = _clave_cache(endpoint, argumentos)
+    try:
+        resultados = caches['consultas_api'].get(clave)
+    except Exception as e:
+        # Si el backend de caché falla (ej. falta la tabla) consultamos directo al API
+        logger.warning("No se pudo leer la caché del API: %s", e)
+        return _realizar_peticion(url, endpoint)
+
+    if resultados is not None:
+        _registrar_cache(acierto=True)
+        return resultados
+
+    _registrar_cache(acierto=False)
+    if settings.API_COALESCENCIA_ACTIVA:
+        # Otro worker puede estar consultando lo mismo: se espera su respuesta
+        return una_vez_entre_procesos(
+            caches['consultas_api'], clave, lambda: _realizar_peticion(url, endpoint), settings.API_CACHE_TTL)
+    resultados = _realizar_peticion(url, endpoint)
+    if resultados is not None:
+        try:
+            caches['consultas_api'].set(clave, resultados, settings.API_CACHE_TTL)
+        except Exception as e:
+            logger.warning("No se pudo escribir en la caché del API: %s", e)
+    return resultados
+
 
-def consultar_api_por_id(identificacion):
+def consultar_api_por_id(identificacion, usar_cache=True):
     """Se conecta al Web Service para consultar una identificación exacta."""
-    token = settings.API_TOKEN
-    base_url = settings.API_BASE_URL
-    url = f"{base_url}PepsExactaID/{token}/{identificacion}"
-    return _realizar_peticion(url)
+    return _consultar('PepsExactaID', [normalizar_identificacion(identificacion)], usar_cache)
 
-def consultar_api_por_nombre(nombres):
+def consultar_api_por_nombre(nombres, usar_cache=True):
     """Se conecta al Web Service para consultar por nombre."""
-    token = settings.API_TOKEN
-    base_url = settings.API_BASE_URL
-    url = f"{base_url}PepsNombre/{token}/{nombres.upper()}" # Nombres suelen ir en mayúscula
-    return _realizar_peticion(url)
+    # Nombres suelen ir en mayúscula
+    return _consultar('PepsNombre', [normalizar_nombre(nombres)], usar_cache)
 
-def consultar_api_por_id_y_nombre(identificacion, nombres):
+def consultar_api_por_id_y_nombre(identificacion, nombres, usar_cache=True):
     """Se conecta al Web Service para consultar por ID y nombre."""
-    token = settings.API_TOKEN
-    base_url = settings.API_BASE_URL
-    url = f"{base_url}PepsIDNombre/{token}/{identificacion}/{nombres.upper()}"
-    return _realizar_peticion(url)
\ No newline at end of file
+    return _consultar(
+        'PepsIDNombre',
+        [normalizar_identificacion(identificacion), normalizar_nombre(nombres)],
+        usar_cache,
+    )
\ No newline at end of file
@@ -0,0 +1,150 @@
+# archivo: consultas/stub_api.py
+"""
+Servidor local que imita el Web Service ConsultaListasPeps.
+
+Se usa en pruebas y benchmarks para no depender del API real. Responde a
+PepsExactaID, PepsNombre y PepsIDNombre con registros sintéticos que tienen
+la misma forma que los del manual, y permite inyectar latencia (fija o por
+endpoint, pasando una función) y errores 5xx.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+TIPOS_LISTA_EJEMPLO = [
+    'OFAC', 'ONU', 'PANAMA PAPERS', 'PEP NACIONAL', 'SENADO DE LA REPUBLICA',
+    'INTERPOL', 'PARADISE PAPERS', 'CONSEJO DE ESTADO',
+]
+
+
+def generar_registro(indice, identificacion=None, nombre=None):
+    """Construye un registro con los campos que devuelve el API real."""
+    tipo_lista = TIPOS_LISTA_EJEMPLO[indice % len(TIPOS_LISTA_EJEMPLO)]
+    return {
+        'Id': identificacion or str(10_000_000 + indice),
+        'NombreCompleto': nombre or f'PERSONA SINTETICA {indice}',
+        'Tipo_Lista': tipo_lista,
+        'Origen_Lista': 'INTERNACIONAL' if indice % 2 else 'NACIONAL',
+        'Relacionado_Con': f'Registro de prueba número {indice}',
+        'Fuente': f'https://fuente.example/{indice}',
+        'Restrictiva': tipo_lista in ('OFAC', 'ONU', 'INTERPOL'),
+        'Boletin': False,
+        'Aka': '',
+        'CoincidenciaNombre': 100 if nombre else 0,
+        'CoincidenciaID': 100 if identificacion else 0,
+        'Tipo_Persona': 'NATURAL',
+        'Fecha_Update': '/Date(1470009600000-0500)/',
+        'Estado': 'INGRESA LISTA: 20160801',
+        'LlaveImagen': '',
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para que el cliente pueda mantener la conexión abierta (keep-alive)
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        servidor = self.server
+        with servidor.lock:
+            servidor.peticiones += 1
+            numero = servidor.peticiones
+            servidor.por_ruta.append(self.path)
+
+        partes = [unquote(p) for p in self.path.strip('/').split('/')]
+        endpoint, argumentos = partes[0], partes[2:]
+
+        latencia = servidor.latencia
+        if callable(latencia):
+            latencia = latencia(endpoint)
+        if latencia:
+            time.sleep(latencia)
+
+        if servidor.fallar_cada and numero % servidor.fallar_cada == 0:
+            self._responder(503, {'Error': 'Servicio no disponible'})
+            return
+
+        if endpoint == 'PepsExactaID' and len(argumentos) == 1:
+            identificacion, nombre = argumentos[0], None
+        elif endpoint == 'PepsNombre' and len(argumentos) == 1:
+            identificacion, nombre = None, argumentos[0]
+        elif endpoint == 'PepsIDNombre' and len(argumentos) == 2:
+            identificacion, nombre = argumentos
+        else:
+            self._responder(404, {'Error': 'Endpoint no encontrado'})
+            return
+
+        total = servidor.resultados_por_consulta
+        if callable(total):
+            total = total(endpoint, identificacion, nombre)
+        resultados = [generar_registro(i, identificacion, nombre) for i in range(total)]
+        self._responder(200, {'Resultados': resultados})
+
+    def _responder(self, status, cuerpo):
+        datos = json.dumps(cuerpo).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente dejó de esperar (timeout de lectura o plazo de la búsqueda)
+            self.close_connection = True
+
+
+class StubAPIServer:
+    """
+    Uso:
+        with StubAPIServer(latencia=0.05, resultados_por_consulta=3) as stub:
+            with override_settings(API_BASE_URL=stub.base_url): ...
+    """
+
+    def __init__(self, latencia=0.0, resultados_por_consulta=1, fallar_cada=0):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.peticiones = 0
+        self.httpd.por_ruta = []
+        self.httpd.latencia = latencia
+        self.httpd.resultados_por_consulta = resultados_por_consulta
+        self.httpd.fallar_cada = fallar_cada
+        self._hilo = None
+
+    @property
+    def base_url(self):
+        host, puerto = self.httpd.server_address[:2]
+        return f'http://{host}:{puerto}/'
+
+    @property
+    def peticiones(self):
+        return self.httpd.peticiones
+
+    @property
+    def rutas(self):
+        return list(self.httpd.por_ruta)
+
+    def configurar(self, **kwargs):
+        for clave, valor in kwargs.items():
+            setattr(self.httpd, clave, valor)
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self.httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
@@ -0,0 +1,12 @@
+# archivo: consultas/tareas.py
+from cola_tareas.cola import tarea
+
+from .models import Busqueda
+from .reportes_pdf import guardar_pdf
+
+
+@tarea('consultas.generar_pdf', max_intentos=3)
+def generar_pdf_tarea(busqueda_id):
+    busqueda = Busqueda.objects.select_related('usuario').filter(pk=busqueda_id).first()
+    if busqueda is not None:
+        guardar_pdf(busqueda)
@@ -1,3 +1,1118 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import models
+from django.db.models import Sum
+from django.utils import timezone
+from django.urls import reverse
+
+from cargas_masivas.models import LoteConsultaMasiva
+from cargas_masivas.stub_s3 import ALMACENAMIENTO_LOCAL, StubS3Server
+from cola_tareas.cola import ejecutar_pendientes
+from cola_tareas.models import Tarea
+from empresas.models import Empresa
+from usuarios.models import Usuario
+
+from . import archivo, benchmark, clasificacion, coalescencia, consulta_paralela, datos_prueba, metricas, paginacion, plazos, reportes_pdf, services
+from . import entidades as entidades_lista
+from .descargas import servir_archivo
+from .models import Busqueda, EntidadLista, MetricaDiaria, Resultado
+from .views import guardar_busqueda
+from .management.commands.bench_clasificacion import clasificacion_anterior
+from .stub_api import StubAPIServer, generar_registro
+
+
+class ClienteAPITests(SimpleTestCase):
+
+    def setUp(self):
+        self.stub = StubAPIServer(resultados_por_consulta=2).iniciar()
+        self.ajustes = override_settings(
+            API_BASE_URL=self.stub.base_url, API_TOKEN='tok', API_BACKOFF_FACTOR=0, API_CACHE_ACTIVO=False,
+        )
+        self.ajustes.enable()
+        services.cerrar_sesion()
+        services.reiniciar_metricas_api()
+
+    def tearDown(self):
+        services.cerrar_sesion()
+        self.ajustes.disable()
+        self.stub.detener()
+
+    def test_consultas_usan_la_misma_sesion(self):
+        self.assertEqual(len(services.consultar_api_por_id('123')), 2)
+        sesion = services.obtener_sesion()
+        services.consultar_api_por_nombre('juan perez')
+        services.consultar_api_por_id_y_nombre('123', 'juan perez')
+        self.assertIs(services.obtener_sesion(), sesion)
+        self.assertIn('/PepsNombre/tok/JUAN%20PEREZ', self.stub.rutas)
+
+    def test_reintenta_errores_5xx(self):
+        self.stub.configurar(fallar_cada=2)
+        services.consultar_api_por_id('1')
+        # La segunda petición falla con 503 y se reintenta de forma transparente
+        self.assertEqual(len(services.consultar_api_por_id('2')), 2)
+        self.assertEqual(self.stub.peticiones, 3)
+
+    @override_settings(API_TIMEOUT_LECTURA=0.2)
+    def test_timeout_de_lectura_no_se_reintenta(self):
+        self.stub.configurar(latencia=0.5)
+        with self.assertLogs('consultas.services', level='WARNING'):
+            self.assertIsNone(services.consultar_api_por_id('1'))
+        self.assertEqual(self.stub.peticiones, 1)
+
+    def test_error_persistente_devuelve_none(self):
+        self.stub.configurar(fallar_cada=1)
+        with self.assertLogs('consultas.services', level='WARNING'):
+            self.assertIsNone(services.consultar_api_por_id('1'))
+
+    def test_metricas_por_endpoint(self):
+        services.consultar_api_por_id('1')
+        services.consultar_api_por_id('2')
+        metricas = services.obtener_metricas_api()
+        self.assertEqual(metricas['PepsExactaID']['peticiones'], 2)
+        self.assertEqual(metricas['PepsExactaID']['errores'], 0)
+        self.assertNotIn('PepsNombre', metricas)
+
+
+class ConsultaParalelaTests(SimpleTestCase):
+
+    def setUp(self):
+        self.stub = StubAPIServer(resultados_por_consulta=1).iniciar()
+        self.ajustes = override_settings(
+            API_BASE_URL=self.stub.base_url, API_TOKEN='tok', API_BACKOFF_FACTOR=0, API_CACHE_ACTIVO=False,
+            API_MAX_REINTENTOS=0, API_REVISION_COMPLETA=True,
+        )
+        self.ajustes.enable()
+        services.cerrar_sesion()
+
+    def tearDown(self):
+        services.cerrar_sesion()
+        self.ajustes.disable()
+        self.stub.detener()
+
+    def test_revision_completa_consulta_los_endpoints_a_la_vez(self):
+        self.stub.configurar(latencia=0.3)
+        inicio = time.perf_counter()
+        resultados = consulta_paralela.consultar_criterios(' 123 ', 'juan perez')
+        duracion = time.perf_counter() - inicio
+
+        self.assertEqual(sorted(self.stub.rutas), [
+            '/PepsExactaID/tok/123', '/PepsIDNombre/tok/123/JUAN%20PEREZ', '/PepsNombre/tok/JUAN%20PEREZ',
+        ])
+        self.assertEqual(len(resultados), 3)
+        # En serie tomaría al menos 0.9s
+        self.assertLess(duracion, 0.8)
+
+    def test_sin_revision_completa_solo_pepsidnombre(self):
+        with override_settings(API_REVISION_COMPLETA=False):
+            consulta_paralela.consultar_criterios('123', 'juan perez')
+        self.assertEqual(self.stub.rutas, ['/PepsIDNombre/tok/123/JUAN%20PEREZ'])
+
+    def test_fusion_sin_repetidos(self):
+        registro = generar_registro(0, identificacion='123', nombre='JUAN PEREZ')
+        por_id = dict(registro, NombreCompleto='juan  perez', CoincidenciaNombre=0)
+        otra_lista = dict(registro, Tipo_Lista='ONU')
+        unidos = consulta_paralela.fusionar_resultados([[registro], None, [por_id, otra_lista]])
+        self.assertEqual(len(unidos), 2)
+        self.assertEqual((unidos[0]['CoincidenciaID'], unidos[0]['CoincidenciaNombre']), (100, 100))
+
+    def test_plazo_usa_lo_que_alcanzo_a_llegar(self):
+        self.stub.configurar(latencia=lambda endpoint: 2.0 if endpoint == 'PepsNombre' else 0)
+        inicio = time.perf_counter()
+        with self.assertLogs('consultas.consulta_paralela', level='WARNING') as registro:
+            resultados = consulta_paralela.consultar_criterios('123', 'juan perez', plazo=0.5)
+        self.assertLess(time.perf_counter() - inicio, 1.5)
+        self.assertIn('PepsNombre', registro.output[0])
+        self.assertEqual(len(resultados), 2)
+        self.assertTrue(consulta_paralela.es_incompleta(resultados))
+
+    @override_settings(API_HILOS=1, API_REVISION_COMPLETA=False)
+    def test_peticion_abandonada_libera_el_hilo_al_vencer_el_plazo(self):
+        self.addCleanup(setattr, consulta_paralela, '_ejecutor', None)
+        consulta_paralela._ejecutor = None
+        self.stub.configurar(latencia=3.0)
+        with self.assertLogs('consultas.consulta_paralela', level='WARNING'), \
+                self.assertLogs('consultas.services', level='INFO') as registro:
+            self.assertIsNone(consulta_paralela.consultar_criterios('123', '', plazo=0.3))
+            self.stub.configurar(latencia=0)
+            # El único hilo del pool queda libre al vencer el plazo de la primera,
+            # no al terminar su timeout de lectura: la segunda responde en su plazo
+            self.assertEqual(len(consulta_paralela.consultar_criterios('456', '', plazo=1.5)), 1)
+        self.assertIn('abandonada', registro.output[0])
+
+    def test_respuesta_completa_no_queda_marcada(self):
+        resultados = consulta_paralela.consultar_criterios('123', 'juan perez')
+        self.assertFalse(consulta_paralela.es_incompleta(resultados))
+        self.assertTrue(consulta_paralela.es_incompleta(None))
+
+    def test_sin_endpoint_principal_es_error(self):
+        # Sin PepsIDNombre, lo que llegó de los otros dos no basta para descartar a nadie
+        self.stub.configurar(latencia=lambda endpoint: 2.0 if endpoint == 'PepsIDNombre' else 0)
+        with self.assertLogs('consultas.consulta_paralela', level='WARNING') as registro:
+            self.assertIsNone(consulta_paralela.consultar_criterios('123', 'juan perez', plazo=0.5))
+        self.assertIn('PepsIDNombre', registro.output[-1])
+
+    def test_todos_fallan_devuelve_none(self):
+        self.stub.configurar(fallar_cada=1)
+        with self.assertLogs('consultas.services', level='WARNING'), \
+                self.assertLogs('consultas.consulta_paralela', level='WARNING'):
+            self.assertIsNone(consulta_paralela.consultar_criterios('123', 'juan perez'))
+
+    def test_lote_respeta_orden_y_concurrencia(self):
+        self.stub.configurar(latencia=0.2)
+        criterios = [(str(i), '') for i in range(6)]
+        inicio = time.perf_counter()
+        respuestas = consulta_paralela.consultar_lote(criterios, concurrencia=3)
+        duracion = time.perf_counter() - inicio
+
+        self.assertEqual([r[0]['Id'] for r in respuestas], [str(i) for i in range(6)])
+        # Dos tandas de tres: ni en serie (1.2s) ni todo a la vez (0.2s)
+        self.assertGreaterEqual(duracion, 0.4)
+        self.assertLess(duracion, 1.0)
+
+
+@override_settings(
+    API_TOKEN='tok',
+    API_CACHE_ACTIVO=True,
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'consultas_api': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pruebas'},
+    },
+)
+class CacheAPITests(SimpleTestCase):
+
+    def setUp(self):
+        self.stub = StubAPIServer(resultados_por_consulta=1).iniciar()
+        self.ajustes = override_settings(API_BASE_URL=self.stub.base_url)
+        self.ajustes.enable()
+        caches['consultas_api'].clear()
+        services.reiniciar_estadisticas_cache()
+
+    def tearDown(self):
+        services.cerrar_sesion()
+        self.ajustes.disable()
+        self.stub.detener()
+
+    def test_misma_consulta_normalizada_usa_la_cache(self):
+        services.consultar_api_por_nombre('juan  perez')
+        services.consultar_api_por_nombre(' Juan Perez ')
+        services.consultar_api_por_id(' 123 ')
+        services.consultar_api_por_id('123')
+        self.assertEqual(self.stub.peticiones, 2)
+        self.assertEqual(services.estadisticas_cache_api()['aciertos'], 2)
+        self.assertEqual(services.estadisticas_cache_api()['fallos'], 2)
+
+    def test_endpoints_distintos_no_comparten_llave(self):
+        services.consultar_api_por_id('123')
+        services.consultar_api_por_id_y_nombre('123', 'JUAN')
+        self.assertEqual(self.stub.peticiones, 2)
+
+    def test_errores_no_se_cachean(self):
+        self.stub.configurar(fallar_cada=1)
+        with self.assertLogs('consultas.services', level='WARNING'):
+            self.assertIsNone(services.consultar_api_por_id('9'))
+        self.stub.configurar(fallar_cada=0)
+        self.assertEqual(len(services.consultar_api_por_id('9')), 1)
+
+    def test_cache_desactivada(self):
+        with override_settings(API_CACHE_ACTIVO=False):
+            services.consultar_api_por_id('123')
+            services.consultar_api_por_id('123')
+        services.consultar_api_por_id('123', usar_cache=False)
+        self.assertEqual(self.stub.peticiones, 3)
+        self.assertEqual(services.estadisticas_cache_api()['fallos'], 0)
+
+
+@override_settings(
+    API_TOKEN='tok',
+    API_CACHE_ACTIVO=True,
+    API_COALESCENCIA_ACTIVA=True,
+    API_COALESCENCIA_SONDEO_MS=10,
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'consultas_api': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pruebas'},
+    },
+)
+class CoalescenciaTests(SimpleTestCase):
+
+    SIMULTANEAS = 8
+
+    def setUp(self):
+        self.stub = StubAPIServer(latencia=0.3, resultados_por_consulta=2).iniciar()
+        self.ajustes = override_settings(API_BASE_URL=self.stub.base_url)
+        self.ajustes.enable()
+        caches['consultas_api'].clear()
+
+    def tearDown(self):
+        services.cerrar_sesion()
+        self.ajustes.disable()
+        self.stub.detener()
+
+    def _a_la_vez(self, funcion):
+        barrera = threading.Barrier(self.SIMULTANEAS)
+
+        def llamar(_):
+            barrera.wait()
+            return funcion()
+
+        with ThreadPoolExecutor(max_workers=self.SIMULTANEAS) as pool:
+            return list(pool.map(llamar, range(self.SIMULTANEAS)))
+
+    def test_consultas_identicas_simultaneas_hacen_una_llamada(self):
+        for cache_activa in (False, True):
+            with self.subTest(cache_activa=cache_activa), override_settings(API_CACHE_ACTIVO=cache_activa):
+                caches['consultas_api'].clear()
+                antes = self.stub.peticiones
+                resultados = self._a_la_vez(lambda: services.consultar_api_por_id(' 123 '))
+                self.assertEqual(self.stub.peticiones - antes, 1)
+                self.assertTrue(all(r == resultados[0] and len(r) == 2 for r in resultados))
+                # Cada quien recibe su propia lista
+                self.assertEqual(len({id(r) for r in resultados}), self.SIMULTANEAS)
+
+    def test_sin_coalescencia_cada_una_llama(self):
+        with override_settings(API_COALESCENCIA_ACTIVA=False, API_CACHE_ACTIVO=False):
+            self._a_la_vez(lambda: services.consultar_api_por_id('123'))
+        self.assertEqual(self.stub.peticiones, self.SIMULTANEAS)
+
+    def test_entre_procesos_uno_calcula_y_los_demas_esperan(self):
+        # Cada hilo hace de un worker distinto: solo comparten la caché
+        llamadas = []
+
+        def consultar():
+            llamadas.append(1)
+            time.sleep(0.2)
+            return ['respuesta']
+
+        resultados = self._a_la_vez(
+            lambda: coalescencia.una_vez_entre_procesos(caches['consultas_api'], 'clave', consultar, 60))
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(resultados, [['respuesta']] * self.SIMULTANEAS)
+        self.assertIsNone(caches['consultas_api'].get('clave:en_curso'))
+
+    def test_si_la_primera_falla_las_demas_llaman(self):
+        # Un error del API (None) no se comparte: cada una hace su propio intento
+        self.stub.configurar(fallar_cada=1)
+        with override_settings(API_MAX_REINTENTOS=0), self.assertLogs('consultas.services', level='WARNING'):
+            services.cerrar_sesion()
+            resultados = self._a_la_vez(lambda: services.consultar_api_por_id('9'))
+        self.assertEqual(resultados, [None] * self.SIMULTANEAS)
+        self.assertEqual(self.stub.peticiones, self.SIMULTANEAS)
+
+        sin_respuesta = []
+
+        def sin_respuesta_la_primera():
+            sin_respuesta.append(1)
+            if len(sin_respuesta) == 1:
+                time.sleep(0.1)
+                return None
+            return ['ok']
+
+        resultados = self._a_la_vez(lambda: coalescencia.compartir('vacia', sin_respuesta_la_primera))
+        self.assertEqual(len(sin_respuesta), self.SIMULTANEAS)
+        self.assertEqual(resultados.count(['ok']), self.SIMULTANEAS - 1)
+
+        llamadas = []
+
+        def fallar_una_vez():
+            llamadas.append(1)
+            if len(llamadas) == 1:
+                time.sleep(0.1)
+                raise RuntimeError('caída')
+            return 'ok'
+
+        resultados = []
+        for resultado in self._a_la_vez(lambda: self._capturar(coalescencia.compartir, 'otra', fallar_una_vez)):
+            resultados.append(resultado)
+        self.assertEqual(sorted(map(str, resultados)), ['caída'] + ['ok'] * (self.SIMULTANEAS - 1))
+
+    @override_settings(API_COALESCENCIA_ESPERA=1.5, API_COALESCENCIA_SONDEO_MS=50)
+    def test_quien_espera_sondea_cada_vez_menos(self):
+        cache = caches['consultas_api']
+        cache.add('lenta:en_curso', 'otro worker', 60)
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            self.assertEqual(coalescencia.una_vez_entre_procesos(cache, 'lenta', lambda: 'propia', 60), 'propia')
+        # 50, 100, 200, 400, 800 ms... en vez de una lectura cada 50 ms
+        self.assertLessEqual(get_many.call_count, 6)
+
+    def test_la_espera_no_pasa_del_plazo_de_la_busqueda(self):
+        cache = caches['consultas_api']
+        cache.add('plazo:en_curso', 'otro worker', 60)
+        inicio = time.perf_counter()
+        with plazos.con_plazo(plazos.limite_en(0.3)):
+            # Vencido el plazo nadie espera el resultado: no se hace la llamada propia
+            self.assertIsNone(coalescencia.una_vez_entre_procesos(cache, 'plazo', lambda: 'propia', 60))
+        self.assertLess(time.perf_counter() - inicio, 1.0)
+
+    @staticmethod
+    def _capturar(funcion, *args):
+        try:
+            return funcion(*args)
+        except RuntimeError as e:
+            return e
+
+
+class PaginaBusquedaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('analista', password='clave-segura', empresa=cls.empresa)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        caches['consultas_api'].clear()
+
+    def _buscar(self, total_resultados, identificacion='123'):
+        registros = [generar_registro(i) for i in range(total_resultados)]
+        with mock.patch('consultas.views.consultar_api_por_id', return_value=registros):
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.post(reverse('pagina_busqueda'), {'identificacion': identificacion})
+        self.assertEqual(respuesta.status_code, 200)
+        return consultas
+
+    def test_guarda_busqueda_y_resultados(self):
+        self._buscar(5)
+        busqueda = Busqueda.objects.get()
+        self.assertTrue(busqueda.encontro_resultados)
+        # OFAC (índice 0) es restrictiva en los registros sintéticos
+        self.assertTrue(busqueda.genero_alerta)
+        self.assertEqual(busqueda.resultados.count(), 5)
+        self.assertEqual(Resultado.objects.filter(clasificacion='Amarillo').count(), 1)
+
+    def test_numero_de_consultas_constante(self):
+        # La primera búsqueda del día crea las filas de métricas; luego solo se actualizan
+        self._buscar(50, '121')
+        pocas = self._buscar(1, '122')
+        muchas = self._buscar(50, '123')
+        self.assertEqual(len(pocas), len(muchas))
+        self.assertEqual(Resultado.objects.count(), 101)
+
+    def test_reenvio_del_formulario_reutiliza_la_busqueda(self):
+        registros = [generar_registro(i) for i in range(3)]
+        with mock.patch('consultas.views.consultar_api_por_id', return_value=registros) as consultar:
+            primera = self.client.post(reverse('pagina_busqueda'), {'identificacion': '123'})
+            segunda = self.client.post(reverse('pagina_busqueda'), {'identificacion': '123'})
+            self.assertEqual(consultar.call_count, 1)
+            self.assertEqual(primera.context['busqueda_obj'], segunda.context['busqueda_obj'])
+            self.assertTrue(segunda.context['alerta_generada'])
+
+            # Otro usuario, u otro criterio, es otra búsqueda
+            self.client.force_login(Usuario.objects.create_user('otro', empresa=self.empresa))
+            self.client.post(reverse('pagina_busqueda'), {'identificacion': '123'})
+            self.client.post(reverse('pagina_busqueda'), {'identificacion': '124'})
+            self.assertEqual(consultar.call_count, 3)
+        self.assertEqual(Busqueda.objects.count(), 3)
+
+        with override_settings(BUSQUEDA_VENTANA_REENVIO=0):
+            self._buscar(1, '124')
+        self.assertEqual(Busqueda.objects.count(), 4)
+
+    def test_error_del_api_guarda_busqueda_sin_resultados(self):
+        with mock.patch('consultas.views.consultar_api_por_id', return_value=None):
+            self.client.post(reverse('pagina_busqueda'), {'identificacion': '123'})
+        busqueda = Busqueda.objects.get()
+        self.assertFalse(busqueda.encontro_resultados)
+        self.assertFalse(busqueda.genero_alerta)
+        self.assertTrue(busqueda.consulta_incompleta)
+
+    def test_respuesta_parcial_queda_marcada_y_se_avisa(self):
+        parcial = consulta_paralela.Respuesta([generar_registro(2)], incompleta=True)
+        with mock.patch('consultas.views.consultar_criterios', return_value=parcial):
+            respuesta = self.client.post(reverse('pagina_busqueda'), {'identificacion': '123', 'nombres': 'ANA'})
+        busqueda = Busqueda.objects.get()
+        self.assertTrue(busqueda.consulta_incompleta)
+        self.assertContains(respuesta, 'Consulta incompleta')
+        self.assertContains(self.client.get(reverse('detalle_busqueda', args=[busqueda.pk])), 'Consulta incompleta')
+
+
+class EntidadesListaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('analista', empresa=cls.empresa)
+
+    def test_el_mismo_registro_se_guarda_una_vez(self):
+        registros = [generar_registro(i) for i in range(5)]
+        guardar_busqueda(self.usuario, 'ID: 1', registros)
+        # Otra búsqueda que encuentra a los mismos con otro porcentaje de coincidencia
+        segunda = guardar_busqueda(self.usuario, 'ID: 2', [dict(r, CoincidenciaNombre=80) for r in registros])
+
+        self.assertEqual(EntidadLista.objects.count(), 5)
+        self.assertEqual(Resultado.objects.count(), 10)
+        resultado = segunda.resultados.select_related('entidad').get(entidad__identificacion='10000000')
+        self.assertEqual(resultado.coincidencia_nombre, 80)
+        self.assertEqual(resultado.nombre_completo, 'PERSONA SINTETICA 0')
+        self.assertEqual(resultado.tipo_lista, 'OFAC')
+
+    def test_registro_que_cambia_es_otra_entidad(self):
+        registro = generar_registro(0)
+        guardar_busqueda(self.usuario, 'ID: 1', [registro, registro])
+        guardar_busqueda(self.usuario, 'ID: 1', [dict(registro, Estado='SALE DE LISTA: 20200101')])
+        self.assertEqual(EntidadLista.objects.count(), 2)
+        self.assertEqual(Resultado.objects.count(), 3)
+
+    def test_huella_igual_desde_el_api_y_desde_la_base(self):
+        entidad = entidades_lista.guardar_entidades([entidades_lista.entidad_desde_registro(generar_registro(3))])[0]
+        guardada = EntidadLista.objects.values(*[campo for campo, _ in entidades_lista.CAMPOS_API]).get(pk=entidad.pk)
+        self.assertEqual(entidades_lista.calcular_huella(entidades_lista.valores_normalizados(guardada)), entidad.huella)
+
+    def test_interpreta_fecha_update_y_estado(self):
+        interpretar_fecha, interpretar_estado = entidades_lista.interpretar_fecha_update, entidades_lista.interpretar_estado
+        self.assertEqual(interpretar_fecha('/Date(1500354000000-0500)/'),
+                         datetime(2017, 7, 18, 5, tzinfo=dt_timezone.utc))
+        # El API SOAP entrega la fecha sin zona, en hora de Colombia
+        self.assertEqual(interpretar_fecha('2017-07-18T00:00:00'), datetime(2017, 7, 18, 5, tzinfo=dt_timezone.utc))
+        self.assertIsNone(interpretar_fecha('/Date(-62135596800000)/'))
+        self.assertIsNone(interpretar_fecha('ayer'))
+        self.assertEqual(interpretar_estado('INGRESA LISTA: 20160801'), (EntidadLista.INGRESO, date(2016, 8, 1)))
+        self.assertEqual(interpretar_estado('SALE DE LISTA: 20200101'), (EntidadLista.RETIRO, date(2020, 1, 1)))
+        self.assertEqual(interpretar_estado('VIGENTE'), (EntidadLista.OTRO, None))
+        self.assertEqual(interpretar_estado(''), ('', None))
+
+    def test_columnas_tipadas_al_guardar_y_con_el_comando(self):
+        guardar_busqueda(self.usuario, 'ID: 1', [generar_registro(0), dict(generar_registro(1), Estado=None)])
+        self.assertEqual(
+            sorted(EntidadLista.objects.values_list('estado_movimiento', 'estado_fecha')),
+            [('', None), (EntidadLista.INGRESO, date(2016, 8, 1))],
+        )
+        self.assertFalse(EntidadLista.objects.filter(fecha_actualizacion__isnull=True).exists())
+
+        # Entidades guardadas antes de las columnas tipadas
+        EntidadLista.objects.update(fecha_actualizacion=None, estado_movimiento='', estado_fecha=None)
+        call_command('tipar_entidades', lote=1, stdout=io.StringIO())
+        self.assertEqual(
+            sorted(EntidadLista.objects.values_list('estado_movimiento', 'estado_fecha')),
+            [('', None), (EntidadLista.INGRESO, date(2016, 8, 1))],
+        )
+        self.assertEqual(EntidadLista.objects.filter(fecha_actualizacion__year=2016).count(), 2)
+
+    def test_dashboard_de_gestion_cuenta_ingresos_recientes(self):
+        caches['default'].clear()
+        self.usuario.es_superior = True
+        self.usuario.save()
+        reciente = f'INGRESA LISTA: {timezone.localdate() - timedelta(days=5):%Y%m%d}'
+        guardar_busqueda(self.usuario, 'ID: 1', [generar_registro(0), dict(generar_registro(1), Estado=reciente)])
+        guardar_busqueda(self.usuario, 'ID: 2', [dict(generar_registro(1), Estado=reciente)])
+
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('gestion_dashboard'))
+        self.assertEqual(respuesta.context['nuevos_en_listas'], 1)
+
+        # Queda en caché: la siguiente carga no repite el conteo
+        guardar_busqueda(self.usuario, 'ID: 3', [dict(generar_registro(2), Estado=reciente)])
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('gestion_dashboard'))
+        self.assertEqual(respuesta.context['nuevos_en_listas'], 1)
+        self.assertFalse([c for c in consultas if 'DISTINCT' in c['sql']])
+        caches['default'].clear()
+        self.assertEqual(self.client.get(reverse('gestion_dashboard')).context['nuevos_en_listas'], 2)
+
+
+class MigracionesSinBloqueoTests(SimpleTestCase):
+
+    def test_indices_concurrentes_fuera_de_transaccion(self):
+        # CREATE/DROP INDEX CONCURRENTLY falla dentro de una transacción en PostgreSQL
+        migraciones = MigrationLoader(None, ignore_no_migrations=True).disk_migrations
+        concurrentes = [
+            nombre for (app, nombre), migracion in migraciones.items()
+            if app == 'consultas' and any(isinstance(op, (AddIndexConcurrently, RemoveIndexConcurrently))
+                                          for op in migracion.operations)
+        ]
+        self.assertEqual(sorted(concurrentes)[:2], ['0003_empresa_busqueda_indices', '0004_indices_cursor_y_trigramas'])
+        # Los plegados de resultados confirman por bloques
+        self.assertFalse(migraciones['consultas', '0006_plegar_resultados_en_entidades'].atomic)
+        self.assertFalse(migraciones['consultas', '0007_resultado_sin_copia_del_registro'].atomic)
+        self.assertIn('0009_entidad_campos_tipados', concurrentes)
+        for nombre in concurrentes:
+            self.assertFalse(migraciones['consultas', nombre].atomic, nombre)
+        self.assertFalse(migraciones['consultas', '0003_empresa_busqueda_copiar'].atomic)
+
+
+class PlegadoDeResultadosMigracionTests(TransactionTestCase):
+    antes = [('consultas', '0005_entidad_lista')]
+    despues = [('consultas', '0007_resultado_sin_copia_del_registro')]
+
+    def _migrar(self, destino):
+        ejecutor = MigrationExecutor(connection)
+        ejecutor.loader.build_graph()
+        ejecutor.migrate(destino)
+        return ejecutor.loader.project_state(destino).apps
+
+    def tearDown(self):
+        self._migrar(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_pliega_los_resultados_repetidos(self):
+        apps = self._migrar(self.antes)
+        Busqueda = apps.get_model('consultas', 'Busqueda')
+        Resultado = apps.get_model('consultas', 'Resultado')
+        busquedas = [Busqueda.objects.create(termino_buscado=str(i)) for i in range(3)]
+        for busqueda in busquedas:
+            Resultado.objects.create(busqueda=busqueda, nombre_completo='ANA PÉREZ', identificacion='1',
+                                     tipo_lista='OFAC', es_restrictiva=True, coincidencia_id=100)
+        Resultado.objects.create(busqueda=busquedas[0], nombre_completo='LUIS GÓMEZ', tipo_lista='ONU')
+
+        apps = self._migrar(self.despues)
+        EntidadListaMigrada = apps.get_model('consultas', 'EntidadLista')
+        self.assertEqual(EntidadListaMigrada.objects.count(), 2)
+        ana = EntidadListaMigrada.objects.get(nombre_completo='ANA PÉREZ')
+        self.assertEqual(ana.resultados.count(), 3)
+        self.assertTrue(ana.es_restrictiva)
+        # La huella es la misma que tendría el registro llegado del API
+        self.assertEqual(ana.huella, entidades_lista.entidad_desde_registro({
+            'NombreCompleto': 'ANA PÉREZ', 'Id': '1', 'Tipo_Lista': 'OFAC', 'Restrictiva': True}).huella)
+
+        # Y se puede volver atrás con los datos copiados de nuevo en Resultado
+        apps = self._migrar(self.antes)
+        self.assertEqual(
+            sorted(apps.get_model('consultas', 'Resultado').objects.values_list('nombre_completo', flat=True)),
+            ['ANA PÉREZ', 'ANA PÉREZ', 'ANA PÉREZ', 'LUIS GÓMEZ'],
+        )
+
+    def test_pliega_los_resultados_guardados_despues_de_0006(self):
+        apps = self._migrar([('consultas', '0006_plegar_resultados_en_entidades')])
+        Busqueda = apps.get_model('consultas', 'Busqueda')
+        Resultado = apps.get_model('consultas', 'Resultado')
+        # La versión anterior de la aplicación sigue guardando sin entidad durante el despliegue
+        Resultado.objects.create(busqueda=Busqueda.objects.create(termino_buscado='1'),
+                                 nombre_completo='ANA PÉREZ', identificacion='1', tipo_lista='OFAC')
+
+        apps = self._migrar(self.despues)
+        resultado = apps.get_model('consultas', 'Resultado').objects.select_related('entidad').get()
+        self.assertEqual(resultado.entidad.nombre_completo, 'ANA PÉREZ')
+        self.assertEqual(resultado.entidad.huella, entidades_lista.entidad_desde_registro({
+            'NombreCompleto': 'ANA PÉREZ', 'Id': '1', 'Tipo_Lista': 'OFAC'}).huella)
+
+
+class ClasificacionTests(TestCase):
+
+    def test_coincide_con_la_clasificacion_anterior(self):
+        tipos = ['', None, 'OFAC', 'panama papers', 'PEPS COLOMBIA', 'Senado de la República',
+                 'BOLETIN PANAMA PAPERS', 'PANAMA PAPERS 2', 'CORTE SUPREMA', 'INTERPOL']
+        self.assertEqual(clasificacion.clasificar_lote(tipos), [clasificacion_anterior(t) for t in tipos])
+
+    def test_recarga_reglas_cuando_cambia_el_archivo(self):
+        descriptor, ruta = tempfile.mkstemp(suffix='.json')
+        os.close(descriptor)
+        self.addCleanup(os.remove, ruta)
+
+        def escribir(valores, mtime):
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                json.dump({'por_defecto': 'Rojo', 'reglas': [
+                    {'clasificacion': 'Amarillo', 'tipo': 'exacta', 'valores': valores}]}, archivo)
+            os.utime(ruta, (mtime, mtime))
+
+        with override_settings(CLASIFICACION_REGLAS=ruta, CLASIFICACION_RECARGA_SEGUNDOS=0):
+            escribir(['LISTA A'], 1_000_000)
+            self.assertEqual(clasificacion.clasificar('Lista B'), 'Rojo')
+            escribir(['LISTA A', 'LISTA B'], 2_000_000)
+            self.assertEqual(clasificacion.clasificar('Lista B'), 'Amarillo')
+
+    @override_settings(STORAGES=ALMACENAMIENTO_LOCAL)  # Reclasificar borra los PDF guardados
+    def test_reclasificar_resultados_actualiza_solo_los_que_cambian(self):
+        empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        usuario = Usuario.objects.create_user('analista', empresa=empresa)
+        busqueda = Busqueda.objects.create(usuario=usuario, termino_buscado='123')
+        entidades = entidades_lista.guardar_entidades([
+            entidades_lista.entidad_desde_registro({'Tipo_Lista': tipo_lista})
+            for tipo_lista in ('PANAMA PAPERS', 'OFAC', 'SENADO')
+        ])
+        Resultado.objects.bulk_create([
+            Resultado(busqueda=busqueda, entidad=entidad, clasificacion='Rojo') for entidad in entidades
+        ])
+
+        call_command('reclasificar_resultados', bloque=2, stdout=io.StringIO())
+
+        self.assertEqual(
+            sorted(Resultado.objects.values_list('entidad__tipo_lista', 'clasificacion')),
+            [('OFAC', 'Rojo'), ('PANAMA PAPERS', 'Amarillo'), ('SENADO', "PEP's")],
+        )
+
+    def test_reclasificar_invalida_los_pdf_de_cada_bloque(self):
+        usuario = Usuario.objects.create_user('analista', empresa=Empresa.objects.create(nombre='Empresa Prueba'))
+        entidad, = entidades_lista.guardar_entidades([entidades_lista.entidad_desde_registro({'Tipo_Lista': 'SENADO'})])
+        busquedas = [Busqueda.objects.create(usuario=usuario, termino_buscado=str(i)) for i in range(3)]
+        for busqueda in busquedas:
+            Resultado.objects.create(busqueda=busqueda, entidad=entidad, clasificacion='Rojo')
+
+        with mock.patch('consultas.management.commands.reclasificar_resultados.invalidar_pdfs') as invalidar:
+            call_command('reclasificar_resultados', bloque=1, stdout=io.StringIO())
+
+        self.assertEqual([llamada.args[0] for llamada in invalidar.call_args_list],
+                         [{busqueda.pk} for busqueda in busquedas])
+
+
+class MetricasDiariasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('analista', empresa=cls.empresa, es_superior=True)
+
+    def _conteos(self):
+        return sorted(
+            MetricaDiaria.objects.values_list('dia', 'empresa', 'usuario', 'metrica', 'clasificacion', 'tipo_lista')
+            .annotate(total=Sum('conteo'))
+        )
+
+    def test_reconstruccion_calcula_dentro_de_la_transaccion_que_reemplaza(self):
+        # Una búsqueda guardada entre el cálculo y el reemplazo se perdería de las métricas
+        guardar_busqueda(self.usuario, '1', [generar_registro(0)])
+        fuera = len(connection.savepoint_ids)
+        profundidad = []
+        calcular = metricas._calcular_metricas
+
+        def calcular_y_medir(desde):
+            profundidad.append(len(connection.savepoint_ids))
+            return calcular(desde)
+
+        with mock.patch.object(metricas, '_calcular_metricas', side_effect=calcular_y_medir):
+            metricas.reconstruir()
+        self.assertEqual(profundidad, [fuera + 1])
+        self.assertEqual(MetricaDiaria.objects.filter(metrica=MetricaDiaria.CONSULTAS).get().conteo, 1)
+
+    def test_incremental_coincide_con_reconstruccion(self):
+        guardar_busqueda(self.usuario, '1', [generar_registro(i) for i in range(4)])
+        guardar_busqueda(self.usuario, '2', [generar_registro(i) for i in range(2)])
+        guardar_busqueda(self.usuario, '3', None)
+        incrementales = self._conteos()
+
+        metricas.reconstruir()
+        self.assertEqual(self._conteos(), incrementales)
+        resumen = metricas.resumen_periodo(MetricaDiaria.objects.all(), timezone.localdate())
+        self.assertEqual(resumen['consultas'], 3)
+        self.assertEqual(resumen['consultas_hoy'], 3)
+        # PANAMA PAPERS (índice 2) solo aparece en la primera búsqueda
+        self.assertEqual(resumen['amarillo'], 1)
+
+    def test_dashboards_no_dependen_del_historial(self):
+        self.client.force_login(self.usuario)
+        # La tabla de últimas búsquedas siempre muestra 5
+        for i in range(5):
+            guardar_busqueda(self.usuario, str(i), [generar_registro(0)])
+        with CaptureQueriesContext(connection) as pocas:
+            self.client.get(reverse('dashboard'))
+        for i in range(20):
+            guardar_busqueda(self.usuario, str(i), [generar_registro(j) for j in range(3)])
+        with CaptureQueriesContext(connection) as muchas:
+            respuesta = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(pocas), len(muchas))
+        self.assertEqual(respuesta.context['total_consultas_mes'], 25)
+
+        respuesta = self.client.get(reverse('gestion_dashboard'))
+        self.assertEqual(respuesta.context['consultas_hoy'], 25)
+        self.assertEqual(respuesta.context['top_usuarios'][0]['total'], 25)
+
+
+class PaginacionCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('superior', empresa=cls.empresa, es_superior=True)
+        ahora = timezone.now()
+        with datos_prueba._fechas_manuales():
+            # Varias búsquedas por segundo: el cursor tiene que desempatar por id
+            Busqueda.objects.bulk_create([
+                Busqueda(usuario=cls.usuario, empresa=cls.empresa, termino_buscado=f'TERMINO {i}',
+                         fecha_busqueda=ahora - timedelta(seconds=i // 3), encontro_resultados=i % 2 == 0)
+                for i in range(60)
+            ])
+        cls.esperados = list(Busqueda.objects.order_by('-fecha_busqueda', '-id').values_list('pk', flat=True))
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_login(self.usuario)
+
+    def _recorrer(self, parametros, direccion='siguiente'):
+        paginas = []
+        while True:
+            pagina = paginacion.paginar_por_cursor(Busqueda.objects.all(), parametros, ['-fecha_busqueda', '-id'], 25)
+            paginas.append([b.pk for b in pagina])
+            cursor = getattr(pagina, direccion)
+            if cursor is None:
+                return paginas
+            parametros = {'despues' if direccion == 'siguiente' else 'antes': cursor}
+
+    def test_recorre_todas_las_filas_en_orden(self):
+        paginas = self._recorrer({})
+        self.assertEqual([len(p) for p in paginas], [25, 25, 10])
+        self.assertEqual(sum(paginas, []), self.esperados)
+
+        # Y de vuelta desde la última página, con los mismos cortes
+        ultima = paginacion.cursor_de(Busqueda.objects.get(pk=self.esperados[49]), ['-fecha_busqueda', '-id'])
+        hacia_atras = self._recorrer({'despues': ultima}, direccion='anterior')
+        self.assertEqual(hacia_atras, paginas[::-1])
+
+    def test_cursor_invalido_muestra_la_primera_pagina(self):
+        for cursor in ('basura', paginacion.codificar_cursor(['no-es-fecha', 1]), paginacion.codificar_cursor([1])):
+            pagina = paginacion.paginar_por_cursor(Busqueda.objects.all(), {'despues': cursor}, ['-fecha_busqueda', '-id'])
+            self.assertEqual([b.pk for b in pagina], self.esperados[:25])
+            self.assertFalse(pagina.has_previous())
+
+    def test_gestion_conserva_filtros_y_no_depende_de_la_profundidad(self):
+        url = reverse('gestion_consultas')
+        with CaptureQueriesContext(connection) as primera:
+            respuesta = self.client.get(url, {'con_resultados': 'si'})
+        self.assertEqual(respuesta.context['total_consultas'], 30)
+        self.assertTrue(respuesta.context['total_exacto'])
+        siguiente = respuesta.context['page_obj'].siguiente
+        self.assertContains(respuesta, f'?con_resultados=si&amp;despues={siguiente}')
+
+        with CaptureQueriesContext(connection) as segunda:
+            respuesta = self.client.get(url, {'con_resultados': 'si', 'despues': siguiente})
+        self.assertEqual(len(respuesta.context['page_obj']), 5)
+        self.assertTrue(all(b.encontro_resultados for b in respuesta.context['page_obj']))
+        # El total sale de la caché y la página no hace OFFSET ni COUNT
+        self.assertLess(len(segunda), len(primera))
+        self.assertFalse(any('OFFSET' in q['sql'] or '__count' in q['sql'] for q in segunda.captured_queries))
+
+    def test_historial_paginado(self):
+        respuesta = self.client.get(reverse('historial_busquedas'))
+        self.assertEqual([b.pk for b in respuesta.context['busquedas']], self.esperados[:25])
+        self.assertContains(respuesta, 'Siguiente')
+
+    def test_conteo_en_cache(self):
+        self.assertEqual(paginacion.contar(Busqueda.objects.filter(empresa=self.empresa)), (60, True))
+        Busqueda.objects.filter(pk=self.esperados[0]).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(paginacion.contar(Busqueda.objects.filter(empresa=self.empresa)), (60, True))
+
+
+class NumeroDeConsultasTests(TestCase):
+    """Cada página hace las mismas consultas con pocos o muchos datos (sin N+1)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('superior', empresa=cls.empresa, es_superior=True)
+        cls.otro = Usuario.objects.create_user('analista', empresa=cls.empresa)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _buscar(self, cantidad, resultados, usuario=None):
+        for i in range(cantidad):
+            busqueda = guardar_busqueda(usuario or self.usuario, str(i), [generar_registro(j) for j in range(resultados)])
+        return busqueda
+
+    def _consultas(self, url):
+        caches['default'].clear()
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, url)
+        return len(consultas)
+
+    def test_listados_no_dependen_del_volumen(self):
+        urls = [reverse(nombre) for nombre in (
+            'dashboard', 'pagina_busqueda', 'historial_busquedas', 'gestion_dashboard', 'gestion_consultas')]
+        self._buscar(2, 1)
+        pocas = {url: self._consultas(url) for url in urls}
+        # Búsquedas de otro usuario con varias clasificaciones por fila
+        self._buscar(30, 6, usuario=self.otro)
+        self._buscar(30, 6)
+        muchas = {url: self._consultas(url) for url in urls}
+        self.assertEqual(muchas, pocas)
+        # gestion_dashboard: 8 más el conteo de ingresos recientes a las listas (sin caché)
+        self.assertLessEqual(max(muchas.values()), 9)
+
+    def test_detalle_y_reporte_no_dependen_de_los_resultados(self):
+        pocos, muchos = self._buscar(1, 1), self._buscar(1, 12)
+        for nombre in ('detalle_busqueda', 'gestion_detalle_busqueda'):
+            self.assertEqual(self._consultas(reverse(nombre, args=[muchos.pk])),
+                             self._consultas(reverse(nombre, args=[pocos.pk])))
+
+        def consultas_reporte(busqueda):
+            busqueda = Busqueda.objects.select_related('usuario').get(pk=busqueda.pk)
+            with CaptureQueriesContext(connection) as consultas:
+                reportes_pdf.renderizar_pdf(busqueda)
+            return len(consultas)
+        self.assertEqual(consultas_reporte(muchos), consultas_reporte(pocos))
+        self.assertEqual(consultas_reporte(muchos), 1)
+
+    def test_conteos_anotados(self):
+        registros = [generar_registro(j) for j in range(6)]
+        busqueda = guardar_busqueda(self.usuario, '1', registros)
+        anotada = Busqueda.objects.con_conteos().get(pk=busqueda.pk)
+        esperados = {clase: busqueda.resultados.filter(clasificacion=clase).count()
+                     for clase in ('Rojo', 'Amarillo', "PEP's")}
+        self.assertEqual((anotada.total_resultados, anotada.rojos, anotada.amarillos, anotada.peps),
+                         (6, esperados['Rojo'], esperados['Amarillo'], esperados["PEP's"]))
+        sin_resultados = guardar_busqueda(self.usuario, '2', [])
+        self.assertEqual(Busqueda.objects.con_conteos().get(pk=sin_resultados.pk).rojos, 0)
+
+
+class DatosPruebaTests(TestCase):
+
+    def test_genera_y_borra_historial_sintetico(self):
+        busquedas, resultados = datos_prueba.generar_historial(200, empresas=2, usuarios_por_empresa=2, lote=64)
+        self.assertEqual(busquedas, 200)
+        self.assertEqual(Resultado.objects.count(), resultados)
+        # La empresa queda copiada del usuario y las fechas repartidas en el año
+        self.assertFalse(Busqueda.objects.exclude(empresa=models.F('usuario__empresa')).exists())
+        self.assertGreater(Busqueda.objects.dates('fecha_busqueda', 'month').count(), 6)
+
+        datos_prueba.borrar_historial()
+        self.assertFalse(Busqueda.objects.exists())
+        self.assertFalse(Empresa.objects.exists())
+
+
+class BenchEscenariosTests(TestCase):
+
+    def setUp(self):
+        datos_prueba.generar_historial(60, empresas=2, usuarios_por_empresa=2, lote=64)
+        self.busquedas = Busqueda.objects.count()
+
+    def test_escenarios_corren_y_no_dejan_datos(self):
+        resultado = benchmark.ejecutar(list(benchmark.ESCENARIOS), peticiones=4, calentamiento=1,
+                                       latencia_api=0, filas_lote=10)
+        for nombre, metricas in resultado['escenarios'].items():
+            self.assertEqual(metricas['errores'], 0, nombre)
+            self.assertEqual(metricas['peticiones'], 4)
+            self.assertGreater(metricas['sql_mediana'], 0)
+            self.assertLessEqual(metricas['p50_ms'], metricas['p99_ms'])
+        self.assertEqual(Busqueda.objects.count(), self.busquedas)
+        self.assertFalse(LoteConsultaMasiva.objects.exists())
+        self.assertFalse(Tarea.objects.exists())
+
+    def test_comparacion_con_linea_base(self):
+        base = {'escenarios': {'dashboard': {
+            'por_segundo': 100, 'p50_ms': 10, 'p95_ms': 20, 'p99_ms': 30, 'sql_mediana': 8, 'sql_max': 8,
+        }}}
+        actual = {'escenarios': {'dashboard': {
+            'por_segundo': 95, 'p50_ms': 10.5, 'p95_ms': 30, 'p99_ms': 31, 'sql_mediana': 9, 'sql_max': 8,
+        }}}
+        empeoradas = {fila[1] for fila in benchmark.comparar(actual, base, tolerancia=0.10) if fila[5]}
+        self.assertEqual(empeoradas, {'p95_ms', 'sql_mediana'})
+
+
+class DescargasTests(SimpleTestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.ajustes = override_settings(MEDIA_ROOT=self.media, STORAGES=ALMACENAMIENTO_LOCAL)
+        self.ajustes.enable()
+        self.contenido = bytes(range(256)) * 1000
+        self.nombre = default_storage.save('lotes/resultado.xlsx', ContentFile(self.contenido))
+        self.fabrica = RequestFactory()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def _servir(self, metodo='get', **encabezados):
+        return servir_archivo(getattr(self.fabrica, metodo)('/', headers=encabezados), default_storage, self.nombre)
+
+    def test_archivo_completo_por_bloques(self):
+        respuesta = self._servir()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        self.assertEqual(respuesta['Content-Length'], str(len(self.contenido)))
+        self.assertEqual(respuesta['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment; filename="resultado.xlsx"', respuesta['Content-Disposition'])
+        self.assertEqual(respuesta['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.assertIn('private', respuesta['Cache-Control'])
+        bloques = list(respuesta.streaming_content)
+        self.assertGreater(len(bloques), 1)
+        self.assertEqual(b''.join(bloques), self.contenido)
+
+    def test_rangos(self):
+        respuesta = self._servir(Range='bytes=1000-1999')
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(respuesta['Content-Range'], f'bytes 1000-1999/{len(self.contenido)}')
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido[1000:2000])
+
+        respuesta = self._servir(Range='bytes=-10')
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido[-10:])
+        respuesta = self._servir(Range='bytes=255990-')
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido[255990:])
+
+        respuesta = self._servir(Range=f'bytes={len(self.contenido)}-')
+        self.assertEqual(respuesta.status_code, 416)
+        self.assertEqual(respuesta['Content-Range'], f'bytes */{len(self.contenido)}')
+
+    def test_peticiones_condicionales(self):
+        etag = self._servir(metodo='head')['ETag']
+        self.assertEqual(self._servir(If_None_Match=etag).status_code, 304)
+        # If-Range con otro ETag: el archivo cambió, se envía completo
+        respuesta = self._servir(Range='bytes=0-9', If_Range='"otro"')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self._servir(Range='bytes=0-9', If_Range=etag).status_code, 206)
+
+    def test_head_y_archivo_inexistente(self):
+        respuesta = self._servir(metodo='head')
+        self.assertEqual((respuesta.status_code, respuesta.content), (200, b''))
+        self.assertEqual(respuesta['Content-Length'], str(len(self.contenido)))
+        with self.assertRaises(Http404):
+            servir_archivo(self.fabrica.get('/'), default_storage, 'lotes/no_existe.xlsx')
+
+
+class ReportePdfTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('analista', empresa=cls.empresa)
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.ajustes = override_settings(MEDIA_ROOT=self.media, STORAGES=ALMACENAMIENTO_LOCAL)
+        self.ajustes.enable()
+        self.client.force_login(self.usuario)
+        self.busqueda = guardar_busqueda(self.usuario, 'ID: 123', [generar_registro(i) for i in range(3)])
+
+    def tearDown(self):
+        self.ajustes.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def _descargar(self):
+        respuesta = self.client.get(reverse('generar_pdf_busqueda', args=[self.busqueda.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertIn('attachment', respuesta['Content-Disposition'])
+        return b''.join(respuesta.streaming_content)
+
+    def test_pdf_se_genera_una_sola_vez(self):
+        with mock.patch.object(reportes_pdf, 'renderizar_pdf', wraps=reportes_pdf.renderizar_pdf) as renderizar:
+            primero = self._descargar()
+            segundo = self._descargar()
+        self.assertEqual(renderizar.call_count, 1)
+        self.assertEqual(primero, segundo)
+
+    def test_pdf_guardado_a_la_vez_por_dos_procesos_no_se_duplica(self):
+        renderizar_pdf = reportes_pdf.renderizar_pdf
+
+        def otro_proceso_lo_guarda(busqueda, base_url=None):
+            # La tarea de pre-generación termina mientras esta descarga renderiza
+            contenido = renderizar_pdf(busqueda, base_url)
+            default_storage.save(reportes_pdf.ruta_pdf(busqueda.pk), ContentFile(contenido))
+            return contenido
+
+        with mock.patch.object(reportes_pdf, 'renderizar_pdf', side_effect=otro_proceso_lo_guarda):
+            ruta = reportes_pdf.guardar_pdf(self.busqueda)
+
+        self.assertEqual(ruta, reportes_pdf.ruta_pdf(self.busqueda.pk))
+        self.assertEqual(default_storage.listdir(reportes_pdf.CARPETA)[1], [ruta.rsplit('/', 1)[1]])
+
+    def test_cambio_de_plantilla_genera_otro_archivo(self):
+        ruta = reportes_pdf.guardar_pdf(self.busqueda)
+        with mock.patch.object(reportes_pdf, 'version_plantilla', return_value='otra'):
+            self.assertNotEqual(reportes_pdf.ruta_pdf(self.busqueda.pk), ruta)
+
+    def test_busqueda_deja_pdf_listo_en_segundo_plano(self):
+        with mock.patch('consultas.views.consultar_api_por_id', return_value=[generar_registro(0)]):
+            self.client.post(reverse('pagina_busqueda'), {'identificacion': '456'})
+        busqueda = Busqueda.objects.latest('pk')
+        self.assertFalse(default_storage.exists(reportes_pdf.ruta_pdf(busqueda.pk)))
+
+        ejecutar_pendientes(['consultas.generar_pdf'])
+        self.assertTrue(default_storage.exists(reportes_pdf.ruta_pdf(busqueda.pk)))
+
+
+class ArchivoHistorialTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('analista', empresa=cls.empresa, es_superior=True)
+        cls.otro = Usuario.objects.create_user('otro', empresa=cls.empresa)
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.ajustes = override_settings(MEDIA_ROOT=self.media, STORAGES=ALMACENAMIENTO_LOCAL)
+        self.ajustes.enable()
+        self.mes = archivo.inicio_de_mes(timezone.localdate() - timedelta(days=900))
+        self.vieja = self._busqueda_del(self.mes, [generar_registro(i) for i in range(3)])
+        self.reciente = guardar_busqueda(self.usuario, 'ID: reciente', [generar_registro(0)])
+        metricas.reconstruir()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def _busqueda_del(self, mes, registros):
+        busqueda = guardar_busqueda(self.usuario, 'ID: vieja', registros)
+        fecha = timezone.make_aware(datetime.combine(mes.replace(day=10), datetime.min.time()))
+        Busqueda.objects.filter(pk=busqueda.pk).update(fecha_busqueda=fecha)
+        return busqueda
+
+    def test_archiva_meses_viejos_y_los_borra_de_la_base(self):
+        self.assertEqual(archivo.meses_por_archivar(24), [self.mes])
+        guardado = archivo.archivar_mes(self.mes)
+
+        self.assertEqual((guardado.busquedas, guardado.resultados), (1, 3))
+        self.assertTrue(default_storage.exists(guardado.ruta_busquedas))
+        self.assertFalse(Busqueda.objects.filter(pk=self.vieja.pk).exists())
+        self.assertTrue(Busqueda.objects.filter(pk=self.reciente.pk).exists())
+        self.assertEqual(archivo.meses_por_archivar(24), [])
+
+    def test_detalle_y_pdf_leen_la_busqueda_archivada(self):
+        archivo.archivar_mes(self.mes)
+        self.client.force_login(self.usuario)
+
+        respuesta = self.client.get(reverse('detalle_busqueda', args=[self.vieja.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['busqueda'].termino_buscado, 'ID: vieja')
+        self.assertEqual(
+            sorted(resultado.nombre_completo for resultado in respuesta.context['resultados']),
+            sorted(registro['NombreCompleto'] for registro in (generar_registro(i) for i in range(3))),
+        )
+        respuesta = self.client.get(reverse('generar_pdf_busqueda', args=[self.vieja.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+
+        # Los filtros de permisos también aplican al archivo
+        self.client.force_login(self.otro)
+        respuesta = self.client.get(reverse('detalle_busqueda', args=[self.vieja.pk]))
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_en_s3_lee_la_busqueda_archivada_por_rangos(self):
+        with StubS3Server() as s3, override_settings(STORAGES=s3.storages(location='cliente/media')):
+            guardado = archivo.archivar_mes(self.mes)
+            busqueda = archivo.cargar_busqueda_archivada(self.vieja.pk)
+
+        self.assertEqual(busqueda.termino_buscado, 'ID: vieja')
+        self.assertEqual(len(busqueda.resultados_archivados), 3)
+        lecturas = [rango for clave, rango in s3.lecturas
+                    if clave in (f'cliente/media/{guardado.ruta_busquedas}', f'cliente/media/{guardado.ruta_resultados}')]
+        # Ni la verificación del archivo ni la lectura descargan el objeto completo
+        self.assertTrue(lecturas)
+        self.assertNotIn(None, lecturas)
+
+    def test_retoma_el_borrado_interrumpido(self):
+        with mock.patch.object(archivo, '_borrar_mes', side_effect=RuntimeError('caída')):
+            with self.assertRaises(RuntimeError):
+                archivo.archivar_mes(self.mes)
+        self.assertTrue(Busqueda.objects.filter(pk=self.vieja.pk).exists())
+
+        with mock.patch.object(archivo, '_exportar') as exportar:
+            archivo.archivar_mes(self.mes)
+        exportar.assert_not_called()
+        self.assertFalse(Busqueda.objects.filter(pk=self.vieja.pk).exists())
+
+    def test_reconstruir_metricas_conserva_los_meses_archivados(self):
+        archivadas = MetricaDiaria.objects.filter(dia__lt=archivo.mes_siguiente(self.mes)).count()
+        self.assertGreater(archivadas, 0)
+        archivo.archivar_mes(self.mes)
+
+        metricas.reconstruir()
+        self.assertEqual(MetricaDiaria.objects.filter(dia__lt=archivo.mes_siguiente(self.mes)).count(), archivadas)
@@ -1,48 +1,141 @@
 # archivo: consultas/views.py
+import hashlib
+import logging
 
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404, render
+from django.core.cache import cache, caches
+from django.core.files.storage import default_storage
+from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from .forms import BusquedaForm
-from .services import consultar_api_por_id, consultar_api_por_id_y_nombre, consultar_api_por_nombre
-from .models import Busqueda, Resultado # <-- IMPORTAMOS LOS MODELOS
+from .services import consultar_api_por_id, consultar_api_por_nombre
+from .consulta_paralela import consultar_criterios, es_incompleta
+from .coalescencia import una_vez_entre_procesos
+from .models import Busqueda, EntidadLista, MetricaDiaria, Resultado # <-- IMPORTAMOS LOS MODELOS
+from .metricas import consultas_por_dia, registrar_busqueda, resumen_periodo, ultimos_dias
+from .clasificacion import clasificar, clasificar_lote
+from .entidades import entidad_desde_registro, guardar_entidades
+from .archivo import obtener_busqueda, resultados_de
 from django.utils import timezone
-from weasyprint import HTML
-from django.template.loader import render_to_string
+from .reportes_pdf import guardar_pdf
+from .descargas import servir_archivo
+from .paginacion import contar, paginar_por_cursor
+from cola_tareas.cola import encolar
+from django.conf import settings
 from datetime import timedelta
-from django.db.models import Count
-from django.db.models.functions import TruncDay
+from django.db.models import Sum
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Historial y gestión de consultas: de la más reciente a la más antigua
+ORDEN_BUSQUEDAS = ['-fecha_busqueda', '-id']
+BUSQUEDAS_POR_PAGINA = 25
+
+# Máximo de filas por INSERT (PostgreSQL admite hasta 65535 parámetros por sentencia)
+RESULTADOS_POR_INSERT = 1000
+
+# Dashboard de gestión: "ingresó a la lista" si su estado es de hace menos de estos días
+DIAS_INGRESO_RECIENTE = 90
 
 
 # --- FUNCIÓN AUXILIAR PARA CLASIFICAR ---
 def get_classification(tipo_lista):
-    if not tipo_lista:
-        return 'No Clasificado'
-
-    tipo_lista_upper = tipo_lista.upper()
-
-    # 1. Listas Amarillas (Filtraciones específicas)
-    yellow_lists = [
-        "PARADISE PAPERS", "PANAMA PAPERS", "BAHAMAS LEAKS",
-        "BOLETIN PANAMA PAPERS", "OFFSHORE LEAKS"
-    ]
-    if tipo_lista_upper in yellow_lists:
-        return "Amarillo"
-
-    # 2. Listas PEP's (Palabras clave)
-    pep_keywords = [
-        'PEP', 'GOBIERNO', 'CONSEJO', 'CORTE', 'EMBAJADAS', 'MINISTERIO',
-        'PRESIDENCIA', 'SENADO', 'CAMARA', 'ASAMBLEA', 'ALCALDIAS',
-        'CONCEJOS', 'NOTARIAS', 'SIGEP', 'ELECTORAL', 'JUDICATURA',
-        'CANDIDATOS', 'PARTIDOS'
-    ]
-    # Check if *any* keyword is *part* of the tipo_lista string
-    if any(keyword in tipo_lista_upper for keyword in pep_keywords):
-        return "PEP's"
-
-    # 3. Todo lo demás es Rojo
-    return "Rojo"
-# --- FIN FUNCIÓN AUXILIAR ---
+    # Se mantiene por compatibilidad; las reglas están en consultas/clasificacion.py
+    return clasificar(tipo_lista)
+
+
+def construir_resultados(resultados_api):
+    """
+    Convierte los items del API en objetos Resultado sin guardar, cada uno con
+    su EntidadLista (también sin guardar; guardar_busqueda las resuelve).
+    Devuelve la lista y si alguno viene de una lista restrictiva.
+    """
+    resultados = []
+    alerta_generada = False
+    clasificaciones = clasificar_lote([item.get('Tipo_Lista', '') for item in resultados_api])
+    for item, clasificacion_calculada in zip(resultados_api, clasificaciones):
+        entidad = entidad_desde_registro(item)
+        if entidad.es_restrictiva:
+            alerta_generada = True
+
+        resultados.append(Resultado(
+            entidad=entidad,
+            coincidencia_nombre=item.get('CoincidenciaNombre', 0),
+            coincidencia_id=item.get('CoincidenciaID', 0),
+
+            # Our internal classification
+            clasificacion=clasificacion_calculada
+        ))
+    return resultados, alerta_generada
+
+
+def guardar_busqueda(usuario, termino_buscado, resultados_api):
+    """
+    Guarda la búsqueda y todos sus resultados en una sola transacción:
+    un INSERT para la Busqueda (con sus banderas ya calculadas) y un INSERT
+    por lotes para los resultados, sin importar cuántos devuelva el API. Los
+    registros que ya estaban guardados como EntidadLista no se vuelven a
+    insertar. En la misma transacción se suman sus conteos a MetricaDiaria.
+    """
+    resultados, alerta_generada = construir_resultados(resultados_api or [])
+
+    with transaction.atomic():
+        busqueda = Busqueda.objects.create(
+            usuario=usuario,
+            empresa_id=usuario.empresa_id,
+            termino_buscado=termino_buscado,
+            encontro_resultados=bool(resultados_api),
+            genero_alerta=alerta_generada,
+            consulta_incompleta=es_incompleta(resultados_api),
+        )
+        guardar_entidades([resultado.entidad for resultado in resultados])
+        for resultado in resultados:
+            resultado.busqueda = busqueda
+        Resultado.objects.bulk_create(resultados, batch_size=RESULTADOS_POR_INSERT)
+        registrar_busqueda(busqueda, resultados)
+    return busqueda
+
+
+def _buscar_y_guardar(usuario, identificacion, nombres, termino_buscado):
+    # --- Decide API method ---
+    if identificacion and nombres:
+        # Los endpoints se consultan a la vez y sus resultados se unen
+        resultados_api = consultar_criterios(identificacion, nombres)
+    elif identificacion:
+        resultados_api = consultar_api_por_id(identificacion)
+    else:
+        resultados_api = consultar_api_por_nombre(nombres)
+
+    busqueda_obj = guardar_busqueda(usuario, termino_buscado, resultados_api)
+    # El PDF se deja listo en segundo plano para que la descarga sea inmediata
+    if settings.PDF_PRERENDERIZAR:
+        encolar('consultas.generar_pdf', busqueda_id=busqueda_obj.pk)
+    return busqueda_obj
+
+
+def _buscar_sin_duplicar(usuario, identificacion, nombres, termino_buscado):
+    """
+    Un doble clic o un reenvío del formulario dentro de BUSQUEDA_VENTANA_REENVIO
+    segundos devuelve la misma Busqueda en vez de consultar y guardar otra,
+    aunque el segundo envío llegue a otro worker mientras el primero sigue
+    consultando.
+    """
+    ventana = settings.BUSQUEDA_VENTANA_REENVIO
+    if not (settings.API_COALESCENCIA_ACTIVA and ventana > 0):
+        return _buscar_y_guardar(usuario, identificacion, nombres, termino_buscado)
+
+    clave = 'envio:' + hashlib.sha1(f'{usuario.pk}|{termino_buscado}'.encode('utf-8')).hexdigest()
+    busqueda_id = una_vez_entre_procesos(
+        caches['consultas_api'], clave,
+        lambda: _buscar_y_guardar(usuario, identificacion, nombres, termino_buscado).pk,
+        ventana,
+    )
+    busqueda_obj = Busqueda.objects.filter(pk=busqueda_id, usuario=usuario, termino_buscado=termino_buscado).first()
+    if busqueda_obj is None:
+        # El id guardado ya no corresponde (se borró o archivó): se busca de nuevo
+        busqueda_obj = _buscar_y_guardar(usuario, identificacion, nombres, termino_buscado)
+    return busqueda_obj
+
 
 @login_required
 def pagina_busqueda(request):
@@ -58,71 +151,18 @@ def pagina_busqueda(request):
             identificacion = form.cleaned_data.get("identificacion")
             nombres = form.cleaned_data.get("nombres")
             termino_buscado = ""
-
-            # --- Decide API method ---
             if identificacion and nombres:
                 termino_buscado = f"ID: {identificacion} y Nombre: {nombres}"
-                resultados_api = consultar_api_por_id_y_nombre(identificacion, nombres)
             elif identificacion:
                 termino_buscado = f"ID: {identificacion}"
-                resultados_api = consultar_api_por_id(identificacion)
             elif nombres:
                 termino_buscado = f"Nombre: {nombres}"
-                resultados_api = consultar_api_por_nombre(nombres)
 
-            # --- Save to Database ---
             if termino_buscado:
-                busqueda_obj = Busqueda.objects.create( # Assign to the outer scope variable
-                    usuario=request.user,
-                    termino_buscado=termino_buscado
-                )
-                if resultados_api is not None:
-                    busqueda_obj.encontro_resultados = bool(resultados_api)
-                    for item in resultados_api:
-                        es_restrictiva = item.get('Restrictiva', False)
-                        if es_restrictiva:
-                            alerta_generada = True
-
-                        # --- Calculate and Save Classification ---
-                        tipo_lista_api = item.get('Tipo_Lista', '')
-                        clasificacion_calculada = get_classification(tipo_lista_api)
-                        # --- End Calculate ---
-
-                        Resultado.objects.create(
-                            busqueda=busqueda_obj,
-
-                            # Original fields
-                            nombre_completo=item.get('NombreCompleto'),
-                            identificacion=item.get('Id'),
-                            tipo_lista=tipo_lista_api, # Use variable already retrieved
-                            origen_lista=item.get('Origen_Lista'),
-                            relacionado_con=item.get('Relacionado_Con'),
-                            fuente=item.get('Fuente'),
-                            es_restrictiva=es_restrictiva,
-
-                            # New fields from Vadom PDF / SIDIF Guide
-                            es_boletin=item.get('Boletin', False),
-                            alias=item.get('Aka'),
-                            coincidencia_nombre=item.get('CoincidenciaNombre', 0),
-                            coincidencia_id=item.get('CoincidenciaID', 0),
-                            tipo_persona=item.get('Tipo_Persona'),
-                            fecha_update=item.get('Fecha_Update'), # Added from model
-                            estado=item.get('Estado'),             # Added from model
-                            llaveimagen=item.get('LlaveImagen'),   # Added from model
-
-                            # Our internal classification
-                            clasificacion=clasificacion_calculada
-                        )
-
-                    if alerta_generada:
-                        busqueda_obj.genero_alerta = True
-                    busqueda_obj.save()
+                busqueda_obj = _buscar_sin_duplicar(request.user, identificacion, nombres, termino_buscado)
+                alerta_generada = busqueda_obj.genero_alerta
         else:
-            # If form is invalid, print errors
-            print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-            print("!!!      FORMULARIO INVÁLIDO       !!!")
-            print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-            print("Errores encontrados:", form.errors)
+            logger.info("Formulario de búsqueda inválido: %s", form.errors.as_json())
 
     # Prepare context for the template
     context = {
@@ -138,18 +178,27 @@ def pagina_busqueda(request):
 
 @login_required
 def historial_busquedas(request):
-    # Esta es la línea clave:
-    # Filtramos las búsquedas para obtener solo las del usuario actual (request.user)
-    # y las ordenamos por fecha, de la más reciente a la más antigua.
-    busquedas = Busqueda.objects.filter(usuario=request.user).order_by('-fecha_busqueda')
+    # Solo las búsquedas del usuario actual, de la más reciente a la más antigua,
+    # por páginas (cursor sobre fecha e id: cada página cuesta lo mismo)
+    busquedas = Busqueda.objects.filter(usuario=request.user)
+    page_obj = paginar_por_cursor(busquedas, request.GET, ORDEN_BUSQUEDAS, BUSQUEDAS_POR_PAGINA)
 
     context = {
-        'busquedas': busquedas
+        'busquedas': page_obj,
+        'page_obj': page_obj,
     }
     return render(request, 'consultas/historial.html', context)
 
 
 
+def contexto_detalle(busqueda):
+    # Los resultados se leen una sola vez; la plantilla los cuenta y recorre de la lista
+    return {
+        'busqueda': busqueda,
+        'resultados': resultados_de(busqueda),
+    }
+
+
 @login_required
 def detalle_busqueda(request, busqueda_id):
     """
@@ -158,59 +207,43 @@ def detalle_busqueda(request, busqueda_id):
     # Buscamos la búsqueda por su ID, pero con una condición de seguridad clave:
     # nos aseguramos de que la búsqueda pertenezca al usuario que está logueado.
     # Esto evita que un usuario pueda ver el historial de otro.
-    busqueda = get_object_or_404(Busqueda, pk=busqueda_id, usuario=request.user)
-    
-    context = {
-        'busqueda': busqueda
-        # Los resultados asociados ya vienen dentro de 'busqueda.resultados.all'
-    }
-    return render(request, 'consultas/detalle_busqueda.html', context)
+    # Si el mes de la búsqueda ya se archivó, se lee del archivo Parquet.
+    busqueda = obtener_busqueda(busqueda_id, usuario=request.user)
+    return render(request, 'consultas/detalle_busqueda.html', contexto_detalle(busqueda))
 
 
 @login_required
 def dashboard(request):
     # --- RANGO DE TIEMPO ---
-    hoy = timezone.now()
-    hace_30_dias = hoy - timedelta(days=30)
+    hoy = timezone.localdate()
+    hace_30_dias = ultimos_dias(30)
 
-    # --- FILTRO BASE (Búsquedas de la empresa en el rango) ---
-    busquedas_periodo = Busqueda.objects.filter(
-        usuario__empresa=request.user.empresa,
-        fecha_busqueda__gte=hace_30_dias
+    # --- FILTRO BASE (Métricas precalculadas de la empresa en el rango) ---
+    metricas_periodo = MetricaDiaria.objects.filter(
+        empresa=request.user.empresa,
+        dia__gte=hace_30_dias
     )
 
-    # --- OBTENER TODOS LOS RESULTADOS CLASIFICADOS DEL PERIODO ---
-    resultados_periodo = Resultado.objects.filter(busqueda__in=busquedas_periodo)
-
     # --- MÉTRICAS PRINCIPALES POR CLASIFICACIÓN (KPIs) ---
-    total_consultas_mes = busquedas_periodo.count()
-
-    # Contamos resultados por clasificación en los últimos 30 días
-    rojo_mes = resultados_periodo.filter(clasificacion='Rojo').count()
-    amarillo_mes = resultados_periodo.filter(clasificacion='Amarillo').count()
-    peps_mes = resultados_periodo.filter(clasificacion="PEP's").count()
-
-    # Contamos resultados por clasificación para HOY
-    busquedas_hoy_ids = busquedas_periodo.filter(fecha_busqueda__date=hoy.date()).values_list('id', flat=True)
-    resultados_hoy = Resultado.objects.filter(busqueda_id__in=busquedas_hoy_ids)
-    rojo_hoy = resultados_hoy.filter(clasificacion='Rojo').count()
-    amarillo_hoy = resultados_hoy.filter(clasificacion='Amarillo').count()
-    peps_hoy = resultados_hoy.filter(clasificacion="PEP's").count()
-    consultas_hoy_count = len(busquedas_hoy_ids) # Contamos las búsquedas únicas de hoy
+    # Todos los conteos del mes y de hoy salen de una sola consulta
+    resumen = resumen_periodo(metricas_periodo, hoy)
+    total_consultas_mes = resumen['consultas']
+    rojo_mes = resumen['rojo']
+    amarillo_mes = resumen['amarillo']
+    peps_mes = resumen['peps']
+    rojo_hoy = resumen['rojo_hoy']
+    amarillo_hoy = resumen['amarillo_hoy']
+    peps_hoy = resumen['peps_hoy']
+    consultas_hoy_count = resumen['consultas_hoy']
 
     # --- DATOS PARA GRÁFICO DE TENDENCIAS ---
     # Tendencia general de consultas
-    tendencia_consultas = (busquedas_periodo
-                           .annotate(dia=TruncDay('fecha_busqueda'))
-                           .values('dia')
-                           .annotate(conteo=Count('id'))
-                           .order_by('dia'))
+    tendencia_consultas = consultas_por_dia(metricas_periodo)
 
     # Tendencia de hallazgos ROJOS
-    tendencia_rojos = (resultados_periodo.filter(clasificacion='Rojo')
-                         .annotate(dia=TruncDay('busqueda__fecha_busqueda'))
+    tendencia_rojos = (metricas_periodo.filter(metrica=MetricaDiaria.RESULTADOS, clasificacion='Rojo')
                          .values('dia')
-                         .annotate(conteo=Count('id'))
+                         .annotate(conteo=Sum('conteo'))
                          .order_by('dia'))
 
     # Preparamos los datos para Chart.js
@@ -223,16 +256,16 @@ def dashboard(request):
 
     # --- DATOS PARA GRÁFICO DE FUENTES ROJAS ---
     # Mantenemos este gráfico enfocado en las fuentes de riesgo ROJO (más críticas)
-    fuentes_rojas = (resultados_periodo.filter(clasificacion='Rojo')
+    fuentes_rojas = (metricas_periodo.filter(metrica=MetricaDiaria.RESULTADOS, clasificacion='Rojo')
                        .values('tipo_lista')
-                       .annotate(conteo=Count('tipo_lista'))
+                       .annotate(conteo=Sum('conteo'))
                        .order_by('-conteo')[:5]) # Top 5 fuentes rojas
 
     labels_fuentes = [item['tipo_lista'] if item['tipo_lista'] else 'N/A' for item in fuentes_rojas]
     data_fuentes = [item['conteo'] for item in fuentes_rojas]
 
     # --- BÚSQUEDAS RECIENTES DEL USUARIO ---
-    ultimas_busquedas = Busqueda.objects.filter(usuario=request.user).order_by('-fecha_busqueda')[:5]
+    ultimas_busquedas = Busqueda.objects.filter(usuario=request.user).con_conteos().order_by('-fecha_busqueda')[:5]
 
     context = {
         'total_consultas_mes': total_consultas_mes,
@@ -261,24 +294,17 @@ def generar_pdf_busqueda(request, busqueda_id):
     Genera un reporte en PDF para una búsqueda específica.
     """
     # 1. Obtenemos la búsqueda de forma segura
-    busqueda = get_object_or_404(Busqueda, pk=busqueda_id, usuario=request.user)
-
-    # 2. Renderizamos la plantilla HTML a una cadena de texto
-    #    Pasamos el objeto 'busqueda' al contexto de la plantilla.
-    html_string = render_to_string('consultas/reporte_pdf.html', {'busqueda': busqueda})
-
-    # 3. Usamos WeasyPrint para convertir el HTML en un PDF en memoria
-    html = HTML(string=html_string, base_url=request.build_absolute_uri('/'))
-    pdf = html.write_pdf()
+    busqueda = obtener_busqueda(busqueda_id, Busqueda.objects.select_related('usuario'), usuario=request.user)
 
-    # 4. Creamos una respuesta HTTP con el contenido del PDF
-    response = HttpResponse(pdf, content_type='application/pdf')
+    # 2. El PDF guardado solo se genera con WeasyPrint la primera vez
+    #    (o cuando cambia la plantilla del reporte).
+    ruta = guardar_pdf(busqueda, base_url=request.build_absolute_uri('/'))
 
-    # 5. Añadimos una cabecera para que el navegador lo trate como una descarga
-    #    con un nombre de archivo dinámico.
-    response['Content-Disposition'] = f'attachment; filename="Reporte-LAFT-{busqueda.termino_buscado}.pdf"'
-
-    return response
+    # 3. Respondemos como descarga con un nombre de archivo dinámico.
+    return servir_archivo(
+        request, default_storage, ruta, content_type='application/pdf',
+        nombre_descarga=f"Reporte-LAFT-{busqueda.termino_buscado}.pdf",
+    )
 
 
 # =============================================================================
@@ -288,7 +314,6 @@ def generar_pdf_busqueda(request, busqueda_id):
 from django.core.exceptions import PermissionDenied
 from usuarios.models import Usuario
 from django.db.models import Q
-from django.core.paginator import Paginator
 
 
 def superior_required(view_func):
@@ -305,6 +330,29 @@ def superior_required(view_func):
     return wrapper
 
 
+def contar_nuevos_en_listas(empresa, desde):
+    """
+    Entidades distintas encontradas por la empresa desde `desde` cuyo estado
+    es un ingreso a la lista de hace menos de DIAS_INGRESO_RECIENTE días
+    (columnas tipadas de EntidadLista: entidad_movimiento_fecha_idx).
+
+    Es un DISTINCT sobre Resultado⋈Busqueda⋈EntidadLista que depende de la
+    fecha de hoy, así que no se puede sumar por día en MetricaDiaria: se guarda
+    en caché DASHBOARD_NUEVOS_EN_LISTAS_TTL segundos.
+    """
+    hoy = timezone.localdate()
+    clave = f'nuevos_en_listas:{empresa.pk}:{hoy.isoformat()}'
+    conteo = cache.get(clave)
+    if conteo is None:
+        conteo = (Resultado.objects
+                  .filter(busqueda__empresa=empresa, busqueda__fecha_busqueda__gte=desde,
+                          entidad__estado_movimiento=EntidadLista.INGRESO,
+                          entidad__estado_fecha__gte=hoy - timedelta(days=DIAS_INGRESO_RECIENTE))
+                  .values('entidad').distinct().count())
+        cache.set(clave, conteo, settings.DASHBOARD_NUEVOS_EN_LISTAS_TTL)
+    return conteo
+
+
 @login_required
 @superior_required
 def gestion_dashboard(request):
@@ -318,44 +366,44 @@ def gestion_dashboard(request):
 
     # Búsquedas de la empresa en los últimos 30 días
     busquedas_empresa = Busqueda.objects.filter(
-        usuario__empresa=empresa,
+        empresa=empresa,
         fecha_busqueda__gte=hace_30_dias
     )
 
-    # Resultados de esas búsquedas
-    resultados_empresa = Resultado.objects.filter(busqueda__in=busquedas_empresa)
+    # Conteos precalculados de la empresa en el mismo periodo
+    metricas_empresa = MetricaDiaria.objects.filter(empresa=empresa, dia__gte=ultimos_dias(30))
 
     # KPIs
-    total_consultas_mes = busquedas_empresa.count()
+    resumen = resumen_periodo(metricas_empresa, timezone.localdate())
+    total_consultas_mes = resumen['consultas']
     total_usuarios_empresa = Usuario.objects.filter(empresa=empresa, is_active=True).count()
 
     # Clasificación de hallazgos
-    rojo_mes = resultados_empresa.filter(clasificacion='Rojo').count()
-    amarillo_mes = resultados_empresa.filter(clasificacion='Amarillo').count()
-    peps_mes = resultados_empresa.filter(clasificacion="PEP's").count()
+    rojo_mes = resumen['rojo']
+    amarillo_mes = resumen['amarillo']
+    peps_mes = resumen['peps']
 
     # Consultas de hoy
-    busquedas_hoy = busquedas_empresa.filter(fecha_busqueda__date=hoy.date())
-    consultas_hoy = busquedas_hoy.count()
+    consultas_hoy = resumen['consultas_hoy']
+
+    # Personas encontradas en el periodo que ingresaron hace poco a una lista
+    nuevos_en_listas = contar_nuevos_en_listas(empresa, hace_30_dias)
 
     # Tendencia de consultas por día
-    tendencia_consultas = (busquedas_empresa
-                           .annotate(dia=TruncDay('fecha_busqueda'))
-                           .values('dia')
-                           .annotate(conteo=Count('id'))
-                           .order_by('dia'))
+    tendencia_consultas = consultas_por_dia(metricas_empresa)
 
     labels_tendencia = [item['dia'].strftime('%d/%m') for item in tendencia_consultas]
     data_consultas = [item['conteo'] for item in tendencia_consultas]
 
     # Top usuarios por consultas
-    top_usuarios = (busquedas_empresa
+    top_usuarios = (metricas_empresa
+                    .filter(metrica=MetricaDiaria.CONSULTAS, usuario__isnull=False)
                     .values('usuario__username', 'usuario__first_name', 'usuario__last_name')
-                    .annotate(total=Count('id'))
+                    .annotate(total=Sum('conteo'))
                     .order_by('-total')[:5])
 
     # Últimas búsquedas
-    ultimas_busquedas = busquedas_empresa.select_related('usuario').order_by('-fecha_busqueda')[:10]
+    ultimas_busquedas = busquedas_empresa.select_related('usuario').con_conteos().order_by('-fecha_busqueda')[:10]
 
     context = {
         'empresa': empresa,
@@ -365,6 +413,8 @@ def gestion_dashboard(request):
         'amarillo_mes': amarillo_mes,
         'peps_mes': peps_mes,
         'consultas_hoy': consultas_hoy,
+        'nuevos_en_listas': nuevos_en_listas,
+        'dias_ingreso_reciente': DIAS_INGRESO_RECIENTE,
         'labels_tendencia': labels_tendencia,
         'data_consultas': data_consultas,
         'top_usuarios': top_usuarios,
@@ -383,9 +433,7 @@ def gestion_consultas(request):
     empresa = request.user.empresa
 
     # Base queryset
-    busquedas = Busqueda.objects.filter(
-        usuario__empresa=empresa
-    ).select_related('usuario').order_by('-fecha_busqueda')
+    busquedas = Busqueda.objects.filter(empresa=empresa).select_related('usuario')
 
     # Filtro por usuario
     usuario_id = request.GET.get('usuario')
@@ -414,21 +462,21 @@ def gestion_consultas(request):
     elif con_resultados == 'no':
         busquedas = busquedas.filter(encontro_resultados=False)
 
-    # Paginación
-    paginator = Paginator(busquedas, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor: sin OFFSET, la página 1.000 cuesta lo mismo que la primera
+    # Los hallazgos de cada fila vienen anotados (no se cargan sus resultados)
+    page_obj = paginar_por_cursor(busquedas.con_conteos(), request.GET, ORDEN_BUSQUEDAS, BUSQUEDAS_POR_PAGINA)
 
     # Lista de usuarios de la empresa para el filtro
     usuarios_empresa = Usuario.objects.filter(empresa=empresa, is_active=True).order_by('username')
 
-    # Contadores
-    total_consultas = busquedas.count()
+    # Contadores (en caché; aproximado si son muchas)
+    total_consultas, total_exacto = contar(busquedas)
 
     context = {
         'page_obj': page_obj,
         'usuarios_empresa': usuarios_empresa,
         'total_consultas': total_consultas,
+        'total_exacto': total_exacto,
         'empresa': empresa,
     }
 
@@ -445,9 +493,5 @@ def gestion_detalle_busqueda(request, busqueda_id):
     empresa = request.user.empresa
 
     # El superior puede ver cualquier búsqueda de su empresa
-    busqueda = get_object_or_404(Busqueda, pk=busqueda_id, usuario__empresa=empresa)
-
-    context = {
-        'busqueda': busqueda
-    }
-    return render(request, 'consultas/detalle_busqueda.html', context)
\ No newline at end of file
+    busqueda = obtener_busqueda(busqueda_id, empresa=empresa)
+    return render(request, 'consultas/detalle_busqueda.html', contexto_detalle(busqueda))
\ No newline at end of file
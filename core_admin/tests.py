@@ -1,3 +1,115 @@
-from django.test import TestCase
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cargas_masivas.models import LoteConsultaMasiva
+from cargas_masivas.stub_s3 import ALMACENAMIENTO_LOCAL
+from consultas.stub_api import generar_registro
+from consultas.views import guardar_busqueda
+from empresas.models import Empresa
+from usuarios.models import Usuario
+
+
+class ListadosPorCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_superuser('admin', 'admin@example.com', 'clave-segura')
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        Usuario.objects.bulk_create([
+            Usuario(username=f'usuario{i}', empresa=cls.empresa, is_active=i % 4 != 0) for i in range(45)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def _recorrer(self, url, nombre, **filtros):
+        vistos, parametros = [], dict(filtros)
+        while True:
+            respuesta = self.client.get(url, parametros)
+            self.assertEqual(respuesta.status_code, 200)
+            vistos += [objeto.pk for objeto in respuesta.context[nombre]]
+            pagina = respuesta.context['page_obj']
+            if not pagina.has_next():
+                return vistos
+            parametros = {**filtros, 'despues': pagina.siguiente}
+
+    def test_usuarios_con_filtro(self):
+        url = reverse('core_admin:usuario_list')
+        esperados = list(Usuario.objects.filter(is_superuser=False, is_active=True)
+                         .order_by('-date_joined', '-id').values_list('pk', flat=True))
+        self.assertEqual(self._recorrer(url, 'usuarios', estado='activo'), esperados)
+        respuesta = self.client.get(url)
+        self.assertEqual((respuesta.context['total_usuarios'], respuesta.context['usuarios_activos']), (45, 33))
+
+    def test_lotes_pendientes_primero(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media, STORAGES=ALMACENAMIENTO_LOCAL))
+        usuario = Usuario.objects.filter(is_superuser=False).first()
+        for i in range(30):
+            LoteConsultaMasiva.objects.create(
+                empresa=self.empresa, usuario_solicitante=usuario,
+                archivo_subido=ContentFile(b'x', name=f'lote{i}.csv'),
+                estado='PENDIENTE' if i % 3 else 'PROCESADO',
+            )
+        esperados = list(LoteConsultaMasiva.objects.order_by('estado', '-fecha_solicitud', '-id')
+                         .values_list('pk', flat=True))
+        self.assertEqual(self._recorrer(reverse('core_admin:lote_list'), 'lotes'), esperados)
+
+
+class NumeroDeConsultasTests(TestCase):
+    """Las páginas del panel hacen las mismas consultas con pocos o muchos datos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_superuser('admin', 'admin@example.com', 'clave-segura')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media, STORAGES=ALMACENAMIENTO_LOCAL))
+        self.client.force_login(self.admin)
+
+    def _poblar(self, empresas, por_empresa):
+        for i in range(empresas):
+            empresa = Empresa.objects.create(nombre=f'Empresa {Empresa.objects.count()}')
+            for j in range(por_empresa):
+                usuario = Usuario.objects.create_user(f'u{empresa.pk}_{j}', empresa=empresa)
+                guardar_busqueda(usuario, str(j), [generar_registro(0)])
+                LoteConsultaMasiva.objects.create(
+                    empresa=empresa, usuario_solicitante=usuario,
+                    archivo_subido=ContentFile(b'x', name=f'lote{j}.csv'),
+                )
+        return LoteConsultaMasiva.objects.latest('pk'), Usuario.objects.filter(is_superuser=False).latest('pk')
+
+    def _consultas(self, urls):
+        cache.clear()
+        medidas = {}
+        for url in urls:
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200, url)
+            medidas[url] = len(consultas)
+        return medidas
+
+    def _urls(self, lote, usuario):
+        return [reverse(f'core_admin:{nombre}') for nombre in (
+            'dashboard', 'lote_list', 'reporte_mensual', 'cola_tareas', 'usuario_list', 'usuario_create')] + [
+            reverse('core_admin:lote_process', args=[lote.pk]),
+            reverse('core_admin:usuario_edit', args=[usuario.pk]),
+            reverse('core_admin:usuario_delete', args=[usuario.pk]),
+        ]
+
+    def test_no_dependen_del_volumen(self):
+        lote, usuario = self._poblar(1, 1)
+        pocas = self._consultas(self._urls(lote, usuario))
+        self._poblar(4, 6)
+        self.assertEqual(self._consultas(self._urls(lote, usuario)), pocas)
@@ -14,6 +14,9 @@ urlpatterns = [
     # Reportes
     path('reporte-mensual/', views.ReporteMensualView.as_view(), name='reporte_mensual'),
 
+    # Tareas en segundo plano
+    path('cola-tareas/', views.ColaTareasView.as_view(), name='cola_tareas'),
+
     # Gestión de Usuarios
     path('usuarios/', views.UsuarioListView.as_view(), name='usuario_list'),
     path('usuarios/crear/', views.UsuarioCreateView.as_view(), name='usuario_create'),
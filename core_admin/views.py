@@ -2,18 +2,19 @@ from django.views.generic import TemplateView, ListView, UpdateView, CreateView,
 from .mixins import SuperuserRequiredMixin
 from django.utils import timezone
 from datetime import datetime
-from django.db.models.functions import TruncDay
-from django.db.models import Q
-from consultas.models import Busqueda
+from django.db.models import Q, Sum
+from consultas.metricas import consultas_por_dia, consultas_por_mes
+from consultas.models import MetricaDiaria
+from consultas.paginacion import PaginacionCursorMixin, contar
 from cargas_masivas.models import LoteConsultaMasiva
 from empresas.models import Empresa
 from usuarios.models import Usuario
 from django.db.models import Count
-from django.db.models.functions import TruncMonth
 import json
 from .forms import ProcesarLoteForm, UsuarioCreateForm, UsuarioEditForm
 from django.urls import reverse_lazy
 from django.contrib import messages
+from cola_tareas.cola import estadisticas_cola
 
 class DashboardView(SuperuserRequiredMixin, TemplateView):
     template_name = 'core_admin/dashboard.html'
@@ -23,28 +24,25 @@ class DashboardView(SuperuserRequiredMixin, TemplateView):
         context['titulo'] = "Dashboard de Administración"
 
         # --- 1. KPIs Globales ---
-        context['total_consultas'] = Busqueda.objects.count()
+        consultas = MetricaDiaria.objects.filter(metrica=MetricaDiaria.CONSULTAS)
+        context['total_consultas'] = consultas.aggregate(total=Sum('conteo', default=0))['total']
         context['total_lotes'] = LoteConsultaMasiva.objects.count()
         context['total_empresas'] = Empresa.objects.count()
         context['total_usuarios'] = Usuario.objects.filter(is_superuser=False, is_active=True).count()
         context['lotes_pendientes'] = LoteConsultaMasiva.objects.filter(estado='PENDIENTE').count()
 
         # --- 2. Datos para Gráfico: Consultas por Mes ---
-        consultas_mes_data = Busqueda.objects.annotate(
-            mes=TruncMonth('fecha_busqueda')
-        ).values('mes').annotate(
-            total=Count('id')
-        ).order_by('mes')
+        consultas_mes_data = consultas_por_mes(consultas)
 
         context['chart_labels'] = json.dumps([mes['mes'].strftime('%Y-%m') for mes in consultas_mes_data])
         context['chart_data'] = json.dumps([mes['total'] for mes in consultas_mes_data])
 
         # --- 3. Tabla de Actividad por Empresa ---
-        busqueda_counts = Busqueda.objects.values('usuario__empresa_id') \
-                                  .annotate(num_consultas=Count('id')) \
+        busqueda_counts = consultas.values('empresa_id') \
+                                  .annotate(num_consultas=Sum('conteo')) \
                                   .order_by()
         
-        busqueda_dict = {item['usuario__empresa_id']: item['num_consultas'] for item in busqueda_counts}
+        busqueda_dict = {item['empresa_id']: item['num_consultas'] for item in busqueda_counts}
 
         # --- LÍNEA CORREGIDA (usando el nombre de la lista "Choices") ---
         empresas_list = Empresa.objects.annotate(
@@ -65,15 +63,17 @@ class DashboardView(SuperuserRequiredMixin, TemplateView):
 
 # --- VISTAS PARA GESTIONAR CARGAS MASIVAS ---
 
-class LoteListView(SuperuserRequiredMixin, ListView):
+class LoteListView(SuperuserRequiredMixin, PaginacionCursorMixin, ListView):
     """
     Lista todos los lotes para que el admin los gestione.
     """
     model = LoteConsultaMasiva
     template_name = 'core_admin/lote_list.html'
     context_object_name = 'lotes'
-    ordering = ['estado', '-fecha_solicitud'] # Muestra PENDIENTES primero
-    paginate_by = 25 # Pagina los resultados
+    orden_cursor = ['estado', '-fecha_solicitud', '-id'] # Muestra PENDIENTES primero
+    paginate_by = 25 # Pagina los resultados (por cursor)
+    # La tabla muestra la empresa y el usuario de cada lote
+    queryset = LoteConsultaMasiva.objects.select_related('empresa', 'usuario_solicitante')
 
     def get_context_data(self, **kwargs):
         # Llama a la implementación base primero para obtener el contexto
@@ -88,6 +88,7 @@ class LoteProcessView(SuperuserRequiredMixin, UpdateView):
     Vista para editar un lote, cambiar estado y subir PDF.
     """
     model = LoteConsultaMasiva
+    queryset = LoteConsultaMasiva.objects.select_related('empresa', 'usuario_solicitante')
     form_class = ProcesarLoteForm
     template_name = 'core_admin/lote_process.html'
     success_url = reverse_lazy('core_admin:lote_list') # Redirige a la lista
@@ -124,45 +125,58 @@ class ReporteMensualView(SuperuserRequiredMixin, TemplateView):
         context['selected_month_form_value'] = target_date.strftime('%Y-%m')
         context['titulo'] = f"Reporte de Consultas: {target_date.strftime('%B %Y')}"
         
-        # 2. Consultar la base de datos
-        consultas_del_mes = Busqueda.objects.filter(
-            fecha_busqueda__year=target_date.year,
-            fecha_busqueda__month=target_date.month
+        # 2. Consultar las métricas diarias precalculadas
+        consultas_del_mes = MetricaDiaria.objects.filter(
+            metrica=MetricaDiaria.CONSULTAS,
+            dia__year=target_date.year,
+            dia__month=target_date.month
         )
         
         # 3. Preparar datos para el gráfico (agrupados por día)
-        consultas_por_dia = consultas_del_mes.annotate(
-            dia=TruncDay('fecha_busqueda')
-        ).values('dia').annotate(
-            total=Count('id')
-        ).order_by('dia')
+        consultas_por_dia_mes = consultas_por_dia(consultas_del_mes)
 
         # 4. Formatear para Chart.js
-        chart_labels = [entry['dia'].strftime('%Y-%m-%d') for entry in consultas_por_dia]
-        chart_data = [entry['total'] for entry in consultas_por_dia]
+        chart_labels = [entry['dia'].strftime('%Y-%m-%d') for entry in consultas_por_dia_mes]
+        chart_data = [entry['conteo'] for entry in consultas_por_dia_mes]
 
         context['chart_labels_json'] = json.dumps(chart_labels)
         context['chart_data_json'] = json.dumps(chart_data)
         
         # 5. KPI: Total de consultas en el mes
-        context['total_consultas_mes'] = consultas_del_mes.count()
+        context['total_consultas_mes'] = sum(chart_data)
 
         return context
 
 
+class ColaTareasView(SuperuserRequiredMixin, TemplateView):
+    """
+    Estado de la cola de tareas en segundo plano: profundidad y latencias.
+    """
+    template_name = 'core_admin/cola_tareas.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['titulo'] = 'Cola de Tareas'
+        context['tareas'] = estadisticas_cola(horas=24)
+        context['total_pendientes'] = sum(t['pendientes'] for t in context['tareas'])
+        context['total_fallidas'] = sum(t['fallidas'] for t in context['tareas'])
+        return context
+
+
 # --- VISTAS PARA GESTIONAR USUARIOS ---
 
-class UsuarioListView(SuperuserRequiredMixin, ListView):
+class UsuarioListView(SuperuserRequiredMixin, PaginacionCursorMixin, ListView):
     """
     Lista todos los usuarios del sistema (excepto superusuarios).
     """
     model = Usuario
     template_name = 'core_admin/usuario_list.html'
     context_object_name = 'usuarios'
+    orden_cursor = ['-date_joined', '-id']
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = Usuario.objects.filter(is_superuser=False).select_related('empresa').order_by('-date_joined')
+        queryset = Usuario.objects.filter(is_superuser=False).select_related('empresa')
 
         # Filtro por empresa
         empresa_id = self.request.GET.get('empresa')
@@ -192,8 +206,8 @@ class UsuarioListView(SuperuserRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         context['titulo'] = 'Gestión de Usuarios'
         context['empresas'] = Empresa.objects.all()
-        context['total_usuarios'] = Usuario.objects.filter(is_superuser=False).count()
-        context['usuarios_activos'] = Usuario.objects.filter(is_superuser=False, is_active=True).count()
+        context['total_usuarios'], _ = contar(Usuario.objects.filter(is_superuser=False))
+        context['usuarios_activos'], _ = contar(Usuario.objects.filter(is_superuser=False, is_active=True))
         return context
 
 
@@ -0,0 +1,27 @@
+# archivo: espejo_listas/admin.py
+from django.contrib import admin
+
+from .importacion import activar_snapshot
+from .models import SnapshotListas
+
+
+@admin.register(SnapshotListas)
+class SnapshotListasAdmin(admin.ModelAdmin):
+    list_display = ('id', 'estado', 'total_entradas', 'entradas_descartadas', 'cargado_en', 'activado_en', 'origen')
+    list_filter = ('estado',)
+    readonly_fields = ('origen', 'huella', 'estado', 'total_entradas', 'entradas_descartadas',
+                       'cargado_en', 'activado_en', 'error')
+
+    actions = ['activar']
+
+    @admin.action(description="Activar el snapshot seleccionado")
+    def activar(self, request, queryset):
+        if queryset.count() != 1 or queryset.first().estado not in ('ACTIVO', 'REEMPLAZADO'):
+            self.message_user(request, "Seleccione un único snapshot cargado completo.", level='error')
+            return
+        activar_snapshot(queryset.first())
+        self.message_user(request, "Snapshot activado; los procesos lo tomarán en la próxima revisión.")
+
+    def has_add_permission(self, request):
+        # Los snapshots solo se crean con `python manage.py importar_listas`
+        return False
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class EspejoListasConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'espejo_listas'
+    verbose_name = 'Espejo local de listas'
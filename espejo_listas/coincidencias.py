@@ -0,0 +1,251 @@
+# archivo: espejo_listas/coincidencias.py
+"""
+Motor de coincidencia aproximada de nombres en español.
+
+Cada nombre se pliega (sin tildes ni signos, en mayúsculas) y se parte en
+palabras; cada palabra tiene además una clave fonética ('VELASQUEZ',
+'BELASQUES' y 'VELAZQUEZ' suenan igual). La búsqueda tiene dos fases:
+
+1. Candidatos. Para cada palabra buscada se reúnen las palabras del
+   vocabulario que suenan igual o que comparten suficientes bigramas. Para
+   superar el umbral un nombre debe tener parejas para casi todas las
+   palabras buscadas (solo pueden faltar las muy cortas), así que basta con
+   mirar los nombres que contienen alguna parecida a las menos frecuentes
+   (filtro por prefijo): un nombre común como JUAN nunca obliga a recorrer
+   millones de entradas.
+2. Puntaje. Cada palabra buscada se empareja con la más parecida del
+   candidato, sin importar el orden, y se pondera por su longitud; los
+   nombres con palabras de más reciben una penalización leve.
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+from itertools import chain
+
+from consultas.services import normalizar_nombre
+
+_REGLAS_FONETICAS = [
+    (re.compile(r'PH'), 'F'),
+    (re.compile(r'CH'), '1'),            # CH se conserva como un sonido propio
+    (re.compile(r'LL'), 'Y'),
+    (re.compile(r'QU(?=[EI])'), 'K'),
+    (re.compile(r'G(?=[EI])'), 'J'),     # Antes que GU: en GUE/GUI la G es suave
+    (re.compile(r'GU(?=[EI])'), 'G'),
+    (re.compile(r'C(?=[EI])'), 'S'),
+    (re.compile(r'C'), 'K'),
+    (re.compile(r'Q'), 'K'),
+    (re.compile(r'Z'), 'S'),
+    (re.compile(r'V'), 'B'),
+    (re.compile(r'W'), 'B'),
+    (re.compile(r'X'), 'KS'),
+    (re.compile(r'H'), ''),              # La H es muda (la CH ya se reemplazó)
+    (re.compile(r'Y(?![AEIOU])'), 'I'),  # Y final o antes de consonante suena como I
+    (re.compile(r'(.)\1+'), r'\1'),      # Letras repetidas
+]
+
+
+def clave_nombre(nombre):
+    """'José  Pérez-Gómez' -> 'JOSE PEREZ GOMEZ': sin tildes, sin signos y con espacios simples."""
+    texto = unicodedata.normalize('NFKD', normalizar_nombre(nombre))
+    texto = ''.join(c if c.isalnum() else ' ' for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.split())
+
+
+def clave_fonetica(palabra):
+    """Clave fonética de una palabra ya plegada: 'VELAZQUEZ' y 'BELASQUES' -> 'BELASKES'."""
+    for patron, reemplazo in _REGLAS_FONETICAS:
+        palabra = patron.sub(reemplazo, palabra)
+    return palabra
+
+
+def _bigramas(palabra):
+    # Con bigramas (y no trigramas) una transposición en una palabra corta,
+    # como SAOTS por SATOS, conserva la mitad de los n-gramas
+    relleno = f' {palabra} '
+    return {relleno[i:i + 2] for i in range(len(relleno) - 1)}
+
+
+def palabras_requeridas(buscadas, umbral):
+    """
+    Cuántas palabras buscadas debe tener (parecidas) un nombre para poder
+    alcanzar el umbral: una palabra sin pareja resta su fracción de la
+    longitud total, así que solo pueden faltar las más cortas ('DE', 'LA').
+    """
+    total = sum(len(p) for p in buscadas)
+    sobra = (1 - umbral) * total
+    faltantes = 0
+    for longitud in sorted(len(p) for p in buscadas):
+        if longitud > sobra:
+            break
+        sobra -= longitud
+        faltantes += 1
+    return max(1, len(buscadas) - faltantes)
+
+
+class MotorCoincidencias:
+    """
+    Índice de nombres para búsqueda aproximada. `nombres` es un iterable de
+    (nombre, dato); el dato se devuelve tal cual con cada coincidencia.
+    """
+
+    def __init__(self, nombres, umbral_bigramas=0.5, similitud_minima=0.75):
+        self.umbral_bigramas = umbral_bigramas
+        # Dos palabras menos parecidas que esto no se consideran la misma palabra
+        self.similitud_minima = similitud_minima
+        self.vocabulario = {}       # palabra -> id
+        self.palabras = []          # id -> palabra
+        self.foneticas = []         # id -> clave fonética
+        self.por_fonetica = {}      # clave fonética -> ids de palabras
+        self.por_bigrama = {}       # bigrama -> ids de palabras
+        self.publicaciones = []     # id de palabra -> posiciones de los nombres que la contienen
+        self.nombres = []           # posición -> tupla de ids de palabras
+        self.datos = []
+        self._parecidas = {}        # palabra buscada -> resultado de _palabras_parecidas
+        for nombre, dato in nombres:
+            self.agregar(nombre, dato)
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def _id_palabra(self, palabra):
+        id_palabra = self.vocabulario.get(palabra)
+        if id_palabra is None:
+            id_palabra = len(self.palabras)
+            self._parecidas.clear()
+            self.vocabulario[palabra] = id_palabra
+            fonetica = clave_fonetica(palabra)
+            self.palabras.append(palabra)
+            self.foneticas.append(fonetica)
+            self.publicaciones.append([])
+            self.por_fonetica.setdefault(fonetica, []).append(id_palabra)
+            for bigrama in _bigramas(palabra):
+                self.por_bigrama.setdefault(bigrama, []).append(id_palabra)
+        return id_palabra
+
+    def agregar(self, nombre, dato):
+        palabras = clave_nombre(nombre).split()
+        if not palabras:
+            return
+        posicion = len(self.nombres)
+        ids = tuple(self._id_palabra(p) for p in palabras)
+        self.nombres.append(ids)
+        self.datos.append(dato)
+        for id_palabra in set(ids):
+            self.publicaciones[id_palabra].append(posicion)
+
+    def _palabras_parecidas(self, palabra):
+        """{id: similitud} de las palabras del vocabulario que se consideran la misma que `palabra`."""
+        parecidas = self._parecidas.get(palabra)
+        if parecidas is not None:
+            return parecidas
+
+        fonetica = clave_fonetica(palabra)
+        bigramas = _bigramas(palabra)
+        conteo = Counter(chain.from_iterable(self.por_bigrama.get(b, ()) for b in bigramas))
+        # Coeficiente de Dice sobre bigramas (una palabra de n letras tiene n + 1).
+        # Como Dice <= 2c / (a + c), primero se descartan las de muy pocos en común
+        minimo = self.umbral_bigramas * len(bigramas) / (2 - self.umbral_bigramas)
+        posibles = [i for i, comunes in conteo.items() if comunes >= minimo
+                    and 2 * comunes / (len(bigramas) + len(self.palabras[i]) + 1) >= self.umbral_bigramas]
+        posibles = set(posibles).union(self.por_fonetica.get(fonetica, ()))
+
+        parecidas = {}
+        comparador = SequenceMatcher(None, b=palabra, autojunk=False)
+        for id_palabra in posibles:
+            otra = self.palabras[id_palabra]
+            if otra == palabra:
+                similitud = 1.0
+            elif self.foneticas[id_palabra] == fonetica:
+                similitud = 0.95
+            else:
+                comparador.set_seq1(otra)
+                if comparador.quick_ratio() < self.similitud_minima:
+                    continue
+                similitud = comparador.ratio()
+            if similitud >= self.similitud_minima:
+                parecidas[id_palabra] = similitud
+
+        if len(self._parecidas) >= 50_000:
+            self._parecidas.clear()
+        self._parecidas[palabra] = parecidas
+        return parecidas
+
+    @staticmethod
+    def _puntaje(buscadas, grupos, ids):
+        """
+        Empareja cada palabra buscada con la más parecida del nombre (cada
+        palabra del nombre se usa una vez) y pondera por longitud; las
+        palabras sin pareja cuentan 0 y las palabras de más restan un poco.
+        """
+        disponibles = list(ids)
+        total = peso = 0.0
+        for palabra, grupo in sorted(zip(buscadas, grupos), key=lambda par: -len(par[0])):
+            mejor, elegida = 0.0, None
+            for id_palabra in disponibles:
+                similitud = grupo.get(id_palabra, 0.0)
+                if similitud > mejor:
+                    mejor, elegida = similitud, id_palabra
+            if elegida is not None:
+                disponibles.remove(elegida)
+            total += mejor * len(palabra)
+            peso += len(palabra)
+        cobertura = len(buscadas) / max(len(buscadas), len(ids))
+        return (total / peso) * (0.85 + 0.15 * cobertura)
+
+    def buscar(self, nombre, umbral=0.85, limite=20):
+        """
+        Devuelve hasta `limite` tuplas (puntaje 0-100, nombre plegado, dato)
+        con puntaje >= umbral (0-1), de mayor a menor. limite=None las devuelve todas.
+        """
+        buscadas = clave_nombre(nombre).split()
+        if not buscadas:
+            return []
+        grupos = [self._palabras_parecidas(p) for p in buscadas]
+        requeridas = palabras_requeridas(buscadas, umbral)
+
+        # Filtro por prefijo: un nombre con `requeridas` palabras parecidas tiene
+        # al menos una parecida a alguna de las (n - requeridas + 1) menos frecuentes
+        tamanos = [sum(len(self.publicaciones[i]) for i in grupo) for grupo in grupos]
+        orden = sorted(range(len(grupos)), key=tamanos.__getitem__)
+        candidatas = set()
+        for indice in orden[:len(grupos) - requeridas + 1]:
+            for id_palabra in grupos[indice]:
+                candidatas.update(self.publicaciones[id_palabra])
+
+        # Máscara de las palabras buscadas a las que se parece cada palabra del vocabulario
+        mascaras = {}
+        for bit, grupo in enumerate(grupos):
+            for id_palabra in grupo:
+                mascaras[id_palabra] = mascaras.get(id_palabra, 0) | (1 << bit)
+
+        resultados = []
+        for posicion in candidatas:
+            ids = self.nombres[posicion]
+            mascara = 0
+            for id_palabra in ids:
+                mascara |= mascaras.get(id_palabra, 0)
+            if mascara.bit_count() < requeridas:
+                continue
+            puntaje = self._puntaje(buscadas, grupos, ids)
+            if puntaje >= umbral:
+                resultados.append((puntaje, posicion))
+
+        resultados.sort(key=lambda r: (-r[0], r[1]))
+        return [
+            (math.floor(puntaje * 100), ' '.join(self.palabras[i] for i in self.nombres[posicion]), self.datos[posicion])
+            for puntaje, posicion in resultados[:limite]
+        ]
+
+
+def motor_desde_resultados(queryset=None):
+    """Motor sobre los nombres distintos del historial de resultados (dato: la identificación)."""
+    from consultas.models import EntidadLista
+
+    # Cada registro encontrado alguna vez está una sola vez en EntidadLista
+    filas = (queryset if queryset is not None else EntidadLista.objects.all())
+    filas = (filas.exclude(nombre_completo__isnull=True)
+             .values_list('nombre_completo', 'identificacion').distinct().iterator(chunk_size=5000))
+    return MotorCoincidencias(filas)
@@ -0,0 +1,182 @@
+# archivo: espejo_listas/importacion.py
+"""
+Carga de snapshots de listas desde archivos.
+
+Formatos admitidos (con los mismos campos que devuelve el API: Id,
+NombreCompleto, Tipo_Lista, Restrictiva, ...):
+
+    .json   una lista de registros, o {"registros": [...]}
+    .jsonl  un registro JSON por línea (se lee en streaming)
+    .csv    una fila por registro con esos nombres de columna
+
+El origen también puede ser una URL http(s); se descarga a un archivo
+temporal antes de importar. Las entradas se insertan por bloques en un
+snapshot nuevo que solo se activa cuando terminó de cargarse, así que las
+consultas nunca ven un snapshot a medias.
+"""
+
+import csv
+import hashlib
+import json
+import logging
+import tempfile
+from itertools import islice
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from consultas.services import normalizar_identificacion
+
+from .coincidencias import clave_nombre
+from .models import EntradaLista, SnapshotListas
+
+logger = logging.getLogger(__name__)
+
+ENTRADAS_POR_INSERT = 5000
+CAMPOS_BOOLEANOS = ('Restrictiva', 'Boletin')
+CAMPOS_ENTEROS = ('CoincidenciaNombre', 'CoincidenciaID')
+
+
+class FormatoNoSoportado(ValueError):
+    pass
+
+
+def huella_archivo(ruta):
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def _booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    return str(valor).strip().upper() in ('1', 'TRUE', 'SI', 'SÍ', 'S', 'X')
+
+
+def _limpiar_registro(registro):
+    # El CSV trae todo como texto; dejamos los tipos como los devuelve el API
+    for campo in CAMPOS_BOOLEANOS:
+        if campo in registro:
+            registro[campo] = _booleano(registro[campo])
+    for campo in CAMPOS_ENTEROS:
+        if campo in registro:
+            try:
+                registro[campo] = int(registro[campo] or 0)
+            except (TypeError, ValueError):
+                registro[campo] = 0
+    return registro
+
+
+def leer_registros(ruta):
+    """Genera los registros del archivo según su extensión."""
+    ruta = Path(ruta)
+    extension = ruta.suffix.lower()
+    if extension == '.json':
+        with open(ruta, encoding='utf-8') as archivo:
+            contenido = json.load(archivo)
+        yield from (contenido['registros'] if isinstance(contenido, dict) else contenido)
+    elif extension == '.jsonl':
+        with open(ruta, encoding='utf-8') as archivo:
+            for linea in archivo:
+                if linea.strip():
+                    yield json.loads(linea)
+    elif extension == '.csv':
+        with open(ruta, encoding='utf-8-sig', newline='') as archivo:
+            yield from csv.DictReader(archivo)
+    else:
+        raise FormatoNoSoportado(f"Formato no soportado: {extension or ruta.name}")
+
+
+def _entradas(snapshot, registros, descartadas):
+    for registro in registros:
+        registro = _limpiar_registro(dict(registro))
+        identificacion = normalizar_identificacion(registro.get('Id') or '')
+        nombre = clave_nombre(registro.get('NombreCompleto') or '')
+        if not identificacion and not nombre:
+            descartadas[0] += 1
+            continue
+        yield EntradaLista(
+            snapshot=snapshot,
+            identificacion=identificacion[:50],
+            nombre=nombre[:255],
+            datos=registro,
+        )
+
+
+def descargar(url, destino):
+    with requests.get(url, stream=True, timeout=(5, 300)) as respuesta:
+        respuesta.raise_for_status()
+        with open(destino, 'wb') as archivo:
+            for bloque in respuesta.iter_content(chunk_size=1024 * 1024):
+                archivo.write(bloque)
+
+
+def importar_snapshot(origen, forzar=False):
+    """
+    Importa un snapshot desde una ruta o URL y lo activa. Si el archivo es
+    idéntico al snapshot activo (misma huella) no hace nada, salvo con `forzar`.
+    Devuelve el snapshot activo resultante.
+    """
+    if str(origen).startswith(('http://', 'https://')):
+        sufijo = Path(str(origen).split('?')[0]).suffix
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta = Path(carpeta) / f'snapshot{sufijo}'
+            descargar(origen, ruta)
+            return _importar_archivo(ruta, str(origen), forzar)
+    return _importar_archivo(Path(origen), str(origen), forzar)
+
+
+def _importar_archivo(ruta, origen, forzar):
+    huella = huella_archivo(ruta)
+    activo = SnapshotListas.objects.filter(estado='ACTIVO').first()
+    if activo and activo.huella == huella and not forzar:
+        logger.info("El snapshot %s ya corresponde a %s; no se importa de nuevo", activo.pk, origen)
+        return activo
+
+    snapshot = SnapshotListas.objects.create(origen=origen[:500], huella=huella)
+    descartadas = [0]
+    total = 0
+    try:
+        entradas = _entradas(snapshot, leer_registros(ruta), descartadas)
+        while bloque := list(islice(entradas, ENTRADAS_POR_INSERT)):
+            EntradaLista.objects.bulk_create(bloque)
+            total += len(bloque)
+
+        with transaction.atomic():
+            SnapshotListas.objects.filter(estado='ACTIVO').update(estado='REEMPLAZADO')
+            snapshot.estado = 'ACTIVO'
+            snapshot.total_entradas = total
+            snapshot.entradas_descartadas = descartadas[0]
+            snapshot.activado_en = timezone.now()
+            snapshot.save(update_fields=['estado', 'total_entradas', 'entradas_descartadas', 'activado_en'])
+    except Exception as e:
+        logger.exception("Falló la importación del snapshot %s desde %s", snapshot.pk, origen)
+        snapshot.entradas.all().delete()
+        snapshot.estado = 'ERROR'
+        snapshot.error = f"{type(e).__name__}: {e}"[:2000]
+        snapshot.save(update_fields=['estado', 'error'])
+        raise
+
+    _purgar_anteriores()
+    return snapshot
+
+
+def _purgar_anteriores():
+    # Conservamos algunos snapshots reemplazados para poder volver atrás
+    conservar = settings.ESPEJO_LISTAS_CONSERVAR
+    viejos = SnapshotListas.objects.filter(estado='REEMPLAZADO').order_by('-activado_en')[conservar:]
+    SnapshotListas.objects.filter(pk__in=[s.pk for s in viejos]).delete()
+
+
+def activar_snapshot(snapshot):
+    """Vuelve a activar un snapshot conservado (por ejemplo, si el último vino con errores)."""
+    with transaction.atomic():
+        SnapshotListas.objects.filter(estado='ACTIVO').update(estado='REEMPLAZADO')
+        snapshot.estado = 'ACTIVO'
+        snapshot.activado_en = timezone.now()
+        snapshot.save(update_fields=['estado', 'activado_en'])
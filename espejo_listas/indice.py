@@ -0,0 +1,173 @@
+# archivo: espejo_listas/indice.py
+"""
+Índice en memoria del snapshot activo de listas.
+
+    por_id      identificación normalizada -> entradas
+    motor       MotorCoincidencias sobre los nombres (ver coincidencias.py)
+
+Una consulta por nombre es aproximada: tolera el orden de las palabras,
+errores de digitación y variantes fonéticas ('JUAN PEREZ' encuentra 'PÉREZ
+GÓMEZ JUAN' y 'JUAN PERES'). CoincidenciaNombre es la similitud 0-100 y se
+devuelven las entradas con al menos ESPEJO_LISTAS_UMBRAL_NOMBRE.
+
+El índice se construye una vez por proceso y se reemplaza cuando se activa
+otro snapshot, sin dejar de responder con el anterior mientras tanto.
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from consultas.services import normalizar_identificacion
+
+from .coincidencias import MotorCoincidencias
+from .models import EntradaLista, SnapshotListas
+
+logger = logging.getLogger(__name__)
+
+
+class IndiceListas:
+
+    def __init__(self, snapshot_id, activado_en, entradas):
+        self.snapshot_id = snapshot_id
+        self.activado_en = activado_en
+        self.registros = []
+        self.por_id = {}
+        self.motor = MotorCoincidencias(())
+        for identificacion, nombre, datos in entradas:
+            posicion = len(self.registros)
+            self.registros.append(datos)
+            if identificacion:
+                self.por_id.setdefault(identificacion, []).append(posicion)
+            if nombre:
+                self.motor.agregar(nombre, posicion)
+
+    def __len__(self):
+        return len(self.registros)
+
+    def _buscar_id(self, identificacion):
+        return self.por_id.get(normalizar_identificacion(identificacion), [])
+
+    def _buscar_nombre(self, nombres):
+        """Devuelve {posición: porcentaje de coincidencia del nombre}."""
+        umbral = settings.ESPEJO_LISTAS_UMBRAL_NOMBRE / 100
+        return {posicion: puntaje for puntaje, _, posicion in self.motor.buscar(nombres, umbral=umbral, limite=None)}
+
+    def _armar(self, por_id, por_nombre):
+        resultados = []
+        for posicion in sorted(set(por_id) | set(por_nombre)):
+            registro = dict(self.registros[posicion])
+            registro['CoincidenciaID'] = 100 if posicion in por_id else 0
+            registro['CoincidenciaNombre'] = por_nombre.get(posicion, 0)
+            resultados.append(registro)
+        return resultados
+
+    def consultar_por_id(self, identificacion):
+        return self._armar(self._buscar_id(identificacion), {})
+
+    def consultar_por_nombre(self, nombres):
+        return self._armar([], self._buscar_nombre(nombres))
+
+    def consultar_por_id_y_nombre(self, identificacion, nombres):
+        return self._armar(self._buscar_id(identificacion), self._buscar_nombre(nombres))
+
+
+def construir_indice(snapshot):
+    inicio = time.perf_counter()
+    entradas = (EntradaLista.objects.filter(snapshot=snapshot)
+                .values_list('identificacion', 'nombre', 'datos')
+                .iterator(chunk_size=5000))
+    indice = IndiceListas(snapshot.pk, snapshot.activado_en, entradas)
+    logger.info("Índice de listas construido: snapshot %s, %s entradas en %.1fs",
+                snapshot.pk, len(indice), time.perf_counter() - inicio)
+    return indice
+
+
+# Lo tiene el hilo que revisa y construye; nunca se espera por él mientras haya un índice que devolver
+_construccion = threading.Lock()
+_estado = {'indice': None, 'revisado': 0.0}
+
+
+def _al_dia(indice):
+    return indice is not None and time.monotonic() - _estado['revisado'] < settings.ESPEJO_LISTAS_REVISION_SEGUNDOS
+
+
+def obtener_indice():
+    """
+    Devuelve el índice del snapshot activo, o None si no hay ninguno. Cada
+    ESPEJO_LISTAS_REVISION_SEGUNDOS se verifica si se activó otro snapshot.
+
+    Un solo hilo revisa y construye el índice nuevo; mientras tanto los demás
+    siguen respondiendo con el actual, y el reemplazo es una sola asignación.
+    Solo se espera cuando todavía no hay ningún índice.
+    """
+    indice = _estado['indice']
+    if _al_dia(indice):
+        return indice
+    if not _construccion.acquire(blocking=indice is None):
+        return indice
+
+    try:
+        indice = _estado['indice']
+        if _al_dia(indice):
+            return indice
+        activo = SnapshotListas.objects.filter(estado='ACTIVO').order_by('-activado_en').first()
+        if activo is None:
+            nuevo = None
+        elif indice is None or indice.snapshot_id != activo.pk:
+            try:
+                nuevo = construir_indice(activo)
+            except Exception:
+                if indice is None:
+                    raise
+                logger.exception("No se pudo construir el índice del snapshot %s; se sigue con el %s",
+                                 activo.pk, indice.snapshot_id)
+                nuevo = indice
+        else:
+            # El mismo snapshot pudo reactivarse desde el admin
+            indice.activado_en = activo.activado_en
+            nuevo = indice
+        _estado['indice'] = nuevo
+        _estado['revisado'] = time.monotonic()
+        return nuevo
+    finally:
+        _construccion.release()
+
+
+def descartar_indice():
+    with _construccion:
+        _estado['indice'] = None
+        _estado['revisado'] = 0.0
+
+
+def indice_vigente():
+    """El índice activo si existe y no es más viejo que ESPEJO_LISTAS_MAX_ANTIGUEDAD_HORAS."""
+    indice = obtener_indice()
+    if indice is None:
+        return None
+    limite = timezone.now() - timedelta(hours=settings.ESPEJO_LISTAS_MAX_ANTIGUEDAD_HORAS)
+    if indice.activado_en is None or indice.activado_en < limite:
+        logger.warning("El espejo local de listas está desactualizado (snapshot %s)", indice.snapshot_id)
+        return None
+    return indice
+
+
+def consultar(endpoint, argumentos):
+    """
+    Responde una consulta con los mismos endpoint y argumentos que el API
+    remoto. Devuelve None si no hay un snapshot vigente.
+    """
+    indice = indice_vigente()
+    if indice is None:
+        return None
+    if endpoint == 'PepsExactaID':
+        return indice.consultar_por_id(*argumentos)
+    if endpoint == 'PepsNombre':
+        return indice.consultar_por_nombre(*argumentos)
+    if endpoint == 'PepsIDNombre':
+        return indice.consultar_por_id_y_nombre(*argumentos)
+    raise ValueError(f"Endpoint desconocido: {endpoint}")
@@ -0,0 +1,144 @@
+# archivo: espejo_listas/management/commands/bench_coincidencias.py
+import bisect
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from espejo_listas.coincidencias import MotorCoincidencias, clave_nombre
+
+NOMBRES = [
+    'JUAN', 'JOSE', 'LUIS', 'CARLOS', 'JORGE', 'ANDRES', 'DIEGO', 'FELIPE', 'JAVIER', 'MIGUEL',
+    'ALEJANDRO', 'SEBASTIAN', 'DAVID', 'CAMILO', 'GUILLERMO', 'HECTOR', 'GERMAN', 'VICTOR', 'ALVARO', 'EDUARDO',
+    'MARIA', 'ANA', 'LUZ', 'SANDRA', 'CLAUDIA', 'PAOLA', 'ANDREA', 'CAROLINA', 'JIMENA', 'VIVIANA',
+    'GLORIA', 'PATRICIA', 'YOLANDA', 'BEATRIZ', 'CECILIA', 'ISABEL', 'ESPERANZA', 'LILIANA', 'XIMENA', 'ROCIO',
+]
+SILABAS = ['BA', 'VE', 'CA', 'CE', 'GA', 'GI', 'LLA', 'YO', 'ZA', 'SO', 'RA', 'RRE', 'MA', 'NE', 'TO', 'DI',
+           'QUE', 'HE', 'JU', 'LO', 'PE', 'FI', 'CHA', 'NU', 'GUE', 'TA', 'MO', 'RI', 'SA', 'LE']
+FINALES = ['Z', 'S', 'N', 'R', 'L', 'DO', 'DA', 'NO', 'RA', 'TE']
+SILABAS_AUSENTES = ['XO', 'KU', 'WA', 'FRU', 'PLI', 'TRO', 'BLU', 'GRE']
+SUSTITUCIONES_FONETICAS = [('V', 'B'), ('B', 'V'), ('Z', 'S'), ('S', 'Z'), ('LL', 'Y'), ('Y', 'LL'),
+                           ('CE', 'SE'), ('CI', 'SI'), ('QU', 'K'), ('GE', 'JE'), ('H', '')]
+TILDES = str.maketrans('AEIOU', 'ÁÉÍÓÚ')
+
+
+def _apellido(rng, silabas):
+    return ''.join(rng.choice(silabas) for _ in range(rng.randint(2, 3))) + rng.choice(FINALES)
+
+
+def generar_corpus(cantidad, apellidos, rng):
+    """Nombres 'NOMBRE [NOMBRE] APELLIDO APELLIDO' con apellidos de frecuencia tipo Zipf."""
+    vocabulario = sorted({_apellido(rng, SILABAS) for _ in range(apellidos)})
+    rng.shuffle(vocabulario)
+    acumulado, total = [], 0.0
+    for rango in range(len(vocabulario)):
+        total += 1 / (rango + 1)
+        acumulado.append(total)
+
+    def apellido():
+        return vocabulario[bisect.bisect(acumulado, rng.random() * total)]
+
+    corpus = []
+    for _ in range(cantidad):
+        palabras = rng.sample(NOMBRES, rng.choice((1, 1, 2)))
+        corpus.append(' '.join(palabras + [apellido(), apellido()]))
+    return corpus
+
+
+def _error_digitacion(palabra, rng):
+    if len(palabra) < 5:
+        return palabra
+    i = rng.randrange(1, len(palabra) - 1)
+    operacion = rng.choice(('sustituir', 'borrar', 'transponer'))
+    if operacion == 'sustituir':
+        return palabra[:i] + rng.choice('AEIOURSNLT') + palabra[i + 1:]
+    if operacion == 'borrar':
+        return palabra[:i] + palabra[i + 1:]
+    return palabra[:i - 1] + palabra[i] + palabra[i - 1] + palabra[i + 1:]
+
+
+def variar(nombre, rng):
+    """Una variante realista del nombre: orden, tildes, digitación, fonética o una palabra de menos."""
+    palabras = nombre.split()
+    for _ in range(rng.randint(1, 2)):
+        cambio = rng.choice(('orden', 'tildes', 'digitacion', 'fonetica', 'omitir'))
+        if cambio == 'orden':
+            palabras = palabras[-2:] + palabras[:-2]
+        elif cambio == 'tildes':
+            i = rng.randrange(len(palabras))
+            palabras[i] = palabras[i].translate(TILDES).capitalize()
+        elif cambio == 'digitacion':
+            i = rng.randrange(len(palabras))
+            palabras[i] = _error_digitacion(palabras[i], rng)
+        elif cambio == 'fonetica':
+            i = rng.randrange(len(palabras))
+            posibles = [(a, b) for a, b in SUSTITUCIONES_FONETICAS if a in palabras[i]]
+            if posibles:
+                a, b = rng.choice(posibles)
+                palabras[i] = palabras[i].replace(a, b, 1)
+        elif cambio == 'omitir' and len(palabras) > 3:
+            palabras.pop(rng.randrange(len(palabras) - 2))
+    return ' '.join(palabras)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide precisión, exhaustividad y consultas por segundo del motor de "
+        "coincidencias sobre un corpus sintético de nombres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nombres', type=int, default=1_000_000)
+        parser.add_argument('--apellidos', type=int, default=50_000, help='Apellidos distintos del corpus')
+        parser.add_argument('--consultas', type=int, default=2000)
+        parser.add_argument('--umbral', type=int, default=85, help='Similitud mínima 0-100')
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['semilla'])
+        corpus = generar_corpus(options['nombres'], options['apellidos'], rng)
+
+        inicio = time.perf_counter()
+        motor = MotorCoincidencias((nombre, posicion) for posicion, nombre in enumerate(corpus))
+        construccion = time.perf_counter() - inicio
+        self.stdout.write(f"{len(motor):,} nombres, {len(motor.palabras):,} palabras distintas; "
+                          f"índice construido en {construccion:.1f}s")
+
+        # Consultas positivas (variantes de un nombre del corpus) y negativas
+        # (apellidos con sílabas que el corpus no usa)
+        positivas = [rng.randrange(len(corpus)) for _ in range(options['consultas'])]
+        consultas = [(variar(corpus[p], rng), clave_nombre(corpus[p])) for p in positivas]
+        negativas = [f'{rng.choice(NOMBRES)} {_apellido(rng, SILABAS_AUSENTES)} {_apellido(rng, SILABAS_AUSENTES)}'
+                     for _ in range(options['consultas'] // 4)]
+
+        umbral = options['umbral'] / 100
+        devueltos = relevantes = encontradas = primero = 0
+        latencias = []
+        for consulta, esperado in consultas:
+            inicio = time.perf_counter()
+            resultados = motor.buscar(consulta, umbral=umbral, limite=None)
+            latencias.append(time.perf_counter() - inicio)
+            aciertos = [r for r in resultados if r[1] == esperado]
+            devueltos += len(resultados)
+            relevantes += len(aciertos)
+            encontradas += bool(aciertos)
+            primero += bool(resultados) and resultados[0][1] == esperado
+
+        falsas_alarmas = 0
+        for consulta in negativas:
+            inicio = time.perf_counter()
+            falsas_alarmas += bool(motor.buscar(consulta, umbral=umbral, limite=None))
+            latencias.append(time.perf_counter() - inicio)
+
+        total = len(consultas)
+        latencias.sort()
+        self.stdout.write(f"Precisión:                {relevantes / max(devueltos, 1):.1%} "
+                          f"({relevantes:,} de {devueltos:,} resultados)")
+        self.stdout.write(f"Exhaustividad:            {encontradas / total:.1%} ({encontradas:,} de {total:,})")
+        self.stdout.write(f"Correcto en primer lugar: {primero / total:.1%}")
+        self.stdout.write(f"Falsas alarmas:           {falsas_alarmas / max(len(negativas), 1):.1%} "
+                          f"de {len(negativas):,} consultas negativas")
+        self.stdout.write(f"Latencia p50/p95:         {statistics.median(latencias) * 1e3:.2f} / "
+                          f"{latencias[int(len(latencias) * 0.95)] * 1e3:.2f} ms")
+        self.stdout.write(self.style.SUCCESS(f"{len(latencias) / sum(latencias):,.0f} consultas/s"))
@@ -0,0 +1,26 @@
+# archivo: espejo_listas/management/commands/importar_listas.py
+from django.core.management.base import BaseCommand, CommandError
+
+from espejo_listas.importacion import FormatoNoSoportado, importar_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa un snapshot de las listas (archivo .json, .jsonl o .csv, o una URL) "
+        "al espejo local y lo activa. Pensado para correr desde cron, por ejemplo "
+        "cada noche después de la actualización de las listas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('origen', help='Ruta o URL del archivo con los registros')
+        parser.add_argument('--forzar', action='store_true', help='Importar aunque sea igual al snapshot activo')
+
+    def handle(self, *args, **options):
+        try:
+            snapshot = importar_snapshot(options['origen'], forzar=options['forzar'])
+        except (FileNotFoundError, FormatoNoSoportado) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot {snapshot.id} activo: {snapshot.total_entradas} entradas "
+            f"({snapshot.entradas_descartadas} descartadas sin Id ni nombre)."
+        ))
@@ -0,0 +1,57 @@
+# archivo: espejo_listas/management/commands/verificar_espejo.py
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from consultas import services
+from espejo_listas.indice import obtener_indice
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el espejo local con el API remoto para una muestra de "
+        "identificaciones del snapshot activo y reporta diferencias y latencias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--muestra', type=int, default=50)
+        parser.add_argument('--semilla', type=int, default=None)
+
+    def handle(self, *args, **options):
+        indice = obtener_indice()
+        if indice is None:
+            raise CommandError("No hay un snapshot activo; importar uno con importar_listas")
+
+        identificaciones = sorted(indice.por_id)
+        muestra = random.Random(options['semilla']).sample(identificaciones, min(options['muestra'], len(identificaciones)))
+        diferencias = errores = 0
+        local, remoto = [], []
+
+        for identificacion in muestra:
+            inicio = time.perf_counter()
+            locales = indice.consultar_por_id(identificacion)
+            local.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            remotos = services._consultar_remoto('PepsExactaID', [identificacion], usar_cache=False)
+            remoto.append(time.perf_counter() - inicio)
+
+            if remotos is None:
+                errores += 1
+                continue
+            claves_locales = sorted((r.get('Tipo_Lista'), r.get('NombreCompleto')) for r in locales)
+            claves_remotas = sorted((r.get('Tipo_Lista'), r.get('NombreCompleto')) for r in remotos)
+            if claves_locales != claves_remotas:
+                diferencias += 1
+                self.stdout.write(self.style.WARNING(
+                    f"{identificacion}: {len(locales)} local, {len(remotos)} remoto"
+                ))
+
+        self.stdout.write(
+            f"Snapshot {indice.snapshot_id}: {len(muestra)} identificaciones, "
+            f"{diferencias} con diferencias, {errores} errores del API"
+        )
+        self.stdout.write(f"Latencia mediana local:  {statistics.median(local) * 1e6:.1f} µs")
+        self.stdout.write(f"Latencia mediana remota: {statistics.median(remoto) * 1e3:.1f} ms")
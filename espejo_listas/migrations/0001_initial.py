@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotListas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origen', models.CharField(max_length=500)),
+                ('huella', models.CharField(db_index=True, max_length=64)),
+                ('estado', models.CharField(choices=[('CARGANDO', 'Cargando'), ('ACTIVO', 'Activo'), ('REEMPLAZADO', 'Reemplazado'), ('ERROR', 'Error')], default='CARGANDO', max_length=20)),
+                ('total_entradas', models.PositiveIntegerField(default=0)),
+                ('entradas_descartadas', models.PositiveIntegerField(default=0)),
+                ('cargado_en', models.DateTimeField(auto_now_add=True)),
+                ('activado_en', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de listas',
+                'verbose_name_plural': 'Snapshots de listas',
+            },
+        ),
+        migrations.CreateModel(
+            name='EntradaLista',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('identificacion', models.CharField(blank=True, default='', max_length=50)),
+                ('nombre', models.CharField(blank=True, default='', max_length=255)),
+                ('datos', models.JSONField()),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entradas', to='espejo_listas.snapshotlistas')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['snapshot', 'identificacion'], name='entrada_snapshot_id_idx'), models.Index(fields=['snapshot', 'nombre'], name='entrada_snapshot_nombre_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# archivo: espejo_listas/models.py
+from django.db import models
+
+
+class SnapshotListas(models.Model):
+    """
+    Una importación completa de las listas restrictivas y PEP. Solo un snapshot
+    está ACTIVO a la vez; el índice en memoria se construye a partir de él.
+    """
+    ESTADO_CHOICES = (
+        ('CARGANDO', 'Cargando'),
+        ('ACTIVO', 'Activo'),
+        ('REEMPLAZADO', 'Reemplazado'),
+        ('ERROR', 'Error'),
+    )
+
+    origen = models.CharField(max_length=500)
+    huella = models.CharField(max_length=64, db_index=True)  # sha256 del archivo importado
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='CARGANDO')
+    total_entradas = models.PositiveIntegerField(default=0)
+    entradas_descartadas = models.PositiveIntegerField(default=0)
+    cargado_en = models.DateTimeField(auto_now_add=True)
+    activado_en = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        verbose_name = 'Snapshot de listas'
+        verbose_name_plural = 'Snapshots de listas'
+
+    def __str__(self):
+        return f"Snapshot {self.id} ({self.estado}, {self.total_entradas} entradas)"
+
+
+class EntradaLista(models.Model):
+    """Un registro de lista tal como lo devuelve el API, más las claves normalizadas de búsqueda."""
+    snapshot = models.ForeignKey(SnapshotListas, on_delete=models.CASCADE, related_name='entradas')
+    identificacion = models.CharField(max_length=50, blank=True, default='')
+    nombre = models.CharField(max_length=255, blank=True, default='')
+    datos = models.JSONField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['snapshot', 'identificacion'], name='entrada_snapshot_id_idx'),
+            models.Index(fields=['snapshot', 'nombre'], name='entrada_snapshot_nombre_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre or 'Sin nombre'} ({self.identificacion or 'N/A'})"
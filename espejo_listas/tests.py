@@ -0,0 +1,205 @@
+import csv
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from consultas import services
+from consultas.stub_api import StubAPIServer, generar_registro
+
+from .importacion import importar_snapshot
+from .coincidencias import MotorCoincidencias, clave_fonetica, clave_nombre, palabras_requeridas
+from .indice import construir_indice, descartar_indice, obtener_indice
+from .models import EntradaLista, SnapshotListas
+
+
+class EspejoListasTests(TestCase):
+
+    def setUp(self):
+        self.carpeta = Path(tempfile.mkdtemp())
+        descartar_indice()
+
+    def tearDown(self):
+        descartar_indice()
+        shutil.rmtree(self.carpeta, ignore_errors=True)
+
+    def _archivo_json(self, registros, nombre='listas.json'):
+        ruta = self.carpeta / nombre
+        ruta.write_text(json.dumps(registros), encoding='utf-8')
+        return ruta
+
+    def _registros(self):
+        return [
+            generar_registro(0, identificacion='900123', nombre='José Pérez Gómez'),
+            generar_registro(1, identificacion='900123', nombre='JOSE PEREZ'),
+            generar_registro(2, identificacion='555', nombre='MARIA LOPEZ'),
+            {'Id': '', 'NombreCompleto': ''},
+        ]
+
+    def test_importa_y_no_repite_el_mismo_archivo(self):
+        ruta = self._archivo_json(self._registros())
+        snapshot = importar_snapshot(ruta)
+        self.assertEqual(snapshot.estado, 'ACTIVO')
+        self.assertEqual(snapshot.total_entradas, 3)
+        self.assertEqual(snapshot.entradas_descartadas, 1)
+        self.assertEqual(EntradaLista.objects.get(identificacion='555').nombre, 'MARIA LOPEZ')
+
+        self.assertEqual(importar_snapshot(ruta).pk, snapshot.pk)
+        self.assertEqual(SnapshotListas.objects.count(), 1)
+
+    def test_importa_csv_con_tipos_del_api(self):
+        ruta = self.carpeta / 'listas.csv'
+        with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+            escritor = csv.DictWriter(archivo, fieldnames=['Id', 'NombreCompleto', 'Tipo_Lista', 'Restrictiva'])
+            escritor.writeheader()
+            escritor.writerow({'Id': '77 88', 'NombreCompleto': 'ANA RUIZ', 'Tipo_Lista': 'OFAC', 'Restrictiva': 'true'})
+            escritor.writerow({'Id': '1.234.567', 'NombreCompleto': 'LUIS DIAZ', 'Tipo_Lista': 'OFAC', 'Restrictiva': 'true'})
+        importar_snapshot(ruta)
+
+        entrada = EntradaLista.objects.get(nombre='ANA RUIZ')
+        self.assertEqual(entrada.identificacion, '7788')
+        self.assertIs(entrada.datos['Restrictiva'], True)
+        # Igual que en los lotes y la vigilancia, para que adelantar_por_snapshot las encuentre
+        self.assertEqual(EntradaLista.objects.get(nombre='LUIS DIAZ').identificacion, '1234567')
+
+    def test_importacion_fallida_conserva_el_snapshot_activo(self):
+        activo = importar_snapshot(self._archivo_json(self._registros()))
+        roto = self.carpeta / 'roto.jsonl'
+        roto.write_text('{"Id": "1", "NombreCompleto": "A"}\nesto no es json\n', encoding='utf-8')
+
+        with self.assertLogs('espejo_listas.importacion', level='ERROR'), self.assertRaises(ValueError):
+            importar_snapshot(roto)
+
+        self.assertEqual(SnapshotListas.objects.get(estado='ACTIVO').pk, activo.pk)
+        fallido = SnapshotListas.objects.get(estado='ERROR')
+        self.assertFalse(fallido.entradas.exists())
+
+    def test_consultas_del_indice(self):
+        importar_snapshot(self._archivo_json(self._registros()))
+        indice = obtener_indice()
+
+        self.assertEqual(len(indice.consultar_por_id(' 900 123 ')), 2)
+        self.assertEqual(len(indice.consultar_por_id('900.123')), 2)
+        # Sin importar tildes ni orden; las palabras de más bajan un poco el puntaje
+        por_nombre = indice.consultar_por_nombre('perez jose')
+        self.assertEqual(sorted(r['CoincidenciaNombre'] for r in por_nombre), [95, 100])
+        self.assertEqual(indice.consultar_por_nombre('JOSE LOPEZ'), [])
+
+        combinado = indice.consultar_por_id_y_nombre('555', 'jose perez')
+        self.assertEqual(len(combinado), 3)
+        maria = next(r for r in combinado if r['Id'] == '555')
+        self.assertEqual((maria['CoincidenciaID'], maria['CoincidenciaNombre']), (100, 0))
+
+    def test_mientras_se_construye_el_nuevo_indice_se_sigue_usando_el_anterior(self):
+        importar_snapshot(self._archivo_json(self._registros()))
+        anterior = obtener_indice()
+        nuevo = importar_snapshot(self._archivo_json(self._registros()[:1], 'otro.json'))
+        vistos = []
+
+        def construir_y_consultar(snapshot):
+            # Otra petición llega mientras este hilo construye el índice nuevo
+            hilo = threading.Thread(target=lambda: vistos.append(obtener_indice()))
+            hilo.start()
+            hilo.join(timeout=5)
+            return construir_indice(snapshot)
+
+        with override_settings(ESPEJO_LISTAS_REVISION_SEGUNDOS=0), \
+                mock.patch('espejo_listas.indice.construir_indice', construir_y_consultar):
+            actual = obtener_indice()
+
+        self.assertEqual(len(vistos), 1)
+        self.assertIs(vistos[0], anterior)
+        self.assertEqual(actual.snapshot_id, nuevo.pk)
+        self.assertEqual(len(actual), 1)
+
+    def test_si_falla_la_construccion_se_conserva_el_indice_anterior(self):
+        importar_snapshot(self._archivo_json(self._registros()))
+        anterior = obtener_indice()
+        importar_snapshot(self._archivo_json(self._registros()[:1], 'otro.json'))
+
+        with override_settings(ESPEJO_LISTAS_REVISION_SEGUNDOS=0), \
+                mock.patch('espejo_listas.indice.construir_indice', side_effect=MemoryError), \
+                self.assertLogs('espejo_listas.indice', level='ERROR'):
+            self.assertIs(obtener_indice(), anterior)
+
+    def test_clave_nombre(self):
+        self.assertEqual(clave_nombre("  josé  o'neil-pérez "), 'JOSE O NEIL PEREZ')
+
+
+class CoincidenciasTests(SimpleTestCase):
+
+    def setUp(self):
+        self.motor = MotorCoincidencias([
+            ('Juan Carlos Velázquez Gómez', 1),
+            ('JUAN CARLOS VELASCO GOMEZ', 2),
+            ('MARÍA DE LOS ÁNGELES HERNÁNDEZ', 3),
+            ('GUILLERMO CHAVEZ', 4),
+        ])
+
+    def test_clave_fonetica(self):
+        self.assertEqual(clave_fonetica('VELAZQUEZ'), clave_fonetica('BELASQUES'))
+        self.assertEqual(clave_fonetica('GERMAN'), clave_fonetica('JERMAN'))
+        self.assertEqual(clave_fonetica('GUILLERMO'), clave_fonetica('GUIYERMO'))
+        self.assertNotEqual(clave_fonetica('CHAVEZ'), clave_fonetica('CABEZ'))
+
+    def test_orden_tildes_fonetica_y_digitacion(self):
+        for consulta in ('GOMEZ VELAZQUEZ JUAN CARLOS', 'juan carlos belasques gomez', 'JUAN CRALOS VELAZQUEZ GOMEZ'):
+            with self.subTest(consulta=consulta):
+                self.assertEqual(self.motor.buscar(consulta)[0][2], 1)
+        self.assertEqual(self.motor.buscar('GUILLERMO CHAVEZ')[0], (100, 'GUILLERMO CHAVEZ', 4))
+
+    def test_umbral(self):
+        # VELASCO no alcanza a ser VELAZQUEZ con el umbral por defecto
+        self.assertEqual([r[2] for r in self.motor.buscar('JUAN CARLOS VELAZQUEZ GOMEZ')], [1])
+        self.assertEqual([r[2] for r in self.motor.buscar('JUAN CARLOS VELAZQUEZ GOMEZ', umbral=0.6)], [1, 2])
+        self.assertEqual(self.motor.buscar('PEDRO PICAPIEDRA'), [])
+
+    def test_palabras_cortas_pueden_faltar(self):
+        self.assertEqual(palabras_requeridas(['JUAN', 'PEREZ', 'GOMEZ'], 0.85), 3)
+        self.assertEqual(palabras_requeridas(['MARIA', 'DE', 'LOS', 'ANGELES', 'HERNANDEZ'], 0.85), 4)
+        self.assertEqual(self.motor.buscar('MARIA LOS ANGELES HERNANDEZ')[0][2], 3)
+
+
+class ServiciosConEspejoTests(TestCase):
+
+    def setUp(self):
+        self.carpeta = Path(tempfile.mkdtemp())
+        ruta = self.carpeta / 'listas.json'
+        ruta.write_text(json.dumps([generar_registro(0, identificacion='123', nombre='ANA RUIZ')]), encoding='utf-8')
+        importar_snapshot(ruta)
+        descartar_indice()
+        self.stub = StubAPIServer(resultados_por_consulta=2).iniciar()
+
+    def tearDown(self):
+        services.cerrar_sesion()
+        self.stub.detener()
+        descartar_indice()
+        shutil.rmtree(self.carpeta, ignore_errors=True)
+
+    def test_modo_local_no_llama_al_api(self):
+        with override_settings(ESPEJO_LISTAS_MODO='local', API_BASE_URL=self.stub.base_url, API_CACHE_ACTIVO=False):
+            resultados = services.consultar_api_por_id('123')
+        self.assertEqual([r['NombreCompleto'] for r in resultados], ['ANA RUIZ'])
+        self.assertEqual(self.stub.peticiones, 0)
+
+    def test_modo_local_usa_el_api_si_el_espejo_esta_viejo(self):
+        with override_settings(ESPEJO_LISTAS_MODO='local', ESPEJO_LISTAS_MAX_ANTIGUEDAD_HORAS=0,
+                               API_BASE_URL=self.stub.base_url, API_CACHE_ACTIVO=False):
+            with self.assertLogs('espejo_listas.indice', level='WARNING'):
+                resultados = services.consultar_api_por_id('123')
+        self.assertEqual(len(resultados), 2)
+        self.assertEqual(self.stub.peticiones, 1)
+
+    def test_modo_respaldo_responde_con_el_espejo_si_el_api_falla(self):
+        self.stub.configurar(fallar_cada=1)
+        with override_settings(ESPEJO_LISTAS_MODO='respaldo', API_BASE_URL=self.stub.base_url,
+                               API_CACHE_ACTIVO=False, API_MAX_REINTENTOS=0):
+            services.cerrar_sesion()
+            with self.assertLogs('consultas.services', level='WARNING'):
+                resultados = services.consultar_api_por_id('123')
+        self.assertEqual(len(resultados), 1)
+        self.assertGreater(self.stub.peticiones, 0)
@@ -57,12 +57,18 @@ INSTALLED_APPS = [
     'usuarios',
     'consultas',
     'cargas_masivas.apps.CargasMasivasConfig',
+    'cola_tareas.apps.ColaTareasConfig',
+    'espejo_listas.apps.EspejoListasConfig',
+    'monitoreo.apps.MonitoreoConfig',
+    'vigilancia.apps.VigilanciaConfig',
 
     'core_admin',
 ]
 
 
 MIDDLEWARE = [
+    # Primero, para medir también a los demás middlewares (no se instala si INSTRUMENTACION_ACTIVA=False)
+    'monitoreo.middleware.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -171,6 +177,157 @@ LOGOUT_REDIRECT_URL = '/cuentas/login/' # Lo enviamos de vuelta a la página de
 API_TOKEN = config('API_TOKEN')
 API_BASE_URL = config('API_BASE_URL')
 
+# Cliente HTTP del API: pool de conexiones con keep-alive y reintentos acotados
+API_POOL_CONEXIONES = config('API_POOL_CONEXIONES', default=4, cast=int)  # Hosts distintos en el pool
+API_POOL_MAXSIZE = config('API_POOL_MAXSIZE', default=20, cast=int)  # Conexiones abiertas por host
+API_TIMEOUT_CONEXION = config('API_TIMEOUT_CONEXION', default=3.05, cast=float)  # Segundos para conectar
+API_TIMEOUT_LECTURA = config('API_TIMEOUT_LECTURA', default=20, cast=float)  # Segundos esperando la respuesta
+API_MAX_REINTENTOS = config('API_MAX_REINTENTOS', default=2, cast=int)  # Para 5xx y conexiones reiniciadas
+API_BACKOFF_FACTOR = config('API_BACKOFF_FACTOR', default=0.3, cast=float)  # Espera 0.3s, 0.6s, 1.2s...
+
+# Consultas concurrentes (consultas/consulta_paralela.py). Con ID y nombre, la
+# revisión completa consulta a la vez PepsIDNombre, PepsExactaID y PepsNombre.
+API_REVISION_COMPLETA = config('API_REVISION_COMPLETA', default=True, cast=bool)
+API_PLAZO_BUSQUEDA = config('API_PLAZO_BUSQUEDA', default=15, cast=float)  # Segundos para reunir las respuestas de una búsqueda
+API_HILOS = config('API_HILOS', default=API_POOL_MAXSIZE, cast=int)  # Peticiones simultáneas al API por proceso
+
+# Caché de resultados del API. Las listas se actualizan a diario, así que por
+# defecto una respuesta se reutiliza durante 6 horas. Poner API_CACHE_ACTIVO=False
+# para auditorías que necesitan siempre la respuesta fresca del servicio.
+API_CACHE_ACTIVO = config('API_CACHE_ACTIVO', default=True, cast=bool)
+API_CACHE_TTL = config('API_CACHE_TTL', default=6 * 60 * 60, cast=int)  # Segundos
+
+# Coalescencia (consultas/coalescencia.py): las consultas idénticas que llegan
+# mientras otra está en curso esperan su respuesta en vez de llamar de nuevo al API,
+# dentro del proceso y, con la caché activa, entre procesos.
+API_COALESCENCIA_ACTIVA = config('API_COALESCENCIA_ACTIVA', default=True, cast=bool)
+API_COALESCENCIA_ESPERA = config('API_COALESCENCIA_ESPERA', default=25, cast=float)  # Segundos máximos esperando a la primera
+API_COALESCENCIA_SONDEO_MS = config('API_COALESCENCIA_SONDEO_MS', default=50, cast=int)  # Primera espera entre lecturas de la caché compartida; se duplica hasta 1s
+BUSQUEDA_VENTANA_REENVIO = config('BUSQUEDA_VENTANA_REENVIO', default=10, cast=int)  # Segundos en que un reenvío idéntico del formulario reutiliza la búsqueda
+
+
+# --- ESPEJO LOCAL DE LISTAS (importar con: python manage.py importar_listas <archivo|url>) ---
+# 'remoto': solo el API. 'local': responde desde el espejo y usa el API si no hay
+# snapshot vigente. 'respaldo': usa el API y recurre al espejo cuando el API falla.
+ESPEJO_LISTAS_MODO = config('ESPEJO_LISTAS_MODO', default='remoto')
+ESPEJO_LISTAS_MAX_ANTIGUEDAD_HORAS = config('ESPEJO_LISTAS_MAX_ANTIGUEDAD_HORAS', default=48, cast=int)  # Más viejo se ignora
+ESPEJO_LISTAS_REVISION_SEGUNDOS = config('ESPEJO_LISTAS_REVISION_SEGUNDOS', default=60, cast=int)  # Cada cuánto buscar un snapshot nuevo
+ESPEJO_LISTAS_CONSERVAR = config('ESPEJO_LISTAS_CONSERVAR', default=2, cast=int)  # Snapshots anteriores que se guardan
+ESPEJO_LISTAS_UMBRAL_NOMBRE = config('ESPEJO_LISTAS_UMBRAL_NOMBRE', default=85, cast=int)  # Similitud mínima (0-100) por nombre
+
+
+# --- CLASIFICACIÓN DE LISTAS ---
+# Reglas Rojo/Amarillo/PEP's. Para cambiarlas sin desplegar, apuntar a una copia
+# del JSON fuera del repositorio; se recarga sola cuando cambia el archivo.
+CLASIFICACION_REGLAS = config('CLASIFICACION_REGLAS', default=str(BASE_DIR / 'consultas' / 'reglas_clasificacion.json'))
+CLASIFICACION_RECARGA_SEGUNDOS = config('CLASIFICACION_RECARGA_SEGUNDOS', default=30, cast=int)  # Cada cuánto revisar el archivo
+
+
+# --- REPORTES PDF ---
+# Generar el PDF de cada búsqueda en la cola de tareas apenas se guarda
+PDF_PRERENDERIZAR = config('PDF_PRERENDERIZAR', default=True, cast=bool)
+
+
+# --- ARCHIVO DEL HISTORIAL (consultas/archivo.py; mensual con: python manage.py archivar_historial) ---
+# Los meses más viejos se exportan a Parquet en el almacenamiento por defecto y se borran de la base
+ARCHIVO_HISTORIAL_MESES = config('ARCHIVO_HISTORIAL_MESES', default=24, cast=int)  # Meses completos que se conservan en la base
+ARCHIVO_HISTORIAL_CARPETA = config('ARCHIVO_HISTORIAL_CARPETA', default='archivo_historial')
+ARCHIVO_HISTORIAL_COMPRESION = config('ARCHIVO_HISTORIAL_COMPRESION', default='zstd')  # Códec de Parquet: zstd, snappy, gzip
+
+
+# --- DESCARGAS (consultas/descargas.py) ---
+# Con S3, los archivos desde este tamaño se entregan con una redirección a una URL prefirmada
+DESCARGAS_REDIRECCION_S3 = config('DESCARGAS_REDIRECCION_S3', default=True, cast=bool)
+DESCARGAS_REDIRECCION_MINIMO_KB = config('DESCARGAS_REDIRECCION_MINIMO_KB', default=512, cast=int)
+DESCARGAS_EXPIRACION = config('DESCARGAS_EXPIRACION', default=60, cast=int)  # Segundos de validez de la URL prefirmada
+
+
+# --- LISTADOS (consultas/paginacion.py) ---
+# Los listados se paginan por cursor; el total mostrado se guarda en caché
+PAGINACION_CONTEO_TTL = config('PAGINACION_CONTEO_TTL', default=120, cast=int)  # Segundos
+# Por encima de esta estimación del planificador (PostgreSQL) se muestra el total aproximado en vez de contar
+PAGINACION_CONTEO_EXACTO_MAXIMO = config('PAGINACION_CONTEO_EXACTO_MAXIMO', default=10_000, cast=int)
+# El dashboard de gestión guarda en caché el conteo de personas que ingresaron hace poco a una lista
+DASHBOARD_NUEVOS_EN_LISTAS_TTL = config('DASHBOARD_NUEVOS_EN_LISTAS_TTL', default=300, cast=int)  # Segundos
+
+
+# --- INSTRUMENTACIÓN (monitoreo/; métricas en /monitoreo/metricas/) ---
+INSTRUMENTACION_ACTIVA = config('INSTRUMENTACION_ACTIVA', default=False, cast=bool)  # Sin esto el middleware no se instala
+INSTRUMENTACION_CACHE = config('INSTRUMENTACION_CACHE', default='monitoreo')  # Caché compartida donde cada proceso publica sus métricas (ver CACHES)
+INSTRUMENTACION_PUBLICAR_CADA = config('INSTRUMENTACION_PUBLICAR_CADA', default=15, cast=int)  # Segundos entre publicaciones
+INSTRUMENTACION_TOKEN = config('INSTRUMENTACION_TOKEN', default='')  # Bearer para que Prometheus lea las métricas sin sesión
+# Perfiles cProfile de peticiones lentas: fracción de peticiones perfiladas (0 = ninguna) y umbral para guardarlas
+INSTRUMENTACION_PERFIL_MUESTREO = config('INSTRUMENTACION_PERFIL_MUESTREO', default=0.0, cast=float)
+INSTRUMENTACION_PERFIL_UMBRAL_MS = config('INSTRUMENTACION_PERFIL_UMBRAL_MS', default=2000, cast=int)  # También se registra en el log
+INSTRUMENTACION_PERFIL_DIRECTORIO = config('INSTRUMENTACION_PERFIL_DIRECTORIO', default=str(BASE_DIR / 'perfiles'))
+INSTRUMENTACION_PERFIL_MAXIMO = config('INSTRUMENTACION_PERFIL_MAXIMO', default=200, cast=int)  # Perfiles que se conservan
+
+# --- PROCESAMIENTO AUTOMÁTICO DE CARGAS MASIVAS ---
+LOTE_CONCURRENCIA = config('LOTE_CONCURRENCIA', default=8, cast=int)  # Consultas simultáneas al API por lote
+LOTE_TAMANO_BLOQUE = config('LOTE_TAMANO_BLOQUE', default=500, cast=int)  # Filas consultadas y guardadas por bloque
+LOTE_LATIDO_VENCIDO = config('LOTE_LATIDO_VENCIDO', default=900, cast=int)  # Segundos sin avance antes de retomar un lote en proceso (más que un bloque)
+LOTE_MAX_FILAS = config('LOTE_MAX_FILAS', default=500_000, cast=int)  # Filas máximas por archivo subido
+LOTE_TAMANO_MAXIMO_MB = config('LOTE_TAMANO_MAXIMO_MB', default=200, cast=int)  # Tamaño máximo del archivo subido
+# Subida directa a S3 (solo con DEBUG=False): el navegador sube el archivo por partes
+LOTE_SUBIDA_TAMANO_PARTE_MB = config('LOTE_SUBIDA_TAMANO_PARTE_MB', default=8, cast=int)  # S3 exige mínimo 5 MB
+LOTE_SUBIDA_EXPIRACION = config('LOTE_SUBIDA_EXPIRACION', default=3600, cast=int)  # Segundos de validez de cada URL prefirmada
+
+
+# --- VIGILANCIA CONTINUA (vigilancia/; cada hora con: python manage.py vigilar) ---
+# Las personas ya consultadas se vuelven a revisar: una revisión sin cambios duplica su intervalo hasta el máximo
+VIGILANCIA_INTERVALO_MINIMO_DIAS = config('VIGILANCIA_INTERVALO_MINIMO_DIAS', default=7, cast=int)
+VIGILANCIA_INTERVALO_MAXIMO_DIAS = config('VIGILANCIA_INTERVALO_MAXIMO_DIAS', default=60, cast=int)
+VIGILANCIA_CONSULTAS_POR_MINUTO = config('VIGILANCIA_CONSULTAS_POR_MINUTO', default=300, cast=int)  # Criterios al API por minuto (0 = sin límite)
+VIGILANCIA_CONCURRENCIA = config('VIGILANCIA_CONCURRENCIA', default=4, cast=int)  # Criterios consultados a la vez
+VIGILANCIA_TAMANO_BLOQUE = config('VIGILANCIA_TAMANO_BLOQUE', default=200, cast=int)  # Personas consultadas y guardadas por bloque
+VIGILANCIA_MAXIMO_POR_CICLO = config('VIGILANCIA_MAXIMO_POR_CICLO', default=15_000, cast=int)  # Las demás esperan al ciclo siguiente
+VIGILANCIA_REINTENTO_MINUTOS = config('VIGILANCIA_REINTENTO_MINUTOS', default=60, cast=int)  # Si el API no respondió
+VIGILANCIA_RESERVA_MINUTOS = config('VIGILANCIA_RESERVA_MINUTOS', default=30, cast=int)  # Si el ciclo muere, vuelven a quedar pendientes
+
+
+# --- COLA DE TAREAS (worker: python manage.py procesar_tareas) ---
+TAREAS_TIMEOUT_VISIBILIDAD = config('TAREAS_TIMEOUT_VISIBILIDAD', default=600, cast=int)  # Segundos antes de retomar una tarea abandonada
+TAREAS_BACKOFF_BASE = config('TAREAS_BACKOFF_BASE', default=30, cast=int)  # Espera del primer reintento (se duplica en cada uno)
+TAREAS_BACKOFF_MAXIMO = config('TAREAS_BACKOFF_MAXIMO', default=3600, cast=int)
+# Si está activo, cada lote subido se encola para el motor automático
+LOTE_PROCESAMIENTO_AUTOMATICO = config('LOTE_PROCESAMIENTO_AUTOMATICO', default=True, cast=bool)
+
+
+# --- CACHÉ ---
+# 'consultas_api' y 'monitoreo' usan por defecto tablas de caché en PostgreSQL para que todos
+# los workers de gunicorn compartan los resultados (crear las tablas con
+# `python manage.py createcachetable`). Al superar MAX_ENTRIES se descarta 1/CULL_FREQUENCY
+# de las entradas más antiguas. En desarrollo basta con la caché en memoria (LRU).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'consultas_api': {
+        'BACKEND': config(
+            'API_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache' if DEBUG else 'django.core.cache.backends.db.DatabaseCache',
+        ),
+        'LOCATION': config('API_CACHE_LOCATION', default='consultas_api_cache'),
+        'TIMEOUT': API_CACHE_TTL,
+        'OPTIONS': {
+            'MAX_ENTRIES': config('API_CACHE_MAX_ENTRADAS', default=100_000, cast=int),
+            'CULL_FREQUENCY': 4,
+        },
+    },
+    # Métricas de instrumentación: una entrada por proceso más el índice. Tabla propia para
+    # que el descarte por MAX_ENTRIES de la caché del API no se lleve las copias de los procesos
+    'monitoreo': {
+        'BACKEND': config(
+            'INSTRUMENTACION_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache' if DEBUG else 'django.core.cache.backends.db.DatabaseCache',
+        ),
+        'LOCATION': config('INSTRUMENTACION_CACHE_LOCATION', default='monitoreo_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
 
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
@@ -192,6 +349,11 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER # El correo saliente será 'info@vadomdata.com'
 ADMIN_EMAIL = config('ADMIN_EMAIL', default='vadomdata@gmail.com')
 
+# Los correos de lotes los envía el worker; tras este número de intentos quedan como FALLIDO
+CORREO_MAX_INTENTOS = config('CORREO_MAX_INTENTOS', default=5, cast=int)
+# Tiempo que un worker se reserva un bloque de correos; si muere, otro los retoma al vencer
+CORREO_RESERVA_SEGUNDOS = config('CORREO_RESERVA_SEGUNDOS', default=600, cast=int)
+
 MI_DOMINIO = config('MI_DOMINIO', default='http://127.0.0.1:8000')
 
 
@@ -224,6 +386,8 @@ else:
     AWS_S3_REGION_NAME = 'us-east-1'
     AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'
     AWS_DEFAULT_ACL = None
+    # Solo para apuntar a un servicio compatible con S3 (MinIO) en pruebas
+    AWS_S3_ENDPOINT_URL = config('AWS_S3_ENDPOINT_URL', default=None)
 
     S3_PREFIX = config('S3_CLIENT_PREFIX', default='default_prefix')
 
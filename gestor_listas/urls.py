@@ -17,6 +17,10 @@ urlpatterns = [
     path('cargas-masivas/', include('cargas_masivas.urls')),
 
     path('core-admin/', include('core_admin.urls')),
+
+    path('monitoreo/', include('monitoreo.urls')),
+
+    path('vigilancia/', include('vigilancia.urls')),
 ]
 
 # Añadir esto al final, solo para desarrollo
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class MonitoreoConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoreo'
+    verbose_name = 'Monitoreo de rendimiento'
@@ -0,0 +1,270 @@
+# archivo: monitoreo/instrumentacion.py
+"""
+Métricas de rendimiento por vista y por componente.
+
+Por cada petición el middleware registra la duración total, cuántas
+consultas SQL hizo y cuánto tardaron, y el tiempo que pasó en los
+componentes lentos: el API de listas ('api_listas'), WeasyPrint
+('weasyprint') y el envío de correo ('smtp'). Los componentes se miden con
+medir() o registrar_componente() desde el código que los llama; lo que se
+mide fuera de una petición (el worker de la cola) queda con vista '-'.
+
+Cada proceso acumula sus métricas en memoria y cada
+INSTRUMENTACION_PUBLICAR_CADA segundos deja una copia en la caché
+compartida (INSTRUMENTACION_CACHE). El endpoint /monitoreo/metricas/ suma
+las copias de todos los procesos y las entrega en el formato de texto de
+Prometheus.
+
+Con INSTRUMENTACION_ACTIVA=False el middleware no se instala y medir() solo
+lee la bandera: no hay costo apreciable.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Límites (segundos) del histograma de duración de las peticiones
+LIMITES_DURACION = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CLAVE_PROCESOS = 'instrumentacion:procesos'
+RETENCION = 24 * 3600  # Segundos que se conserva la copia de un proceso que ya no publica
+
+AYUDAS = {
+    'laft_peticiones_total': ('counter', 'Peticiones atendidas por vista, método y código de respuesta'),
+    'laft_peticion_duracion_segundos': ('histogram', 'Duración de las peticiones por vista'),
+    'laft_sql_consultas_total': ('counter', 'Consultas SQL hechas durante las peticiones de cada vista'),
+    'laft_sql_duracion_segundos_total': ('counter', 'Tiempo en consultas SQL durante las peticiones de cada vista'),
+    'laft_componente_llamadas_total': ('counter', 'Llamadas a componentes externos (API de listas, WeasyPrint, SMTP)'),
+    'laft_componente_duracion_segundos_total': ('counter', 'Tiempo en componentes externos por vista'),
+    'laft_perfiles_guardados_total': ('counter', 'Perfiles cProfile guardados de peticiones lentas'),
+}
+
+
+class MedicionPeticion:
+    """Lo medido durante la petición en curso (puede llegar desde varios hilos)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sql_consultas = 0
+        self.sql_segundos = 0.0
+        self.componentes = defaultdict(lambda: [0, 0.0])  # componente -> [llamadas, segundos]
+
+    def medir_sql(self, execute, sql, params, many, context):
+        """Para connection.execute_wrapper()."""
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self.lock:
+                self.sql_consultas += 1
+                self.sql_segundos += duracion
+
+    def sumar_componente(self, componente, segundos):
+        with self.lock:
+            acumulado = self.componentes[componente]
+            acumulado[0] += 1
+            acumulado[1] += segundos
+
+
+_peticion_actual = ContextVar('instrumentacion_peticion', default=None)
+
+
+class Registro:
+    """Contadores e histogramas del proceso, con etiquetas como tuplas de pares."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.contadores = defaultdict(float)  # (nombre, etiquetas) -> valor
+        self.histogramas = {}  # (nombre, etiquetas) -> [cubetas..., suma, cuenta]
+
+    def sumar(self, nombre, etiquetas, valor=1):
+        with self.lock:
+            self.contadores[(nombre, etiquetas)] += valor
+
+    def observar(self, nombre, etiquetas, valor):
+        with self.lock:
+            histograma = self.histogramas.get((nombre, etiquetas))
+            if histograma is None:
+                histograma = self.histogramas[(nombre, etiquetas)] = [0] * len(LIMITES_DURACION) + [0.0, 0]
+            for i, limite in enumerate(LIMITES_DURACION):
+                if valor <= limite:
+                    histograma[i] += 1
+            histograma[-2] += valor
+            histograma[-1] += 1
+
+    def copia(self):
+        with self.lock:
+            return {
+                'contadores': dict(self.contadores),
+                'histogramas': {clave: list(valores) for clave, valores in self.histogramas.items()},
+            }
+
+    def reiniciar(self):
+        with self.lock:
+            self.contadores.clear()
+            self.histogramas.clear()
+
+
+registro = Registro()
+_ultima_publicacion = 0.0
+
+
+def iniciar_peticion():
+    """Empieza a medir una petición; devuelve (medición, token para terminar_peticion)."""
+    medicion = MedicionPeticion()
+    return medicion, _peticion_actual.set(medicion)
+
+
+def terminar_peticion(token):
+    _peticion_actual.reset(token)
+
+
+def registrar_componente(componente, segundos):
+    """Suma `segundos` de `componente` a la petición en curso, o al proceso si no hay petición."""
+    if not settings.INSTRUMENTACION_ACTIVA:
+        return
+    medicion = _peticion_actual.get()
+    if medicion is not None:
+        medicion.sumar_componente(componente, segundos)
+        return
+    etiquetas = (('componente', componente), ('vista', '-'))
+    registro.sumar('laft_componente_llamadas_total', etiquetas)
+    registro.sumar('laft_componente_duracion_segundos_total', etiquetas, segundos)
+    publicar_si_corresponde()
+
+
+class _Cronometro:
+    __slots__ = ('componente', 'inicio')
+
+    def __init__(self, componente):
+        self.componente = componente
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+
+    def __exit__(self, *exc):
+        registrar_componente(self.componente, time.perf_counter() - self.inicio)
+
+
+_SIN_MEDICION = nullcontext()
+
+
+def medir(componente):
+    """with medir('weasyprint'): ... suma el tiempo del bloque al componente."""
+    if not settings.INSTRUMENTACION_ACTIVA:
+        return _SIN_MEDICION
+    return _Cronometro(componente)
+
+
+def registrar_peticion(vista, metodo, estado, duracion, medicion):
+    """Pasa al registro del proceso lo medido en una petición terminada."""
+    por_vista = (('vista', vista),)
+    registro.sumar('laft_peticiones_total', (('estado', str(estado)), ('metodo', metodo), ('vista', vista)))
+    registro.observar('laft_peticion_duracion_segundos', por_vista, duracion)
+    registro.sumar('laft_sql_consultas_total', por_vista, medicion.sql_consultas)
+    registro.sumar('laft_sql_duracion_segundos_total', por_vista, medicion.sql_segundos)
+    for componente, (llamadas, segundos) in medicion.componentes.items():
+        etiquetas = (('componente', componente), ('vista', vista))
+        registro.sumar('laft_componente_llamadas_total', etiquetas, llamadas)
+        registro.sumar('laft_componente_duracion_segundos_total', etiquetas, segundos)
+    publicar_si_corresponde()
+
+
+def _clave_proceso():
+    return f'instrumentacion:{socket.gethostname()}:{os.getpid()}'
+
+
+def publicar_si_corresponde():
+    if time.monotonic() - _ultima_publicacion >= settings.INSTRUMENTACION_PUBLICAR_CADA:
+        publicar()
+
+
+def publicar():
+    """Deja la copia de las métricas de este proceso en la caché compartida."""
+    global _ultima_publicacion
+    _ultima_publicacion = time.monotonic()
+    clave = _clave_proceso()
+    try:
+        cache = caches[settings.INSTRUMENTACION_CACHE]
+        cache.set(clave, registro.copia(), RETENCION)
+        procesos = cache.get(CLAVE_PROCESOS) or {}
+        if clave not in procesos:
+            # Si dos procesos escriben a la vez uno se pierde; vuelve a anotarse en su próxima publicación
+            procesos[clave] = time.time()
+            cache.set(CLAVE_PROCESOS, procesos, RETENCION)
+    except Exception as e:
+        # Las métricas nunca deben tumbar una petición
+        logger.warning("No se pudieron publicar las métricas del proceso: %s", e)
+
+
+def metricas_combinadas():
+    """Suma de las copias publicadas por todos los procesos (incluido este, ya actualizado)."""
+    publicar()
+    cache = caches[settings.INSTRUMENTACION_CACHE]
+    procesos = cache.get(CLAVE_PROCESOS) or {}
+    copias = cache.get_many(list(procesos))
+    copias[_clave_proceso()] = registro.copia()
+    if len(copias) < len(procesos):
+        # Procesos cuya copia ya venció: se sacan del índice
+        cache.set(CLAVE_PROCESOS, {clave: procesos[clave] for clave in copias if clave in procesos}, RETENCION)
+
+    contadores, histogramas = defaultdict(float), {}
+    for copia in copias.values():
+        for clave, valor in copia['contadores'].items():
+            contadores[clave] += valor
+        for clave, valores in copia['histogramas'].items():
+            if clave in histogramas:
+                histogramas[clave] = [a + b for a, b in zip(histogramas[clave], valores)]
+            else:
+                histogramas[clave] = list(valores)
+    return contadores, histogramas
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + '}'
+
+
+def _numero(valor):
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+def exportar_prometheus():
+    """Texto para Prometheus (formato de exposición 0.0.4) con las métricas de todos los procesos."""
+    contadores, histogramas = metricas_combinadas()
+    por_nombre = defaultdict(list)
+    for (nombre, etiquetas), valor in contadores.items():
+        por_nombre[nombre].append((etiquetas, valor))
+    for (nombre, etiquetas), valores in histogramas.items():
+        por_nombre[nombre].append((etiquetas, valores))
+
+    lineas = []
+    for nombre in sorted(por_nombre):
+        tipo, ayuda = AYUDAS.get(nombre, ('untyped', ''))
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} {tipo}')
+        for etiquetas, valor in sorted(por_nombre[nombre]):
+            if tipo != 'histogram':
+                lineas.append(f'{nombre}{_etiquetas(etiquetas)} {_numero(valor)}')
+                continue
+            for limite, cuenta in zip(LIMITES_DURACION, valor):
+                lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas + (("le", limite),))} {cuenta}')
+            lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas + (("le", "+Inf"),))} {valor[-1]}')
+            lineas.append(f'{nombre}_sum{_etiquetas(etiquetas)} {_numero(valor[-2])}')
+            lineas.append(f'{nombre}_count{_etiquetas(etiquetas)} {valor[-1]}')
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,88 @@
+# archivo: monitoreo/middleware.py
+import cProfile
+import logging
+import random
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+from . import instrumentacion
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentacionMiddleware:
+    """
+    Mide cada petición (ver monitoreo/instrumentacion.py). Va primero en
+    MIDDLEWARE para que la duración incluya al resto de middlewares.
+
+    Con INSTRUMENTACION_PERFIL_MUESTREO > 0, esa fracción de las peticiones
+    corre bajo cProfile; si la petición supera INSTRUMENTACION_PERFIL_UMBRAL_MS
+    el perfil se guarda en INSTRUMENTACION_PERFIL_DIRECTORIO (se abre con
+    `python -m pstats archivo.prof` o snakeviz).
+
+    En las descargas por bloques la duración es hasta entregar la respuesta,
+    no hasta terminar de enviar el archivo.
+    """
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTACION_ACTIVA:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion, token = instrumentacion.iniciar_peticion()
+        perfil = self._perfil()
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pila:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(medicion.medir_sql))
+                if perfil is not None:
+                    perfil.enable()
+                try:
+                    respuesta = self.get_response(request)
+                finally:
+                    if perfil is not None:
+                        perfil.disable()
+        finally:
+            instrumentacion.terminar_peticion(token)
+        duracion = time.perf_counter() - inicio
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia else 'sin_ruta'
+        instrumentacion.registrar_peticion(vista, request.method, respuesta.status_code, duracion, medicion)
+
+        if duracion * 1000 >= settings.INSTRUMENTACION_PERFIL_UMBRAL_MS:
+            logger.warning("Petición lenta %s %s (%s): %.0f ms, %s consultas SQL (%.0f ms)",
+                           request.method, request.path, vista, duracion * 1000,
+                           medicion.sql_consultas, medicion.sql_segundos * 1000)
+            if perfil is not None:
+                self._guardar_perfil(perfil, vista, duracion)
+        return respuesta
+
+    def _perfil(self):
+        muestreo = settings.INSTRUMENTACION_PERFIL_MUESTREO
+        if muestreo <= 0 or random.random() >= muestreo:
+            return None
+        return cProfile.Profile()
+
+    def _guardar_perfil(self, perfil, vista, duracion):
+        directorio = Path(settings.INSTRUMENTACION_PERFIL_DIRECTORIO)
+        try:
+            directorio.mkdir(parents=True, exist_ok=True)
+            nombre = f"{timezone.now():%Y%m%dT%H%M%S}_{vista.replace(':', '.')}_{duracion * 1000:.0f}ms_{random.getrandbits(24):06x}.prof"
+            perfil.dump_stats(directorio / nombre)
+            # Solo los más recientes, para no llenar el disco
+            perfiles = sorted(directorio.glob('*.prof'), key=lambda p: p.stat().st_mtime)
+            for viejo in perfiles[:-settings.INSTRUMENTACION_PERFIL_MAXIMO]:
+                viejo.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning("No se pudo guardar el perfil de %s: %s", vista, e)
+            return
+        instrumentacion.registro.sumar('laft_perfiles_guardados_total', ())
@@ -0,0 +1,147 @@
+import pstats
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from consultas.stub_api import StubAPIServer
+from empresas.models import Empresa
+from usuarios.models import Usuario
+
+from . import instrumentacion
+from .middleware import InstrumentacionMiddleware
+
+
+class InstrumentacionInactivaTests(SimpleTestCase):
+
+    def setUp(self):
+        instrumentacion.registro.reiniciar()
+
+    def test_middleware_no_se_instala(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            InstrumentacionMiddleware(lambda request: HttpResponse())
+
+    def test_medir_no_registra(self):
+        with instrumentacion.medir('smtp'):
+            pass
+        instrumentacion.registrar_componente('api_listas', 1.0)
+        self.assertEqual(instrumentacion.registro.copia(), {'contadores': {}, 'histogramas': {}})
+
+
+@override_settings(INSTRUMENTACION_ACTIVA=True, INSTRUMENTACION_PUBLICAR_CADA=0)
+class InstrumentacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.usuario = Usuario.objects.create_user('analista', password='clave-segura', empresa=cls.empresa)
+        cls.admin = Usuario.objects.create_superuser('admin', 'admin@example.com', 'clave-segura')
+
+    def setUp(self):
+        instrumentacion.registro.reiniciar()
+        caches[settings.INSTRUMENTACION_CACHE].clear()
+
+    def _contadores(self):
+        return instrumentacion.metricas_combinadas()[0]
+
+    def test_registra_vista_sql_y_duracion(self):
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('historial_busquedas'))
+        self.client.get(reverse('historial_busquedas'))
+
+        contadores, histogramas = instrumentacion.metricas_combinadas()
+        vista = (('vista', 'historial_busquedas'),)
+        self.assertEqual(contadores[('laft_peticiones_total',
+                                    (('estado', '200'), ('metodo', 'GET'), ('vista', 'historial_busquedas')))], 2)
+        self.assertGreater(contadores[('laft_sql_consultas_total', vista)], 0)
+        self.assertGreater(contadores[('laft_sql_duracion_segundos_total', vista)], 0)
+        self.assertEqual(histogramas[('laft_peticion_duracion_segundos', vista)][-1], 2)
+
+    def test_tiempo_del_api_se_atribuye_a_la_vista(self):
+        # Los endpoints se consultan en hilos del pool: el contexto de la petición debe llegar hasta ellos
+        with StubAPIServer(resultados_por_consulta=1) as stub, \
+                override_settings(API_BASE_URL=stub.base_url, API_REVISION_COMPLETA=True):
+            caches['consultas_api'].clear()
+            self.client.force_login(self.usuario)
+            self.client.post(reverse('pagina_busqueda'), {'identificacion': '123', 'nombres': 'Ana Pérez'})
+
+        etiquetas = (('componente', 'api_listas'), ('vista', 'pagina_busqueda'))
+        contadores = self._contadores()
+        self.assertEqual(contadores[('laft_componente_llamadas_total', etiquetas)], 3)
+        self.assertGreater(contadores[('laft_componente_duracion_segundos_total', etiquetas)], 0)
+
+    def test_componente_fuera_de_una_peticion(self):
+        with instrumentacion.medir('smtp'):
+            pass
+        self.assertEqual(self._contadores()[('laft_componente_llamadas_total', (('componente', 'smtp'), ('vista', '-')))], 1)
+
+    def test_suma_las_metricas_de_otros_procesos(self):
+        cache = caches[settings.INSTRUMENTACION_CACHE]
+        clave = ('laft_sql_consultas_total', (('vista', 'dashboard'),))
+        cache.set('instrumentacion:otro:1', {'contadores': {clave: 5}, 'histogramas': {}})
+        cache.set(instrumentacion.CLAVE_PROCESOS, {'instrumentacion:otro:1': 0, 'instrumentacion:vencido:2': 0})
+        instrumentacion.registro.sumar(*clave, 2)
+
+        self.assertEqual(self._contadores()[clave], 7)
+        # La copia que ya no existe se saca del índice
+        self.assertNotIn('instrumentacion:vencido:2', cache.get(instrumentacion.CLAVE_PROCESOS))
+
+    def test_las_metricas_no_comparten_la_cache_del_api(self):
+        self.assertNotEqual(settings.INSTRUMENTACION_CACHE, 'consultas_api')
+        cache = caches[settings.INSTRUMENTACION_CACHE]
+        clave = ('laft_sql_consultas_total', (('vista', 'dashboard'),))
+        cache.set('instrumentacion:otro:1', {'contadores': {clave: 5}, 'histogramas': {}})
+        cache.set(instrumentacion.CLAVE_PROCESOS, {'instrumentacion:otro:1': 0})
+
+        # Vaciar (o que se descarten entradas de) la caché del API no se lleva las métricas
+        caches['consultas_api'].clear()
+        self.assertEqual(self._contadores()[clave], 5)
+
+    def test_endpoint_solo_para_superusuarios(self):
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get(reverse('monitoreo:metricas')).status_code, 404)
+
+        self.client.force_login(self.admin)
+        respuesta = self.client.get(reverse('monitoreo:metricas'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+        texto = respuesta.content.decode()
+        self.assertIn('# TYPE laft_peticion_duracion_segundos histogram', texto)
+        self.assertIn('laft_peticion_duracion_segundos_bucket{vista="monitoreo:metricas",le="+Inf"} 1', texto)
+
+    def test_endpoint_con_token(self):
+        url = reverse('monitoreo:metricas')
+        self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer secreto'}).status_code, 404)
+        with override_settings(INSTRUMENTACION_TOKEN='secreto'):
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer otro'}).status_code, 404)
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer secreto'}).status_code, 200)
+
+    def test_perfil_de_peticion_lenta(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        middleware = InstrumentacionMiddleware(lambda request: HttpResponse())
+        with override_settings(INSTRUMENTACION_PERFIL_MUESTREO=1.0, INSTRUMENTACION_PERFIL_UMBRAL_MS=0,
+                               INSTRUMENTACION_PERFIL_DIRECTORIO=directorio, INSTRUMENTACION_PERFIL_MAXIMO=2):
+            with self.assertLogs('monitoreo.middleware', 'WARNING'):
+                for _ in range(3):
+                    middleware(RequestFactory().get('/no-existe/'))
+
+        perfiles = list(Path(directorio).glob('*.prof'))
+        self.assertEqual(len(perfiles), 2)
+        pstats.Stats(str(perfiles[0]))
+        self.assertEqual(self._contadores()[('laft_perfiles_guardados_total', ())], 3)
+
+    def test_sin_muestreo_no_guarda_perfiles(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        middleware = InstrumentacionMiddleware(lambda request: HttpResponse())
+        with override_settings(INSTRUMENTACION_PERFIL_UMBRAL_MS=0, INSTRUMENTACION_PERFIL_DIRECTORIO=directorio):
+            with self.assertLogs('monitoreo.middleware', 'WARNING'):
+                middleware(RequestFactory().get('/no-existe/'))
+        self.assertEqual(list(Path(directorio).iterdir()), [])
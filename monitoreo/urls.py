@@ -0,0 +1,10 @@
+# archivo: monitoreo/urls.py
+from django.urls import path
+
+from . import views
+
+app_name = 'monitoreo'
+
+urlpatterns = [
+    path('metricas/', views.metricas, name='metricas'),
+]
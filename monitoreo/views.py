@@ -0,0 +1,24 @@
+# archivo: monitoreo/views.py
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
+
+from .instrumentacion import exportar_prometheus
+
+
+def _autorizado(request):
+    if request.user.is_authenticated and request.user.is_superuser:
+        return True
+    # Prometheus no tiene sesión: se identifica con "Authorization: Bearer <INSTRUMENTACION_TOKEN>"
+    token = settings.INSTRUMENTACION_TOKEN
+    return bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+@never_cache
+def metricas(request):
+    """Métricas de todos los procesos en el formato de texto de Prometheus."""
+    if not _autorizado(request):
+        # Igual que el panel de administración: no revelar que la ruta existe
+        raise Http404
+    return HttpResponse(exportar_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
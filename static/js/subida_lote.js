@@ -0,0 +1,131 @@
+// archivo: static/js/subida_lote.js
+// Subida del archivo de un lote directo a S3, por partes y con reanudación.
+// El servidor firma cada parte (cargas_masivas/subida_directa.py); el archivo
+// no pasa por Django. Si la conexión se cae, al volver a elegir el mismo
+// archivo solo se suben las partes que S3 aún no tiene.
+(function () {
+    const form = document.getElementById('form-lote');
+    if (!form || !form.dataset.subidaDirecta) {
+        return;
+    }
+    const urlBase = form.dataset.subidaDirecta;
+    const input = form.querySelector('input[type="file"]');
+    const boton = form.querySelector('button[type="submit"]');
+    const progreso = document.getElementById('progreso-subida');
+    const barra = progreso.querySelector('.progress-bar');
+    const estado = document.getElementById('estado-subida');
+    const csrf = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+    const PARTES_SIMULTANEAS = 4;
+    const REINTENTOS = 5;
+
+    function claveLocal(archivo) {
+        return 'subida-lote:' + [archivo.name, archivo.size, archivo.lastModified].join(':');
+    }
+
+    async function pedir(url, datos) {
+        const opciones = datos === undefined
+            ? {credentials: 'same-origin'}
+            : {
+                method: 'POST', credentials: 'same-origin', body: JSON.stringify(datos),
+                headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrf},
+            };
+        const respuesta = await fetch(url, opciones);
+        const cuerpo = await respuesta.json().catch(() => ({}));
+        if (!respuesta.ok) {
+            const error = new Error(cuerpo.error || 'No se pudo subir el archivo.');
+            error.status = respuesta.status;
+            throw error;
+        }
+        return cuerpo;
+    }
+
+    async function obtenerSubida(archivo) {
+        // Retomar la subida de este mismo archivo si quedó a medias
+        const guardada = localStorage.getItem(claveLocal(archivo));
+        if (guardada) {
+            try {
+                return await pedir(urlBase + guardada + '/');
+            } catch (error) {
+                localStorage.removeItem(claveLocal(archivo));
+            }
+        }
+        const subida = await pedir(urlBase, {nombre: archivo.name, tamano: archivo.size});
+        subida.partes = [];
+        localStorage.setItem(claveLocal(archivo), subida.id);
+        return subida;
+    }
+
+    function esperar(ms) {
+        return new Promise((resolver) => setTimeout(resolver, ms));
+    }
+
+    async function subirParte(archivo, subida, numero) {
+        const inicio = (numero - 1) * subida.tamano_parte;
+        const trozo = archivo.slice(inicio, inicio + subida.tamano_parte);
+        for (let intento = 1; ; intento++) {
+            try {
+                // Se firma justo antes de subir: las URLs vencen
+                const {urls} = await pedir(urlBase + subida.id + '/firmar/', {partes: [numero]});
+                const respuesta = await fetch(urls[numero], {method: 'PUT', body: trozo});
+                if (!respuesta.ok) {
+                    throw new Error('S3 respondió ' + respuesta.status);
+                }
+                return trozo.size;
+            } catch (error) {
+                if (intento >= REINTENTOS) {
+                    throw error;
+                }
+                await esperar(1000 * 2 ** intento);
+            }
+        }
+    }
+
+    async function subir(archivo) {
+        const subida = await obtenerSubida(archivo);
+        const pendientes = [];
+        for (let numero = 1; numero <= subida.total_partes; numero++) {
+            if (!subida.partes.includes(numero)) {
+                pendientes.push(numero);
+            }
+        }
+        let enviados = (subida.total_partes - pendientes.length) * subida.tamano_parte;
+        const mostrar = () => {
+            const porcentaje = Math.min(100, Math.round(100 * enviados / archivo.size));
+            barra.style.width = porcentaje + '%';
+            estado.textContent = 'Subiendo archivo... ' + porcentaje + '%';
+        };
+        mostrar();
+
+        async function trabajador() {
+            while (pendientes.length) {
+                enviados += await subirParte(archivo, subida, pendientes.shift());
+                mostrar();
+            }
+        }
+        await Promise.all(Array.from({length: PARTES_SIMULTANEAS}, trabajador));
+
+        estado.textContent = 'Verificando el archivo...';
+        const resultado = await pedir(urlBase + subida.id + '/completar/', {});
+        localStorage.removeItem(claveLocal(archivo));
+        return resultado;
+    }
+
+    form.addEventListener('submit', async (evento) => {
+        const archivo = input.files[0];
+        if (!archivo) {
+            return;
+        }
+        evento.preventDefault();
+        boton.disabled = true;
+        barra.classList.remove('bg-danger');
+        progreso.classList.remove('d-none');
+        try {
+            const resultado = await subir(archivo);
+            window.location.href = resultado.siguiente;
+        } catch (error) {
+            barra.classList.add('bg-danger');
+            estado.textContent = error.message + ' Vuelva a elegir el archivo para reanudar la subida.';
+            boton.disabled = false;
+        }
+    });
+})();
@@ -0,0 +1,34 @@
+# archivo: vigilancia/admin.py
+from django.contrib import admin
+
+from .models import CambioVigilancia, CicloVigilancia, PersonaVigilada
+
+
+@admin.register(PersonaVigilada)
+class PersonaVigiladaAdmin(admin.ModelAdmin):
+    list_display = ('clave', 'empresa', 'origen', 'genero_alerta', 'intervalo_dias', 'ultima_revision',
+                    'proxima_revision', 'activa')
+    list_filter = ('activa', 'origen', 'genero_alerta')
+    search_fields = ('identificacion', 'nombres')
+    raw_id_fields = ('empresa',)
+    readonly_fields = ('clave', 'origen', 'origen_id', 'huella_resultados', 'agregada_en', 'ultima_revision')
+    # Con millones de filas el conteo del paginador sería la consulta más cara
+    show_full_result_count = False
+
+
+@admin.register(CambioVigilancia)
+class CambioVigilanciaAdmin(admin.ModelAdmin):
+    list_display = ('persona', 'empresa', 'tipo', 'alerta', 'inicial', 'fecha', 'atendida_en')
+    list_filter = ('alerta', 'tipo', 'inicial')
+    raw_id_fields = ('persona', 'empresa', 'entidad', 'atendida_por')
+    show_full_result_count = False
+
+
+@admin.register(CicloVigilancia)
+class CicloVigilanciaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'iniciado_en', 'terminado_en', 'agregadas', 'adelantadas', 'revisadas',
+                    'con_cambios', 'errores', 'alertas')
+
+    def has_add_permission(self, request):
+        # Los ciclos solo los crea `python manage.py vigilar`
+        return False
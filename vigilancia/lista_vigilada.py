@@ -0,0 +1,182 @@
+# archivo: vigilancia/lista_vigilada.py
+"""
+Lista vigilada de cada empresa (PersonaVigilada).
+
+Cada ciclo lee solo lo nuevo desde el anterior: las búsquedas con id mayor
+que la última leída y los lotes procesados después del último. Los criterios
+se normalizan igual que en las cargas masivas (validar_fila), así que la
+misma persona consultada cien veces, por búsqueda o por lote, es una sola
+fila por empresa; las repetidas chocan con la restricción única y se
+descartan en el INSERT.
+
+La línea base de cada persona es lo que vio la empresa al consultarla: los
+registros de la búsqueda (sus EntidadLista), que se guardan como cambios
+iniciales, o el conjunto vacío si un lote no encontró nada. Los lotes solo
+guardan un resumen de sus hallazgos, sin las entidades: la primera revisión
+fija esa línea base y solo avisa si la fila original no había generado
+alerta.
+
+Las búsquedas con identificación y nombre tampoco sirven de línea base:
+antes de la revisión completa solo consultaban PepsIDNombre, y la revisión
+consulta además PepsExactaID y PepsNombre, así que cada homónimo parecería
+nuevo. Lo mismo con las consultas incompletas. Sus registros se guardan
+como cambios iniciales, pero la primera revisión fija el conjunto sin avisar.
+
+Para comparar revisiones sin reconstruir el conjunto, cada persona guarda
+la huella del conjunto: SHA-1 de las huellas de sus entidades, ordenadas.
+"""
+
+import hashlib
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+
+from cargas_masivas.ingesta import validar_fila
+from cargas_masivas.models import LoteConsultaMasiva
+from consultas.models import Busqueda, Resultado
+from espejo_listas.coincidencias import clave_nombre
+
+from .models import CambioVigilancia, PersonaVigilada
+
+BLOQUE = 5000  # Búsquedas o filas de lote leídas por consulta
+# Las búsquedas de los últimos segundos pueden tener un id menor que otra ya
+# confirmada y seguir en su transacción: se dejan para el ciclo siguiente
+MARGEN = timedelta(seconds=60)
+
+# pagina_busqueda guarda 'ID: x y Nombre: y', 'ID: x' o 'Nombre: y'
+_TERMINO = re.compile(r'ID: (?P<identificacion>\S*)(?: y Nombre: (?P<con_id>.*))?|Nombre: (?P<nombres>.*)', re.DOTALL)
+
+
+def huella_conjunto(huellas):
+    return hashlib.sha1('\n'.join(sorted(set(huellas))).encode('ascii')).hexdigest()
+
+
+HUELLA_VACIA = huella_conjunto([])
+
+
+def criterio_de_termino(termino):
+    """'ID: 123 y Nombre: Ana' -> ('123', 'Ana'); None si el término no tiene ese formato."""
+    coincidencia = _TERMINO.fullmatch(termino or '')
+    if not coincidencia:
+        return None
+    return coincidencia['identificacion'] or '', coincidencia['con_id'] or coincidencia['nombres'] or ''
+
+
+def _persona(empresa_id, identificacion, nombres, origen, origen_id, fecha):
+    identificacion, nombres, clave, error = validar_fila(identificacion, nombres)
+    if error:
+        return None
+    intervalo = settings.VIGILANCIA_INTERVALO_MINIMO_DIAS
+    return PersonaVigilada(
+        empresa_id=empresa_id, clave=clave, identificacion=identificacion, nombres=nombres,
+        nombre_plegado=clave_nombre(nombres)[:150], origen=origen, origen_id=origen_id,
+        # Las consultas viejas quedan pendientes de una vez y salen primero
+        intervalo_dias=intervalo, proxima_revision=fecha + timedelta(days=intervalo),
+    )
+
+
+def _agregar(personas):
+    """
+    Inserta las personas que aún no se vigilan. Devuelve las insertadas, con
+    su pk, para que quien llama guarde su línea base.
+    """
+    if not personas:
+        return []
+    por_empresa = defaultdict(list)
+    for persona in personas:
+        por_empresa[persona.empresa_id].append(persona.clave)
+    filtro = Q()
+    for empresa_id, claves in por_empresa.items():
+        filtro |= Q(empresa_id=empresa_id, clave__in=claves)
+    existentes = set(PersonaVigilada.objects.filter(filtro).values_list('empresa_id', 'clave'))
+    nuevas = [p for p in personas if (p.empresa_id, p.clave) not in existentes]
+    if not nuevas:
+        return []
+
+    # Si otro ciclo las insertó a la vez, la restricción única las descarta; son
+    # nuestras solo las que quedaron con el mismo origen
+    PersonaVigilada.objects.bulk_create(nuevas, ignore_conflicts=True)
+    ids = {
+        (empresa_id, clave, origen, origen_id): pk
+        for pk, empresa_id, clave, origen, origen_id in PersonaVigilada.objects.filter(filtro).values_list(
+            'pk', 'empresa_id', 'clave', 'origen', 'origen_id')
+    }
+    insertadas = []
+    for persona in nuevas:
+        persona.pk = ids.get((persona.empresa_id, persona.clave, persona.origen, persona.origen_id))
+        if persona.pk is not None:
+            persona._state.adding = False
+            insertadas.append(persona)
+    return insertadas
+
+
+def sincronizar_busquedas(ciclo, hasta):
+    """Agrega a la lista los criterios de las búsquedas nuevas. Devuelve cuántas personas agregó."""
+    busquedas = Busqueda.objects.filter(empresa__isnull=False, fecha_busqueda__lt=hasta)
+    agregadas = 0
+    while bloque := list(busquedas.filter(pk__gt=ciclo.ultima_busqueda_id).order_by('pk').values_list(
+            'pk', 'empresa_id', 'termino_buscado', 'genero_alerta', 'consulta_incompleta', 'fecha_busqueda')[:BLOQUE]):
+        personas, sin_linea_base = {}, set()
+        for pk, empresa_id, termino, genero_alerta, incompleta, fecha in bloque:
+            criterio = criterio_de_termino(termino)
+            persona = criterio and _persona(empresa_id, *criterio, PersonaVigilada.BUSQUEDA, pk, fecha)
+            if persona is not None and (empresa_id, persona.clave) not in personas:
+                # La primera búsqueda de la persona es su línea base
+                persona.genero_alerta = genero_alerta
+                personas[(empresa_id, persona.clave)] = persona
+                if incompleta or (persona.identificacion and persona.nombres):
+                    sin_linea_base.add(pk)
+
+        entidades = defaultdict(dict)
+        origenes = [persona.origen_id for persona in personas.values()]
+        for busqueda_id, entidad_id, huella in Resultado.objects.filter(busqueda_id__in=origenes).values_list(
+                'busqueda_id', 'entidad_id', 'entidad__huella'):
+            entidades[busqueda_id][entidad_id] = huella
+        for persona in personas.values():
+            if persona.origen_id not in sin_linea_base:
+                persona.huella_resultados = huella_conjunto(entidades[persona.origen_id].values())
+
+        insertadas = _agregar(list(personas.values()))
+        CambioVigilancia.objects.bulk_create([
+            CambioVigilancia(persona=persona, empresa_id=persona.empresa_id, entidad_id=entidad_id,
+                             tipo=CambioVigilancia.ALTA, inicial=True)
+            for persona in insertadas for entidad_id in entidades[persona.origen_id]
+        ], batch_size=1000)
+
+        agregadas += len(insertadas)
+        ciclo.ultima_busqueda_id = bloque[-1][0]
+        ciclo.agregadas += len(insertadas)
+        ciclo.save(update_fields=['ultima_busqueda_id', 'agregadas'])
+    return agregadas
+
+
+def sincronizar_lotes(ciclo, hasta):
+    """Agrega a la lista las filas de los lotes procesados desde el ciclo anterior."""
+    lotes = LoteConsultaMasiva.objects.filter(estado='PROCESADO', fecha_procesado__lt=hasta)
+    if ciclo.lotes_hasta is not None:
+        lotes = lotes.filter(fecha_procesado__gt=ciclo.lotes_hasta)
+    agregadas = 0
+    for lote in lotes.order_by('fecha_procesado', 'pk').only('pk', 'empresa_id', 'fecha_procesado'):
+        ultimo_id = 0
+        while bloque := list(lote.filas.filter(pk__gt=ultimo_id).order_by('pk').only(
+                'pk', 'identificacion', 'nombres', 'error_consulta', 'encontro_resultados', 'genero_alerta')[:BLOQUE]):
+            personas = []
+            for fila in bloque:
+                persona = _persona(lote.empresa_id, fila.identificacion, fila.nombres,
+                                   PersonaVigilada.LOTE, lote.pk, lote.fecha_procesado)
+                if persona is None:
+                    continue
+                if not (fila.error_consulta or fila.consulta_incompleta or fila.encontro_resultados):
+                    persona.huella_resultados = HUELLA_VACIA
+                persona.genero_alerta = fila.genero_alerta
+                personas.append(persona)
+            insertadas = len(_agregar(personas))
+            agregadas += insertadas
+            ciclo.agregadas += insertadas
+            ultimo_id = bloque[-1].pk
+        ciclo.lotes_hasta = lote.fecha_procesado
+        ciclo.save(update_fields=['lotes_hasta', 'agregadas'])
+    return agregadas
@@ -0,0 +1,42 @@
+# archivo: vigilancia/management/commands/vigilar.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vigilancia.models import PersonaVigilada
+from vigilancia.revision import ejecutar_ciclo
+
+
+class Command(BaseCommand):
+    help = (
+        "Un ciclo de vigilancia continua: agrega a la lista vigilada las "
+        "búsquedas y lotes nuevos, adelanta a quienes aparecen en un snapshot "
+        "nuevo del espejo y vuelve a consultar las personas cuya revisión ya "
+        "toca. Pensado para correr desde cron (por ejemplo cada hora); la "
+        "primera vez recorre todo el historial."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=None,
+                            help='Personas revisadas como máximo (por defecto VIGILANCIA_MAXIMO_POR_CICLO)')
+        parser.add_argument('--solo-sincronizar', action='store_true',
+                            help='Solo actualiza la lista vigilada, sin consultar el API')
+
+    def handle(self, *args, **options):
+        if options['limite'] is not None and options['limite'] < 0:
+            raise CommandError("--limite no puede ser negativo")
+
+        inicio = time.perf_counter()
+        ciclo = ejecutar_ciclo(limite=options['limite'], revisar=not options['solo_sincronizar'])
+        self.stdout.write(
+            f"{ciclo.agregadas:,} personas agregadas, {ciclo.adelantadas:,} adelantadas por el espejo, "
+            f"{ciclo.revisadas:,} revisadas ({ciclo.con_cambios:,} con cambios, {ciclo.errores:,} sin respuesta del API)"
+        )
+        pendientes = PersonaVigilada.objects.filter(activa=True, proxima_revision__lte=ciclo.terminado_en).count()
+        mensaje = f"Ciclo {ciclo.pk} en {time.perf_counter() - inicio:.1f}s: {ciclo.alertas:,} alertas nuevas"
+        if ciclo.alertas:
+            self.stdout.write(self.style.WARNING(mensaje))
+        else:
+            self.stdout.write(self.style.SUCCESS(mensaje))
+        if pendientes:
+            self.stdout.write(f"Quedan {pendientes:,} personas pendientes para el ciclo siguiente.")
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('consultas', '0009_entidad_campos_tipados'),
+        ('empresas', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CicloVigilancia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iniciado_en', models.DateTimeField(auto_now_add=True)),
+                ('terminado_en', models.DateTimeField(blank=True, null=True)),
+                ('ultima_busqueda_id', models.PositiveBigIntegerField(default=0)),
+                ('lotes_hasta', models.DateTimeField(blank=True, null=True)),
+                ('snapshot_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('agregadas', models.PositiveIntegerField(default=0)),
+                ('adelantadas', models.PositiveIntegerField(default=0)),
+                ('revisadas', models.PositiveIntegerField(default=0)),
+                ('con_cambios', models.PositiveIntegerField(default=0)),
+                ('errores', models.PositiveIntegerField(default=0)),
+                ('alertas', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Ciclo de vigilancia',
+                'verbose_name_plural': 'Ciclos de vigilancia',
+            },
+        ),
+        migrations.CreateModel(
+            name='PersonaVigilada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=160)),
+                ('identificacion', models.CharField(blank=True, default='', max_length=50)),
+                ('nombres', models.CharField(blank=True, default='', max_length=150)),
+                ('nombre_plegado', models.CharField(blank=True, default='', max_length=150)),
+                ('origen', models.CharField(choices=[('BUSQUEDA', 'Búsqueda individual'), ('LOTE', 'Carga masiva')], max_length=10)),
+                ('origen_id', models.PositiveBigIntegerField()),
+                ('agregada_en', models.DateTimeField(auto_now_add=True)),
+                ('activa', models.BooleanField(default=True)),
+                ('huella_resultados', models.CharField(blank=True, default='', max_length=40)),
+                ('genero_alerta', models.BooleanField(default=False)),
+                ('intervalo_dias', models.PositiveSmallIntegerField(default=1)),
+                ('ultima_revision', models.DateTimeField(blank=True, null=True)),
+                ('proxima_revision', models.DateTimeField()),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personas_vigiladas', to='empresas.empresa')),
+            ],
+            options={
+                'verbose_name': 'Persona vigilada',
+                'verbose_name_plural': 'Personas vigiladas',
+            },
+        ),
+        migrations.CreateModel(
+            name='CambioVigilancia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('ALTA', 'Aparece en la lista'), ('BAJA', 'Ya no aparece')], max_length=4)),
+                ('inicial', models.BooleanField(default=False)),
+                ('alerta', models.BooleanField(default=False)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('atendida_en', models.DateTimeField(blank=True, null=True)),
+                ('atendida_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cambios_vigilancia', to='empresas.empresa')),
+                ('entidad', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='cambios_vigilancia', to='consultas.entidadlista')),
+                ('persona', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cambios', to='vigilancia.personavigilada')),
+            ],
+            options={
+                'verbose_name': 'Cambio de vigilancia',
+                'verbose_name_plural': 'Cambios de vigilancia',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='personavigilada',
+            index=models.Index(condition=models.Q(('activa', True)), fields=['proxima_revision'], name='vigilada_pendiente_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personavigilada',
+            index=models.Index(condition=models.Q(('identificacion', ''), _negated=True), fields=['identificacion'], name='vigilada_identificacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personavigilada',
+            index=models.Index(condition=models.Q(('identificacion', '')), fields=['nombre_plegado'], name='vigilada_nombre_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='personavigilada',
+            constraint=models.UniqueConstraint(fields=('empresa', 'clave'), name='persona_vigilada_unica'),
+        ),
+        migrations.AddIndex(
+            model_name='cambiovigilancia',
+            index=models.Index(condition=models.Q(('alerta', True)), fields=['empresa', '-fecha', '-id'], name='cambio_alerta_empresa_idx'),
+        ),
+    ]
@@ -0,0 +1,122 @@
+# archivo: vigilancia/models.py
+from django.db import models
+
+from consultas.models import EntidadLista
+from empresas.models import Empresa
+from usuarios.models import Usuario
+
+
+class PersonaVigilada(models.Model):
+    """
+    Una identificación (o, si no la hay, un nombre) que una empresa ya
+    consultó y que se vuelve a revisar periódicamente contra las listas. La
+    clave es la de FilaLote: una sola fila por criterio y empresa aunque se
+    haya consultado muchas veces.
+    """
+    BUSQUEDA = 'BUSQUEDA'
+    LOTE = 'LOTE'
+    ORIGEN_CHOICES = (
+        (BUSQUEDA, 'Búsqueda individual'),
+        (LOTE, 'Carga masiva'),
+    )
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='personas_vigiladas')
+    # 'I:<identificación>' o, si no hay, 'N:<nombres>'
+    clave = models.CharField(max_length=160)
+    identificacion = models.CharField(max_length=50, blank=True, default='')
+    nombres = models.CharField(max_length=150, blank=True, default='')
+    nombre_plegado = models.CharField(max_length=150, blank=True, default='')  # clave_nombre(nombres), como en el espejo
+    origen = models.CharField(max_length=10, choices=ORIGEN_CHOICES)
+    origen_id = models.PositiveBigIntegerField()  # id de la Busqueda o del lote
+    agregada_en = models.DateTimeField(auto_now_add=True)
+    activa = models.BooleanField(default=True)
+
+    # Huella del conjunto de registros de la última revisión (vigilancia/lista_vigilada.py).
+    # Vacía si aún no se conoce: los lotes solo guardan un resumen de sus hallazgos
+    huella_resultados = models.CharField(max_length=40, blank=True, default='')
+    genero_alerta = models.BooleanField(default=False)  # Ya tuvo algún hallazgo restrictivo
+    intervalo_dias = models.PositiveSmallIntegerField(default=1)
+    ultima_revision = models.DateTimeField(null=True, blank=True)
+    proxima_revision = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Persona vigilada'
+        verbose_name_plural = 'Personas vigiladas'
+        constraints = [
+            models.UniqueConstraint(fields=['empresa', 'clave'], name='persona_vigilada_unica'),
+        ]
+        indexes = [
+            # Cada ciclo toma las que ya tocan, de la más atrasada a la más reciente
+            models.Index(fields=['proxima_revision'], name='vigilada_pendiente_idx', condition=models.Q(activa=True)),
+            # Un snapshot nuevo del espejo adelanta a quienes aparecen en él
+            models.Index(fields=['identificacion'], name='vigilada_identificacion_idx',
+                         condition=~models.Q(identificacion='')),
+            models.Index(fields=['nombre_plegado'], name='vigilada_nombre_idx', condition=models.Q(identificacion='')),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} ({self.empresa_id})"
+
+
+class CambioVigilancia(models.Model):
+    """
+    Una diferencia entre dos revisiones de una persona vigilada: un registro
+    que apareció (ALTA) o que ya no aparece (BAJA). No se guarda la respuesta
+    de cada revisión; el conjunto vigente se reconstruye con los cambios.
+    """
+    ALTA = 'ALTA'
+    BAJA = 'BAJA'
+    TIPO_CHOICES = (
+        (ALTA, 'Aparece en la lista'),
+        (BAJA, 'Ya no aparece'),
+    )
+
+    persona = models.ForeignKey(PersonaVigilada, on_delete=models.CASCADE, related_name='cambios')
+    # Copia de persona.empresa: el listado de alertas filtra aquí sin pasar por las personas
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='cambios_vigilancia')
+    entidad = models.ForeignKey(EntidadLista, on_delete=models.PROTECT, related_name='cambios_vigilancia')
+    tipo = models.CharField(max_length=4, choices=TIPO_CHOICES)
+    inicial = models.BooleanField(default=False)  # Parte de la línea base, no un cambio
+    alerta = models.BooleanField(default=False)  # Hallazgo restrictivo nuevo
+    fecha = models.DateTimeField(auto_now_add=True)
+    atendida_en = models.DateTimeField(null=True, blank=True)
+    atendida_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        verbose_name = 'Cambio de vigilancia'
+        verbose_name_plural = 'Cambios de vigilancia'
+        indexes = [
+            # Alertas de la empresa, de la más reciente a la más antigua (paginación por cursor)
+            models.Index(fields=['empresa', '-fecha', '-id'], name='cambio_alerta_empresa_idx',
+                         condition=models.Q(alerta=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} de la entidad {self.entidad_id} para {self.persona_id}"
+
+
+class CicloVigilancia(models.Model):
+    """
+    Una corrida de `manage.py vigilar`. Guarda hasta dónde leyó cada fuente y
+    qué snapshot del espejo comparó: el ciclo siguiente sigue desde ahí.
+    """
+    iniciado_en = models.DateTimeField(auto_now_add=True)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+
+    ultima_busqueda_id = models.PositiveBigIntegerField(default=0)
+    lotes_hasta = models.DateTimeField(null=True, blank=True)  # fecha_procesado del último lote leído
+    snapshot_id = models.PositiveBigIntegerField(null=True, blank=True)
+
+    agregadas = models.PositiveIntegerField(default=0)
+    adelantadas = models.PositiveIntegerField(default=0)  # Por aparecer en un snapshot nuevo
+    revisadas = models.PositiveIntegerField(default=0)
+    con_cambios = models.PositiveIntegerField(default=0)
+    errores = models.PositiveIntegerField(default=0)  # El API no respondió; se reintentan
+    alertas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Ciclo de vigilancia'
+        verbose_name_plural = 'Ciclos de vigilancia'
+
+    def __str__(self):
+        return f"Ciclo {self.pk} ({self.iniciado_en:%Y-%m-%d %H:%M})"
@@ -0,0 +1,279 @@
+# archivo: vigilancia/revision.py
+"""
+Revisión periódica de la lista vigilada contra el API de listas.
+
+Revisar millones de personas en cada ciclo no es viable ni necesario: la
+gran mayoría nunca cambia. Cada persona tiene su propia próxima revisión y
+un ciclo solo consulta las que ya tocan:
+
+- Una revisión sin cambios duplica el intervalo de la persona, hasta
+  VIGILANCIA_INTERVALO_MAXIMO_DIAS; un cambio lo devuelve al mínimo.
+- Cuando el espejo local activa un snapshot nuevo, los registros que no
+  estaban en el anterior adelantan la revisión de las personas con esa
+  identificación (o ese nombre, si no tienen identificación). Así un
+  ingreso a la lista se detecta en el ciclo siguiente aunque la persona
+  estuviera programada para dentro de dos meses.
+
+Las pendientes se consultan por bloques con consultar_lote, a lo sumo
+VIGILANCIA_CONCURRENCIA a la vez y VIGILANCIA_CONSULTAS_POR_MINUTO por
+minuto para no competir con las búsquedas de los usuarios. Si varias
+empresas vigilan el mismo criterio, se consulta una sola vez.
+
+Una respuesta incompleta (algún endpoint no respondió) se trata como un
+error del API: faltarían registros que sí están, y la revisión siguiente
+los daría por nuevos.
+
+De cada revisión se guarda solo la diferencia con la anterior
+(CambioVigilancia): si la huella del conjunto no cambió, no se escribe
+nada más que la fecha de la próxima revisión. Un registro restrictivo que
+aparece y no estaba antes para la misma lista es una alerta; un registro
+que solo cambió de datos (la huella de la entidad es otra) no lo es.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from consultas.consulta_paralela import consultar_lote, es_incompleta
+from consultas.entidades import entidad_desde_registro, guardar_entidades
+from consultas.services import normalizar_identificacion, normalizar_nombre
+from espejo_listas.models import EntradaLista, SnapshotListas
+
+from .lista_vigilada import MARGEN, huella_conjunto, sincronizar_busquedas, sincronizar_lotes
+from .models import CambioVigilancia, CicloVigilancia, PersonaVigilada
+
+logger = logging.getLogger(__name__)
+
+LOTE_ACTUALIZACION = 1000  # Identificaciones o nombres por UPDATE ... IN (...)
+BLOQUE_ENTRADAS = 10_000  # Registros del snapshot leídos antes de actualizar
+
+
+def clave_registro(entidad):
+    # La misma persona en la misma lista aunque el API haya cambiado otros datos del registro
+    return (
+        normalizar_identificacion(entidad.identificacion or ''),
+        normalizar_nombre(entidad.nombre_completo or ''),
+        entidad.tipo_lista or '',
+    )
+
+
+# --- Snapshot nuevo del espejo ---
+
+def _adelantar(personas, campo, valores, ahora):
+    adelantadas = 0
+    for i in range(0, len(valores), LOTE_ACTUALIZACION):
+        adelantadas += personas.filter(**{f'{campo}__in': valores[i:i + LOTE_ACTUALIZACION]}).update(
+            proxima_revision=ahora)
+    return adelantadas
+
+
+def adelantar_por_snapshot(ciclo):
+    """
+    Si el espejo activó un snapshot desde el ciclo anterior, adelanta la
+    revisión de quienes aparecen en registros nuevos o modificados.
+    Devuelve cuántas personas adelantó.
+    """
+    activo = SnapshotListas.objects.filter(estado='ACTIVO').order_by('-activado_en').first()
+    anterior_id = ciclo.snapshot_id
+    if activo is None or activo.pk == anterior_id:
+        return 0
+    ciclo.snapshot_id = activo.pk
+    ciclo.save(update_fields=['snapshot_id'])
+    if anterior_id is None or not SnapshotListas.objects.filter(pk=anterior_id).exists():
+        # Sin el snapshot anterior no hay con qué comparar; quedan las revisiones programadas
+        logger.info("Snapshot %s sin anterior para comparar; no se adelantan revisiones", activo.pk)
+        return 0
+
+    nuevas = EntradaLista.objects.filter(snapshot=activo).exclude(Exists(EntradaLista.objects.filter(
+        snapshot_id=anterior_id, identificacion=OuterRef('identificacion'),
+        nombre=OuterRef('nombre'), datos=OuterRef('datos'),
+    )))
+    ahora = timezone.now()
+    pendientes = PersonaVigilada.objects.filter(activa=True, proxima_revision__gt=ahora)
+    identificaciones, nombres, adelantadas = set(), set(), 0
+    for identificacion, nombre in nuevas.values_list('identificacion', 'nombre').iterator(chunk_size=BLOQUE_ENTRADAS):
+        if identificacion:
+            identificaciones.add(identificacion)
+        elif nombre:
+            nombres.add(nombre)
+        if len(identificaciones) + len(nombres) >= BLOQUE_ENTRADAS:
+            adelantadas += _adelantar_bloque(pendientes, identificaciones, nombres, ahora)
+            identificaciones, nombres = set(), set()
+    adelantadas += _adelantar_bloque(pendientes, identificaciones, nombres, ahora)
+
+    ciclo.adelantadas += adelantadas
+    ciclo.save(update_fields=['adelantadas'])
+    return adelantadas
+
+
+def _adelantar_bloque(pendientes, identificaciones, nombres, ahora):
+    return (_adelantar(pendientes, 'identificacion', sorted(identificaciones), ahora)
+            + _adelantar(pendientes.filter(identificacion=''), 'nombre_plegado', sorted(nombres), ahora))
+
+
+# --- Revisión de las pendientes ---
+
+def _reservar(cantidad):
+    """
+    Toma las `cantidad` personas más atrasadas y corre su próxima revisión
+    VIGILANCIA_RESERVA_MINUTOS: otro ciclo simultáneo no las toma y, si este
+    muere a mitad de bloque, vuelven a quedar pendientes solas.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(PersonaVigilada.objects.filter(activa=True, proxima_revision__lte=ahora)
+                   .select_for_update(skip_locked=True).order_by('proxima_revision')
+                   .values_list('pk', flat=True)[:cantidad])
+        PersonaVigilada.objects.filter(pk__in=ids).update(
+            proxima_revision=ahora + timedelta(minutes=settings.VIGILANCIA_RESERVA_MINUTOS))
+    return list(PersonaVigilada.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def conjuntos_vigentes(personas):
+    """persona_id -> {entidad_id: clave_registro} con los registros que tiene hoy, según sus cambios."""
+    conjuntos = {persona.pk: {} for persona in personas}
+    cambios = (CambioVigilancia.objects.filter(persona_id__in=list(conjuntos)).order_by('pk')
+               .select_related('entidad').only('persona_id', 'tipo', 'entidad__identificacion',
+                                               'entidad__nombre_completo', 'entidad__tipo_lista'))
+    for cambio in cambios:
+        if cambio.tipo == CambioVigilancia.ALTA:
+            conjuntos[cambio.persona_id][cambio.entidad_id] = clave_registro(cambio.entidad)
+        else:
+            conjuntos[cambio.persona_id].pop(cambio.entidad_id, None)
+    return conjuntos
+
+
+def _registrar_cambios(con_cambios):
+    """Guarda las diferencias de las personas cuyo conjunto cambió. Devuelve (cambios, alertas)."""
+    guardar_entidades([entidad for _, entidades in con_cambios for entidad in entidades.values()])
+    anteriores = conjuntos_vigentes([persona for persona, _ in con_cambios])
+
+    cambios = []
+    for persona, entidades in con_cambios:
+        anterior = anteriores[persona.pk]
+        # Sin línea base esta revisión la fija. De un lote con hallazgos solo avisa si la
+        # fila no lo hizo; de una búsqueda (con ID y nombre, o incompleta) no avisa
+        inicial = not persona.huella_resultados
+        silenciosa = inicial and (persona.genero_alerta or persona.origen == PersonaVigilada.BUSQUEDA)
+        claves_anteriores = set(anterior.values())
+        actuales = {entidad.pk: entidad for entidad in entidades.values()}
+        for entidad_id, entidad in actuales.items():
+            if entidad_id in anterior:
+                continue
+            alerta = entidad.es_restrictiva and clave_registro(entidad) not in claves_anteriores and not silenciosa
+            persona.genero_alerta |= alerta
+            cambios.append(CambioVigilancia(persona=persona, empresa_id=persona.empresa_id, entidad=entidad,
+                                            tipo=CambioVigilancia.ALTA, inicial=inicial, alerta=alerta))
+        cambios += [
+            CambioVigilancia(persona=persona, empresa_id=persona.empresa_id, entidad_id=entidad_id,
+                             tipo=CambioVigilancia.BAJA)
+            for entidad_id in anterior if entidad_id not in actuales
+        ]
+    CambioVigilancia.objects.bulk_create(cambios, batch_size=1000)
+    alertas = [cambio for cambio in cambios if cambio.alerta]
+    for cambio in alertas:
+        logger.warning("Vigilancia: %s (empresa %s) aparece en %s", cambio.persona.clave,
+                       cambio.persona.empresa_id, cambio.entidad.tipo_lista)
+    return cambios, alertas
+
+
+def revisar_bloque(personas, ciclo):
+    """Consulta un bloque de personas y guarda sus diferencias. Devuelve cuántos criterios consultó."""
+    por_criterio = {}
+    for persona in personas:
+        por_criterio.setdefault((persona.identificacion, persona.nombres), []).append(persona)
+    respuestas = consultar_lote(list(por_criterio), concurrencia=settings.VIGILANCIA_CONCURRENCIA)
+
+    ahora = timezone.now()
+    minimo, maximo = settings.VIGILANCIA_INTERVALO_MINIMO_DIAS, settings.VIGILANCIA_INTERVALO_MAXIMO_DIAS
+    con_cambios, revisadas, errores = [], [], 0
+    for grupo, respuesta in zip(por_criterio.values(), respuestas):
+        if es_incompleta(respuesta):
+            # El API no respondió (o no todos sus endpoints): se reintenta pronto sin tocar la línea base
+            for persona in grupo:
+                persona.proxima_revision = ahora + timedelta(minutes=settings.VIGILANCIA_REINTENTO_MINUTOS)
+            errores += len(grupo)
+            continue
+
+        entidades = {}
+        for item in respuesta:
+            entidad = entidad_desde_registro(item)
+            entidades.setdefault(entidad.huella, entidad)
+        huella = huella_conjunto(entidades)
+        for persona in grupo:
+            if persona.huella_resultados == huella:
+                persona.intervalo_dias = min(persona.intervalo_dias * 2, maximo)
+            else:
+                con_cambios.append((persona, entidades))
+                persona.intervalo_dias = minimo
+            persona.ultima_revision = ahora
+            persona.proxima_revision = ahora + timedelta(days=persona.intervalo_dias)
+            revisadas.append(persona)
+
+    with transaction.atomic():
+        alertas = []
+        if con_cambios:
+            _, alertas = _registrar_cambios(con_cambios)
+        for persona, entidades in con_cambios:
+            persona.huella_resultados = huella_conjunto(entidades)
+        PersonaVigilada.objects.bulk_update(personas, [
+            'huella_resultados', 'genero_alerta', 'intervalo_dias', 'ultima_revision', 'proxima_revision',
+        ])
+
+    ciclo.revisadas += len(revisadas)
+    ciclo.con_cambios += len(con_cambios)
+    ciclo.errores += errores
+    ciclo.alertas += len(alertas)
+    ciclo.save(update_fields=['revisadas', 'con_cambios', 'errores', 'alertas'])
+    return len(por_criterio)
+
+
+def revisar_pendientes(ciclo, limite=None):
+    """
+    Revisa, de la más atrasada a la más reciente, hasta `limite` personas
+    pendientes (VIGILANCIA_MAXIMO_POR_CICLO por defecto), sin pasar de
+    VIGILANCIA_CONSULTAS_POR_MINUTO criterios por minuto.
+    """
+    limite = settings.VIGILANCIA_MAXIMO_POR_CICLO if limite is None else limite
+    por_minuto = settings.VIGILANCIA_CONSULTAS_POR_MINUTO
+    tomadas = 0
+    while tomadas < limite:
+        personas = _reservar(min(settings.VIGILANCIA_TAMANO_BLOQUE, limite - tomadas))
+        if not personas:
+            break
+        inicio = time.monotonic()
+        consultados = revisar_bloque(personas, ciclo)
+        tomadas += len(personas)
+        if por_minuto:
+            # El bloque siguiente espera lo que falte para no pasar del ritmo
+            espera = consultados * 60 / por_minuto - (time.monotonic() - inicio)
+            if espera > 0 and tomadas < limite:
+                time.sleep(espera)
+    return tomadas
+
+
+def ejecutar_ciclo(limite=None, revisar=True):
+    """
+    Un ciclo completo: agrega a la lista las consultas nuevas, adelanta a
+    quienes aparecen en un snapshot nuevo y revisa las pendientes.
+    """
+    anterior = CicloVigilancia.objects.order_by('-pk').first()
+    ciclo = CicloVigilancia.objects.create(
+        ultima_busqueda_id=anterior.ultima_busqueda_id if anterior else 0,
+        lotes_hasta=anterior.lotes_hasta if anterior else None,
+        snapshot_id=anterior.snapshot_id if anterior else None,
+    )
+    hasta = timezone.now() - MARGEN
+    sincronizar_busquedas(ciclo, hasta)
+    sincronizar_lotes(ciclo, hasta)
+    adelantar_por_snapshot(ciclo)
+    if revisar:
+        revisar_pendientes(ciclo, limite)
+    ciclo.terminado_en = timezone.now()
+    ciclo.save(update_fields=['terminado_en'])
+    return ciclo
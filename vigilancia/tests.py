@@ -0,0 +1,251 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from cargas_masivas.models import FilaLote, LoteConsultaMasiva
+from consultas import services
+from consultas.entidades import entidad_desde_registro, guardar_entidades
+from consultas.models import Busqueda
+from consultas.stub_api import StubAPIServer, generar_registro
+from consultas.views import guardar_busqueda
+from empresas.models import Empresa
+from espejo_listas.models import EntradaLista, SnapshotListas
+from usuarios.models import Usuario
+
+from .lista_vigilada import criterio_de_termino, huella_conjunto
+from .models import CambioVigilancia, PersonaVigilada
+from .revision import conjuntos_vigentes, ejecutar_ciclo
+
+
+class VigilanciaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Prueba')
+        cls.otra_empresa = Empresa.objects.create(nombre='Otra Empresa')
+        cls.usuario = Usuario.objects.create_user('cliente', email='cliente@example.com', empresa=cls.empresa)
+        cls.otro_usuario = Usuario.objects.create_user('otro', email='otro@example.com', empresa=cls.otra_empresa)
+
+    def setUp(self):
+        # Registros que devuelve el API por identificación o nombre; el 0 es OFAC (restrictiva)
+        self.hallazgos = {}
+        self.stub = StubAPIServer(resultados_por_consulta=self._resultados_por_consulta).iniciar()
+        self.ajustes = override_settings(
+            API_BASE_URL=self.stub.base_url, API_TOKEN='tok', API_CACHE_ACTIVO=False,
+            VIGILANCIA_CONSULTAS_POR_MINUTO=0, VIGILANCIA_TAMANO_BLOQUE=2,
+        )
+        self.ajustes.enable()
+
+    def tearDown(self):
+        services.cerrar_sesion()
+        self.ajustes.disable()
+        self.stub.detener()
+
+    def _resultados_por_consulta(self, endpoint, identificacion, nombre):
+        return self.hallazgos.get(identificacion or nombre, 0)
+
+    def _buscar(self, usuario, termino, registros, dias=30):
+        busqueda = guardar_busqueda(usuario, termino, registros)
+        Busqueda.objects.filter(pk=busqueda.pk).update(fecha_busqueda=timezone.now() - timedelta(days=dias))
+        return busqueda
+
+    def _lote(self, *filas):
+        lote = LoteConsultaMasiva.objects.create(
+            empresa=self.empresa, usuario_solicitante=self.usuario, archivo_subido='lote.xlsx',
+            estado='PROCESADO', fecha_procesado=timezone.now() - timedelta(days=30),
+        )
+        FilaLote.objects.bulk_create([
+            FilaLote(lote=lote, numero_fila=i + 2, clave=f'I:{fila["identificacion"]}', consultada=True, **fila)
+            for i, fila in enumerate(filas)
+        ])
+        return lote
+
+    def _revisar_todas(self, **kwargs):
+        PersonaVigilada.objects.update(proxima_revision=timezone.now())
+        return ejecutar_ciclo(**kwargs)
+
+    def test_criterio_de_termino(self):
+        self.assertEqual(criterio_de_termino('ID: 111 y Nombre: Juan Perez'), ('111', 'Juan Perez'))
+        self.assertEqual(criterio_de_termino('ID: 111'), ('111', ''))
+        self.assertEqual(criterio_de_termino('Nombre: Ana'), ('', 'Ana'))
+        self.assertIsNone(criterio_de_termino('otra cosa'))
+
+    def test_lista_sin_repetidos_con_linea_base_de_la_busqueda(self):
+        self._buscar(self.usuario, 'ID: 111', [generar_registro(2, identificacion='111')])
+        self._buscar(self.usuario, 'ID: 111 y Nombre: Juan Perez', [])
+        self._buscar(self.otro_usuario, 'ID: 111', [])
+        self._buscar(self.usuario, 'Nombre: maria  gomez', [])
+        self._buscar(self.usuario, 'término sin formato', [])
+        self._lote({'identificacion': '111'},
+                   {'identificacion': '222', 'encontro_resultados': True, 'genero_alerta': True})
+
+        ciclo = ejecutar_ciclo(revisar=False)
+
+        self.assertEqual(ciclo.agregadas, 4)
+        self.assertEqual(
+            sorted(PersonaVigilada.objects.values_list('empresa_id', 'clave')),
+            sorted([(self.empresa.pk, 'I:111'), (self.empresa.pk, 'I:222'),
+                    (self.empresa.pk, 'N:MARIA GOMEZ'), (self.otra_empresa.pk, 'I:111')]),
+        )
+        # La línea base es lo que devolvió la primera búsqueda
+        persona = PersonaVigilada.objects.get(empresa=self.empresa, clave='I:111')
+        self.assertEqual(persona.origen, PersonaVigilada.BUSQUEDA)
+        cambio = persona.cambios.get()
+        self.assertEqual(persona.huella_resultados, huella_conjunto([cambio.entidad.huella]))
+        self.assertTrue(cambio.inicial)
+        self.assertFalse(cambio.alerta)
+        # Del lote con hallazgos no hay entidades: la línea base queda pendiente
+        del_lote = PersonaVigilada.objects.get(clave='I:222')
+        self.assertEqual(del_lote.huella_resultados, '')
+        self.assertTrue(del_lote.genero_alerta)
+
+        # El ciclo siguiente solo lee lo nuevo, y no consultó el API
+        self.assertEqual(ejecutar_ciclo(revisar=False).agregadas, 0)
+        self.assertEqual(self.stub.peticiones, 0)
+
+    def test_revision_guarda_solo_diferencias(self):
+        self._buscar(self.usuario, 'ID: 111', [])
+        self._buscar(self.otro_usuario, 'ID: 111', [])
+        self._buscar(self.usuario, 'ID: 999', [], dias=1)
+        ejecutar_ciclo(revisar=False)
+
+        # Entra a OFAC: las búsquedas de hace 30 días ya tocan; la de ayer no
+        self.hallazgos['111'] = 1
+        with self.assertLogs('vigilancia.revision', level='WARNING'):
+            ciclo = ejecutar_ciclo()
+        self.assertEqual((ciclo.revisadas, ciclo.con_cambios, ciclo.alertas), (2, 2, 2))
+        # Las dos empresas vigilan el mismo criterio: una sola consulta
+        self.assertEqual(self.stub.rutas, ['/PepsExactaID/tok/111'])
+        alerta = CambioVigilancia.objects.get(empresa=self.empresa)
+        self.assertEqual(alerta.tipo, CambioVigilancia.ALTA)
+        self.assertTrue(alerta.alerta)
+        self.assertFalse(alerta.inicial)
+        self.assertEqual(alerta.entidad.tipo_lista, 'OFAC')
+        self.assertTrue(alerta.persona.genero_alerta)
+
+        # Sin cambios no se escribe nada y el intervalo se duplica
+        ciclo = self._revisar_todas()
+        self.assertEqual((ciclo.revisadas, ciclo.con_cambios), (3, 0))
+        self.assertEqual(CambioVigilancia.objects.count(), 2)
+        persona = PersonaVigilada.objects.get(empresa=self.empresa, clave='I:111')
+        self.assertEqual(persona.intervalo_dias, 14)
+        self.assertAlmostEqual(persona.proxima_revision, timezone.now() + timedelta(days=14),
+                               delta=timedelta(minutes=1))
+
+        # Sale de la lista: una baja por empresa, sin alerta, y vuelve al intervalo mínimo
+        self.hallazgos['111'] = 0
+        ciclo = self._revisar_todas()
+        self.assertEqual((ciclo.con_cambios, ciclo.alertas), (2, 0))
+        self.assertEqual(CambioVigilancia.objects.filter(tipo=CambioVigilancia.BAJA, alerta=False).count(), 2)
+        persona.refresh_from_db()
+        self.assertEqual(persona.intervalo_dias, 7)
+        self.assertEqual(conjuntos_vigentes([persona]), {persona.pk: {}})
+
+    def test_primera_revision_del_lote_no_repite_su_alerta(self):
+        self._lote({'identificacion': '222', 'encontro_resultados': True, 'genero_alerta': True},
+                   {'identificacion': '333', 'error_consulta': True},
+                   {'identificacion': '444'})
+        ejecutar_ciclo(revisar=False)
+        self.hallazgos.update({'222': 1, '333': 1, '444': 1})
+
+        # Como mucho `limite` por ciclo; las demás esperan al siguiente
+        with self.assertLogs('vigilancia.revision', level='WARNING'):
+            self.assertEqual(self._revisar_todas(limite=2).revisadas, 2)
+            self.assertEqual(ejecutar_ciclo().revisadas, 1)
+
+        cambios = {c.persona.identificacion: c for c in CambioVigilancia.objects.select_related('persona')}
+        # 222 ya había generado alerta en el lote; 333 no se pudo consultar entonces
+        self.assertTrue(cambios['222'].inicial)
+        self.assertFalse(cambios['222'].alerta)
+        self.assertTrue(cambios['333'].inicial)
+        self.assertTrue(cambios['333'].alerta)
+        # 444 no tuvo hallazgos en el lote: su línea base era el conjunto vacío
+        self.assertFalse(cambios['444'].inicial)
+        self.assertTrue(cambios['444'].alerta)
+
+    def test_busqueda_con_id_y_nombre_fija_la_linea_base_sin_avisar(self):
+        # Antes de la revisión completa la búsqueda solo consultaba PepsIDNombre
+        self._buscar(self.usuario, 'ID: 555 y Nombre: Ana Ruiz', [generar_registro(2, '555', 'ANA RUIZ')])
+        ejecutar_ciclo(revisar=False)
+        persona = PersonaVigilada.objects.get()
+        self.assertEqual(persona.huella_resultados, '')
+
+        # La revisión encuentra además a los homónimos de PepsNombre: no son nuevos
+        self.hallazgos.update({'555': 1, 'ANA RUIZ': 2})
+        ciclo = self._revisar_todas()
+        self.assertEqual((ciclo.con_cambios, ciclo.alertas), (1, 0))
+        self.assertFalse(CambioVigilancia.objects.filter(alerta=True).exists())
+        persona.refresh_from_db()
+        self.assertNotEqual(persona.huella_resultados, '')
+        self.assertEqual(self._revisar_todas().con_cambios, 0)
+
+        # Si PepsNombre no responde a tiempo no se dan de baja sus registros
+        self.stub.configurar(latencia=lambda endpoint: 1.0 if endpoint == 'PepsNombre' else 0)
+        cambios = CambioVigilancia.objects.count()
+        with override_settings(API_PLAZO_BUSQUEDA=0.3), self.assertLogs('consultas.consulta_paralela', level='WARNING'):
+            ciclo = self._revisar_todas()
+        self.assertEqual((ciclo.revisadas, ciclo.errores, ciclo.con_cambios), (0, 1, 0))
+        self.assertEqual(CambioVigilancia.objects.count(), cambios)
+        persona.refresh_from_db()
+        self.assertLess(persona.proxima_revision, timezone.now() + timedelta(days=1))
+
+    def test_snapshot_nuevo_adelanta_a_quienes_aparecen(self):
+        for termino in ('ID: 111', 'ID: 444', 'Nombre: Ana Ruiz', 'Nombre: Luis Diaz'):
+            self._buscar(self.usuario, termino, [], dias=1)
+        registro_444 = generar_registro(0, identificacion='444')
+        anterior = SnapshotListas.objects.create(origen='a.json', huella='a', estado='ACTIVO',
+                                                 activado_en=timezone.now())
+        EntradaLista.objects.create(snapshot=anterior, identificacion='444', nombre='PERSONA SINTETICA 0',
+                                    datos=registro_444)
+        ejecutar_ciclo(revisar=False)
+
+        anterior.estado = 'REEMPLAZADO'
+        anterior.save()
+        nuevo = SnapshotListas.objects.create(origen='b.json', huella='b', estado='ACTIVO', activado_en=timezone.now())
+        EntradaLista.objects.bulk_create([
+            EntradaLista(snapshot=nuevo, identificacion='444', nombre='PERSONA SINTETICA 0', datos=registro_444),
+            EntradaLista(snapshot=nuevo, identificacion='111', nombre='JUAN', datos=generar_registro(0, '111')),
+            EntradaLista(snapshot=nuevo, identificacion='', nombre='ANA RUIZ',
+                         datos=generar_registro(1, '', 'ANA RUIZ')),
+        ])
+
+        ciclo = ejecutar_ciclo(revisar=False)
+
+        self.assertEqual(ciclo.adelantadas, 2)
+        pendientes = PersonaVigilada.objects.filter(proxima_revision__lte=timezone.now())
+        self.assertEqual(sorted(pendientes.values_list('clave', flat=True)), ['I:111', 'N:ANA RUIZ'])
+        # El mismo snapshot no vuelve a adelantar a nadie
+        self.assertEqual(ejecutar_ciclo(revisar=False).adelantadas, 0)
+
+    def test_superior_ve_y_atiende_las_alertas_de_su_empresa(self):
+        entidad, = guardar_entidades([entidad_desde_registro(generar_registro(0, identificacion='111'))])
+        alertas = {}
+        for empresa in (self.empresa, self.otra_empresa):
+            persona = PersonaVigilada.objects.create(
+                empresa=empresa, clave='I:111', identificacion='111', origen=PersonaVigilada.BUSQUEDA,
+                origen_id=1, proxima_revision=timezone.now(),
+            )
+            alertas[empresa.pk] = CambioVigilancia.objects.create(
+                persona=persona, empresa=empresa, entidad=entidad, tipo=CambioVigilancia.ALTA, alerta=True)
+        superior = Usuario.objects.create_user('superior', empresa=self.empresa, es_superior=True)
+        self.client.force_login(superior)
+
+        respuesta = self.client.get(reverse('vigilancia:alertas'))
+        self.assertEqual(list(respuesta.context['page_obj']), [alertas[self.empresa.pk]])
+        self.assertContains(respuesta, 'OFAC')
+
+        # Una alerta de otra empresa no se puede atender
+        self.client.post(reverse('vigilancia:atender_alerta', args=[alertas[self.otra_empresa.pk].pk]))
+        respuesta = self.client.post(reverse('vigilancia:atender_alerta', args=[alertas[self.empresa.pk].pk]))
+        self.assertRedirects(respuesta, reverse('vigilancia:alertas'))
+        for alerta in alertas.values():
+            alerta.refresh_from_db()
+        self.assertEqual(alertas[self.empresa.pk].atendida_por, superior)
+        self.assertIsNone(alertas[self.otra_empresa.pk].atendida_en)
+        self.assertEqual(list(self.client.get(reverse('vigilancia:alertas')).context['page_obj']), [])
+
+        # Un usuario que no es superior no entra
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get(reverse('vigilancia:alertas')).status_code, 403)
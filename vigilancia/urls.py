@@ -0,0 +1,11 @@
+# archivo: vigilancia/urls.py
+from django.urls import path
+
+from . import views
+
+app_name = 'vigilancia'
+
+urlpatterns = [
+    path('alertas/', views.alertas, name='alertas'),
+    path('alertas/<int:cambio_id>/atender/', views.atender_alerta, name='atender_alerta'),
+]
@@ -0,0 +1,53 @@
+# archivo: vigilancia/views.py
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect, render
+from django.utils import timezone
+from django.views.decorators.http import require_POST
+
+from consultas.paginacion import contar, paginar_por_cursor
+from consultas.views import superior_required
+
+from .models import CambioVigilancia, PersonaVigilada
+
+ORDEN_ALERTAS = ['-fecha', '-id']
+ALERTAS_POR_PAGINA = 25
+
+
+@login_required
+@superior_required
+def alertas(request):
+    """
+    Personas ya consultadas por la empresa que aparecieron después en una
+    lista restrictiva (vigilancia continua). Por defecto solo las pendientes.
+    """
+    empresa = request.user.empresa
+    alertas_empresa = (CambioVigilancia.objects.filter(empresa=empresa, alerta=True)
+                       .select_related('persona', 'entidad', 'atendida_por'))
+    estado = request.GET.get('estado', 'pendientes')
+    if estado == 'pendientes':
+        alertas_empresa = alertas_empresa.filter(atendida_en__isnull=True)
+    elif estado == 'atendidas':
+        alertas_empresa = alertas_empresa.filter(atendida_en__isnull=False)
+
+    page_obj = paginar_por_cursor(alertas_empresa, request.GET, ORDEN_ALERTAS, ALERTAS_POR_PAGINA)
+    total_vigiladas, total_exacto = contar(PersonaVigilada.objects.filter(empresa=empresa, activa=True))
+
+    context = {
+        'empresa': empresa,
+        'page_obj': page_obj,
+        'estado': estado,
+        'total_vigiladas': total_vigiladas,
+        'total_exacto': total_exacto,
+    }
+    return render(request, 'vigilancia/alertas.html', context)
+
+
+@require_POST
+@login_required
+@superior_required
+def atender_alerta(request, cambio_id):
+    # Solo alertas de la propia empresa; las ya atendidas conservan quién y cuándo
+    CambioVigilancia.objects.filter(
+        pk=cambio_id, empresa=request.user.empresa, alerta=True, atendida_en__isnull=True,
+    ).update(atendida_en=timezone.now(), atendida_por=request.user)
+    return redirect('vigilancia:alertas')